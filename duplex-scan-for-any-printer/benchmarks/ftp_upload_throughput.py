@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+FTP upload throughput benchmark (loopback).
+
+Starts the scanner FTP server in a child process and drives it with several
+simulated scanners uploading concurrently, once per server configuration.
+Reports throughput and per-file latency as JSON.
+
+Usage:
+    python benchmarks/ftp_upload_throughput.py
+    python benchmarks/ftp_upload_throughput.py --clients 6 --files 20 --size-kb 800
+    python benchmarks/ftp_upload_throughput.py --payload ambiguous   # forces Magika
+    python benchmarks/ftp_upload_throughput.py --configs async-sync,async,threaded
+"""
+from __future__ import annotations
+
+import argparse
+import ftplib
+import io
+import json
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+# name -> (server_mode, async_validation). "async-sync" is the pre-pool behaviour.
+CONFIGS = {
+    "async-sync": ("async", False),
+    "async": ("async", True),
+    "threaded": ("threaded", True),
+    "multiprocess": ("multiprocess", True),
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _payload(kind: str, size: int, seed: int) -> bytes:
+    rnd = random.Random(seed)
+    body = bytes(rnd.getrandbits(8) for _ in range(size))
+    if kind == "jpeg":
+        return b"\xff\xd8\xff\xe0" + body + b"\xff\xd9"
+    return b"\x00\x01scan" + body  # no known signature — goes through Magika
+
+
+def _serve(port: int, directory: str, server_mode: str, async_validation: bool, sock_path: str):
+    # Keep ingest notifications away from a real agent running on this host
+    os.environ["SCAN_INGEST_SOCKET"] = sock_path
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    from agent.ftp_server import create_ftp_server
+    server = create_ftp_server(
+        host="127.0.0.1",
+        port=port,
+        directory=directory,
+        server_mode=server_mode,
+        async_validation=async_validation,
+        max_cons_per_ip=0,
+    )
+    server.serve_forever()
+
+
+def _wait_ready(port: int, timeout: float = 15.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("FTP server did not start")
+
+
+def _client(port: int, files: int, data: bytes, idx: int, latencies: list, errors: list) -> None:
+    try:
+        ftp = ftplib.FTP()
+        ftp.connect("127.0.0.1", port, timeout=30)
+        ftp.login()
+        ftp.cwd("scan_duplex")
+        for n in range(files):
+            t0 = time.perf_counter()
+            ftp.storbinary(f"STOR bench_{idx}_{n}.jpg", io.BytesIO(data))
+            latencies.append(time.perf_counter() - t0)
+        ftp.quit()
+    except Exception as e:
+        errors.append(f"client {idx}: {e}")
+
+
+def run_config(name: str, clients: int, files: int, data: bytes) -> dict:
+    server_mode, async_validation = CONFIGS[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        inbox = os.path.join(tmp, "inbox")
+        os.makedirs(os.path.join(inbox, "scan_duplex"))
+        port = _free_port()
+        proc = multiprocessing.Process(
+            target=_serve,
+            args=(port, inbox, server_mode, async_validation, os.path.join(tmp, "ingest.sock")),
+        )  # not a daemon: multiprocess mode forks a child per connection
+        proc.start()
+        try:
+            _wait_ready(port)
+            latencies: list = []
+            errors: list = []
+            threads = [
+                threading.Thread(target=_client, args=(port, files, data, i, latencies, errors))
+                for i in range(clients)
+            ]
+            t0 = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - t0
+        finally:
+            proc.terminate()
+            proc.join(timeout=5)
+
+    total_mb = len(data) * len(latencies) / (1024 * 1024)
+    lat_sorted = sorted(latencies) or [0.0]
+    return {
+        "config": name,
+        "server_mode": server_mode,
+        "async_validation": async_validation,
+        "uploads": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_mb_s": round(total_mb / elapsed, 2) if elapsed else 0.0,
+        "uploads_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(statistics.median(lat_sorted) * 1000, 1),
+            "p95": round(lat_sorted[int(0.95 * (len(lat_sorted) - 1))] * 1000, 1),
+            "max": round(lat_sorted[-1] * 1000, 1),
+        },
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--clients", type=int, default=4, help="concurrent simulated scanners")
+    ap.add_argument("--files", type=int, default=10, help="uploads per client")
+    ap.add_argument("--size-kb", type=int, default=500, help="upload size in KiB")
+    ap.add_argument("--payload", choices=("jpeg", "ambiguous"), default="jpeg",
+                    help="jpeg: magic-byte fast path; ambiguous: needs Magika")
+    ap.add_argument("--configs", default="async-sync,async,threaded,multiprocess",
+                    help=f"comma-separated subset of: {', '.join(CONFIGS)}")
+    ap.add_argument("--output", help="also write the JSON report to this file")
+    args = ap.parse_args()
+
+    names = [c.strip() for c in args.configs.split(",") if c.strip()]
+    unknown = [c for c in names if c not in CONFIGS]
+    if unknown:
+        ap.error(f"unknown config(s): {', '.join(unknown)}")
+
+    data = _payload(args.payload, args.size_kb * 1024, seed=42)
+    report = {
+        "clients": args.clients,
+        "files_per_client": args.files,
+        "size_kb": args.size_kb,
+        "payload": args.payload,
+        "results": [],
+    }
+    for name in names:
+        print(f"▶ {name} ...", file=sys.stderr)
+        report["results"].append(run_config(name, args.clients, args.files, data))
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
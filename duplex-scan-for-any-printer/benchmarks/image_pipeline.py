@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Image pipeline benchmark on deterministic synthetic scans.
+
+Runs each processing stage (orientation, deskew, crop, PDF generation) on the
+scans from ``synthetic_scans.py`` at several DPIs and reports, per stage and
+per DPI: latency (p50/p95/max), throughput (items/s, megapixels/s), peak RSS
+while the stage runs, and accuracy against the generated ground truth
+(orientation hit rate, deskew angle error, crop bbox IoU). The report is JSON
+and stable across runs with the same seed, so two reports can be diffed or
+passed to ``--compare``.
+
+The crop stage needs the background-removal checkpoints (``./checkpoints``,
+relative to the working directory, like the agent); without them it is
+reported as skipped.
+
+Usage:
+    python benchmarks/image_pipeline.py
+    python benchmarks/image_pipeline.py --dpi 150,300 --samples 2 --stages orientation,deskew
+    python benchmarks/image_pipeline.py --output before.json
+    python benchmarks/image_pipeline.py --compare before.json --max-regression 15
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from synthetic_scans import SyntheticScan, bbox_iou, generate  # noqa: E402
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return None
+
+
+class PeakRSS:
+    """Samples RSS on a background thread; ``measure()`` brackets one call."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.available = rss_bytes() is not None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            rss = rss_bytes() or 0
+            if rss > self.peak:
+                self.peak = rss
+
+    @contextlib.contextmanager
+    def measure(self):
+        if not self.available:
+            yield
+            return
+        self.peak = rss_bytes() or 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        try:
+            yield
+        finally:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, rss_bytes() or 0)
+
+
+# ─── Stages ──────────────────────────────────────────────────────────────────
+# Each stage takes a sample and a scratch directory and returns accuracy
+# values for that sample (possibly empty). Only the call itself is timed.
+
+def _orientation(sample: SyntheticScan, _tmp: str) -> Dict[str, float]:
+    from agent.image_processing import detect_orientation_with_confidence
+    angle, confidence = detect_orientation_with_confidence(sample.image)
+    return {"correct": float(angle == sample.rotation), "confidence": confidence}
+
+
+def _deskew(sample: SyntheticScan, _tmp: str) -> Dict[str, float]:
+    from agent.image_processing import deskew_image
+    _, angle = deskew_image(sample.name, sample.image)
+    return {"angle_error": abs(angle + sample.skew)}  # a perfect correction rotates by -skew
+
+
+def _crop(sample: SyntheticScan, _tmp: str) -> Dict[str, float]:
+    from agent.image_processing import crop_document_v2
+    result = crop_document_v2(sample.image, debug=False, img_name=sample.name)
+    bbox = result[1] if isinstance(result, tuple) else (0, 0, sample.image.width, sample.image.height)
+    return {"iou": bbox_iou(bbox, sample.bbox)}
+
+
+def _pdf_scan_document(sample: SyntheticScan, tmp: str, mono: bool = False) -> Dict[str, float]:
+    from agent.layout_engine import determine_document_span, layout_documents_smart
+    from agent.pdf_generator import A4, save_pdf_scan_document_fast, save_pdf_scan_document_mono_fast
+    doc = sample.document
+    margin = 10
+    span = determine_document_span(doc.width, doc.height, A4[0], A4[1], margin, sample.dpi)
+    pages = layout_documents_smart([(span, (0, 0, doc.width, doc.height), doc, sample.dpi)], A4[0], A4[1], margin)
+    out = os.path.join(tmp, "scan_document.pdf")
+    (save_pdf_scan_document_mono_fast if mono else save_pdf_scan_document_fast)(pages, out, A4, margin)
+    return {}
+
+
+def _pdf_duplex(sample: SyntheticScan, tmp: str) -> Dict[str, float]:
+    from agent.pdf_generator import save_pdf_from_images_interleaved_fast
+    save_pdf_from_images_interleaved_fast([(sample.document, sample.document.rotate(180))],
+                                          os.path.join(tmp, "duplex.pdf"))
+    return {}
+
+
+def _pdf_card_2in1(sample: SyntheticScan, tmp: str) -> Dict[str, float]:
+    from agent.pdf_generator import save_pdf_card_2in1_grid_fast
+    save_pdf_card_2in1_grid_fast([sample.document, sample.document.rotate(180)],
+                                 os.path.join(tmp, "card_2in1.pdf"))
+    return {}
+
+
+def _crop_unavailable() -> Optional[str]:
+    from agent.constants import CHECKPOINT_PATHS
+    missing = [p for p in CHECKPOINT_PATHS if not os.path.exists(p)]
+    if missing:
+        return f"background-removal checkpoints not found: {', '.join(missing)}"
+    return None
+
+
+# name -> (sample kinds, function, availability check returning a skip reason)
+STAGES: Dict[str, tuple] = {
+    "orientation": (("page", "card"), _orientation, None),
+    "deskew": (("page", "card"), _deskew, None),
+    "crop": (("card", "page"), _crop, _crop_unavailable),
+    "pdf_scan_document": (("page", "card"), _pdf_scan_document, None),
+    "pdf_scan_document_mono": (("page",), lambda s, t: _pdf_scan_document(s, t, mono=True), None),
+    "pdf_duplex": (("page",), _pdf_duplex, None),
+    "pdf_card_2in1": (("card",), _pdf_card_2in1, None),
+}
+
+
+# ─── Aggregation ─────────────────────────────────────────────────────────────
+
+def _latency(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values) or [0.0]
+    return {
+        "p50": round(statistics.median(ordered) * 1000, 1),
+        "p95": round(ordered[math.ceil(0.95 * len(ordered)) - 1] * 1000, 1),  # nearest rank
+        "max": round(ordered[-1] * 1000, 1),
+    }
+
+
+def _accuracy(rows: List[Dict[str, float]]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    keys = sorted({k for row in rows for k in row})
+    for key in keys:
+        values = [row[key] for row in rows if key in row]
+        if key == "correct":
+            out["orientation_accuracy"] = round(sum(values) / len(values), 3)
+        elif key == "iou":
+            out["iou_mean"] = round(statistics.fmean(values), 3)
+            out["iou_min"] = round(min(values), 3)
+            out["iou_ge_0_9"] = round(sum(v >= 0.9 for v in values) / len(values), 3)
+        elif key == "angle_error":
+            out["angle_error_mean"] = round(statistics.fmean(values), 3)
+            out["angle_error_max"] = round(max(values), 3)
+        else:
+            out[f"{key}_mean"] = round(statistics.fmean(values), 3)
+    return out
+
+
+def _summarize(records: List[dict]) -> dict:
+    elapsed = sum(r["seconds"] for r in records)
+    mpix = sum(r["megapixels"] for r in records)
+    errors = [r["error"] for r in records if r.get("error")]
+    ok = [r for r in records if not r.get("error")]
+    summary = {
+        "items": len(records),
+        "errors": len(errors),
+        "latency_ms": _latency([r["seconds"] for r in ok]),
+        "items_per_s": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "megapixels_per_s": round(mpix / elapsed, 2) if elapsed else 0.0,
+    }
+    peaks = [r["peak_rss"] for r in records if r.get("peak_rss")]
+    if peaks:
+        summary["peak_rss_mb"] = round(max(peaks) / 1e6, 1)
+        summary["peak_rss_growth_mb"] = round(max(r["peak_rss"] - r["rss_before"] for r in records
+                                                  if r.get("peak_rss")) / 1e6, 1)
+    accuracy = _accuracy([r["accuracy"] for r in ok])
+    if accuracy:
+        summary["accuracy"] = accuracy
+    if errors:
+        summary["first_error"] = errors[0]
+    return summary
+
+
+def _run_one(fn: Callable, sample: SyntheticScan, tmp: str, peak: PeakRSS, quiet: bool) -> dict:
+    record = {"dpi": sample.dpi, "kind": sample.kind, "megapixels": sample.megapixels,
+              "rss_before": rss_bytes() or 0, "accuracy": {}}
+    sink = io.StringIO() if quiet else None
+    with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+        with peak.measure():
+            t0 = time.perf_counter()
+            try:
+                record["accuracy"] = fn(sample, tmp)
+            except Exception as e:
+                record["error"] = f"{sample.name}: {type(e).__name__}: {e}"
+            record["seconds"] = time.perf_counter() - t0
+    record["peak_rss"] = peak.peak if peak.available else None
+    return record
+
+
+def run(stage_names: List[str], dpis: List[int], samples: int, seed: int,
+        warmup: int = 1, quiet: bool = True) -> dict:
+    peak = PeakRSS()
+    records: Dict[str, List[dict]] = {name: [] for name in stage_names}
+    skipped: Dict[str, str] = {}
+    for name in stage_names:
+        check = STAGES[name][2]
+        reason = check() if check else None
+        if reason:
+            skipped[name] = reason
+
+    active = [n for n in stage_names if n not in skipped]
+    warmed: Dict[str, int] = {n: 0 for n in active}
+    with tempfile.TemporaryDirectory() as tmp:
+        for sample in generate(dpis, samples, seed=seed):
+            print(f"▶ {sample.name} ...", file=sys.stderr)
+            for name in active:
+                kinds, fn, _ = STAGES[name]
+                if sample.kind not in kinds:
+                    continue
+                while warmed[name] < warmup:  # first call pays for imports and model/JIT setup
+                    _run_one(fn, sample, tmp, peak, quiet)
+                    warmed[name] += 1
+                records[name].append(_run_one(fn, sample, tmp, peak, quiet))
+
+    stages: Dict[str, dict] = {}
+    for name in stage_names:
+        if name in skipped:
+            stages[name] = {"skipped": skipped[name]}
+            continue
+        rows = records[name]
+        entry = _summarize(rows)
+        entry["by_dpi"] = {str(d): _summarize([r for r in rows if r["dpi"] == d])
+                           for d in dpis if any(r["dpi"] == d for r in rows)}
+        kinds = sorted({r["kind"] for r in rows})
+        if len(kinds) > 1:
+            entry["by_kind"] = {k: _summarize([r for r in rows if r["kind"] == k]) for k in kinds}
+        stages[name] = entry
+    return {"stages": stages, "rss_sampling": peak.available}
+
+
+# ─── Comparison ──────────────────────────────────────────────────────────────
+
+# (path inside a stage summary, higher is better)
+_COMPARED = (
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p95"), False),
+    (("megapixels_per_s",), True),
+    (("peak_rss_mb",), False),
+    (("accuracy", "orientation_accuracy"), True),
+    (("accuracy", "angle_error_mean"), False),
+    (("accuracy", "iou_mean"), True),
+)
+
+
+def _get(d: dict, path: tuple):
+    for key in path:
+        if not isinstance(d, dict) or key not in d:
+            return None
+        d = d[key]
+    return d
+
+
+def compare(baseline: dict, current: dict) -> Dict[str, dict]:
+    """Per stage and metric: baseline, current, change in % and whether it got worse."""
+    out: Dict[str, dict] = {}
+    for name, stage in current.get("stages", {}).items():
+        base = baseline.get("stages", {}).get(name)
+        if not base or "skipped" in stage or "skipped" in base:
+            continue
+        metrics = {}
+        for path, higher_is_better in _COMPARED:
+            before, after = _get(base, path), _get(stage, path)
+            if before is None or after is None:
+                continue
+            change = round((after - before) / before * 100, 1) if before else 0.0
+            metrics[".".join(path)] = {
+                "baseline": before, "current": after, "change_pct": change,
+                "regressed": (change < 0) if higher_is_better else (change > 0),
+            }
+        out[name] = metrics
+    return out
+
+
+def _meta(args) -> dict:
+    from importlib import metadata
+    versions = {}
+    for dist in ("numpy", "opencv-python-headless", "opencv-python", "Pillow", "PyMuPDF", "deskew", "withoutbg"):
+        try:
+            versions[dist] = metadata.version(dist)
+        except metadata.PackageNotFoundError:
+            pass
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        rev = None
+    return {
+        "seed": args.seed,
+        "dpi": [int(d) for d in args.dpi.split(",")],
+        "samples_per_kind": args.samples,
+        "warmup": args.warmup,
+        "git_rev": rev,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dpi", default="150,300,600", help="comma-separated scan DPIs")
+    ap.add_argument("--samples", type=int, default=3, help="samples per document kind per DPI")
+    ap.add_argument("--stages", default=",".join(STAGES), help=f"comma-separated subset of: {', '.join(STAGES)}")
+    ap.add_argument("--seed", type=int, default=0, help="generator seed (same seed, same pixels)")
+    ap.add_argument("--warmup", type=int, default=1, help="untimed calls per stage before measuring")
+    ap.add_argument("--verbose", action="store_true", help="keep the stages' own console output")
+    ap.add_argument("--output", help="also write the JSON report to this file")
+    ap.add_argument("--compare", metavar="BASELINE", help="earlier report to diff against")
+    ap.add_argument("--max-regression", type=float, metavar="PCT",
+                    help="with --compare: exit 1 if any p50 latency grew by more than PCT%%")
+    args = ap.parse_args()
+
+    names = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in names if s not in STAGES]
+    if unknown:
+        ap.error(f"unknown stage(s): {', '.join(unknown)}")
+    if args.max_regression is not None and not args.compare:
+        ap.error("--max-regression needs --compare")
+
+    logging.basicConfig(level=logging.WARNING)
+    report = {"meta": _meta(args)}
+    report.update(run(names, report["meta"]["dpi"], args.samples, args.seed, args.warmup, not args.verbose))
+
+    status = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("seed") != args.seed:
+            print("⚠️  baseline used a different seed; accuracy is not comparable", file=sys.stderr)
+        report["comparison"] = compare(baseline, report)
+        for stage, metrics in report["comparison"].items():
+            p50 = metrics.get("latency_ms.p50")
+            if p50:
+                print(f"  {stage:24s} p50 {p50['baseline']:>9} → {p50['current']:>9} ms "
+                      f"({p50['change_pct']:+.1f}%)", file=sys.stderr)
+                if args.max_regression is not None and p50["change_pct"] > args.max_regression:
+                    status = 1
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
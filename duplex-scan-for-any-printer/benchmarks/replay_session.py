@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+Replay recorded scan sessions offline.
+
+Takes existing projects — ``scan_out/<session>/images`` plus the
+``scan_out/<session>.json`` and ``.pdf`` the agent produced from them — and
+reruns the session pipeline on those images in test mode (no printing, the
+project is only read) into a scratch output directory. Reports per-stage
+timing (the pipeline's own ``[TIMING]`` lines) with peak RSS during each
+stage, and how the new PDFs and metadata differ from the recorded ones.
+
+Tuning knobs, so the same real sessions can be replayed with other settings:
+  --workers N             sessions processed concurrently (max_parallel_sessions)
+  --cv-threads N          OpenCV worker threads
+  --analysis-width PX     orientation/deskew analysis width
+  --document-crop-width PX / --card-crop-width PX   background-removal width
+  --encoder PROFILE       PDF image encoding (default, compact, archive);
+                          --pdf-quality / --pdf-max-dim override it
+
+Usage:
+    python benchmarks/replay_session.py scan_out/scan_duplex-1760000000
+    python benchmarks/replay_session.py scan_out/*/ --workers 2 --encoder compact --output replay.json
+    python benchmarks/replay_session.py scan_out/card_2in1-1760000000 --card-crop-width 400 --keep /tmp/replay
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import contextlib
+import dataclasses
+import io
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from image_pipeline import rss_bytes  # noqa: E402
+from synthetic_scans import bbox_iou  # noqa: E402
+
+MODES = ("scan_duplex", "copy_duplex", "scan_document", "card_2in1", "test_print")
+
+# pdf_generator module settings per profile
+ENCODER_PROFILES = {
+    "default": {"PDF_JPEG_QUALITY": 90, "PDF_MAX_DIMENSION": 2000},
+    "compact": {"PDF_JPEG_QUALITY": 75, "PDF_MAX_DIMENSION": 1754},  # A4 at 150 DPI
+    "archive": {"PDF_JPEG_QUALITY": 95, "PDF_MAX_DIMENSION": 3508},  # A4 at 300 DPI
+}
+
+# Recorded output name suffix -> report key
+OUTPUTS = {"": "pdf", "_mono": "pdf_mono", "_test": "pdf_test"}
+
+_TIMING = re.compile(r"\[(?:TIMING|FAST)\]\s*([^:=]+?):\s+([\d.]+)s\b")
+
+
+@dataclasses.dataclass
+class RecordedSession:
+    id: str
+    mode: str
+    project_dir: str
+    images: List[str]
+    metadata: Optional[dict]
+    outputs: Dict[str, str]  # report key -> recorded PDF path
+
+
+def load_recorded(path: str, mode: Optional[str] = None) -> RecordedSession:
+    """A project folder written by ``process_session`` (``<output_dir>/<session id>``)."""
+    project_dir = os.path.abspath(path.rstrip("/\\"))
+    session_id = os.path.basename(project_dir)
+    output_dir = os.path.dirname(project_dir)
+    images_dir = os.path.join(project_dir, "images")
+    if not os.path.isdir(images_dir):
+        raise ValueError(f"{path}: no images/ folder (not a scan project)")
+    images = [os.path.join(images_dir, name) for name in sorted(os.listdir(images_dir))
+              if not name.startswith(".") and os.path.isfile(os.path.join(images_dir, name))]
+    if not images:
+        raise ValueError(f"{path}: images/ is empty")
+
+    metadata = None
+    meta_path = os.path.join(output_dir, f"{session_id}.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            metadata = json.load(f)
+    # Session ids are "<mode>-[<device>-]<timestamp>" and modes never contain "-"
+    mode = mode or (metadata or {}).get("mode") or session_id.split("-", 1)[0]
+    if mode not in MODES:
+        raise ValueError(f"{path}: unknown mode {mode!r}; pass --mode")
+    outputs = {key: os.path.join(output_dir, f"{session_id}{suffix}.pdf") for suffix, key in OUTPUTS.items()
+               if os.path.exists(os.path.join(output_dir, f"{session_id}{suffix}.pdf"))}
+    return RecordedSession(session_id, mode, project_dir, images, metadata, outputs)
+
+
+# ─── Measurement ─────────────────────────────────────────────────────────────
+
+class StdoutTap(io.TextIOBase):
+    """``sys.stdout`` replacement that keeps each thread's lines with timestamps."""
+
+    def __init__(self, echo=None):
+        self.echo = echo
+        self._local = threading.local()
+
+    def begin(self) -> None:
+        self._local.lines, self._local.partial = [], ""
+
+    def end(self) -> List[Tuple[float, str]]:
+        lines = getattr(self._local, "lines", None) or []
+        self._local.lines = None
+        return lines
+
+    def write(self, text: str) -> int:
+        if self.echo is not None:
+            self.echo.write(text)
+        lines = getattr(self._local, "lines", None)
+        if lines is not None:
+            now = time.perf_counter()
+            *complete, self._local.partial = (self._local.partial + text).split("\n")
+            lines.extend((now, line) for line in complete)
+        return len(text)
+
+    def flush(self) -> None:
+        if self.echo is not None:
+            self.echo.flush()
+
+
+class RSSTrace:
+    """Process RSS sampled on a background thread, queried by time window."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self._times: List[float] = []
+        self._values: List[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.available = rss_bytes() is not None
+
+    def _run(self) -> None:
+        while True:
+            rss = rss_bytes()
+            if rss is not None:
+                self._times.append(time.perf_counter())
+                self._values.append(rss)
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self) -> None:
+        if self.available:
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def peak(self, t0: float, t1: float) -> Optional[int]:
+        lo = bisect.bisect_left(self._times, t0)
+        hi = bisect.bisect_right(self._times, t1)
+        window = self._values[lo:hi]
+        return max(window) if window else None
+
+
+def _stage_timings(lines: List[Tuple[float, str]], trace: RSSTrace) -> Dict[str, dict]:
+    """``[TIMING] label: 1.234s`` lines → {label: seconds, peak RSS while it ran}."""
+    stages: Dict[str, dict] = {}
+    for t, line in lines:
+        m = _TIMING.search(line)
+        if not m:
+            continue
+        label = re.sub(r"\d+", "N", m.group(1).strip())
+        seconds = float(m.group(2))
+        entry = stages.setdefault(label, {"seconds": 0.0})
+        entry["seconds"] = round(entry["seconds"] + seconds, 3)
+        peak = trace.peak(t - seconds, t)
+        if peak is not None:
+            entry["peak_rss_mb"] = max(entry.get("peak_rss_mb", 0.0), round(peak / 1e6, 1))
+    return stages
+
+
+# ─── Settings ────────────────────────────────────────────────────────────────
+
+def apply_settings(args) -> Dict[str, object]:
+    """Set the pipeline's module-level tunables; returns the effective values."""
+    import cv2
+    import main
+    from agent import image_processing, pdf_generator
+
+    encoder = dict(ENCODER_PROFILES[args.encoder])
+    if args.pdf_quality is not None:
+        encoder["PDF_JPEG_QUALITY"] = args.pdf_quality
+    if args.pdf_max_dim is not None:
+        encoder["PDF_MAX_DIMENSION"] = args.pdf_max_dim
+    for name, value in encoder.items():
+        setattr(pdf_generator, name, value)
+    if args.analysis_width is not None:
+        image_processing.ANALYSIS_WIDTH = args.analysis_width
+    if args.document_crop_width is not None:
+        main.SCAN_DOCUMENT_CROP_WIDTH = args.document_crop_width
+    if args.card_crop_width is not None:
+        main.CARD_CROP_WIDTH = args.card_crop_width
+    if args.cv_threads is not None:
+        cv2.setNumThreads(args.cv_threads)
+
+    return {
+        "workers": args.workers,
+        "cv_threads": cv2.getNumThreads(),
+        "analysis_width": image_processing.ANALYSIS_WIDTH,
+        "document_crop_width": main.SCAN_DOCUMENT_CROP_WIDTH,
+        "card_crop_width": main.CARD_CROP_WIDTH,
+        "encoder": args.encoder,
+        "pdf_jpeg_quality": pdf_generator.PDF_JPEG_QUALITY,
+        "pdf_max_dimension": pdf_generator.PDF_MAX_DIMENSION,
+    }
+
+
+def _base_config(path: Optional[str]):
+    from agent.config import Config
+    if path:
+        return Config.load(path)
+    return Config(inbox_base="", subdirs={}, output_dir="")
+
+
+# ─── Replay ──────────────────────────────────────────────────────────────────
+
+def replay_once(cfg, rec: RecordedSession, tap: StdoutTap, trace: RSSTrace) -> dict:
+    import main
+    from agent.session_manager import Session
+
+    session = Session(id=rec.id, mode=rec.mode, images=list(rec.images))
+    tap.begin()
+    t0 = time.perf_counter()
+    run: dict = {}
+    try:
+        main._process_session_inner(cfg, session, time.time())
+    except Exception as e:
+        run["error"] = f"{type(e).__name__}: {e}"
+    t1 = time.perf_counter()
+    lines = tap.end()
+    run["wall_s"] = round(t1 - t0, 3)
+    peak = trace.peak(t0, t1)
+    if peak is not None:
+        run["peak_rss_mb"] = round(peak / 1e6, 1)
+    run["stages"] = _stage_timings(lines, trace)
+    return run
+
+
+def _aggregate(runs: List[dict]) -> Dict[str, dict]:
+    labels: Dict[str, List[dict]] = {}
+    for run in runs:
+        for label, entry in run["stages"].items():
+            labels.setdefault(label, []).append(entry)
+    out = {}
+    for label, entries in labels.items():
+        seconds = [e["seconds"] for e in entries]
+        out[label] = {"seconds_p50": round(statistics.median(seconds), 3), "seconds_max": max(seconds)}
+        peaks = [e["peak_rss_mb"] for e in entries if "peak_rss_mb" in e]
+        if peaks:
+            out[label]["peak_rss_mb"] = max(peaks)
+    return out
+
+
+# ─── Output diff ─────────────────────────────────────────────────────────────
+
+def _render_gray(path: str, dpi: int):
+    import fitz
+    import numpy as np
+    with fitz.open(path) as doc:
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+            yield np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+
+
+def pdf_diff(recorded: Optional[str], replayed: Optional[str], dpi: int = 30) -> dict:
+    """Size, page count and mean per-pixel difference (0–255) of low-res renders."""
+    if not recorded or not replayed or not os.path.exists(replayed):
+        return {"recorded": bool(recorded), "replayed": bool(replayed and os.path.exists(replayed))}
+    a_size, b_size = os.path.getsize(recorded), os.path.getsize(replayed)
+    out = {"bytes": [a_size, b_size], "bytes_change_pct": round((b_size - a_size) / a_size * 100, 1) if a_size else None}
+    try:
+        import numpy as np
+        from PIL import Image
+        a_pages, b_pages = list(_render_gray(recorded, dpi)), list(_render_gray(replayed, dpi))
+    except ImportError:
+        return out
+    except Exception as e:
+        out["render_error"] = str(e)
+        return out
+    out["pages"] = [len(a_pages), len(b_pages)]
+    diffs = []
+    for a, b in zip(a_pages, b_pages):
+        if a.shape != b.shape:
+            b = np.asarray(Image.fromarray(b).resize((a.shape[1], a.shape[0])))
+        diffs.append(float(np.mean(np.abs(a.astype(np.int16) - b.astype(np.int16)))))
+    if diffs:
+        out["pixel_diff_mean"] = round(statistics.fmean(diffs), 2)
+        out["pixel_diff_max_page"] = round(max(diffs), 2)
+    return out
+
+
+def _bbox(img: dict) -> Optional[Tuple[int, int, int, int]]:
+    b = img.get("bbox")
+    if isinstance(b, dict) and all(k in b for k in ("x", "y", "w", "h")):
+        return (b["x"], b["y"], b["w"], b["h"])
+    return None
+
+
+def metadata_diff(recorded: Optional[dict], replayed: Optional[dict], limit: int = 50) -> dict:
+    """Per-image rotation / deskew / crop / size changes between two metadata files."""
+    if recorded is None or replayed is None:
+        return {"recorded": recorded is not None, "replayed": replayed is not None}
+
+    def by_source(meta: dict) -> Dict[str, dict]:
+        return {str(img.get("source_file") or img.get("filename") or img.get("id")): img
+                for img in meta.get("images", [])}
+
+    old, new = by_source(recorded), by_source(replayed)
+    changes = []
+    deskew_deltas, ious = [], []
+    for key in sorted(set(old) | set(new)):
+        if key not in new or key not in old:
+            changes.append({"image": key, "change": "missing" if key not in new else "added"})
+            continue
+        a, b, change = old[key], new[key], {}
+        if a.get("rotation") != b.get("rotation"):
+            change["rotation"] = [a.get("rotation"), b.get("rotation")]
+        delta = float(b.get("deskew_angle") or 0) - float(a.get("deskew_angle") or 0)
+        deskew_deltas.append(abs(delta))
+        if abs(delta) >= 0.01:
+            change["deskew_angle"] = [a.get("deskew_angle"), b.get("deskew_angle")]
+        if _bbox(a) and _bbox(b):
+            iou = bbox_iou(_bbox(a), _bbox(b))
+            ious.append(iou)
+            if iou < 0.999:
+                change["bbox_iou"] = round(iou, 3)
+        elif (a.get("width"), a.get("height")) != (b.get("width"), b.get("height")):
+            change["size"] = [[a.get("width"), a.get("height")], [b.get("width"), b.get("height")]]
+        if change:
+            changes.append({"image": key, **change})
+
+    pages = [len({p.get("page") for p in m.get("layout", {}).get("positions", [])}) for m in (recorded, replayed)]
+    out = {
+        "images": [len(old), len(new)],
+        "layout_pages": pages,
+        "changed_images": len(changes),
+        "deskew_delta_max": round(max(deskew_deltas), 2) if deskew_deltas else 0.0,
+    }
+    if ious:
+        out["bbox_iou_min"] = round(min(ious), 3)
+    if recorded.get("updated", 0) > recorded.get("created", 0):
+        out["recorded_edited"] = True  # the editor saved changes after processing
+    out["changes"] = changes[:limit]
+    return out
+
+
+def diff_outputs(rec: RecordedSession, out_dir: str) -> dict:
+    result = {}
+    for suffix, key in OUTPUTS.items():
+        replayed = os.path.join(out_dir, f"{rec.id}{suffix}.pdf")
+        if key in rec.outputs or os.path.exists(replayed):
+            result[key] = pdf_diff(rec.outputs.get(key), replayed)
+    replayed_meta = None
+    meta_path = os.path.join(out_dir, f"{rec.id}.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            replayed_meta = json.load(f)
+    if rec.metadata is not None or replayed_meta is not None:
+        result["metadata"] = metadata_diff(rec.metadata, replayed_meta)
+    return result
+
+
+def _meta(settings: dict, args) -> dict:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        rev = None
+    return {"settings": settings, "repeat": args.repeat, "git_rev": rev, "python": platform.python_version(),
+            "platform": platform.platform(), "cpu_count": os.cpu_count()}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("projects", nargs="+", help="project folders (<output_dir>/<session id>)")
+    ap.add_argument("--mode", choices=MODES, help="override the mode read from metadata / session id")
+    ap.add_argument("--config", help="agent config for page size and margins (default: built-in defaults)")
+    ap.add_argument("--repeat", type=int, default=1, help="replay every session this many times")
+    ap.add_argument("--workers", type=int, default=1, help="sessions processed concurrently")
+    ap.add_argument("--cv-threads", type=int, help="OpenCV threads (cv2.setNumThreads)")
+    ap.add_argument("--analysis-width", type=int, help="orientation/deskew analysis width (default 600)")
+    ap.add_argument("--document-crop-width", type=int, help="scan_document background-removal width (default 300)")
+    ap.add_argument("--card-crop-width", type=int, help="card_2in1 background-removal width (default 200)")
+    ap.add_argument("--encoder", choices=ENCODER_PROFILES, default="default", help="PDF image encoding profile")
+    ap.add_argument("--pdf-quality", type=int, help="override the profile's JPEG quality")
+    ap.add_argument("--pdf-max-dim", type=int, help="override the profile's max embedded image dimension")
+    ap.add_argument("--keep", metavar="DIR", help="keep the replayed outputs here (default: temp dir, removed)")
+    ap.add_argument("--verbose", action="store_true", help="echo the pipeline's console output to stderr")
+    ap.add_argument("--output", help="also write the JSON report to this file")
+    args = ap.parse_args()
+
+    try:
+        recorded = [load_recorded(p, args.mode) for p in args.projects]
+    except (OSError, ValueError) as e:
+        ap.error(str(e))
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    from agent.logger import init_logger
+    agent_logger = init_logger("INFO" if args.verbose else "WARNING").logger
+    agent_logger.propagate = False
+    for handler in agent_logger.handlers:  # keep stdout for the report
+        if isinstance(handler, logging.StreamHandler):
+            handler.setStream(sys.stderr)
+
+    with contextlib.redirect_stdout(sys.stderr):  # import-time chatter stays off the report
+        settings = apply_settings(args)
+    base = _base_config(args.config)
+    scratch = os.path.abspath(args.keep) if args.keep else tempfile.mkdtemp(prefix="replay-")
+
+    trace = RSSTrace()
+    tap = StdoutTap(echo=sys.stderr if args.verbose else None)
+    real_stdout, sys.stdout = sys.stdout, tap
+    runs: Dict[str, List[dict]] = {rec.id: [] for rec in recorded}
+    rounds = []
+    trace.start()
+    try:
+        for r in range(args.repeat):
+            out_dir = os.path.join(scratch, f"round-{r + 1}")
+            os.makedirs(out_dir, exist_ok=True)
+            cfg = dataclasses.replace(base, output_dir=out_dir, test_mode=True,
+                                      delete_inbox_files_after_process=False,
+                                      max_parallel_sessions=args.workers)
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="session") as pool:
+                futures = {rec.id: pool.submit(replay_once, cfg, rec, tap, trace) for rec in recorded}
+                for rec in recorded:
+                    print(f"▶ round {r + 1}: {rec.id} ({rec.mode}, {len(rec.images)} images) ...",
+                          file=sys.stderr)
+                    runs[rec.id].append(futures[rec.id].result())
+            wall = time.perf_counter() - t0
+            rounds.append({"wall_s": round(wall, 3),
+                           "sessions_per_min": round(len(recorded) / wall * 60, 2) if wall else 0.0})
+    finally:
+        trace.stop()
+        sys.stdout = real_stdout
+
+    report = {"meta": _meta(settings, args), "rounds": rounds, "sessions": []}
+    for rec in recorded:
+        report["sessions"].append({
+            "id": rec.id,
+            "mode": rec.mode,
+            "images": len(rec.images),
+            "runs": [{k: v for k, v in run.items() if k != "stages"} for run in runs[rec.id]],
+            "stages": _aggregate(runs[rec.id]),
+            "outputs": diff_outputs(rec, os.path.join(scratch, f"round-{args.repeat}")),
+        })
+    if args.keep:
+        report["meta"]["outputs_dir"] = scratch
+    else:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    return 1 if any("error" in run for session in runs.values() for run in session) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic scans with ground truth, for the image pipeline benchmark.
+
+Every sample is rendered from a seeded RNG, so the same (seed, dpi, index)
+always gives the same pixels. Two kinds of document:
+
+- ``page``: an A4 text page (heading, ragged paragraphs, content weighted to
+  the top like real letters) filling most of the scanner bed;
+- ``card``: an ID-card sized (85.6 × 54 mm) card with a colour band, photo
+  box and text lines, placed somewhere on a textured background.
+
+Each document is optionally turned upside down, rotated by a known skew,
+pasted onto the bed and degraded with sensor noise and a slight blur. The
+ground truth records the orientation, the skew (PIL ``rotate`` convention:
+positive = counter-clockwise, so a perfect deskew returns ``-skew``) and the
+document's axis-aligned bounding box in the scan.
+
+Usage:
+    python benchmarks/synthetic_scans.py --out /tmp/synthetic --dpi 150
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+MM_PER_INCH = 25.4
+A4_MM = (210.0, 297.0)
+CARD_MM = (85.6, 54.0)
+BED_MM = (216.0, 297.0)  # typical flatbed / ADF scan area
+
+PAGE_SKEWS = (0.0, 2.5, -4.0, 1.0, -1.5, 6.0)
+CARD_SKEWS = (0.0, 3.0, -6.0, 8.0, -2.0, 12.0)
+
+_WORDS = (
+    "invoice account scanner document payment total amount reference service "
+    "customer period balance address contract number statement receipt order "
+    "delivery invoice date tax net gross summary item quantity price notes the "
+    "of and to in for on with by from at as is this that please page due"
+).split()
+
+
+@dataclass
+class SyntheticScan:
+    name: str
+    kind: str  # "page" | "card"
+    dpi: int
+    image: Image.Image = field(repr=False)
+    document: Image.Image = field(repr=False)  # the clean, upright document
+    rotation: int  # 0 or 180: what orientation detection should report
+    skew: float  # degrees applied with PIL rotate (counter-clockwise)
+    bbox: Tuple[int, int, int, int]  # document's axis-aligned box in ``image`` (x, y, w, h)
+    noise: float  # Gaussian sensor noise sigma (0–255 scale)
+
+    @property
+    def megapixels(self) -> float:
+        return self.image.width * self.image.height / 1e6
+
+    def truth(self) -> Dict:
+        return {"name": self.name, "kind": self.kind, "dpi": self.dpi, "size": list(self.image.size),
+                "rotation": self.rotation, "skew": self.skew, "bbox": list(self.bbox), "noise": self.noise}
+
+
+def _px(mm: float, dpi: int) -> int:
+    return int(round(mm / MM_PER_INCH * dpi))
+
+
+def _font(px: int) -> ImageFont.ImageFont:
+    return ImageFont.load_default(size=max(8, px))
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(n))
+
+
+def text_page(dpi: int, rng: random.Random) -> Image.Image:
+    """Upright A4 page of ragged text; the bottom third stays mostly empty."""
+    w, h = _px(A4_MM[0], dpi), _px(A4_MM[1], dpi)
+    tone = rng.randint(244, 252)
+    page = Image.new("RGB", (w, h), (tone, tone, tone - rng.randint(0, 4)))
+    draw = ImageDraw.Draw(page)
+    margin = _px(20, dpi)
+    body = _font(int(11 / 72 * dpi))
+    line_h = int(11 / 72 * dpi * 1.5)
+
+    y = margin
+    draw.text((margin, y), _sentence(rng, 3).title(), fill=(20, 20, 20), font=_font(int(20 / 72 * dpi)))
+    y += line_h * 3
+    limit = margin + int((h - 2 * margin) * rng.uniform(0.55, 0.8))
+    while y < limit:
+        for _ in range(rng.randint(3, 7)):
+            text = _sentence(rng, rng.randint(9, 13))
+            while body.getlength(text) > w - 2 * margin:
+                text = text.rsplit(" ", 1)[0]
+            draw.text((margin, y), text, fill=(30, 30, 35), font=body)
+            y += line_h
+        y += line_h
+    return page
+
+
+def id_card(dpi: int, rng: random.Random) -> Image.Image:
+    """Upright card: coloured header band, photo box on the left, text lines."""
+    w, h = _px(CARD_MM[0], dpi), _px(CARD_MM[1], dpi)
+    base = tuple(rng.randint(200, 245) for _ in range(3))
+    band = tuple(rng.randint(30, 160) for _ in range(3))
+    card = Image.new("RGB", (w, h), base)
+    draw = ImageDraw.Draw(card)
+    draw.rectangle((0, 0, w, h // 5), fill=band)
+    draw.text((w // 20, h // 25), _sentence(rng, 2).upper(), fill=(255, 255, 255), font=_font(h // 9))
+    photo = (w // 20, h // 4, w // 20 + w // 4, h // 4 + int(h * 0.6))
+    draw.rectangle(photo, fill=(150, 150, 160), outline=(60, 60, 60), width=max(1, dpi // 150))
+    font = _font(h // 14)
+    for i in range(5):
+        draw.text((photo[2] + w // 20, h // 4 + i * h // 8), _sentence(rng, rng.randint(2, 4)),
+                  fill=(25, 25, 25), font=font)
+    return card
+
+
+def _texture(size: Tuple[int, int], rng: random.Random) -> Image.Image:
+    """Wood/fabric-like background: low-frequency colour blotches plus grain."""
+    w, h = size
+    nrng = np.random.default_rng(rng.getrandbits(32))
+    small = nrng.integers(40, 140, size=(max(2, h // 64), max(2, w // 64), 3), dtype=np.uint8)
+    img = Image.fromarray(small).resize(size, Image.Resampling.BICUBIC)
+    grain = nrng.normal(0, 12, size=(h, w, 1))
+    return Image.fromarray(np.clip(np.asarray(img, np.float32) + grain, 0, 255).astype(np.uint8))
+
+
+def _degrade(img: Image.Image, noise: float, rng: random.Random) -> Image.Image:
+    img = img.filter(ImageFilter.GaussianBlur(radius=0.6))
+    if noise <= 0:
+        return img
+    nrng = np.random.default_rng(rng.getrandbits(32))
+    arr = np.asarray(img, np.float32) + nrng.normal(0, noise, size=(img.height, img.width, 1))
+    return Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+
+
+def compose(document: Image.Image, bed: Image.Image, offset: Tuple[int, int], rotation: int,
+            skew: float, noise: float, rng: random.Random) -> Tuple[Image.Image, Tuple[int, int, int, int]]:
+    """Place ``document`` (rotated/skewed) on ``bed``; returns the scan and the document bbox."""
+    doc = document.rotate(180) if rotation == 180 else document
+    doc = doc.convert("RGBA")
+    if skew:
+        doc = doc.rotate(skew, resample=Image.Resampling.BICUBIC, expand=True)
+    scan = bed.copy()
+    scan.paste(doc, offset, doc)
+    x0, y0, x1, y1 = doc.getchannel("A").point(lambda a: 255 if a > 127 else 0).getbbox()
+    x0, y0 = max(0, x0 + offset[0]), max(0, y0 + offset[1])
+    x1, y1 = min(scan.width, x1 + offset[0]), min(scan.height, y1 + offset[1])
+    return _degrade(scan, noise, rng), (x0, y0, x1 - x0, y1 - y0)
+
+
+def make_sample(kind: str, dpi: int, index: int, seed: int = 0) -> SyntheticScan:
+    rng = random.Random(f"{seed}:{kind}:{dpi}:{index}")
+    rotation = 180 if index % 2 else 0
+    noise = (2.0, 6.0, 10.0)[index % 3]
+    bed_w, bed_h = _px(BED_MM[0], dpi), _px(BED_MM[1], dpi)
+
+    if kind == "page":
+        document = text_page(dpi, rng)
+        skew = PAGE_SKEWS[index % len(PAGE_SKEWS)]
+        tone = rng.randint(215, 235)
+        bed_w, bed_h = int(bed_w * 1.1), int(bed_h * 1.06)  # room for the skewed page
+        bed = Image.new("RGB", (bed_w, bed_h), (tone, tone, tone))
+    elif kind == "card":
+        document = id_card(dpi, rng)
+        skew = CARD_SKEWS[index % len(CARD_SKEWS)]
+        bed = _texture((bed_w, bed_h), rng)
+    else:
+        raise ValueError(f"Unknown sample kind: {kind}")
+
+    # Size of the document after rotate(expand=True), to place it fully on the bed
+    rad = np.deg2rad(abs(skew))
+    rw = int(np.ceil(document.width * np.cos(rad) + document.height * np.sin(rad)))
+    rh = int(np.ceil(document.width * np.sin(rad) + document.height * np.cos(rad)))
+    if kind == "page":
+        jitter = dpi // 30
+        offset = ((bed_w - rw) // 2 + rng.randint(-jitter, jitter),
+                  (bed_h - rh) // 2 + rng.randint(-jitter, jitter))
+    else:
+        offset = (rng.randint(0, bed_w - rw), rng.randint(0, bed_h - rh))
+
+    image, bbox = compose(document, bed, offset, rotation, skew, noise, rng)
+    return SyntheticScan(name=f"{kind}-{dpi}dpi-{index:02d}", kind=kind, dpi=dpi, image=image,
+                         document=document, rotation=rotation, skew=skew, bbox=bbox, noise=noise)
+
+
+def generate(dpis: Sequence[int] = (150, 300, 600), samples: int = 3,
+             kinds: Sequence[str] = ("page", "card"), seed: int = 0) -> Iterator[SyntheticScan]:
+    """Yield samples one at a time (600 DPI pages are ~100 MB decoded each)."""
+    for dpi in dpis:
+        for kind in kinds:
+            for index in range(samples):
+                yield make_sample(kind, dpi, index, seed)
+
+
+def bbox_iou(a: Sequence[int], b: Sequence[int]) -> float:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", required=True, help="directory for the scans and truth.json")
+    ap.add_argument("--dpi", default="150,300,600", help="comma-separated DPIs")
+    ap.add_argument("--samples", type=int, default=3, help="samples per kind per DPI")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    truth: List[Dict] = []
+    for sample in generate([int(d) for d in args.dpi.split(",")], args.samples, seed=args.seed):
+        sample.image.save(os.path.join(args.out, f"{sample.name}.jpg"), quality=92, dpi=(sample.dpi, sample.dpi))
+        truth.append(sample.truth())
+        print(f"▶ {sample.name}", file=sys.stderr)
+    with open(os.path.join(args.out, "truth.json"), "w", encoding="utf-8") as f:
+        json.dump(truth, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,8 @@ Usage:
     python run.py --no-web     # Skip web UI
     python run.py --setup      # Create config + dirs only
     python run.py --config X   # Use custom config
+    python run.py --profile-imports [--top N]  # Show where startup import time goes
+    python run.py --zygote     # Preload heavy libraries once, fork services from it
 """
 from __future__ import annotations
 
@@ -19,11 +21,15 @@ from pathlib import Path
 
 from src.orchestrator_utils import (
     check_port_available, create_default_config, install_service,
-    log_event, print_banner, setup_log_dir,
+    log_event, print_banner, profile_imports, setup_log_dir,
     setup_orchestrator_log, setup_signal_handlers, spawn_child,
     stream_child_output, terminate_children, validate_prerequisites,
-    _enable_ansi_windows,
+    _child_env, _enable_ansi_windows,
 )
+from src import zygote as zygote_host
+
+# Crash restarts per service in zygote mode before the orchestrator gives up
+MAX_ZYGOTE_RESTARTS = 5
 
 
 def create_default_directories(config_path: str = None):
@@ -60,8 +66,18 @@ def main():
     parser.add_argument('--setup', action='store_true', help='Create config + dirs only')
     parser.add_argument('--config', type=str, default=None, help='Path to config file')
     parser.add_argument('--install-service', action='store_true', help='Install as systemd service')
+    parser.add_argument('--profile-imports', action='store_true',
+                        help='Print the slowest imports of each service at startup, then exit')
+    parser.add_argument('--top', type=int, default=15, help='Rows per service for --profile-imports')
+    parser.add_argument('--zygote', action='store_true',
+                        help='Preload heavy libraries once and fork the services from this process '
+                             '(POSIX); crashed services are re-forked')
     args = parser.parse_args()
 
+    if args.profile_imports:
+        profile_imports(top=args.top)
+        return
+
     # Enable ANSI colors on Windows 10+
     _enable_ansi_windows()
 
@@ -90,42 +106,40 @@ def main():
     log_dir = setup_log_dir()
     orch_log = setup_orchestrator_log(log_dir)
 
-    # Spawn children and prepare streaming
-    children = []          # list of (name, proc, stdout_pipe)
-    stream_threads = []    # list of threading.Thread for stdout streaming
-    services = []          # list of (display_name, info) for banner
-
-    # Scan agent (always runs)
-    agent_cmd = [sys.executable, "-m", "src.main", "--config", config_path]
-    name, proc, pipe = spawn_child("agent", agent_cmd)
-    children.append((name, proc, pipe))
-    if pipe:
-        t = threading.Thread(target=stream_child_output, args=(name, pipe), daemon=True)
-        t.start()
-        stream_threads.append(t)
-    services.append(("Scan Agent", f"watching {config_path}"))
-
-    # FTP server (optional)
+    # Services: key -> (module, args, banner name, banner info); the agent always runs
+    specs = {"agent": ("src.main", ["--config", config_path], "Scan Agent", f"watching {config_path}")}
     if not args.no_ftp:
-        ftp_cmd = [sys.executable, "-m", "src.agent.ftp_server"]
-        name, proc, pipe = spawn_child("ftp", ftp_cmd)
-        children.append((name, proc, pipe))
-        if pipe:
-            t = threading.Thread(target=stream_child_output, args=(name, pipe), daemon=True)
-            t.start()
-            stream_threads.append(t)
-        services.append(("FTP Server", "ftp://0.0.0.0:2121"))
-
-    # Web UI (optional)
+        specs["ftp"] = ("src.agent.ftp_server", [], "FTP Server", "ftp://0.0.0.0:2121")
     if not args.no_web:
-        web_cmd = [sys.executable, "-m", "src.web_ui_server"]
-        name, proc, pipe = spawn_child("web", web_cmd)
-        children.append((name, proc, pipe))
-        if pipe:
-            t = threading.Thread(target=stream_child_output, args=(name, pipe), daemon=True)
-            t.start()
-            stream_threads.append(t)
-        services.append(("Web UI", "http://localhost:8099 (browser)"))
+        specs["web"] = ("src.web_ui_server", [], "Web UI", "http://localhost:8099 (browser)")
+
+    zygote = None
+    if args.zygote:
+        if zygote_host.available():
+            zygote = zygote_host.Zygote(env=_child_env())
+            seconds = zygote.preload()
+            log_event(orch_log, f"Zygote preloaded {len(zygote.loaded)} modules in {seconds:.2f}s")
+        else:
+            log_event(orch_log, "Zygote mode needs fork(); starting services cold")
+
+    def stream_and_close(name, pipe):
+        stream_child_output(name, pipe)
+        pipe.close()
+
+    def start_service(key):
+        module, cmd_args, _, _ = specs[key]
+        if zygote is not None:
+            child = zygote.spawn(key, module, cmd_args)
+            log_event(orch_log, f"Forked {key} (pid {child[1].pid})")
+        else:
+            child = spawn_child(key, [sys.executable, "-m", module, *cmd_args])
+        if child[2]:
+            threading.Thread(target=stream_and_close, args=(key, child[2]), daemon=True).start()
+        return child
+
+    children = [start_service(key) for key in specs]   # list of (name, proc, stdout_pipe)
+    services = [(display, info) for _, _, display, info in specs.values()]
+    restarts = {key: 0 for key in specs}
 
     # Banner and signal handlers
     print_banner(services, config_path)
@@ -138,13 +152,20 @@ def main():
     exit_code = 0
     try:
         while not shutdown_event.is_set():
-            for name, proc, _ in children:
+            for i, (name, proc, _) in enumerate(children):
                 ret = proc.poll()
-                if ret is not None:
-                    log_event(orch_log, f"ERROR: {name} exited unexpectedly (code {ret})")
-                    exit_code = 1
-                    shutdown_event.set()
-                    break
+                if ret is None:
+                    continue
+                if zygote is not None and restarts[name] < MAX_ZYGOTE_RESTARTS:
+                    restarts[name] += 1
+                    log_event(orch_log, f"WARNING: {name} exited (code {ret}), restarting "
+                                        f"({restarts[name]}/{MAX_ZYGOTE_RESTARTS})")
+                    children[i] = start_service(name)
+                    continue
+                log_event(orch_log, f"ERROR: {name} exited unexpectedly (code {ret})")
+                exit_code = 1
+                shutdown_event.set()
+                break
             shutdown_event.wait(timeout=1.0)
     except KeyboardInterrupt:
         pass
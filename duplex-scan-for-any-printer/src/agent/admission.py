@@ -0,0 +1,196 @@
+"""Memory admission control in front of session processing.
+
+``check_disk_space``/``check_memory_available`` only pass or fail, so a large
+session on a busy Pi could push the add-on into the OOM killer. Before a
+session is processed, ``AdmissionController.admit`` estimates its peak memory
+from the page headers (no decode) and compares it with what
+``ResourceMonitor.check_memory`` reports, minus the monitor's minimum free
+memory and the estimates of sessions already running:
+
+- **run**: it fits; processed as configured.
+- **degraded**: only the lean estimate fits. The session runs with smaller
+  analysis/crop widths (its own, passed down the pipeline: other sessions
+  keep theirs), no shared page buffers (``/dev/shm`` is RAM), the background
+  model unloaded once no session uses it, and, for modes whose pages are
+  independent (scan_document, card_2in1), pages decoded one at a time
+  instead of all up front (``streamed``).
+- **queued**: not even that fits while other sessions run; it waits (up to
+  ``SCAN_ADMISSION_MAX_WAIT_SECS``) for one to finish, then decides again. A
+  session that still does not fit, or has nothing to wait for, runs degraded.
+
+Decisions are logged, counted in ``scan_admission_decisions_total`` and set
+on the session's trace.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from agent import logger, tracing
+
+MAX_WAIT_SECS = float(os.getenv("SCAN_ADMISSION_MAX_WAIT_SECS", "600"))
+POLL_SECS = 15.0  # re-check while queued; finishing sessions wake waiters at once
+DEGRADED_ANALYSIS_WIDTH = 400
+BG_MODEL_MB = 750
+SESSION_OVERHEAD_MB = 64
+STREAMABLE_MODES = ("scan_document", "card_2in1")  # pages processed independently
+_MB = 1024 * 1024
+
+ADMISSIONS = tracing.Counter("scan_admission_decisions_total",
+                             "Session admission decisions (run, degraded, queued).", ("decision",))
+ADMISSION_WAIT = tracing.Histogram("scan_admission_wait_seconds",
+                                   "Time sessions waited for memory before processing.")
+RESERVED_BYTES = tracing.Gauge("scan_admission_reserved_bytes",
+                               "Estimated peak memory of the sessions being processed.")
+
+
+@dataclass
+class Admission:
+    decision: str  # "run" | "degraded"
+    streamed: bool  # pages decoded one at a time by the mode loop
+    estimate_mb: float
+    available_mb: float
+    waited_s: float = 0.0
+    analysis_width: Optional[int] = None  # this session's override of image_processing.ANALYSIS_WIDTH
+
+    @property
+    def degraded(self) -> bool:
+        return self.decision == "degraded"
+
+
+def page_sizes_mb(paths: List[str]) -> List[float]:
+    """Decoded size of each page from its header; unreadable files count as 10x their bytes."""
+    from PIL import Image
+
+    sizes = []
+    for path in paths:
+        try:
+            with Image.open(path) as img:
+                sizes.append(img.width * img.height * len(img.getbands()) / _MB)
+        except Exception:
+            try:
+                sizes.append(os.path.getsize(path) * 10 / _MB)
+            except OSError:
+                sizes.append(0.0)
+    return sizes
+
+
+def estimate_peak_mb(mode: str, sizes: List[float], degraded: bool = False,
+                     model_loaded: bool = False, page_buffers: bool = True) -> float:
+    """Rough peak resident memory of processing ``mode`` over pages of ``sizes`` MB."""
+    total, largest = sum(sizes), max(sizes, default=0.0)
+    peak = SESSION_OVERHEAD_MB + 2 * largest  # rotated/deskewed copies of one page
+    if page_buffers and not degraded:
+        peak += total  # decoded copies in the /dev/shm page buffers
+    if mode in STREAMABLE_MODES:
+        peak += 0.5 * total  # crops kept for layout and the PDFs
+        if not degraded:
+            peak += total  # every page decoded up front
+        if not model_loaded:
+            peak += BG_MODEL_MB
+    else:
+        peak += 1.1 * total  # all pages (pairing needs them) plus the PDF streams
+    return peak
+
+
+def degraded_analysis_width() -> int:
+    """Analysis width for a degraded session (never above the profiled one)."""
+    from agent import image_processing
+
+    return min(image_processing.ANALYSIS_WIDTH, DEGRADED_ANALYSIS_WIDTH)
+
+
+class AdmissionController:
+    def __init__(self, monitor, max_wait_secs: float = MAX_WAIT_SECS, poll_secs: float = POLL_SECS):
+        self.monitor = monitor
+        self.max_wait_secs = max_wait_secs
+        self.poll_secs = poll_secs
+        self._cond = threading.Condition()
+        self._reserved: Dict[str, float] = {}
+
+    def _decide(self, mode: str, sizes: List[float], waited: float) -> Tuple[str, float, float]:
+        """(decision, estimate, available).
+
+        "queued" means wait and decide again; "forced" is a degraded run that
+        does not fit either but has nothing left to wait for.
+        """
+        from agent.image_buffers import get_buffer_store
+
+        model_loaded = bool(tracing.MODEL_LOADED.value())
+        full = estimate_peak_mb(mode, sizes, model_loaded=model_loaded,
+                                page_buffers=get_buffer_store().enabled)
+        lean = estimate_peak_mb(mode, sizes, degraded=True, model_loaded=model_loaded)
+        ok, available = self.monitor.check_memory()
+        if available <= 0:
+            return "run", full, available  # memory unknown
+        # Running sessions count with their whole estimate, although part of it
+        # is already in use (and missing from ``available``): errs on the safe side
+        budget = available - self.monitor.min_memory_mb - sum(self._reserved.values())
+        if ok and full <= budget:
+            return "run", full, available
+        if lean <= budget:
+            return "degraded", lean, available
+        if self._reserved and waited < self.max_wait_secs:
+            return "queued", lean, available
+        return "forced", lean, available
+
+    @contextmanager
+    def admit(self, session_id: str, mode: str, paths: List[str]) -> Iterator[Admission]:
+        """Hold an admission for processing ``paths`` (blocks while queued)."""
+        sizes = page_sizes_mb(paths)
+        start = time.monotonic()
+        queued = False
+        with self._cond:
+            while True:
+                waited = time.monotonic() - start
+                decision, estimate, available = self._decide(mode, sizes, waited)
+                if decision != "queued":
+                    break
+                if not queued:
+                    queued = True
+                    ADMISSIONS.inc(decision="queued")
+                    logger.warning(
+                        f"⏳ Session {session_id} queued: needs ~{estimate:.0f}MB, "
+                        f"{available:.0f}MB available, {len(self._reserved)} session(s) running"
+                    )
+                self._cond.wait(self.poll_secs)
+            self._reserved[session_id] = estimate
+            RESERVED_BYTES.set(sum(self._reserved.values()) * _MB)
+
+        forced = decision == "forced"
+        if forced:
+            decision = "degraded"
+        degraded = decision == "degraded"
+        admission = Admission(decision, streamed=degraded and mode in STREAMABLE_MODES,
+                              estimate_mb=round(estimate, 1), available_mb=round(available, 1),
+                              waited_s=round(time.monotonic() - start, 3),
+                              analysis_width=degraded_analysis_width() if degraded else None)
+        ADMISSIONS.inc(decision=decision)
+        ADMISSION_WAIT.observe(admission.waited_s)
+        span = tracing.current_span()
+        if span is not None:
+            span.set(admission=decision, admission_estimate_mb=admission.estimate_mb,
+                     admission_available_mb=admission.available_mb, admission_wait_s=admission.waited_s)
+        if admission.degraded:
+            over = " (over budget, nothing left to wait for)" if forced else ""
+            logger.warning(
+                f"🪫 Session {session_id} runs degraded{over}: ~{admission.estimate_mb:.0f}MB estimated, "
+                f"{admission.available_mb:.0f}MB available"
+                + (", pages streamed" if admission.streamed else "")
+            )
+        else:
+            logger.info(
+                f"🧮 Session {session_id} admitted: ~{admission.estimate_mb:.0f}MB estimated for "
+                f"{len(paths)} page(s), {admission.available_mb:.0f}MB available"
+            )
+        try:
+            yield admission
+        finally:
+            with self._cond:
+                self._reserved.pop(session_id, None)
+                RESERVED_BYTES.set(sum(self._reserved.values()) * _MB)
+                self._cond.notify_all()
@@ -3,31 +3,43 @@
 Exposes scan agent state and commands as a localhost-only HTTP API.
 Used by the web UI process (and any future integrations) to:
   - Query current session state
+  - Subscribe to session events (``/api/events``, Server-Sent Events)
   - Issue confirm/reject commands
   - Check notification channel statuses
+  - Scrape pipeline metrics (``/metrics``, Prometheus text format) and
+    inspect recent session traces (``/api/traces``)
+  - Arm the session profiler for the next N sessions (``/api/profiling``)
 
 Binding to 127.0.0.1 prevents external access — only localhost services
-(web UI, future dashboard, etc.) can call this API.
+(web UI, future dashboard, etc.) can call this API. When ``AGENT_API_SOCKET``
+is set the same app is also served on that Unix socket, which the web UI
+prefers.
 """
 from __future__ import annotations
 
 import asyncio
 import logging
+import os
 import threading
 from typing import Optional, Any, Callable
 
 import uvicorn
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from agent import session_profiler, tracing
+from agent.session_events import EventBroadcaster, EventStreamChannel
 
 logger = logging.getLogger(__name__)
 
 # Module-level state set by init() before start_in_thread()
 _session_manager: Optional[Any] = None
 _notification_manager: Optional[Any] = None
-_session_command_cb: Optional[Callable] = None  # (confirm: bool, print_requested: bool) -> None
+_session_command_cb: Optional[Callable] = None  # (confirm, print_requested, session_id) -> None
 _config: Optional[Any] = None
 
+AGENT_API_SOCKET = os.getenv("AGENT_API_SOCKET", "")
+
 app = FastAPI(title="Scan Agent Internal API", docs_url=None, redoc_url=None)
 
 
@@ -43,16 +55,26 @@ def init(
     _notification_manager = notification_manager
     _session_command_cb = session_command_cb
     _config = config
+    if notification_manager is not None:
+        notification_manager.add_channel(EventStreamChannel(events))
 
 
-def start_in_thread(host: str = "127.0.0.1", port: int = 8098) -> None:
-    """Launch uvicorn in a daemon thread bound to localhost only."""
+def start_in_thread(host: str = "127.0.0.1", port: int = 8098, uds: Optional[str] = None) -> None:
+    """Launch uvicorn in a daemon thread bound to localhost only (plus ``uds`` if given)."""
     def _run() -> None:
         uvicorn.run(app, host=host, port=port, log_level="error")
 
     threading.Thread(target=_run, daemon=True, name="agent-api").start()
     logger.info("Agent internal API listening on %s:%d", host, port)
 
+    uds = AGENT_API_SOCKET if uds is None else uds
+    if uds and hasattr(os, "fork"):  # Unix sockets: POSIX only
+        def _run_uds() -> None:
+            uvicorn.run(app, uds=uds, log_level="error")
+
+        threading.Thread(target=_run_uds, daemon=True, name="agent-api-uds").start()
+        logger.info("Agent internal API listening on unix:%s", uds)
+
 
 # ─── Endpoints ────────────────────────────────────────────────────────────────
 
@@ -61,35 +83,116 @@ async def health() -> dict:
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def metrics() -> PlainTextResponse:
+    """Pipeline and process metrics in the Prometheus text exposition format."""
+    return PlainTextResponse(tracing.render(), media_type=tracing.CONTENT_TYPE)
+
+
+@app.get("/api/traces")
+async def traces(limit: int = 20) -> dict:
+    """Span trees of the most recently processed sessions, newest first."""
+    return {"traces": tracing.recent_traces(limit)}
+
+
+@app.get("/api/profiling")
+async def profiling_status() -> dict:
+    """Armed profiler runs, sessions being profiled and the latest profiles."""
+    return session_profiler.status()
+
+
+@app.post("/api/profiling")
+async def profiling_arm(sessions: int = 1):
+    """Profile the next ``sessions`` sessions (0 disarms).
+
+    Each profile lands in ``scan_out/<session_id>/profile/``.
+    """
+    if not 0 <= sessions <= session_profiler.MAX_ARMED:
+        return JSONResponse(
+            {"ok": False, "message": f"sessions must be 0..{session_profiler.MAX_ARMED}"}, status_code=400
+        )
+    armed = session_profiler.arm(sessions)
+    return JSONResponse({"ok": True, "armed": armed})
+
+
+def _session_dict(s: Any) -> dict:
+    return {
+        "id": s.id,
+        "mode": s.mode,
+        "device": s.device,
+        "state": s.state,
+        "image_count": len(s.images),
+        "created_at": s.created_at,
+        "last_activity": s.last_activity,
+    }
+
+
+def _current_session(sessions: list) -> Optional[Any]:
+    """The most relevant active session (prefers WAIT_CONFIRM)."""
+    if not sessions:
+        return None
+    waiting = [s for s in sessions if s.state == "WAIT_CONFIRM"]
+    return max(waiting or sessions, key=lambda x: x.last_activity)
+
+
+def _sessions_snapshot() -> dict:
+    """Active sessions as carried by every event on ``/api/events``."""
+    if _session_manager is None:
+        return {"sessions": [], "current": None}
+    sessions = sorted(_session_manager.active_sessions(), key=lambda x: x.last_activity, reverse=True)
+    current = _current_session(sessions)
+    return {
+        "sessions": [_session_dict(s) for s in sessions],
+        "current": _session_dict(current) if current is not None else None,
+    }
+
+
+events = EventBroadcaster(snapshot=_sessions_snapshot)
+
+
 @app.get("/api/session/current")
 async def session_current():
     """Return the most relevant active session (prefers WAIT_CONFIRM)."""
     if _session_manager is None:
         return JSONResponse({"session": None, "message": "not initialized"})
 
-    with _session_manager._lock:
-        sessions = list(_session_manager._by_mode.values())
-
-    if not sessions:
+    s = _current_session(_session_manager.active_sessions())
+    if s is None:
         return JSONResponse({"session": None})
+    return JSONResponse({"session": _session_dict(s)})
 
-    waiting = [s for s in sessions if s.state == "WAIT_CONFIRM"]
-    s = waiting[0] if waiting else max(sessions, key=lambda x: x.last_activity)
-    return JSONResponse({
-        "session": {
-            "id": s.id,
-            "mode": s.mode,
-            "state": s.state,
-            "image_count": len(s.images),
-            "created_at": s.created_at,
-            "last_activity": s.last_activity,
-        }
-    })
+
+@app.get("/api/events")
+async def session_events(request: Request):
+    """Server-Sent Events: one JSON event per notification hook, each with a sessions snapshot.
+
+    The first event is a ``snapshot`` (or, with ``Last-Event-ID``, the
+    events missed since). Idle streams get a ``: ping`` comment every 15 s.
+    """
+    last_id = request.headers.get("last-event-id")
+    try:
+        last_event_id = int(last_id) if last_id else None
+    except ValueError:
+        last_event_id = None
+    return StreamingResponse(
+        events.stream(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/sessions")
+async def sessions_list():
+    """Return every active session, one per (device, mode), most recent first."""
+    if _session_manager is None:
+        return JSONResponse({"sessions": [], "message": "not initialized"})
+    sessions = sorted(_session_manager.active_sessions(), key=lambda x: x.last_activity, reverse=True)
+    return JSONResponse({"sessions": [_session_dict(s) for s in sessions]})
 
 
 @app.post("/api/session/confirm")
-async def session_confirm(print_requested: bool = False):
-    """Confirm the current WAIT_CONFIRM session.
+async def session_confirm(print_requested: bool = False, session_id: Optional[str] = None):
+    """Confirm a WAIT_CONFIRM session (``session_id``, else the most recent one).
 
     Fires the callback in a thread pool so the endpoint returns immediately
     without blocking while image processing runs.
@@ -98,15 +201,20 @@ async def session_confirm(print_requested: bool = False):
         return JSONResponse({"ok": False, "message": "no command handler"}, status_code=503)
     try:
         loop = asyncio.get_event_loop()
-        loop.run_in_executor(None, lambda: _session_command_cb(confirm=True, print_requested=print_requested))
+        loop.run_in_executor(
+            None,
+            lambda: _session_command_cb(
+                confirm=True, print_requested=print_requested, session_id=session_id
+            ),
+        )
         return JSONResponse({"ok": True, "message": "confirm accepted"})
     except Exception as e:
         return JSONResponse({"ok": False, "message": str(e)}, status_code=500)
 
 
 @app.post("/api/session/reject")
-async def session_reject():
-    """Reject the current WAIT_CONFIRM session.
+async def session_reject(session_id: Optional[str] = None):
+    """Reject a WAIT_CONFIRM session (``session_id``, else the most recent one).
 
     Fires the callback in a thread pool so the endpoint returns immediately.
     """
@@ -114,7 +222,10 @@ async def session_reject():
         return JSONResponse({"ok": False, "message": "no command handler"}, status_code=503)
     try:
         loop = asyncio.get_event_loop()
-        loop.run_in_executor(None, lambda: _session_command_cb(confirm=False, print_requested=False))
+        loop.run_in_executor(
+            None,
+            lambda: _session_command_cb(confirm=False, print_requested=False, session_id=session_id),
+        )
         return JSONResponse({"ok": True, "message": "reject accepted"})
     except Exception as e:
         return JSONResponse({"ok": False, "message": str(e)}, status_code=500)
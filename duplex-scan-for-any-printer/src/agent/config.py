@@ -3,7 +3,7 @@ from __future__ import annotations
 import os
 import yaml
 from dataclasses import dataclass, field
-from typing import Dict, List
+from typing import Any, Dict, List
 
 
 def _parse_int_list(value) -> List[int]:
@@ -60,6 +60,10 @@ class Config:
     gutter_pt: int = 18
     delete_inbox_files_after_process: bool = True
     test_mode: bool = False
+    max_parallel_sessions: int = 2  # confirmed sessions processed concurrently (one per scanner)
+    profile_sessions: int = 0  # profile the first N sessions after start (agent_api can re-arm)
+    performance_profile: str = "auto"  # auto | low | medium | high (see agent.tuning)
+    tuning: Dict[str, Any] = field(default_factory=dict)  # overrides of single profile settings
 
     @staticmethod
     def load(path: str) -> "Config":
@@ -107,6 +111,10 @@ class Config:
                 raw.get("delete_inbox_files_after_process", True)
             ),
             test_mode=bool(raw.get("test_mode", False)),
+            max_parallel_sessions=int(raw.get("max_parallel_sessions", 2)),
+            profile_sessions=int(raw.get("profile_sessions", 0) or 0),
+            performance_profile=str(raw.get("performance_profile") or "auto"),
+            tuning=dict(raw.get("tuning") or {}),
         )
         # Allow env overrides for base folders
         cfg.inbox_base = os.getenv("SCAN_INBOX_BASE", cfg.inbox_base)
@@ -0,0 +1,190 @@
+"""Content-addressed cache for image derivatives (thumbnails, previews).
+
+Entries are keyed by the SHA-256 of the *source bytes* plus a variant
+(``w200``, ``w800`` ...) and an output format, so two projects that share a
+scanner filename never collide and an edited source never serves a stale
+thumbnail. Files live at ``<root>/<hh>/<sha256>-<variant>.<fmt>``.
+
+- Quota: total size is capped; least-recently-used entries (mtime is the
+  LRU clock, bumped on every hit) are evicted down to 90% of the cap.
+- Single-flight: concurrent requests for the same missing entry share one
+  generation; followers wait for the leader's result.
+- Writes go through a unique ``<path>.<pid>-<n>.tmp`` + ``os.replace`` so
+  readers never see a partial file, even when the agent and the web UI
+  generate the same entry at once (single-flight is per process).
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+from agent import request_metrics
+from agent.ingest_channel import file_sha256
+
+DEFAULT_QUOTA_MB = 512
+_LOW_WATER = 0.9
+_HASH_MEMO_SIZE = 4096
+_tmp_tokens = itertools.count()  # per process, shared by every store on a root
+
+# generate(source_path, tmp_output_path) writes the derivative
+Generator = Callable[[str, str], None]
+
+
+class DerivativeStore:
+    def __init__(self, root: str, max_bytes: int = DEFAULT_QUOTA_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._hashes: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._usage: Optional[int] = None  # bytes on disk, scanned lazily
+        os.makedirs(root, exist_ok=True)
+
+    # ── Keys ────────────────────────────────────────────────────────────────
+
+    def source_digest(self, source_path: str) -> str:
+        """SHA-256 of the source, memoised per (inode, mtime, size)."""
+        st = os.stat(source_path)
+        memo_key = (os.path.realpath(source_path), st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            digest = self._hashes.get(memo_key)
+            if digest is not None:
+                self._hashes.move_to_end(memo_key)
+                return digest
+        digest = file_sha256(source_path)
+        with self._lock:
+            self._hashes[memo_key] = digest
+            while len(self._hashes) > _HASH_MEMO_SIZE:
+                self._hashes.popitem(last=False)
+        return digest
+
+    def path_for(self, digest: str, variant: str, fmt: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}-{variant}.{fmt}")
+
+    # ── Lookup / generation ────────────────────────────────────────────────
+
+    def get(self, source_path: str, variant: str, fmt: str, generate: Generator) -> str:
+        """Return the cached derivative path, generating it at most once."""
+        path = self.path_for(self.source_digest(source_path), variant, fmt)
+        if self._touch(path):
+            request_metrics.cache("hit")
+            return path
+
+        with self._lock:
+            pending = self._inflight.get(path)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[path] = Future()
+        if not leader:
+            request_metrics.cache("wait")
+            return pending.result()
+
+        try:
+            if not self._touch(path):  # another leader may have just finished
+                request_metrics.cache("miss")
+                self._generate(source_path, path, generate)
+            else:
+                request_metrics.cache("hit")
+            pending.set_result(path)
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(path, None)
+        return path
+
+    def _touch(self, path: str) -> bool:
+        try:
+            os.utime(path)  # LRU clock
+            return True
+        except OSError:
+            return False
+
+    def _generate(self, source_path: str, path: str, generate: Generator) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}-{next(_tmp_tokens)}.tmp"
+        try:
+            generate(source_path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._account(os.path.getsize(path))
+
+    # ── Quota ──────────────────────────────────────────────────────────────
+
+    def _entries(self):
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                yield full, st.st_size, st.st_mtime
+
+    def usage(self) -> int:
+        with self._lock:
+            if self._usage is None:
+                self._usage = sum(size for _, size, _ in self._entries())
+            return self._usage
+
+    def _account(self, added: int) -> None:
+        self.usage()  # make sure the baseline is known
+        with self._lock:
+            self._usage += added
+            over = self._usage > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop least-recently-used entries until usage is under the low-water mark."""
+        target = int(self.max_bytes * _LOW_WATER)
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for full, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(full)
+            except OSError:
+                continue
+            total -= size
+            freed += size
+        with self._lock:
+            self._usage = total
+        if freed:
+            print(f"🧹 Derivative cache: evicted {freed // 1024}KB (now {total // 1024}KB)")
+        return freed
+
+
+def store_root(out_dir: str) -> str:
+    """Store location shared by the agent and the web UI for one output dir."""
+    return os.path.join(out_dir, ".thumbnails", "store")
+
+
+_stores: Dict[str, DerivativeStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(root: str, max_bytes: Optional[int] = None) -> DerivativeStore:
+    """Shared store for ``root`` (quota from THUMBNAIL_CACHE_MB unless given)."""
+    key = os.path.realpath(root)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            if max_bytes is None:
+                max_bytes = int(os.getenv("THUMBNAIL_CACHE_MB", str(DEFAULT_QUOTA_MB))) * 1024 * 1024
+            store = _stores[key] = DerivativeStore(root, max_bytes)
+        return store
@@ -3,12 +3,19 @@ Simple FTP server for receiving scanner uploads.
 Built on pyftpdlib for lightweight operation.
 """
 
+import hashlib
 import logging
 import os
+import re
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from pyftpdlib.authorizers import DummyAuthorizer
 from pyftpdlib.handlers import FTPHandler
-from pyftpdlib.servers import FTPServer
+from pyftpdlib.servers import FTPServer, ThreadedFTPServer, MultiprocessFTPServer
+
+from agent.ingest_channel import IngestNotifier
 
 # Only accept file types a scanner would produce
 _ALLOWED_EXTENSIONS = frozenset({".jpg", ".jpeg", ".png", ".pdf", ".tiff", ".tif", ".bmp"})
@@ -21,30 +28,114 @@ _ALLOWED_MAGIKA_LABELS = frozenset({
     "image",  # generic fallback label Magika may emit
 })
 
+# Magic-byte signatures checked before falling back to Magika. A confident
+# match either way skips the ONNX inference entirely.
+_SCANNER_SIGNATURES = (
+    b"\xff\xd8\xff",              # JPEG
+    b"\x89PNG\r\n\x1a\n",         # PNG
+    b"%PDF-",                     # PDF
+    b"II*\x00",                   # TIFF (little-endian)
+    b"MM\x00*",                   # TIFF (big-endian)
+)
+_FOREIGN_SIGNATURES = (
+    b"\x7fELF",                   # Linux executable
+    b"MZ",                        # Windows executable
+    b"PK\x03\x04",                # ZIP / Office documents
+    b"#!",                        # script with shebang
+    b"\xca\xfe\xba\xbe",           # Mach-O / Java class
+)
+
+# Server flavours (pyftpdlib): one IO loop, thread per connection, or process per connection.
+# Note: in "multiprocess" each connection process loads its own Magika model
+# when an ambiguous file arrives.
+_SERVER_CLASSES = {
+    "async": FTPServer,
+    "threaded": ThreadedFTPServer,
+    "multiprocess": MultiprocessFTPServer,
+}
+
+# Post-upload validation (sniff/Magika/statvfs/hash) runs on this many threads
+# per process so the IO loop keeps serving other transfers meanwhile.
+_VALIDATION_WORKERS = 2
+
 # Disk space thresholds (MB)
 _WARN_FREE_MB = 200   # Log a warning when free space drops below this
 _REFUSE_FREE_MB = 50  # Delete the just-received file when free space is critically low
 
+# Device folder names become part of session/project ids, which the web UI
+# restricts to [\w-]; long names are truncated with a hash suffix.
+_DEVICE_NAME_RE = re.compile(r"[^\w\-]")
+_DEVICE_NAME_MAX = 32
+
+# Completion notifications to the scan agent (see agent/ingest_channel.py).
+# Created on first use; sends are non-blocking and dropped if the agent is down.
+_notifier: IngestNotifier = None
+
+
+def _get_notifier() -> IngestNotifier:
+    global _notifier
+    if _notifier is None:
+        _notifier = IngestNotifier()
+    return _notifier
+
+
 # Lazy-initialised singleton — Magika loads an ONNX model on first use,
 # so we only pay that cost once per process.
 _magika: object = None
+_magika_lock = threading.Lock()
+
+# Lazy validation pool, recreated after fork (multiprocess mode) — (pid, executor)
+_validation_pool = (None, None)
 
 
 def _get_magika():
     """Return a cached Magika instance, or None if the library is unavailable."""
     global _magika
     if _magika is not None:
-        return _magika
-    try:
-        from magika import Magika
-        _magika = Magika()
-        logging.info("FTP: Magika content-type detector loaded.")
-    except Exception as e:
-        logging.warning(f"FTP: Magika not available — content-type check disabled ({e})")
-        _magika = False  # sentinel: don't retry
+        return _magika if _magika is not False else None
+    with _magika_lock:  # validation workers may race to load the model
+        if _magika is None:
+            try:
+                from magika import Magika
+                _magika = Magika()
+                logging.info("FTP: Magika content-type detector loaded.")
+            except Exception as e:
+                logging.warning(f"FTP: Magika not available — content-type check disabled ({e})")
+                _magika = False  # sentinel: don't retry
     return _magika if _magika is not False else None
 
 
+def _get_validation_pool() -> ThreadPoolExecutor:
+    global _validation_pool
+    pid, pool = _validation_pool
+    if pool is None or pid != os.getpid():
+        pool = ThreadPoolExecutor(max_workers=_VALIDATION_WORKERS, thread_name_prefix="ftp-validate")
+        _validation_pool = (os.getpid(), pool)
+    return pool
+
+
+def _sniff_content(file: str):
+    """Classify a file from its leading bytes.
+
+    Returns True for a recognised scanner format, False for a recognised
+    non-scanner format, and None when the header is ambiguous (ask Magika).
+    """
+    try:
+        with open(file, "rb") as f:
+            head = f.read(16)
+            size = os.fstat(f.fileno()).st_size
+    except OSError:
+        return None
+    if head.startswith(_SCANNER_SIGNATURES):
+        return True
+    if head.startswith(_FOREIGN_SIGNATURES):
+        return False
+    # "BM" alone is too weak; trust it only when the header's size field matches
+    if head.startswith(b"BM") and len(head) >= 6 and struct.unpack("<I", head[2:6])[0] == size:
+        return True
+    return None
+
+
 def _is_content_type_allowed(file: str) -> bool:
     """Use Magika to verify the file's actual content matches scanner output.
 
@@ -75,11 +166,38 @@ def _is_content_type_allowed(file: str) -> bool:
         return True  # fail-open
 
 
-class ScannerFTPHandler(FTPHandler):
-    """Custom FTP handler with logging, extension filtering, and disk guards."""
+def _device_name(username: str, remote_ip: str) -> str:
+    """Identify the uploading scanner by client IP, prefixed with the FTP user when authenticated.
 
-    def on_file_received(self, file):
-        """Called when a file upload is completed."""
+    Scanners usually share the configured credentials, so the user alone
+    would merge them all into one device.
+    """
+    ip = remote_ip or "unknown"
+    who = f"{username}_{ip}" if username and username != "anonymous" else ip
+    name = _DEVICE_NAME_RE.sub("_", who)
+    if len(name) > _DEVICE_NAME_MAX:
+        # Truncated names stay distinct (long IPv6 addresses, long user names)
+        digest = hashlib.sha1(who.encode()).hexdigest()[:8]
+        name = f"{name[:_DEVICE_NAME_MAX - 9]}_{digest}"
+    return name
+
+
+def _discard(file: str, what: str) -> None:
+    """Remove a rejected upload and tell the agent to forget it."""
+    try:
+        os.remove(file)
+    except OSError as e:
+        logging.error(f"FTP: Failed to remove {what}: {e}")
+    _get_notifier().abort(file)
+
+
+def _validate_upload(file: str, device: str) -> bool:
+    """Check a finished upload and publish the verdict to the agent.
+
+    Runs extension, content-type and disk checks; rejected files are removed.
+    Returns True when the file was accepted.
+    """
+    try:
         # 1. Extension whitelist — reject anything a scanner wouldn't produce
         ext = os.path.splitext(file)[1].lower()
         if ext not in _ALLOWED_EXTENSIONS:
@@ -87,24 +205,24 @@ class ScannerFTPHandler(FTPHandler):
                 f"FTP: Rejected file with disallowed extension '{ext}': {file}. "
                 f"Allowed: {', '.join(sorted(_ALLOWED_EXTENSIONS))}"
             )
-            try:
-                os.remove(file)
-            except OSError as e:
-                logging.error(f"FTP: Failed to remove rejected file: {e}")
-            return
+            _discard(file, "rejected file")
+            return False
 
-        # 2. Content-type check via Magika — catches disguised files whose
-        #    extension was spoofed (e.g. an executable named .jpg)
-        if not _is_content_type_allowed(file):
+        # 2. Content-type check — catches disguised files whose extension was
+        #    spoofed (e.g. an executable named .jpg). Magic bytes settle the
+        #    common cases; only ambiguous headers pay for Magika inference.
+        verdict = _sniff_content(file)
+        checker = "magic bytes"
+        if verdict is None:
+            verdict = _is_content_type_allowed(file)
+            checker = "Magika"
+        if not verdict:
             logging.warning(
                 f"FTP: Rejected file '{os.path.basename(file)}' — "
-                "Magika identified content type as non-scanner output."
+                f"{checker} identified content type as non-scanner output."
             )
-            try:
-                os.remove(file)
-            except OSError as e:
-                logging.error(f"FTP: Failed to remove Magika-rejected file: {e}")
-            return
+            _discard(file, f"{checker}-rejected file")
+            return False
 
         # 3. Disk space guard — act after upload so we always have a statvfs target
         try:
@@ -115,36 +233,100 @@ class ScannerFTPHandler(FTPHandler):
                     f"FTP: Disk critically low ({free_mb:.0f} MB free). "
                     f"Deleting received file to prevent disk exhaustion: {file}"
                 )
-                try:
-                    os.remove(file)
-                except OSError as e:
-                    logging.error(f"FTP: Failed to remove file during disk guard: {e}")
-                return
+                _discard(file, "file during disk guard")
+                return False
             if free_mb < _WARN_FREE_MB:
                 logging.warning(f"FTP: Low disk space — only {free_mb:.0f} MB free.")
         except (OSError, AttributeError):
             pass  # statvfs not available (non-Linux); skip check
 
         logging.info(f"FTP file received: {file}")
+        # Hand the validated, fully written file to the agent (size + sha256)
+        _get_notifier().complete(file, device)
+        return True
+    except Exception as e:
+        logging.error(f"FTP: Validation failed for {file}: {e}")
+        _get_notifier().abort(file)
+        return False
+
+
+class ScannerFTPHandler(FTPHandler):
+    """Custom FTP handler with logging, extension filtering, and disk guards."""
+
+    # File uploads under <mode>/<device>/ so the agent can keep one session per
+    # scanner. Disable to keep the flat <mode>/ layout.
+    device_folders = True
+    # Validate on the worker pool instead of the IO loop (start_ftp_server enables it)
+    async_validation = False
+
+    def _device_path(self, file: str) -> str:
+        """Redirect an upload into the uploader's subfolder of its mode folder.
+
+        Only files stored directly in a top-level mode folder are redirected;
+        anything else keeps the path the client asked for.
+        """
+        parent = os.path.dirname(file)
+        root = os.path.normpath(self.fs.root)
+        if os.path.normpath(os.path.dirname(parent)) != root:
+            return file
+        device_dir = os.path.join(parent, _device_name(self.username, self.remote_ip))
+        try:
+            os.makedirs(device_dir, exist_ok=True)
+        except OSError as e:
+            logging.warning(f"FTP: Could not create device folder {device_dir}: {e}")
+            return file
+        return os.path.join(device_dir, os.path.basename(file))
+
+    def _device(self) -> str:
+        return _device_name(getattr(self, "username", ""), getattr(self, "remote_ip", ""))
+
+    def ftp_STOR(self, file, mode="w"):
+        if self.device_folders:
+            file = self._device_path(file)
+        # Claim the path before the file is created so the agent's watchdog
+        # fallback waits for our completion notice instead of guessing.
+        _get_notifier().begin(file, self._device())
+        if mode == "w" and not self._restart_position and os.path.isfile(file):
+            # Replace rather than truncate: the agent may have hardlinked the
+            # previous upload into a project, which must not be overwritten.
+            try:
+                os.unlink(file)
+            except OSError as e:
+                logging.warning(f"FTP: Could not unlink {file} before overwrite: {e}")
+        return super().ftp_STOR(file, mode)
+
+    def on_file_received(self, file):
+        """Called when a file upload is completed.
+
+        Validation is handed to a worker thread when ``async_validation`` is on
+        so one upload being classified never stalls other transfers; the result
+        reaches the agent through the ingest channel either way.
+        """
+        device = self._device()
+        if self.async_validation:
+            _get_validation_pool().submit(_validate_upload, file, device)
+        else:
+            _validate_upload(file, device)
 
     def on_incomplete_file_received(self, file):
         """Called when a file upload was interrupted. Remove the partial file."""
         logging.warning(f"FTP: Upload interrupted, removing partial file: {file}")
-        try:
-            os.remove(file)
-        except OSError as e:
-            logging.error(f"FTP: Failed to remove partial file: {e}")
+        _discard(file, "partial file")
 
 
-def start_ftp_server(
+def create_ftp_server(
     host: str = "0.0.0.0",
     port: int = 2121,
     directory: str = "/share/scan_inbox",
     username: str = None,
     password: str = None,
+    device_folders: bool = True,
+    server_mode: str = "async",
+    async_validation: bool = True,
+    max_cons_per_ip: int = 3,
 ):
     """
-    Start FTP server for scanner uploads.
+    Build (but don't start) the FTP server for scanner uploads.
     
     Args:
         host: Bind address (default: 0.0.0.0)
@@ -152,8 +334,16 @@ def start_ftp_server(
         directory: Upload directory (default: /share/scan_inbox)
         username: FTP username (None = anonymous)
         password: FTP password (None = anonymous)
+        device_folders: File uploads under <mode>/<device>/ (default: True)
+        server_mode: "async" (single IO loop), "threaded" or "multiprocess"
+        async_validation: Validate uploads on a worker pool (default: True)
+        max_cons_per_ip: Concurrent connections per client IP (0 = unlimited)
     """
-    
+    if server_mode not in _SERVER_CLASSES:
+        raise ValueError(
+            f"Unknown FTP server mode {server_mode!r} (expected one of {', '.join(_SERVER_CLASSES)})"
+        )
+
     # Create authorizer
     authorizer = DummyAuthorizer()
     
@@ -185,6 +375,9 @@ def start_ftp_server(
     # Create handler
     handler = ScannerFTPHandler
     handler.authorizer = authorizer
+    handler.device_folders = device_folders
+    # A process per connection never blocks its siblings — validate inline there
+    handler.async_validation = async_validation and server_mode != "multiprocess"
     
     # Passive ports (for PASV mode) — 3 ports is enough for home use
     handler.passive_ports = range(30000, 30003)
@@ -196,14 +389,38 @@ def start_ftp_server(
     handler.banner = "Scan Agent FTP Server ready"
     
     # Create server
-    server = FTPServer((host, port), handler)
+    server = _SERVER_CLASSES[server_mode]((host, port), handler)
     
     # Limits
     server.max_cons = 10
-    server.max_cons_per_ip = 3
+    server.max_cons_per_ip = max_cons_per_ip
     
-    logging.info(f"FTP server starting on {host}:{port}")
+    logging.info(f"FTP server ({server_mode}) ready on {host}:{port}")
     logging.info(f"Upload directory: {directory}")
+    return server
+
+
+def start_ftp_server(
+    host: str = "0.0.0.0",
+    port: int = 2121,
+    directory: str = "/share/scan_inbox",
+    username: str = None,
+    password: str = None,
+    device_folders: bool = True,
+    server_mode: str = "async",
+):
+    """
+    Start FTP server for scanner uploads (blocking). See create_ftp_server for args.
+    """
+    server = create_ftp_server(
+        host=host,
+        port=port,
+        directory=directory,
+        username=username,
+        password=password,
+        device_folders=device_folders,
+        server_mode=server_mode,
+    )
     
     # Start server (blocking)
     try:
@@ -222,10 +439,14 @@ if __name__ == "__main__":
     _username = os.environ.get("FTP_USERNAME") or None
     _password = os.environ.get("FTP_PASSWORD") or None
     _directory = os.environ.get("FTP_DIRECTORY", "/share/scan_inbox")
+    _device_folders = os.environ.get("FTP_DEVICE_FOLDERS", "1").lower() not in ("0", "false", "no")
+    _server_mode = os.environ.get("FTP_SERVER_MODE", "async").lower()
     start_ftp_server(
         host="0.0.0.0",
         port=2121,
         directory=_directory,
         username=_username,
         password=_password,
+        device_folders=_device_folders,
+        server_mode=_server_mode,
     )
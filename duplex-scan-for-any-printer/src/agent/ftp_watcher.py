@@ -1,57 +1,207 @@
 from __future__ import annotations
 
 import os
+import threading
 import time
-from typing import Callable
+from typing import Callable, Dict, Optional, Tuple
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
+from agent.session_manager import DEFAULT_DEVICE
+from agent.ingest_channel import (
+    IngestEvent,
+    IngestListener,
+    EVENT_BEGIN,
+    EVENT_COMPLETE,
+    EVENT_ABORT,
+    file_sha256,
+)
+
+# Fallback (no ingest notification): a file is handed over once its size has
+# not changed for this long. Covers SMB drops and an FTP server without the channel.
+_FALLBACK_SETTLE_SECS = 1.0
+_FALLBACK_POLL_SECS = 0.25
+# An upload announced with "begin" but never completed/aborted is released to
+# the fallback after this long (lost datagram, killed FTP server).
+_UPLOAD_OWNERSHIP_SECS = 600
+# The same (path, size) reported by both the channel and the fallback is delivered once.
+_DEDUPE_WINDOW_SECS = 60
+
+
+def resolve_mode_and_device(folder: str, path: str) -> tuple:
+    """Map a file under a watched mode folder to ``(mode, device)``.
+
+    The FTP server files uploads as ``<mode>/<device>/<name>``; files placed
+    directly in ``<mode>/`` belong to the default device.
+    """
+    mode = os.path.basename(folder)
+    rel_parts = os.path.relpath(path, folder).split(os.sep)
+    device = rel_parts[0] if len(rel_parts) > 1 else DEFAULT_DEVICE
+    return mode, device
+
 
 class NewFileHandler(FileSystemEventHandler):
-    def __init__(self, on_new_file: Callable[[str, str], None]):
+    def __init__(self, folder: str, on_created: Callable[[str, str], None]):
         super().__init__()
-        self.on_new_file = on_new_file
+        self.folder = folder
+        self.on_created_cb = on_created
 
     def on_created(self, event):
         if event.is_directory:
             return
-        
-        try:
-            # Log immediately when file is detected
-            print(f"[FTPWatcher] File detected: {event.src_path}")
-            # Small delay to ensure file is fully written (reduced from 0.2 to 0.05)
-            time.sleep(0.05)
-            path = event.src_path
-            
-            # Verify file exists and is readable
-            if not os.path.exists(path):
-                print(f"[FTPWatcher] ⚠️  File disappeared: {path}")
-                return
-            
-            # Determine mode by parent folder name
-            mode = os.path.basename(os.path.dirname(path))
-            print(f"[FTPWatcher] Processing file in mode: {mode}")
-            self.on_new_file(mode, path)
-        except Exception as e:
-            print(f"[FTPWatcher] ❌ Error handling file {event.src_path}: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        # Log immediately when file is detected; completion is decided by the
+        # ingest channel (or the settle fallback), never by a fixed sleep here.
+        print(f"[FTPWatcher] File detected: {event.src_path}")
+        self.on_created_cb(self.folder, event.src_path)
 
 
 class FTPWatcher:
-    def __init__(self, root: str, subdirs: dict, on_new_file: Callable[[str, str], None]):
+    """Hands completed uploads to ``on_new_file(mode, path, device)``.
+
+    Primary path: the FTP server's ingest channel reports each finished,
+    validated upload with its size and hash. Fallback: watchdog create events,
+    delivered once the file stops growing and only if the channel hasn't
+    claimed the path.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        subdirs: dict,
+        on_new_file: Callable[[str, str, str], None],
+        ingest_socket: Optional[str] = None,
+    ):
         self.root = root
         self.subdirs = subdirs
         self.on_new_file = on_new_file
         self._observer = Observer()
+        self._folders = [os.path.realpath(os.path.join(root, name)) for name in subdirs.values()]
+        self._listener = IngestListener(self._on_ingest_event, path=ingest_socket)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Tuple[str, int, float]] = {}  # path -> (folder, size, since)
+        self._uploading: Dict[str, float] = {}  # path -> begin time (channel owns it)
+        self._delivered: Dict[Tuple[str, int], float] = {}
+        self._running = False
 
     def start(self):
-        for name in self.subdirs.values():
-            folder = os.path.join(self.root, name)
+        for folder in self._folders:
             os.makedirs(folder, exist_ok=True)
-            self._observer.schedule(NewFileHandler(self.on_new_file), folder, recursive=False)
+            # Recursive so per-device subfolders (<mode>/<device>/) are picked up
+            self._observer.schedule(NewFileHandler(folder, self._on_fs_created), folder, recursive=True)
         self._observer.start()
+        self._listener.start()
+        self._running = True
+        threading.Thread(target=self._settle_loop, daemon=True, name="ingest-fallback").start()
 
     def stop(self):
+        self._running = False
+        self._listener.stop()
         self._observer.stop()
         self._observer.join()
+
+    # ── Ingest channel (primary) ───────────────────────────────────────────
+
+    def _folder_for(self, path: str) -> Optional[str]:
+        real = os.path.realpath(path)
+        for folder in self._folders:
+            if os.path.commonpath([real, folder]) == folder and real != folder:
+                return folder
+        return None
+
+    def _on_ingest_event(self, event: IngestEvent) -> None:
+        folder = self._folder_for(event.path)
+        if folder is None:
+            print(f"[FTPWatcher] ⚠️  Ingest event outside watched folders ignored: {event.path}")
+            return
+        path = os.path.join(folder, os.path.relpath(os.path.realpath(event.path), folder))
+
+        if event.event == EVENT_BEGIN:
+            with self._lock:
+                self._uploading[path] = time.time()
+            return
+
+        with self._lock:
+            self._uploading.pop(path, None)
+            self._pending.pop(path, None)
+        if event.event == EVENT_ABORT:
+            print(f"[FTPWatcher] Upload aborted/rejected: {path}")
+            return
+        if event.event != EVENT_COMPLETE:
+            return
+
+        try:
+            size = os.path.getsize(path)
+            # Same bytes the FTP server validated (an event without a hash only has its size)
+            mismatch = "size" if size != event.size else (
+                "sha256" if event.sha256 and file_sha256(path) != event.sha256 else None)
+        except OSError:
+            print(f"[FTPWatcher] ⚠️  File disappeared: {path}")
+            return
+        if mismatch:
+            # Modified after the FTP server hashed it — let the fallback settle it
+            print(f"[FTPWatcher] ⚠️  {mismatch} mismatch for {path}; waiting to settle")
+            with self._lock:
+                self._pending[path] = (folder, size, time.time())
+            return
+        print(f"[FTPWatcher] Upload complete: {path} ({size} bytes, sha256 {event.sha256[:12]})")
+        self._deliver(folder, path, size)
+
+    # ── Watchdog (fallback) ────────────────────────────────────────────────
+
+    def _on_fs_created(self, folder: str, path: str) -> None:
+        with self._lock:
+            if path not in self._pending:
+                self._pending[path] = (folder, -1, time.time())
+
+    def _settle_loop(self) -> None:
+        while self._running:
+            time.sleep(_FALLBACK_POLL_SECS)
+            try:
+                for folder, path, size in self._settled(time.time()):
+                    self._deliver(folder, path, size)
+            except Exception as e:
+                print(f"[FTPWatcher] ❌ Fallback settle error: {e}")
+
+    def _settled(self, now: float) -> list:
+        """Pop pending files whose size has been stable for the settle period."""
+        ready = []
+        with self._lock:
+            for path, (folder, last_size, since) in list(self._pending.items()):
+                began = self._uploading.get(path)
+                if began is not None:
+                    if now - began < _UPLOAD_OWNERSHIP_SECS:
+                        continue  # the channel will report completion
+                    del self._uploading[path]
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    del self._pending[path]  # rejected or cleaned up before settling
+                    continue
+                if size != last_size:
+                    self._pending[path] = (folder, size, now)
+                elif now - since >= _FALLBACK_SETTLE_SECS:
+                    del self._pending[path]
+                    ready.append((folder, path, size))
+        return ready
+
+    # ── Delivery ───────────────────────────────────────────────────────────
+
+    def _deliver(self, folder: str, path: str, size: int) -> None:
+        now = time.time()
+        key = (path, size)
+        with self._lock:
+            for k, t in list(self._delivered.items()):
+                if now - t > _DEDUPE_WINDOW_SECS:
+                    del self._delivered[k]
+            if key in self._delivered:
+                return
+            self._delivered[key] = now
+        try:
+            # Determine mode by watched folder, device by per-device subfolder
+            mode, device = resolve_mode_and_device(folder, path)
+            print(f"[FTPWatcher] Processing file in mode: {mode} (device: {device})")
+            self.on_new_file(mode, path, device)
+        except Exception as e:
+            print(f"[FTPWatcher] ❌ Error handling file {path}: {str(e)}")
+            import traceback
+            traceback.print_exc()
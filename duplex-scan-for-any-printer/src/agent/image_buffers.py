@@ -0,0 +1,378 @@
+"""Decoded scan pages shared between processes as memory-mapped ``.npy`` files.
+
+The agent decodes every scan of a session, and the web UI's crop, transform
+and tile paths used to decode the same JPEGs again when the project is opened
+in the editor. The agent now writes each decoded page once (``put_image``)
+and any process (web UI request threads, zygote-forked workers) maps it
+read-only with ``view(path)`` (``np.load(mmap_mode="r")``): no decode, and
+no copy until a transform produces a new array.
+
+- Pages are grouped per session (the session id is also the project id)
+  under ``SCAN_BUFFER_DIR``, by default ``/dev/shm/scan-buffers`` when
+  ``/dev/shm`` is large enough, so raw pages do not wear the SD card. A page
+  that does not fit ``SCAN_BUFFER_MAX_MB`` (0 disables the store) or the
+  free space is skipped, and readers decode the file as before.
+- The agent queues pages with ``put_image_async``: a background writer does
+  the copy into the store (a full uncompressed page, ~26 MB at 300 DPI A4),
+  so it never sits on the session's critical path. At most
+  ``WRITE_QUEUE_PAGES`` pages wait; further pages are skipped, not blocked on.
+- Entries are keyed by the source's file name, size and mtime, which survive
+  the move from the inbox into the project folder; an edited original never
+  matches a stale buffer.
+- Groups are reference counted with lease files (one per holder, stamped
+  with its pid so a crashed holder does not pin the group). When the last
+  lease is released (the agent's, when the session finishes) the group stays
+  readable for ``SCAN_BUFFER_IDLE_SECS``, refreshed by every ``view``, since
+  the editor usually opens a new project right away; ``sweep`` then removes
+  it. Mappings already handed out stay valid after removal.
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from agent import tuning
+
+MAX_BYTES = int(float(os.getenv("SCAN_BUFFER_MAX_MB", "512")) * 1024 * 1024)
+IDLE_SECS = float(os.getenv("SCAN_BUFFER_IDLE_SECS", "900"))
+WRITE_QUEUE_PAGES = 8  # decoded pages held for the background writer
+SWEEP_INTERVAL_SECS = 60.0
+_SHM_DIR = "/dev/shm"
+_MIN_SHM_BYTES = 256 * 1024 * 1024  # Docker's default 64 MB /dev/shm is too small
+_FREE_RESERVE_BYTES = 32 * 1024 * 1024
+_LEASE_PREFIX = ".lease-"
+_USED_FILE = ".used"
+_EXIF_ORIENTATION = 0x0112
+
+
+def default_root() -> str:
+    configured = os.getenv("SCAN_BUFFER_DIR")
+    if configured:
+        return configured
+    try:
+        st = os.statvfs(_SHM_DIR)
+        if st.f_blocks * st.f_frsize >= _MIN_SHM_BYTES and os.access(_SHM_DIR, os.W_OK):
+            return os.path.join(_SHM_DIR, "scan-buffers")
+    except (OSError, AttributeError):
+        pass
+    return os.path.join(tempfile.gettempdir(), "scan-buffers")
+
+
+def buffer_key(source_path: str) -> str:
+    st = os.stat(source_path)
+    return f"{os.path.basename(source_path)}-{st.st_size}-{st.st_mtime_ns}"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class BufferStore:
+    def __init__(self, root: Optional[str] = None, max_bytes: int = MAX_BYTES,
+                 idle_secs: float = IDLE_SECS):
+        self.root = root or default_root()
+        self.max_bytes = max_bytes
+        self.idle_secs = idle_secs
+        self._lock = threading.Lock()
+        self._tokens = itertools.count()
+        self._last_sweep = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _group_dir(self, group: str) -> str:
+        return os.path.join(self.root, os.path.basename(group))
+
+    def _touch(self, group_dir: str) -> None:
+        try:
+            with open(os.path.join(group_dir, _USED_FILE), "a"):
+                pass
+            os.utime(os.path.join(group_dir, _USED_FILE))
+        except OSError:
+            pass
+
+    # ── Leases ──────────────────────────────────────────────────────────────
+
+    def acquire(self, group: str) -> Optional[str]:
+        """Take a lease on ``group`` (created if needed); returns the lease path."""
+        if not self.enabled:
+            return None
+        group_dir = self._group_dir(group)
+        lease = os.path.join(group_dir, f"{_LEASE_PREFIX}{os.getpid()}-{next(self._tokens)}")
+        try:
+            os.makedirs(group_dir, exist_ok=True)
+            with open(lease, "x"):
+                pass
+        except OSError:
+            return None
+        self._touch(group_dir)
+        return lease
+
+    def release(self, lease: Optional[str]) -> None:
+        if lease is None:
+            return
+        try:
+            os.remove(lease)
+        except FileNotFoundError:
+            pass
+        group_dir = os.path.dirname(lease)
+        if self.idle_secs <= 0 and not self._live_leases(group_dir):
+            self._remove(group_dir)  # no grace period: the last holder cleans up
+        else:
+            self._touch(group_dir)
+        self.sweep()
+
+    @contextmanager
+    def session(self, group: str) -> Iterator[None]:
+        """Hold a lease on ``group`` for the block."""
+        lease = self.acquire(group)
+        try:
+            yield
+        finally:
+            self.release(lease)
+
+    def _live_leases(self, group_dir: str) -> int:
+        live = 0
+        try:
+            names = os.listdir(group_dir)
+        except OSError:
+            return 0
+        for name in names:
+            if not name.startswith(_LEASE_PREFIX):
+                continue
+            try:
+                pid = int(name[len(_LEASE_PREFIX):].split("-", 1)[0])
+            except ValueError:
+                continue
+            if _pid_alive(pid):
+                live += 1
+            else:
+                try:
+                    os.remove(os.path.join(group_dir, name))
+                except OSError:
+                    pass
+        return live
+
+    # ── Cleanup ─────────────────────────────────────────────────────────────
+
+    def _groups(self) -> List[Tuple[float, int, str]]:
+        """(last used, bytes, dir) of every group."""
+        out = []
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return out
+        for name in names:
+            group_dir = os.path.join(self.root, name)
+            size, used = 0, 0.0
+            try:
+                with os.scandir(group_dir) as it:
+                    for entry in it:
+                        st = entry.stat()
+                        size += st.st_size
+                        if entry.name == _USED_FILE:
+                            used = st.st_mtime
+                used = used or os.stat(group_dir).st_mtime
+            except OSError:
+                continue
+            out.append((used, size, group_dir))
+        return out
+
+    def _remove(self, group_dir: str) -> None:
+        # Rename first so writers and readers never see a half-deleted group
+        doomed = os.path.join(self.root, f".gone-{os.getpid()}-{next(self._tokens)}")
+        try:
+            os.replace(group_dir, doomed)
+        except OSError:
+            return
+        shutil.rmtree(doomed, ignore_errors=True)
+
+    def sweep(self, force: bool = False) -> int:
+        """Remove unleased groups idle for ``idle_secs``; returns how many."""
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_sweep < SWEEP_INTERVAL_SECS:
+                return 0
+            self._last_sweep = now
+        removed = 0
+        for used, _, group_dir in self._groups():
+            if os.path.basename(group_dir).startswith(".gone-"):
+                shutil.rmtree(group_dir, ignore_errors=True)
+            elif now - used >= self.idle_secs and not self._live_leases(group_dir):
+                self._remove(group_dir)
+                removed += 1
+        return removed
+
+    def _make_room(self, nbytes: int) -> bool:
+        groups = self._groups()
+        usage = sum(size for _, size, _ in groups)
+        # Evict unleased groups, least recently used first
+        for _, size, group_dir in sorted(groups):
+            if usage + nbytes <= self.max_bytes:
+                break
+            if not self._live_leases(group_dir):
+                self._remove(group_dir)
+                usage -= size
+        if usage + nbytes > self.max_bytes:
+            return False
+        try:
+            st = os.statvfs(self.root)
+            return st.f_bavail * st.f_frsize >= nbytes + _FREE_RESERVE_BYTES
+        except (OSError, AttributeError):
+            return True
+
+    # ── Pages ───────────────────────────────────────────────────────────────
+
+    def put(self, group: str, key: str, array: np.ndarray) -> bool:
+        """Write ``array`` once as ``<group>/<key>.npy``; False if it was skipped."""
+        if not self.enabled:
+            return False
+        group_dir = self._group_dir(group)
+        path = os.path.join(group_dir, f"{key}.npy")
+        if os.path.exists(path):
+            return True
+        if not self._make_room(array.nbytes):
+            return False
+        tmp = f"{path}.{os.getpid()}-{next(self._tokens)}.tmp"
+        try:
+            os.makedirs(group_dir, exist_ok=True)
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return False
+        self._touch(group_dir)
+        return True
+
+    def view(self, source_path: str) -> Optional[np.ndarray]:
+        """Read-only mapping of the decoded page of ``source_path``, or None."""
+        if not self.enabled:
+            return None
+        try:
+            name = f"{buffer_key(source_path)}.npy"
+            groups = os.listdir(self.root)
+        except OSError:
+            return None
+        for group in groups:
+            if group.startswith("."):
+                continue
+            path = os.path.join(self.root, group, name)
+            if not os.path.exists(path):
+                continue
+            try:
+                array = np.load(path, mmap_mode="r")
+            except (OSError, ValueError):
+                continue  # removed meanwhile
+            self._touch(os.path.join(self.root, group))
+            return array
+        return None
+
+
+_store: Optional[BufferStore] = None
+_store_lock = threading.Lock()
+
+
+def get_buffer_store() -> BufferStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BufferStore()
+            if not os.getenv("SCAN_BUFFER_MAX_MB"):
+                _store.max_bytes = tuning.settings()["page_buffer_mb"] * 1024 * 1024
+        return _store
+
+
+def put_image(group: str, source_path: str, img) -> bool:
+    """Store a decoded PIL scan (RGB or L, as PIL decoded it) for ``source_path``.
+
+    Images with an EXIF rotation are skipped: OpenCV applies it on decode and
+    PIL does not, so the two would disagree.
+    """
+    store = get_buffer_store()
+    if not store.enabled or img.mode not in ("RGB", "L"):
+        return False
+    try:
+        if img.getexif().get(_EXIF_ORIENTATION, 1) != 1:
+            return False
+        return store.put(group, buffer_key(source_path), np.asarray(img))
+    except Exception:
+        return False
+
+
+_writer: Tuple[int, Optional[ThreadPoolExecutor]] = (0, None)
+_write_slots = threading.BoundedSemaphore(WRITE_QUEUE_PAGES)
+
+
+def _get_writer() -> ThreadPoolExecutor:
+    global _writer
+    pid, pool = _writer
+    if pool is None or pid != os.getpid():
+        pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-buffers")
+        _writer = (os.getpid(), pool)
+    return pool
+
+
+def put_image_async(group: str, source_path: str, img) -> bool:
+    """Queue ``put_image`` on the background writer; False if it was skipped.
+
+    ``img`` is decoded here, in the caller's thread: PIL's lazy load is not
+    thread-safe, and the pipeline keeps using the image while it is written.
+    It must not be modified afterwards (the pipeline only derives new images
+    from it).
+    """
+    if not get_buffer_store().enabled or not _write_slots.acquire(blocking=False):
+        return False
+    try:
+        img.load()
+    except Exception:
+        _write_slots.release()
+        return False
+
+    def _write() -> None:
+        try:
+            put_image(group, source_path, img)
+        finally:
+            _write_slots.release()
+
+    try:
+        _get_writer().submit(_write)
+    except RuntimeError:  # interpreter shutting down
+        _write_slots.release()
+        return False
+    return True
+
+
+def flush_writes(timeout: Optional[float] = None) -> None:
+    """Wait for the pages queued so far to be written."""
+    _get_writer().submit(lambda: None).result(timeout)
+
+
+def view_bgr(source_path: str) -> Optional[np.ndarray]:
+    """The decoded page as a BGR array, as ``cv2.imread`` would return it, or None."""
+    array = get_buffer_store().view(source_path)
+    if array is None:
+        return None
+    import cv2
+    if array.ndim == 2:
+        return cv2.cvtColor(array, cv2.COLOR_GRAY2BGR)
+    return cv2.cvtColor(array, cv2.COLOR_RGB2BGR)
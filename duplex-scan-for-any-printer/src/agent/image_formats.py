@@ -0,0 +1,76 @@
+"""Output formats for served image derivatives (thumbnails, page renders).
+
+JPEG is always available. WebP and AVIF are offered when Pillow can encode
+them; at the qualities below they are visually on par with the JPEGs while
+typically 30–60% (WebP) and 60–80% (AVIF) smaller. ``negotiate`` picks the
+smallest enabled format the client advertises in ``Accept`` — ``<img>``
+requests from current browsers send ``image/avif,image/webp,...``. The
+format is the derivative's file extension, so it is part of the cache key,
+and responses must carry ``Vary: Accept``.
+
+AVIF encodes take about a second per page even at a fast encoder speed, so
+it is only negotiated when ``WEB_UI_AVIF`` is set (add-on option
+``web_ui_avif``); an explicit ``format=avif`` always works.
+"""
+from __future__ import annotations
+
+import io
+import os
+from typing import Iterable, Optional, Tuple
+
+from PIL import Image
+
+MEDIA_TYPES = {"jpg": "image/jpeg", "webp": "image/webp", "avif": "image/avif"}
+QUALITY = {"jpg": 80, "webp": 78, "avif": 55}
+_PIL_NAMES = {"jpg": "JPEG", "webp": "WEBP", "avif": "AVIF"}
+_ENCODER_OPTIONS = {"avif": {"speed": 8}}
+_PREFERENCE = ("avif", "webp")  # smallest first; jpg is the fallback
+
+_available: Optional[Tuple[str, ...]] = None
+
+
+def available() -> Tuple[str, ...]:
+    """Formats this Pillow build can encode (always includes ``jpg``)."""
+    global _available
+    if _available is None:
+        Image.init()
+        _available = tuple(fmt for fmt, name in _PIL_NAMES.items()
+                           if fmt == "jpg" or name in Image.SAVE)
+    return _available
+
+
+def avif_enabled() -> bool:
+    return os.environ.get("WEB_UI_AVIF", "").lower() in ("1", "true", "yes")
+
+
+def preferred() -> str:
+    """What ``negotiate`` returns for a browser that accepts everything."""
+    return negotiate("image/avif,image/webp")
+
+
+def normalize(fmt: str) -> str:
+    return fmt.lower().replace("jpeg", "jpg")
+
+
+def negotiate(accept: str, allowed: Optional[Iterable[str]] = None) -> str:
+    """Best of ``allowed`` (default: all available) that ``accept`` lists, else ``jpg``."""
+    allowed = set(available() if allowed is None else allowed) & set(available())
+    if not avif_enabled():
+        allowed.discard("avif")
+    accept = (accept or "").lower()
+    for fmt in _PREFERENCE:
+        if fmt in allowed and MEDIA_TYPES[fmt] in accept:
+            return fmt
+    return "jpg"
+
+
+def encode(img: Image.Image, fmt: str, quality: Optional[int] = None) -> bytes:
+    """Encode a PIL image as ``fmt`` at the shared per-format quality."""
+    if fmt not in available():
+        raise ValueError(f"Unsupported format: {fmt}")
+    if img.mode not in ("RGB", "L") and not (fmt != "jpg" and img.mode == "RGBA"):
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, _PIL_NAMES[fmt], quality=QUALITY[fmt] if quality is None else quality,
+             **_ENCODER_OPTIONS.get(fmt, {}))
+    return buf.getvalue()
@@ -5,19 +5,33 @@ from PIL import Image, ImageDraw
 import numpy as np
 import cv2
 import os
+import threading
 import time
+from contextlib import contextmanager
 import deskew
 from withoutbg import OpenSourceModel
 
 import gc
 
-from agent import logger
+from agent import logger, tracing
 from agent.constants import CHECKPOINT_DIR, CHECKPOINT_FILES
 
+# Width orientation detection and deskew downsample to before analysing
+ANALYSIS_WIDTH = 600
+
 # Global model cache for background removal
 # Strategy: Load on demand, unload after batch to free RAM (~500MB-1GB)
 # Trade-off: +1s per batch vs 750MB RAM saved 24/7 - worth it for 24/7 agent
 _BG_REMOVAL_MODEL = None
+# Sessions currently using the model; the last one out unloads it if any asked to
+_BG_MODEL_USERS = 0
+_BG_MODEL_UNLOAD_PENDING = False
+_BG_MODEL_LOCK = threading.Lock()
+# Sessions run in parallel: one load at a time (a second copy is another
+# ~750MB the admission estimate does not count), and one inference at a time
+# (OpenSourceModel loads its ONNX sessions lazily on first use, unguarded)
+_BG_MODEL_LOAD_LOCK = threading.Lock()
+_BG_MODEL_RUN_LOCK = threading.Lock()
 
 def _get_bg_removal_model():
     """Get or initialize the background removal model (lazy load pattern).
@@ -26,15 +40,23 @@ def _get_bg_removal_model():
     For 24/7 agent, saving 750MB RAM is more valuable than 1s speedup.
     """
     global _BG_REMOVAL_MODEL
-    if _BG_REMOVAL_MODEL is None:
+    model = _BG_REMOVAL_MODEL
+    if model is not None:
+        return model
+    with _BG_MODEL_LOAD_LOCK:
+        if _BG_REMOVAL_MODEL is not None:
+            return _BG_REMOVAL_MODEL
         checkpoint_kwargs = {arg: f"{CHECKPOINT_DIR}/{name}" for name, arg in CHECKPOINT_FILES}
         _total_mb = sum(os.path.getsize(p) for p in checkpoint_kwargs.values() if os.path.exists(p)) / 1024 / 1024
         logger.info(f"🔄 Loading background removal model ({_total_mb:.0f} MB)...")
         load_start = time.time()
-        _BG_REMOVAL_MODEL = OpenSourceModel(**checkpoint_kwargs)
+        with tracing.span("model_load"):
+            _BG_REMOVAL_MODEL = OpenSourceModel(**checkpoint_kwargs)
         load_time = time.time() - load_start
+        tracing.MODEL_LOADS.inc()
+        tracing.MODEL_LOADED.set(1)
         logger.info(f"✅ Model loaded successfully in {load_time:.2f}s")
-    return _BG_REMOVAL_MODEL
+        return _BG_REMOVAL_MODEL
 
 def _unload_bg_removal_model():
     """Unload the background removal model to free memory (~500MB-1GB).
@@ -42,10 +64,34 @@ def _unload_bg_removal_model():
     Called automatically after each batch processing to keep RAM low.
     """
     global _BG_REMOVAL_MODEL
-    if _BG_REMOVAL_MODEL is not None:
+    with _BG_MODEL_LOAD_LOCK:
+        if _BG_REMOVAL_MODEL is None:
+            return
         logger.info("🗑️  Unloading background removal model to free RAM...")
         _BG_REMOVAL_MODEL = None
-        gc.collect()
+        tracing.MODEL_LOADED.set(0)
+    gc.collect()
+
+@contextmanager
+def bg_removal_model_session(unload: bool = True):
+    """Scope one session's use of the background removal model.
+
+    On exit the model is unloaded if this or an earlier session asked for it
+    (``unload``), but only once no other session is still using it.
+    """
+    global _BG_MODEL_USERS, _BG_MODEL_UNLOAD_PENDING
+    with _BG_MODEL_LOCK:
+        _BG_MODEL_USERS += 1
+    try:
+        yield
+    finally:
+        with _BG_MODEL_LOCK:
+            _BG_MODEL_USERS -= 1
+            _BG_MODEL_UNLOAD_PENDING = _BG_MODEL_UNLOAD_PENDING or unload
+            if _BG_MODEL_USERS == 0 and _BG_MODEL_UNLOAD_PENDING:
+                _BG_MODEL_UNLOAD_PENDING = False
+                _unload_bg_removal_model()
+
 
 def _remove_background_rmbg(model, img: Image.Image) -> Image.Image:
     """Run background removal on an image using the given model.
@@ -57,7 +103,8 @@ def _remove_background_rmbg(model, img: Image.Image) -> Image.Image:
     Returns:
         PIL Image in RGBA mode with alpha channel representing the foreground mask.
     """
-    return model.remove_background(img)
+    with _BG_MODEL_RUN_LOCK:
+        return model.remove_background(img)
 
 
 def load_image(path: str) -> Image.Image:
@@ -78,7 +125,7 @@ def is_landscape(img: Image.Image) -> bool:
     return img.width >= img.height
 
 
-def detect_orientation_angle(img: Image.Image) -> int:
+def detect_orientation_angle(img: Image.Image, analysis_width: Optional[int] = None) -> int:
     """
     Ultra-lightweight SOTA orientation detection optimized for Raspberry Pi.
     
@@ -88,11 +135,13 @@ def detect_orientation_angle(img: Image.Image) -> int:
     3. Mass centroid analysis - text weight distribution
     4. Projection profile periodicity via autocorrelation
     
+    ``analysis_width`` overrides ``ANALYSIS_WIDTH`` for one call (degraded sessions).
+
     Returns: rotation angle needed (0, 90, 180, 270)
     For document duplex: focus on 0° vs 180° detection
     """
     # Step 1: Smart downsample - preserve aspect ratio, target ~600px width
-    target_width = 600
+    target_width = analysis_width or ANALYSIS_WIDTH
     if img.width > target_width:
         scale = target_width / float(img.width)
         new_size = (int(img.width * scale), int(img.height * scale))
@@ -257,13 +306,14 @@ def detect_orientation_osd(img: Image.Image) -> Tuple[int, float]:
         # pytesseract not installed or tesseract binary missing
         return None, 0.0
 
-def detect_orientation_with_confidence(img: Image.Image) -> Tuple[int, float]:
+def detect_orientation_with_confidence(img: Image.Image,
+                                       analysis_width: Optional[int] = None) -> Tuple[int, float]:
     """
     Detect orientation and return confidence score.
     Returns: (angle, confidence) where confidence in [0, 1]
     """
     # Reuse the same logic but expose scores
-    target_width = 600
+    target_width = analysis_width or ANALYSIS_WIDTH
     if img.width > target_width:
         scale = target_width / float(img.width)
         new_size = (int(img.width * scale), int(img.height * scale))
@@ -405,7 +455,8 @@ def detect_orientation_with_confidence(img: Image.Image) -> Tuple[int, float]:
         return (0, confidence)
 
 
-def batch_correct_orientation(images: list[Image.Image], image_paths: list[str] = None) -> list[int]:
+def batch_correct_orientation(images: list[Image.Image], image_paths: list[str] = None,
+                              analysis_width: Optional[int] = None) -> list[int]:
     """
     Smart batch orientation correction for duplex scanning.
     
@@ -418,6 +469,7 @@ def batch_correct_orientation(images: list[Image.Image], image_paths: list[str]
     Args:
         images: List of PIL images
         image_paths: Optional list of file paths (for timestamp detection)
+        analysis_width: Downsample width for this batch (default ``ANALYSIS_WIDTH``)
     
     Returns: list of rotation angles (0 or 180) for each image
     """
@@ -467,7 +519,7 @@ def batch_correct_orientation(images: list[Image.Image], image_paths: list[str]
     # Phase 1: Individual detection with confidence
     detections = []
     for img in images:
-        angle, confidence = detect_orientation_with_confidence(img)
+        angle, confidence = detect_orientation_with_confidence(img, analysis_width)
         detections.append((angle, confidence))
     
     # Phase 2: Split into fronts and backs
@@ -694,13 +746,15 @@ def rotate_with_auto_fill(image_path, angle, pad_size=20):
 
     return rotated_img
 
-def deskew_image(fileName: str, img: Image.Image) -> Tuple[Image.Image, float]:
+def deskew_image(fileName: str, img: Image.Image,
+                 analysis_width: Optional[int] = None) -> Tuple[Image.Image, float]:
     """
     Correct skew/tilt in scanned document.
     
     Args:
         fileName: Path to image file (for logging)
         img: PIL Image to deskew
+        analysis_width: Downsample width for this call (default ``ANALYSIS_WIDTH``)
     
     Returns:
         Deskewed PIL Image
@@ -711,7 +765,7 @@ def deskew_image(fileName: str, img: Image.Image) -> Tuple[Image.Image, float]:
     - Auto-detect blank pages and skip processing
     """
     # Downsample for speed (600px width uses ~1MB RAM vs ~10MB for 2000px)
-    target_width = 600
+    target_width = analysis_width or ANALYSIS_WIDTH
     if img.width > target_width:
         scale = target_width / float(img.width)
         new_size = (int(img.width * scale), int(img.height * scale))
@@ -824,7 +878,7 @@ def crop_document_v2(img: Image.Image, processing_width: int = 800, debug: bool
         # Get cached model (loaded once, reused for all images)
         model = _get_bg_removal_model()
 
-        result_rgba = model.remove_background(img_small)  # Returns PIL Image with alpha channel
+        result_rgba = _remove_background_rmbg(model, img_small)  # Returns PIL Image with alpha channel
         
         # Step 3: Find bounding box from alpha channel
         # Convert to numpy array and get alpha channel
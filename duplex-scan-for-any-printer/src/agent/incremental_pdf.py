@@ -0,0 +1,247 @@
+"""Incremental scan_document PDF regeneration for the editor's "Generate".
+
+Regenerating used to re-transform every source image and re-encode every
+page of both PDFs, even after a single bbox edit. Here:
+
+- each image's transform result is cached in the derivative store, keyed by
+  the source content hash + the transform fields of its metadata + target
+  DPI, as the final embedded JPEG streams (color and mono) plus the
+  transformed size (all layout needs);
+- each written PDF gets a manifest of per-page signatures (the items placed
+  on it and where). On the next run, pages whose signature is unchanged are
+  copied from the previous PDF; only changed pages are built from streams.
+
+One edited image therefore costs one transform and one page rebuild.
+
+The streams are full resolution, so they get their own store and quota
+(``PDF_STREAM_CACHE_MB``) instead of pushing thumbnails out of the shared
+one. A stream evicted between ``encode`` and ``write_pdf`` is re-encoded
+from its source.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+from reportlab.lib.pagesizes import A4
+
+from agent.derivative_store import DerivativeStore, get_store, store_root
+from agent.pdf_render import FITZ_LOCK
+from agent.pdf_generator import _encode_pdf_jpeg, _optimize_for_pdf, _scan_document_rect, _to_monochrome
+from agent.transform_service import apply_metadata_transforms
+
+# Metadata fields read by apply_metadata_transforms; anything else (order, ids,
+# timestamps) does not change the pixels.
+TRANSFORM_FIELDS = ("rotation", "deskew_angle", "brightness", "contrast", "bbox")
+VARIANTS = ("color", "mono")
+STREAM_CACHE_MB = int(os.getenv("PDF_STREAM_CACHE_MB", "1024"))
+_MANIFEST_VERSION = 1
+
+
+def transform_key(img_meta: Dict, target_dpi: int) -> str:
+    """Short hash of everything besides the source bytes that shapes the output."""
+    params = {f: img_meta.get(f) for f in TRANSFORM_FIELDS}
+    blob = json.dumps([params, int(target_dpi), _MANIFEST_VERSION], sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+@dataclass
+class EncodedImage:
+    """A transformed image as cached JPEG streams; stands in for the PIL image in layout."""
+    key: str
+    width: int
+    height: int
+    placed_size: Tuple[int, int]  # size of the embedded (downscaled) streams
+    color_path: str
+    mono_path: str
+    cached: bool = False
+    # What it was encoded from, to rebuild a stream the cache evicted
+    source_path: Optional[str] = None
+    meta: Optional[Dict] = None
+    target_dpi: int = 0
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    def stream_path(self, variant: str) -> str:
+        return self.color_path if variant == "color" else self.mono_path
+
+
+class IncrementalPdfBuilder:
+    def __init__(self, store: DerivativeStore, manifest_dir: str):
+        self.store = store
+        self.manifest_dir = manifest_dir
+        self._lock = threading.Lock()
+        self._output_locks: Dict[str, threading.Lock] = {}
+        os.makedirs(manifest_dir, exist_ok=True)
+
+    # ── Images ──────────────────────────────────────────────────────────────
+
+    def encode(self, source_path: str, img_meta: Dict, target_dpi: int) -> EncodedImage:
+        """Transform + encode one image, or reuse the cached result."""
+        variant = f"pdf-{transform_key(img_meta, target_dpi)}"
+        state: Dict = {}
+
+        def transformed():
+            if "img" not in state:
+                state["img"] = apply_metadata_transforms(source_path, img_meta, True, target_dpi)
+                state["optimized"] = _optimize_for_pdf(state["img"])
+            return state["img"], state["optimized"]
+
+        def gen_size(_src, out):
+            img, optimized = transformed()
+            with open(out, "w", encoding="utf-8") as f:
+                json.dump({"width": img.width, "height": img.height,
+                           "placed": list(optimized.size)}, f)
+
+        def gen_color(_src, out):
+            with open(out, "wb") as f:
+                f.write(_encode_pdf_jpeg(transformed()[1]))
+
+        def gen_mono(_src, out):
+            with open(out, "wb") as f:
+                f.write(_encode_pdf_jpeg(_to_monochrome(transformed()[1])))
+
+        size_path = self.store.get(source_path, f"{variant}-size", "json", gen_size)
+        color_path = self.store.get(source_path, f"{variant}-color", "jpg", gen_color)
+        mono_path = self.store.get(source_path, f"{variant}-mono", "jpg", gen_mono)
+        with open(size_path, "r", encoding="utf-8") as f:
+            size = json.load(f)
+        key = f"{self.store.source_digest(source_path)}-{variant}"
+        return EncodedImage(key, int(size["width"]), int(size["height"]), tuple(size["placed"]),
+                            color_path, mono_path, cached="img" not in state,
+                            source_path=source_path, meta=dict(img_meta), target_dpi=target_dpi)
+
+    def read_stream(self, img: EncodedImage, variant: str) -> bytes:
+        """The image's embedded JPEG stream; re-encoded if the cache evicted it meanwhile."""
+        try:
+            with open(img.stream_path(variant), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            if img.source_path is None:
+                raise
+        optimized = _optimize_for_pdf(
+            apply_metadata_transforms(img.source_path, img.meta or {}, True, img.target_dpi))
+        return _encode_pdf_jpeg(_to_monochrome(optimized) if variant == "mono" else optimized)
+
+    # ── Documents ───────────────────────────────────────────────────────────
+
+    def _manifest_path(self, output_path: str) -> str:
+        name = hashlib.sha256(os.path.realpath(output_path).encode()).hexdigest()[:16]
+        return os.path.join(self.manifest_dir, f"{name}.json")
+
+    def _load_manifest(self, output_path: str) -> Optional[List[str]]:
+        """Page signatures of ``output_path`` if it is still the file we wrote."""
+        try:
+            with open(self._manifest_path(output_path), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            st = os.stat(output_path)
+        except (OSError, ValueError):
+            return None
+        if (manifest.get("version") != _MANIFEST_VERSION
+                or manifest.get("mtime_ns") != st.st_mtime_ns or manifest.get("size") != st.st_size):
+            return None
+        return manifest.get("pages")
+
+    def _save_manifest(self, output_path: str, signatures: List[str]) -> None:
+        st = os.stat(output_path)
+        path = self._manifest_path(output_path)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": _MANIFEST_VERSION, "mtime_ns": st.st_mtime_ns,
+                       "size": st.st_size, "pages": signatures}, f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def page_signature(page_items, variant: str, page_size, margin: int) -> str:
+        items = [(span, list(pos), img.key, float(dpi)) for span, pos, img, dpi in page_items]
+        blob = json.dumps([variant, list(page_size), margin, items], sort_keys=True)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def _output_lock(self, output_path: str) -> threading.Lock:
+        key = os.path.realpath(output_path)
+        with self._lock:
+            return self._output_locks.setdefault(key, threading.Lock())
+
+    def write_pdf(self, pages: List[List[Tuple[str, Tuple[int, int], EncodedImage, float]]],
+                  output_path: str, variant: str = "color",
+                  page_size: Tuple[int, int] = A4, margin: int = 10) -> Dict[str, int]:
+        """Write ``pages`` (layout output over ``EncodedImage``s), reusing unchanged pages.
+
+        Returns ``{"pages": n, "reused": r, "rendered": n - r}``. Only the
+        PyMuPDF calls take ``FITZ_LOCK``, one at a time: reading the streams
+        runs unlocked, so concurrent generations and page renders interleave
+        instead of waiting for a whole document. Two writes of the same
+        ``output_path`` (two "Generate" clicks) run one after the other, so
+        the manifest always describes the file that was saved.
+        """
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown variant: {variant}")
+        with self._output_lock(output_path):
+            return self._write_pdf(pages, output_path, variant, page_size, margin)
+
+    def _write_pdf(self, pages, output_path: str, variant: str,
+                   page_size: Tuple[int, int], margin: int) -> Dict[str, int]:
+        W, H = page_size
+        signatures = [self.page_signature(items, variant, page_size, margin) for items in pages]
+
+        previous = self._load_manifest(output_path)
+        old_doc = None
+        old_index = {}
+        with FITZ_LOCK:
+            doc = fitz.open()
+            if previous:
+                old_doc = fitz.open(output_path)
+                if old_doc.page_count == len(previous):
+                    old_index = {sig: i for i, sig in enumerate(previous)}
+
+        reused = 0
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        try:
+            for sig, page_items in zip(signatures, pages):
+                if sig in old_index:
+                    with FITZ_LOCK:
+                        doc.insert_pdf(old_doc, from_page=old_index[sig], to_page=old_index[sig])
+                    reused += 1
+                    continue
+                with FITZ_LOCK:
+                    page = doc.new_page(width=W, height=H)
+                for span, draw_pos, img, scan_dpi in page_items:
+                    stream = self.read_stream(img, variant)
+                    rect = _scan_document_rect(span, draw_pos, img.size, img.placed_size,
+                                               scan_dpi, page_size, margin)
+                    with FITZ_LOCK:
+                        page.insert_image(rect, stream=stream, keep_proportion=True)
+
+            with FITZ_LOCK:
+                doc.save(tmp_path, garbage=4, deflate=True, clean=True)
+        finally:
+            with FITZ_LOCK:
+                doc.close()
+                if old_doc is not None:
+                    old_doc.close()
+        os.replace(tmp_path, output_path)
+        self._save_manifest(output_path, signatures)
+        return {"pages": len(pages), "reused": reused, "rendered": len(pages) - reused}
+
+
+_builders: Dict[str, IncrementalPdfBuilder] = {}
+_builders_lock = threading.Lock()
+
+
+def get_builder(out_dir: str) -> IncrementalPdfBuilder:
+    """Shared builder with its own stream store next to the output dir's derivative store."""
+    key = os.path.realpath(out_dir)
+    with _builders_lock:
+        builder = _builders.get(key)
+        if builder is None:
+            base = os.path.dirname(store_root(out_dir))
+            streams = get_store(os.path.join(base, "pdf_streams"), STREAM_CACHE_MB * 1024 * 1024)
+            builder = _builders[key] = IncrementalPdfBuilder(streams, os.path.join(base, "pdf_manifests"))
+        return builder
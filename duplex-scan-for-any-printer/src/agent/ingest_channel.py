@@ -0,0 +1,185 @@
+"""Completion-aware ingest channel between the FTP server and the scan agent.
+
+The FTP server runs in its own process and is the only component that knows
+when an upload has *finished*. It announces uploads over a Unix datagram
+socket so the agent never has to guess from inotify create events:
+
+    {"event": "begin",    "path": ..., "device": ...}
+    {"event": "complete", "path": ..., "device": ..., "size": ..., "sha256": ...}
+    {"event": "abort",    "path": ...}
+
+Datagrams are fire-and-forget: when the agent isn't listening the sender
+drops the message and the agent's watchdog fallback picks the file up once
+it stops growing.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+from dataclasses import dataclass, asdict
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = "/tmp/scan_agent_ingest.sock"
+
+EVENT_BEGIN = "begin"
+EVENT_COMPLETE = "complete"
+EVENT_ABORT = "abort"
+
+_MAX_DATAGRAM = 64 * 1024
+_HASH_CHUNK = 1024 * 1024
+
+
+def socket_path() -> str:
+    """Socket path shared by both processes (override with SCAN_INGEST_SOCKET)."""
+    return os.environ.get("SCAN_INGEST_SOCKET", DEFAULT_SOCKET_PATH)
+
+
+def file_sha256(path: str) -> str:
+    """Stream a file through SHA-256 (page cache is hot right after upload)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@dataclass
+class IngestEvent:
+    event: str
+    path: str
+    device: str = ""
+    size: int = -1
+    sha256: str = ""
+
+    def encode(self) -> bytes:
+        return json.dumps(asdict(self)).encode("utf-8")
+
+    @classmethod
+    def decode(cls, data: bytes) -> "IngestEvent":
+        raw = json.loads(data.decode("utf-8"))
+        return cls(
+            event=str(raw["event"]),
+            path=str(raw["path"]),
+            device=str(raw.get("device", "")),
+            size=int(raw.get("size", -1)),
+            sha256=str(raw.get("sha256", "")),
+        )
+
+
+class IngestNotifier:
+    """Sender side, used by the FTP server. Never raises, never blocks."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or socket_path()
+        self._sock: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+
+    def _socket(self) -> Optional[socket.socket]:
+        if self._sock is None and hasattr(socket, "AF_UNIX"):
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sock.setblocking(False)
+        return self._sock
+
+    def send(self, event: IngestEvent) -> bool:
+        """Deliver one event; False when no agent is listening (fallback applies)."""
+        with self._lock:
+            try:
+                sock = self._socket()
+                if sock is None:
+                    return False
+                sock.sendto(event.encode(), self.path)
+                return True
+            except OSError as e:
+                # ENOENT/ECONNREFUSED: agent not running; EAGAIN: agent backlogged
+                logger.debug(f"Ingest notify dropped for {event.path}: {e}")
+                return False
+
+    def begin(self, path: str, device: str = "") -> bool:
+        return self.send(IngestEvent(EVENT_BEGIN, path, device=device))
+
+    def complete(self, path: str, device: str = "") -> bool:
+        """Announce a finished upload together with its size and content hash."""
+        try:
+            size = os.path.getsize(path)
+            digest = file_sha256(path)
+        except OSError as e:
+            logger.warning(f"Ingest: cannot stat/hash {path}: {e}")
+            return False
+        return self.send(IngestEvent(EVENT_COMPLETE, path, device=device, size=size, sha256=digest))
+
+    def abort(self, path: str) -> bool:
+        return self.send(IngestEvent(EVENT_ABORT, path))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+
+class IngestListener:
+    """Receiver side, used by the agent. Calls ``on_event`` from a daemon thread."""
+
+    def __init__(self, on_event: Callable[[IngestEvent], None], path: Optional[str] = None):
+        self.on_event = on_event
+        self.path = path or socket_path()
+        self._sock: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    def start(self) -> bool:
+        """Bind the socket; returns False when Unix sockets are unavailable."""
+        if not hasattr(socket, "AF_UNIX"):
+            logger.warning("Ingest: Unix sockets unavailable — relying on file watcher only")
+            return False
+        try:
+            if os.path.exists(self.path):
+                os.remove(self.path)  # stale socket from a previous run
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(self.path)
+            sock.settimeout(0.5)
+        except OSError as e:
+            logger.warning(f"Ingest: cannot bind {self.path} ({e}) — relying on file watcher only")
+            return False
+        self._sock = sock
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="ingest-listener")
+        self._thread.start()
+        logger.info(f"Ingest channel listening on {self.path}")
+        return True
+
+    def _run(self) -> None:
+        while self._running:
+            try:
+                data = self._sock.recv(_MAX_DATAGRAM)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                event = IngestEvent.decode(data)
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Ingest: malformed datagram ignored: {e}")
+                continue
+            try:
+                self.on_event(event)
+            except Exception as e:
+                logger.error(f"Ingest: handler failed for {event.path}: {e}")
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,78 @@
+"""Move scans from the inbox into project storage without rewriting them.
+
+Every page used to be written twice: once by the FTP server into the inbox
+and again by ``shutil.copy2`` into ``<output_dir>/<session>/images``. On SD
+cards that doubles wear for no benefit. ``place_file`` picks the cheapest
+operation that keeps the project copy independent of later inbox activity:
+
+- ``rename``   — the inbox file is going away anyway (same filesystem)
+- ``reflink``  — copy-on-write clone (btrfs, XFS, bcachefs)
+- ``hardlink`` — shared inode; safe because the FTP server unlinks before
+                 overwriting, so a re-upload never writes through the link
+- ``copy``     — different filesystem or nothing else supported
+"""
+from __future__ import annotations
+
+import errno
+import os
+import shutil
+
+# Linux FICLONE ioctl: _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+
+# errnos meaning "this filesystem/pair can't do it" — fall through to the next method
+_UNSUPPORTED = {
+    errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL,
+    errno.ENOTTY, errno.EMLINK, errno.ENOSYS,
+}
+
+
+def _reflink(src: str, dst: str) -> bool:
+    try:
+        import fcntl
+    except ImportError:  # Windows
+        return False
+    try:
+        with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                failed = True
+            else:
+                failed = False
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED:
+            raise
+        return False
+    if failed:
+        os.remove(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def place_file(src: str, dst: str, keep_source: bool = True) -> str:
+    """Put ``src`` at ``dst`` with as few written bytes as possible.
+
+    ``dst`` must not exist. With ``keep_source=False`` the source may be
+    consumed (renamed away). Returns the method used.
+    """
+    if not keep_source:
+        try:
+            os.rename(src, dst)
+            return "rename"
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+    if _reflink(src, dst):
+        return "reflink"
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED:
+            raise
+    shutil.copy2(src, dst)
+    return "copy"
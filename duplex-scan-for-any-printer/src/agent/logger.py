@@ -10,18 +10,37 @@ Simplified for Docker/HAOS deployment:
 
 import logging
 import sys
+import threading
 import time
 from typing import Optional
 from contextlib import contextmanager
 
 
 class SessionContextFilter(logging.Filter):
-    """Add session context to log records."""
+    """Add session context to log records.
+
+    Context is per thread so sessions processed in parallel keep their own ids.
+    """
     
     def __init__(self):
         super().__init__()
-        self.session_id: Optional[str] = None
-        self.mode: Optional[str] = None
+        self._local = threading.local()
+
+    @property
+    def session_id(self) -> Optional[str]:
+        return getattr(self._local, "session_id", None)
+
+    @session_id.setter
+    def session_id(self, value: Optional[str]) -> None:
+        self._local.session_id = value
+
+    @property
+    def mode(self) -> Optional[str]:
+        return getattr(self._local, "mode", None)
+
+    @mode.setter
+    def mode(self, value: Optional[str]) -> None:
+        self._local.mode = value
     
     def filter(self, record: logging.LogRecord) -> bool:
         record.session_id = self.session_id or "-"
@@ -0,0 +1,207 @@
+"""In-process cache and write coalescing for project metadata JSON.
+
+Every image request used to ``json.load`` ``<project>.json`` just to check one
+filename, and every editor save rewrote the whole file. ``MetadataStore``:
+
+- caches the parsed file per project, revalidated by (mtime, size) with one
+  ``stat`` per read, together with a filename → image index;
+- hands out immutable-by-convention snapshots: updates deep-copy the current
+  snapshot, apply the change and swap the new one in, so a reader never sees
+  a half-applied edit (callers that modify the data use ``snapshot.copy()``);
+- coalesces writes: an update marks the project dirty and schedules one
+  atomic write (``.tmp`` + ``os.replace``) ``write_delay`` seconds later;
+  edits arriving in that window ride along. Pending writes are flushed on
+  shutdown and dropped when the project is deleted.
+"""
+from __future__ import annotations
+
+import copy
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_WRITE_DELAY = 0.5
+
+
+class MetadataSnapshot:
+    """One consistent version of a project's metadata. Do not mutate ``data``."""
+    __slots__ = ("project_id", "data", "_by_filename")
+
+    def __init__(self, project_id: str, data: Dict):
+        self.project_id = project_id
+        self.data = data
+        index: Dict[str, Dict] = {}
+        for img in data.get("images") or []:
+            for name in (img.get("filename"), img.get("source_file")):
+                if name and name not in index:
+                    index[name] = img
+        self._by_filename = index
+
+    def image(self, filename: str) -> Optional[Dict]:
+        """Image entry whose ``filename`` or ``source_file`` is ``filename``."""
+        return self._by_filename.get(filename)
+
+    def ordered_images(self) -> List[Dict]:
+        return sorted(self.data.get("images", []), key=lambda x: x.get("order", 0))
+
+    def copy(self) -> Dict:
+        return copy.deepcopy(self.data)
+
+
+class _Entry:
+    __slots__ = ("snapshot", "disk", "dirty", "timer")
+
+    def __init__(self, snapshot: MetadataSnapshot, disk: Optional[Tuple[int, int]]):
+        self.snapshot = snapshot
+        self.disk = disk
+        self.dirty = False
+        self.timer: Optional[threading.Timer] = None
+
+
+def _stat_key(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class MetadataStore:
+    def __init__(self, out_dir: str, write_delay: float = DEFAULT_WRITE_DELAY,
+                 on_flush: Optional[Callable[[str], None]] = None):
+        self.out_dir = out_dir
+        self.write_delay = write_delay
+        self.on_flush = on_flush
+        self._lock = threading.RLock()
+        self._entries: Dict[str, _Entry] = {}
+        self.parses = 0
+        self.writes = 0
+
+    def path(self, project_id: str) -> str:
+        return os.path.join(self.out_dir, f"{project_id}.json")
+
+    # ── Reads ───────────────────────────────────────────────────────────────
+
+    def get(self, project_id: str) -> Optional[MetadataSnapshot]:
+        """Current snapshot (including unflushed edits), or None if there is no metadata.
+
+        Raises ``ValueError`` if the file exists but is not valid JSON.
+        """
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry is not None and entry.dirty:
+                return entry.snapshot
+        path = self.path(project_id)
+        disk = _stat_key(path)
+        if disk is None:
+            with self._lock:
+                entry = self._entries.get(project_id)
+                if entry is not None and not entry.dirty:
+                    del self._entries[project_id]
+            return None
+        if entry is not None and entry.disk == disk:
+            return entry.snapshot
+
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = MetadataSnapshot(project_id, json.load(f))
+        with self._lock:
+            self.parses += 1
+            entry = self._entries.get(project_id)
+            if entry is None:
+                self._entries[project_id] = _Entry(snapshot, disk)
+            elif not entry.dirty:
+                entry.snapshot, entry.disk = snapshot, disk
+            else:
+                return entry.snapshot  # an edit landed while we were parsing
+        return snapshot
+
+    # ── Writes ──────────────────────────────────────────────────────────────
+
+    def update(self, project_id: str, mutate: Callable[[Dict], Any],
+               create: Optional[Callable[[], Dict]] = None) -> Tuple[MetadataSnapshot, Any]:
+        """Apply ``mutate(data)`` to a copy of the current metadata and schedule a write.
+
+        ``create()`` supplies the initial document when none exists yet;
+        without it a missing project raises ``FileNotFoundError``.
+        Returns the new snapshot and whatever ``mutate`` returned.
+        """
+        with self._lock:
+            current = self.get(project_id)
+            if current is not None:
+                data = current.copy()
+            elif create is not None:
+                data = create()
+            else:
+                raise FileNotFoundError(self.path(project_id))
+            result = mutate(data)
+            snapshot = MetadataSnapshot(project_id, data)
+            entry = self._entries.get(project_id)
+            if entry is None:
+                entry = self._entries[project_id] = _Entry(snapshot, None)
+            entry.snapshot = snapshot
+            entry.dirty = True
+            if entry.timer is None:
+                entry.timer = threading.Timer(self.write_delay, self._flush_one, args=(project_id,))
+                entry.timer.daemon = True
+                entry.timer.start()
+        return snapshot, result
+
+    def _flush_one(self, project_id: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry is None:
+                return False
+            if entry.timer is not None:
+                entry.timer.cancel()
+                entry.timer = None
+            if not entry.dirty:
+                return False
+            snapshot = entry.snapshot
+            entry.dirty = False
+            path = self.path(project_id)
+            tmp_path = path + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(snapshot.data, f, indent=2, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                entry.dirty = True  # keep the edits; retried by the next update or flush
+                print(f"⚠️  Failed to write metadata for {project_id}: {e}")
+                return False
+            self.writes += 1
+            if entry.snapshot is snapshot:
+                entry.disk = _stat_key(path)
+        if self.on_flush is not None:
+            try:
+                self.on_flush(project_id)
+            except Exception as e:
+                print(f"⚠️  Metadata flush hook failed for {project_id}: {e}")
+        return True
+
+    def flush(self, project_id: Optional[str] = None) -> int:
+        """Write pending edits now (one project or all); returns files written."""
+        with self._lock:
+            ids = [project_id] if project_id is not None else list(self._entries)
+        return sum(self._flush_one(pid) for pid in ids)
+
+    def discard(self, project_id: str) -> None:
+        """Forget a project (pending edits included), e.g. after deleting it."""
+        with self._lock:
+            entry = self._entries.pop(project_id, None)
+            if entry is not None and entry.timer is not None:
+                entry.timer.cancel()
+
+
+_stores: Dict[str, MetadataStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_metadata_store(out_dir: str, on_flush: Optional[Callable[[str], None]] = None) -> MetadataStore:
+    """Shared store for ``out_dir`` (``on_flush`` is only used when it is created)."""
+    key = os.path.realpath(out_dir)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = MetadataStore(out_dir, on_flush=on_flush)
+        return store
@@ -61,11 +61,14 @@ class NotificationChannel(ABC):
     def notify_image_added(self, session_info: Dict[str, Any]) -> None:
         """Called when an image is added to an active session. Default: no-op."""
 
-    def notify_session_action(self, confirmed: bool, action_by: str = "external") -> None:
+    def notify_session_action(
+        self, confirmed: bool, action_by: str = "external", session_id: Optional[str] = None
+    ) -> None:
         """Called when a session is confirmed/rejected from an external source (e.g. Web UI).
 
         Channels that track in-flight notification messages (e.g. Telegram inline keyboards)
-        should use this to update/remove those messages.  Default is a no-op so existing
+        should use this to update/remove those messages.  ``session_id`` names the resolved
+        session; None means "all pending sessions".  Default is a no-op so existing
         channel implementations don't need to override it.
         """
 
@@ -103,11 +106,13 @@ class NotificationManager:
             except Exception as e:
                 logger.error("[%s] notify_image_added failed: %s", ch.name, e)
 
-    def notify_session_action(self, confirmed: bool, action_by: str = "external") -> None:
+    def notify_session_action(
+        self, confirmed: bool, action_by: str = "external", session_id: Optional[str] = None
+    ) -> None:
         """Broadcast confirm/reject action to all channels (for UI cleanup)."""
         for ch in self._channels:
             try:
-                ch.notify_session_action(confirmed, action_by)
+                ch.notify_session_action(confirmed, action_by, session_id=session_id)
             except Exception as e:
                 logger.error("[%s] notify_session_action failed: %s", ch.name, e)
 
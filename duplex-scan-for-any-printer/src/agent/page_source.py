@@ -0,0 +1,177 @@
+"""Page sources for multi-page uploads (multi-frame TIFF, scanner PDFs).
+
+``load_image`` only ever sees the first frame of a container, and PIL cannot
+read PDFs at all. ``iter_pages`` yields one page at a time so a 30-page ADF
+upload is never fully decoded in memory:
+
+- TIFF: frames are visited with ``seek``; only the current frame is decoded.
+- PDF: a page that is just one embedded scan has its JPEG/PNG stream copied
+  out with ``extract_image`` (no rasterisation, no re-encode). Anything else
+  (vector content, rotation, several images) is rendered.
+
+``expand_pages`` writes the pages next to each other so the rest of the
+pipeline keeps working on single-image files.
+"""
+from __future__ import annotations
+
+import importlib.util
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from PIL import Image
+
+from agent import logger
+
+# PyMuPDF is imported on the first PDF upload, not at agent start
+HAS_PYMUPDF = importlib.util.find_spec("fitz") is not None
+
+PDF_EXTENSIONS = frozenset({".pdf"})
+TIFF_EXTENSIONS = frozenset({".tif", ".tiff"})
+
+# Embedded streams PIL can open as-is
+_PASSTHROUGH_FORMATS = {"jpeg": ".jpg", "jpg": ".jpg", "png": ".png"}
+_RENDER_DPI = 300
+# A page counts as "one scan" when its image covers this much of the page
+_FULL_PAGE_COVERAGE = 0.9
+
+
+@dataclass
+class Page:
+    """One page of a container. Exactly one of ``data``/``image`` is set."""
+
+    index: int  # 1-based
+    ext: str
+    data: Optional[bytes] = None  # encoded stream, written verbatim
+    image: Optional[Image.Image] = None
+
+    def save(self, path: str) -> None:
+        if self.data is not None:
+            with open(path, "wb") as f:
+                f.write(self.data)
+        else:
+            self.image.save(path)
+
+
+def _ext(path: str) -> str:
+    return os.path.splitext(path)[1].lower()
+
+
+def page_count(path: str) -> int:
+    ext = _ext(path)
+    if ext in PDF_EXTENSIONS:
+        if not HAS_PYMUPDF:
+            raise RuntimeError("PyMuPDF is required to read PDF uploads")
+        from agent.pdf_render import open_document
+        with open_document(path) as doc:
+            return doc.page_count
+    with Image.open(path) as img:
+        return getattr(img, "n_frames", 1)
+
+
+def needs_expansion(path: str) -> bool:
+    """True for containers the image pipeline cannot load directly."""
+    ext = _ext(path)
+    if ext in PDF_EXTENSIONS:
+        return True
+    if ext in TIFF_EXTENSIONS:
+        try:
+            return page_count(path) > 1
+        except Exception:
+            return False  # let load_image report the broken file
+    return False
+
+
+def _iter_tiff(path: str) -> Iterator[Page]:
+    with Image.open(path) as img:
+        for i in range(getattr(img, "n_frames", 1)):
+            img.seek(i)
+            frame = img.copy()  # decodes only this frame
+            yield Page(i + 1, ".png", image=frame)
+
+
+def _embedded_scan(doc, page) -> Optional[Page]:
+    """Return the page's sole full-page image stream, if it has one."""
+    if page.rotation:
+        return None
+    images = page.get_images(full=True)
+    if len(images) != 1:
+        return None
+    xref = images[0][0]
+    smask = images[0][1]
+    if smask:
+        return None  # transparency needs compositing
+    rects = page.get_image_rects(xref)
+    if len(rects) != 1:
+        return None
+    page_area = abs(page.rect)
+    if not page_area or abs(rects[0] & page.rect) / page_area < _FULL_PAGE_COVERAGE:
+        return None
+    info = doc.extract_image(xref)
+    ext = _PASSTHROUGH_FORMATS.get((info or {}).get("ext", "").lower())
+    if not ext:
+        return None
+    return Page(page.number + 1, ext, data=info["image"])
+
+
+def _iter_pdf(path: str) -> Iterator[Page]:
+    if not HAS_PYMUPDF:
+        raise RuntimeError("PyMuPDF is required to read PDF uploads")
+    import fitz
+    from agent.pdf_render import FITZ_LOCK
+
+    # PyMuPDF calls share the process-wide lock; it is released between pages
+    with FITZ_LOCK:
+        doc = fitz.open(path)
+    try:
+        for number in range(doc.page_count):
+            with FITZ_LOCK:
+                page = doc[number]
+                extracted = _embedded_scan(doc, page)
+                if extracted is None:
+                    pix = page.get_pixmap(dpi=_RENDER_DPI)
+                    extracted = Page(number + 1, ".png", data=pix.tobytes("png"))
+                    pix = None
+            yield extracted
+    finally:
+        with FITZ_LOCK:
+            doc.close()
+
+
+def iter_pages(path: str) -> Iterator[Page]:
+    """Yield the pages of ``path`` one at a time."""
+    ext = _ext(path)
+    if ext in PDF_EXTENSIONS:
+        yield from _iter_pdf(path)
+    elif ext in TIFF_EXTENSIONS:
+        yield from _iter_tiff(path)
+    else:
+        with Image.open(path) as img:
+            img.load()
+            yield Page(1, ext, image=img.copy())
+
+
+def _page_prefix(path: str) -> str:
+    # Keep pages in one ordering group: strict_order_paths groups on
+    # '<prefix>_<digits>' and orders by a trailing '_<index>'.
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem if re.search(r"_\d+$", stem) else f"{stem}_0"
+
+
+def expand_pages(path: str, out_dir: str) -> List[str]:
+    """Write each page of ``path`` into ``out_dir``; returns the page paths in order."""
+    prefix = _page_prefix(path)
+    out: List[str] = []
+    extracted = 0
+    for page in iter_pages(path):
+        target = os.path.join(out_dir, f"{prefix}_{page.index}{page.ext}")
+        page.save(target)
+        if page.data is not None and page.ext == ".jpg":
+            extracted += 1
+        out.append(target)
+    logger.info(
+        f"📄 Expanded {os.path.basename(path)} into {len(out)} page(s)"
+        + (f" ({extracted} JPEG stream(s) extracted)" if extracted else "")
+    )
+    return out
@@ -19,6 +19,22 @@ except ImportError:
     HAS_PYMUPDF = False
 
 
+def _fitz_lock():
+    """The process-wide PyMuPDF lock (``agent.pdf_render.FITZ_LOCK``).
+
+    The fast writers below run on the agent's session pool, next to the
+    preview pre-render thread; each takes the lock per PyMuPDF call, while
+    resizing and JPEG encoding run unlocked.
+    """
+    from .pdf_render import FITZ_LOCK
+    return FITZ_LOCK
+
+
+# Encoder settings for images embedded in the PDFs
+PDF_JPEG_QUALITY = 90
+PDF_MAX_DIMENSION = 2000  # ~200 DPI on A4
+
+
 def _new_canvas(path: str, page_size: Tuple[int, int]) -> canvas.Canvas:
     c = canvas.Canvas(path, pagesize=page_size)
     c._doc.compression = 1  # Enable compression for PDF structure only
@@ -70,7 +86,7 @@ def _optimize_for_pdf(img: Image.Image, target_dpi: int = 150) -> Image.Image:
     # Downscale if resolution is too high
     # A4 at 150 DPI = ~1240x1754 pixels
     # Most scanners do 300+ DPI, so we can safely downscale to 150-200 DPI
-    max_dimension = 2000  # Equivalent to ~200 DPI on A4
+    max_dimension = PDF_MAX_DIMENSION
     w, h = img.size
     if w > max_dimension or h > max_dimension:
         scale = max_dimension / max(w, h)
@@ -532,7 +548,9 @@ def save_pdf_from_images_interleaved_fast(pairs: List[Tuple[Image.Image, Image.I
         return time.time() - start
     
     try:
-        doc = fitz.open()
+        lock = _fitz_lock()
+        with lock:
+            doc = fitz.open()
         W, H = page_size
         margin = 10
         
@@ -547,11 +565,12 @@ def save_pdf_from_images_interleaved_fast(pairs: List[Tuple[Image.Image, Image.I
                 
                 # Save to memory buffer (no disk I/O!)
                 img_bytes = io.BytesIO()
-                img_optimized.save(img_bytes, 'JPEG', quality=90, optimize=True)
+                img_optimized.save(img_bytes, 'JPEG', quality=PDF_JPEG_QUALITY, optimize=True)
                 img_bytes.seek(0)
                 
                 # Create page and fit image with margin
-                page = doc.new_page(width=W, height=H)
+                with lock:
+                    page = doc.new_page(width=W, height=H)
                 iw, ih = img_optimized.size
                 
                 # Calculate fitted size
@@ -567,11 +586,13 @@ def save_pdf_from_images_interleaved_fast(pairs: List[Tuple[Image.Image, Image.I
                 
                 # Insert image from memory
                 rect = fitz.Rect(dx, dy, dx + dw, dy + dh)
-                page.insert_image(rect, stream=img_bytes.getvalue(), keep_proportion=True)
+                with lock:
+                    page.insert_image(rect, stream=img_bytes.getvalue(), keep_proportion=True)
         
         # Save PDF with optimization
-        doc.save(output_path, garbage=4, deflate=True, clean=True)
-        doc.close()
+        with lock:
+            doc.save(output_path, garbage=4, deflate=True, clean=True)
+            doc.close()
         
     except Exception as e:
         print(f"⚠️  PyMuPDF failed: {e}, falling back to ReportLab")
@@ -596,7 +617,9 @@ def save_pdf_from_images_interleaved_mono_fast(pairs: List[Tuple[Image.Image, Im
         return time.time() - start
     
     try:
-        doc = fitz.open()
+        lock = _fitz_lock()
+        with lock:
+            doc = fitz.open()
         W, H = page_size
         margin = 10
         
@@ -612,11 +635,12 @@ def save_pdf_from_images_interleaved_mono_fast(pairs: List[Tuple[Image.Image, Im
                 
                 # Save to memory buffer
                 img_bytes = io.BytesIO()
-                img_mono.save(img_bytes, 'JPEG', quality=90, optimize=True)
+                img_mono.save(img_bytes, 'JPEG', quality=PDF_JPEG_QUALITY, optimize=True)
                 img_bytes.seek(0)
                 
                 # Create page and fit image
-                page = doc.new_page(width=W, height=H)
+                with lock:
+                    page = doc.new_page(width=W, height=H)
                 iw, ih = img_mono.size
                 
                 # Calculate fitted size with margin
@@ -632,11 +656,13 @@ def save_pdf_from_images_interleaved_mono_fast(pairs: List[Tuple[Image.Image, Im
                 
                 # Insert image from memory
                 rect = fitz.Rect(dx, dy, dx + dw, dy + dh)
-                page.insert_image(rect, stream=img_bytes.getvalue(), keep_proportion=True)
+                with lock:
+                    page.insert_image(rect, stream=img_bytes.getvalue(), keep_proportion=True)
         
         # Save PDF with optimization
-        doc.save(output_path, garbage=4, deflate=True, clean=True)
-        doc.close()
+        with lock:
+            doc.save(output_path, garbage=4, deflate=True, clean=True)
+            doc.close()
         
     except Exception as e:
         print(f"⚠️  PyMuPDF failed: {e}, falling back to ReportLab")
@@ -677,12 +703,15 @@ def save_pdf_card_2in1_grid_fast(images: List[Image.Image],
             return time.time() - start
         
         # Create PDF with PyMuPDF
-        doc = fitz.open()
+        lock = _fitz_lock()
+        with lock:
+            doc = fitz.open()
         W, H = page_size
         
         for page_items in pages:
             # Create new page
-            page = doc.new_page(width=W, height=H)
+            with lock:
+                page = doc.new_page(width=W, height=H)
             
             for quadrant, img in page_items:
                 # Get quadrant bounds
@@ -694,17 +723,19 @@ def save_pdf_card_2in1_grid_fast(images: List[Image.Image],
                 
                 # Save image to memory buffer (no disk I/O!)
                 img_bytes = io.BytesIO()
-                img.save(img_bytes, 'JPEG', quality=90, optimize=True)
+                img.save(img_bytes, 'JPEG', quality=PDF_JPEG_QUALITY, optimize=True)
                 img_bytes.seek(0)
                 
                 # Insert image from memory buffer
                 rect = fitz.Rect(qx + margin, qy + margin, 
                                 qx + qw - margin, qy + qh - margin)
-                page.insert_image(rect, stream=img_bytes.getvalue(), keep_proportion=True)
+                with lock:
+                    page.insert_image(rect, stream=img_bytes.getvalue(), keep_proportion=True)
         
         # Save PDF
-        doc.save(output_path, garbage=4, deflate=True, clean=True)
-        doc.close()
+        with lock:
+            doc.save(output_path, garbage=4, deflate=True, clean=True)
+            doc.close()
         
     except Exception as e:
         print(f"⚠️  PyMuPDF failed: {e}, falling back to ReportLab")
@@ -738,11 +769,14 @@ def save_pdf_card_2in1_grid_mono_fast(images: List[Image.Image],
             return time.time() - start
         
         # Create PDF with PyMuPDF
-        doc = fitz.open()
+        lock = _fitz_lock()
+        with lock:
+            doc = fitz.open()
         W, H = page_size
         
         for page_items in pages:
-            page = doc.new_page(width=W, height=H)
+            with lock:
+                page = doc.new_page(width=W, height=H)
             
             for quadrant, img in page_items:
                 qx, qy, qw, qh = quadrant_bounds(quadrant, W, H)
@@ -753,15 +787,17 @@ def save_pdf_card_2in1_grid_mono_fast(images: List[Image.Image],
                 
                 # Save to memory buffer
                 img_bytes = io.BytesIO()
-                img.save(img_bytes, 'JPEG', quality=90, optimize=True)
+                img.save(img_bytes, 'JPEG', quality=PDF_JPEG_QUALITY, optimize=True)
                 img_bytes.seek(0)
                 
                 rect = fitz.Rect(qx + margin, qy + margin,
                                 qx + qw - margin, qy + qh - margin)
-                page.insert_image(rect, stream=img_bytes.getvalue(), keep_proportion=True)
+                with lock:
+                    page.insert_image(rect, stream=img_bytes.getvalue(), keep_proportion=True)
         
-        doc.save(output_path, garbage=4, deflate=True, clean=True)
-        doc.close()
+        with lock:
+            doc.save(output_path, garbage=4, deflate=True, clean=True)
+            doc.close()
         
     except Exception as e:
         print(f"⚠️  PyMuPDF failed: {e}, falling back to ReportLab")
@@ -770,6 +806,78 @@ def save_pdf_card_2in1_grid_mono_fast(images: List[Image.Image],
     return time.time() - start
 
 
+def _encode_pdf_jpeg(img: Image.Image) -> bytes:
+    """JPEG stream inserted into the fast PyMuPDF documents."""
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, 'JPEG', quality=PDF_JPEG_QUALITY, optimize=True)
+    return img_bytes.getvalue()
+
+
+def _scan_document_rect(span: str, draw_pos: Tuple[float, float],
+                        orig_size: Tuple[int, int], placed_size: Tuple[int, int],
+                        scan_dpi: float, page_size: Tuple[int, int], margin: int):
+    """Page rectangle (PyMuPDF coordinates) for one scan_document layout item.
+
+    ``orig_size`` is the transformed image's size, ``placed_size`` the size of the
+    (possibly downscaled) image actually embedded.
+    """
+    W, H = page_size
+    draw_x, draw_y = draw_pos
+    orig_w, _ = orig_size
+    iw, ih = placed_size
+
+    # Adjust DPI based on optimization scaling
+    scale_ratio = iw / float(orig_w) if orig_w > 0 else 1.0
+    adjusted_dpi = scan_dpi * scale_ratio
+    
+    # Convert pixels to points
+    img_w_pt = iw * 72.0 / adjusted_dpi
+    img_h_pt = ih * 72.0 / adjusted_dpi
+    
+    # Determine available space
+    if span == "single":
+        available_w = W // 2 - 2 * margin
+        available_h = H // 2 - 2 * margin
+    elif span == "half_horizontal":
+        available_w = W - 2 * margin
+        available_h = H // 2 - 2 * margin
+    elif span == "half_vertical":
+        available_w = W // 2 - 2 * margin
+        available_h = H - 2 * margin
+    else:  # "full"
+        available_w = W - 2 * margin
+        available_h = H - 2 * margin
+    
+    # Scale down if needed
+    if img_w_pt > available_w or img_h_pt > available_h:
+        scale = min(available_w / img_w_pt, available_h / img_h_pt)
+        img_w_pt *= scale
+        img_h_pt *= scale
+    
+    # Calculate final position (centered)
+    final_x = draw_x
+    final_y = draw_y
+    
+    if span == "half_horizontal":
+        final_x = (W - img_w_pt) / 2.0
+    elif span == "half_vertical":
+        final_y = (H - img_h_pt) / 2.0
+    elif span == "single":
+        quad_w = W // 2
+        quad_h = H // 2
+        final_x = draw_x + (quad_w - 2*margin - img_w_pt) / 2.0
+        final_y = draw_y + (quad_h - 2*margin - img_h_pt) / 2.0
+    else:  # "full"
+        final_x = (W - img_w_pt) / 2.0
+        final_y = (H - img_h_pt) / 2.0
+    
+    # PyMuPDF uses top-left origin; layout positions are bottom-left (ReportLab)
+    return fitz.Rect(final_x, H - final_y - img_h_pt,
+                     final_x + img_w_pt, H - final_y)
+
+
 def save_pdf_scan_document_fast(pages: List[List[Tuple[str, Tuple[int, int], Image.Image, float]]], 
                                 output_path: str, 
                                 page_size: Tuple[int, int] = A4,
@@ -787,84 +895,28 @@ def save_pdf_scan_document_fast(pages: List[List[Tuple[str, Tuple[int, int], Ima
         return time.time() - start
     
     try:
-        doc = fitz.open()
+        lock = _fitz_lock()
+        with lock:
+            doc = fitz.open()
         W, H = page_size
         
         for page_items in pages:
-            page = doc.new_page(width=W, height=H)
+            with lock:
+                page = doc.new_page(width=W, height=H)
             
-            for span, (draw_x, draw_y), img, scan_dpi in page_items:
+            for span, draw_pos, img, scan_dpi in page_items:
                 # Optimize image
-                orig_w, orig_h = img.size
                 img_optimized = _optimize_for_pdf(img)
-                iw, ih = img_optimized.size
-                
-                # Adjust DPI based on optimization scaling
-                scale_ratio = iw / float(orig_w) if orig_w > 0 else 1.0
-                adjusted_dpi = scan_dpi * scale_ratio
-                
-                # Convert pixels to points
-                img_w_pt = iw * 72.0 / adjusted_dpi
-                img_h_pt = ih * 72.0 / adjusted_dpi
-                
-                # Determine available space
-                if span == "single":
-                    available_w = W // 2 - 2 * margin
-                    available_h = H // 2 - 2 * margin
-                elif span == "half_horizontal":
-                    available_w = W - 2 * margin
-                    available_h = H // 2 - 2 * margin
-                elif span == "half_vertical":
-                    available_w = W // 2 - 2 * margin
-                    available_h = H - 2 * margin
-                else:  # "full"
-                    available_w = W - 2 * margin
-                    available_h = H - 2 * margin
-                
-                # Scale down if needed
-                if img_w_pt > available_w or img_h_pt > available_h:
-                    scale = min(available_w / img_w_pt, available_h / img_h_pt)
-                    img_w_pt *= scale
-                    img_h_pt *= scale
-                
-                # Calculate final position (centered)
-                final_x = draw_x
-                final_y = draw_y
-                
-                if span == "half_horizontal":
-                    final_x = (W - img_w_pt) / 2.0
-                elif span == "half_vertical":
-                    final_y = (H - img_h_pt) / 2.0
-                elif span == "single":
-                    quad_w = W // 2
-                    quad_h = H // 2
-                    if draw_x < W // 2:
-                        final_x = draw_x + (quad_w - 2*margin - img_w_pt) / 2.0
-                    else:
-                        final_x = draw_x + (quad_w - 2*margin - img_w_pt) / 2.0
-                    if draw_y >= H // 2:
-                        final_y = draw_y + (quad_h - 2*margin - img_h_pt) / 2.0
-                    else:
-                        final_y = draw_y + (quad_h - 2*margin - img_h_pt) / 2.0
-                else:  # "full"
-                    final_x = (W - img_w_pt) / 2.0
-                    final_y = (H - img_h_pt) / 2.0
-                
-                # Save and insert image using memory buffer
-                if img_optimized.mode != 'RGB':
-                    img_optimized = img_optimized.convert('RGB')
-                
-                img_bytes = io.BytesIO()
-                img_optimized.save(img_bytes, 'JPEG', quality=90, optimize=True)
-                img_bytes.seek(0)
-                
-                # PyMuPDF uses bottom-left origin, ReportLab too, but coordinates differ
-                rect = fitz.Rect(final_x, H - final_y - img_h_pt,
-                                final_x + img_w_pt, H - final_y)
-                page.insert_image(rect, stream=img_bytes.getvalue(), keep_proportion=True)
+                rect = _scan_document_rect(span, draw_pos, img.size, img_optimized.size,
+                                           scan_dpi, page_size, margin)
+                # Insert image from memory buffer
+                stream = _encode_pdf_jpeg(img_optimized)
+                with lock:
+                    page.insert_image(rect, stream=stream, keep_proportion=True)
         
-        doc.save(output_path, garbage=4, deflate=True, clean=True)
-        doc.close()
+        with lock:
+            doc.save(output_path, garbage=4, deflate=True, clean=True)
+            doc.close()
         
     except Exception as e:
         print(f"⚠️  PyMuPDF failed: {e}, falling back to ReportLab")
@@ -889,81 +941,27 @@ def save_pdf_scan_document_mono_fast(pages: List[List[Tuple[str, Tuple[int, int]
         return time.time() - start
     
     try:
-        doc = fitz.open()
+        lock = _fitz_lock()
+        with lock:
+            doc = fitz.open()
         W, H = page_size
         
         for page_items in pages:
-            page = doc.new_page(width=W, height=H)
+            with lock:
+                page = doc.new_page(width=W, height=H)
             
-            for span, (draw_x, draw_y), img, scan_dpi in page_items:
+            for span, draw_pos, img, scan_dpi in page_items:
                 # Optimize and convert to monochrome
-                orig_w, orig_h = img.size
-                img_optimized = _optimize_for_pdf(img)
-                img_mono = _to_monochrome(img_optimized)
-                iw, ih = img_mono.size
-                
-                scale_ratio = iw / float(orig_w) if orig_w > 0 else 1.0
-                adjusted_dpi = scan_dpi * scale_ratio
-                
-                img_w_pt = iw * 72.0 / adjusted_dpi
-                img_h_pt = ih * 72.0 / adjusted_dpi
-                
-                # Determine available space
-                if span == "single":
-                    available_w = W // 2 - 2 * margin
-                    available_h = H // 2 - 2 * margin
-                elif span == "half_horizontal":
-                    available_w = W - 2 * margin
-                    available_h = H // 2 - 2 * margin
-                elif span == "half_vertical":
-                    available_w = W // 2 - 2 * margin
-                    available_h = H - 2 * margin
-                else:
-                    available_w = W - 2 * margin
-                    available_h = H - 2 * margin
-                
-                if img_w_pt > available_w or img_h_pt > available_h:
-                    scale = min(available_w / img_w_pt, available_h / img_h_pt)
-                    img_w_pt *= scale
-                    img_h_pt *= scale
-                
-                # Calculate position
-                final_x = draw_x
-                final_y = draw_y
-                
-                if span == "half_horizontal":
-                    final_x = (W - img_w_pt) / 2.0
-                elif span == "half_vertical":
-                    final_y = (H - img_h_pt) / 2.0
-                elif span == "single":
-                    quad_w = W // 2
-                    quad_h = H // 2
-                    if draw_x < W // 2:
-                        final_x = draw_x + (quad_w - 2*margin - img_w_pt) / 2.0
-                    else:
-                        final_x = draw_x + (quad_w - 2*margin - img_w_pt) / 2.0
-                    if draw_y >= H // 2:
-                        final_y = draw_y + (quad_h - 2*margin - img_h_pt) / 2.0
-                    else:
-                        final_y = draw_y + (quad_h - 2*margin - img_h_pt) / 2.0
-                else:
-                    final_x = (W - img_w_pt) / 2.0
-                    final_y = (H - img_h_pt) / 2.0
-                
-                # Insert image using memory buffer
-                if img_mono.mode != 'RGB':
-                    img_mono = img_mono.convert('RGB')
-                
-                img_bytes = io.BytesIO()
-                img_mono.save(img_bytes, 'JPEG', quality=90, optimize=True)
-                img_bytes.seek(0)
-                
-                rect = fitz.Rect(final_x, H - final_y - img_h_pt,
-                                final_x + img_w_pt, H - final_y)
-                page.insert_image(rect, stream=img_bytes.getvalue(), keep_proportion=True)
+                img_mono = _to_monochrome(_optimize_for_pdf(img))
+                rect = _scan_document_rect(span, draw_pos, img.size, img_mono.size,
+                                           scan_dpi, page_size, margin)
+                stream = _encode_pdf_jpeg(img_mono)
+                with lock:
+                    page.insert_image(rect, stream=stream, keep_proportion=True)
         
-        doc.save(output_path, garbage=4, deflate=True, clean=True)
-        doc.close()
+        with lock:
+            doc.save(output_path, garbage=4, deflate=True, clean=True)
+            doc.close()
         
     except Exception as e:
         print(f"⚠️  PyMuPDF failed: {e}, falling back to ReportLab")
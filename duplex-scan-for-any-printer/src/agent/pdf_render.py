@@ -0,0 +1,176 @@
+"""Cached PDF page rendering for the editor endpoints.
+
+Every page request used to reopen the PDF with PyMuPDF and rasterise the page
+to PNG. The render service instead:
+
+- keeps recently used ``fitz.Document`` objects open in a small LRU, reopened
+  when the file's mtime or size changes;
+- stores rendered pages in the content-addressed derivative store keyed by
+  (PDF hash, page, dpi, format), so a page is rasterised once per PDF version;
+- encodes JPEG (or WebP/AVIF, see ``agent.image_formats``) instead of PNG.
+
+PyMuPDF is not thread-safe, so every PyMuPDF call in the process is
+serialised by ``FITZ_LOCK`` (also taken by ``open_document`` for callers that
+need a document directly); cache hits never take it. This holds in both
+processes: the agent's session pool (``pdf_generator``'s fast writers), the
+pre-render thread and upload splitting (``page_source``), and the web UI's
+renders and generations (``incremental_pdf``). Writers keep their document
+private to one thread and take the lock per call, never around image
+resizing or encoding, so concurrent sessions still overlap everything but
+the PyMuPDF calls themselves.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from agent import image_formats
+from agent.derivative_store import DerivativeStore, get_store
+
+# Named preview sizes used by /api/scan/{file}/page/{n}?size=...
+PAGE_DPI = {"small": 72, "medium": 150, "large": 200}
+# Rendered right after the agent writes a PDF (gallery + editor default)
+PRERENDER_SIZES = ("small", "medium")
+FORMATS = image_formats.MEDIA_TYPES
+
+_MAX_OPEN_DOCS = 8
+_JPEG_QUALITY = 85
+_WEBP_QUALITY = 80
+
+# Serialises every PyMuPDF call made from any thread in this process
+FITZ_LOCK = threading.RLock()
+
+
+@contextmanager
+def open_document(path: str) -> Iterator[fitz.Document]:
+    """``fitz.open(path)`` under ``FITZ_LOCK``, closed on exit."""
+    with FITZ_LOCK:
+        doc = fitz.open(path)
+        try:
+            yield doc
+        finally:
+            doc.close()
+
+
+class PdfRenderService:
+    def __init__(self, store: DerivativeStore, max_docs: int = _MAX_OPEN_DOCS):
+        self.store = store
+        self.max_docs = max_docs
+        self._docs: "OrderedDict[str, Tuple[int, int, fitz.Document]]" = OrderedDict()
+        self._fitz_lock = FITZ_LOCK
+
+    # ── Documents ───────────────────────────────────────────────────────────
+
+    def _document(self, path: str) -> fitz.Document:
+        """Open (or reuse) ``path``. Caller must hold ``_fitz_lock``."""
+        key = os.path.realpath(path)
+        st = os.stat(key)
+        cached = self._docs.get(key)
+        if cached is not None:
+            mtime_ns, size, doc = cached
+            if (mtime_ns, size) == (st.st_mtime_ns, st.st_size):
+                self._docs.move_to_end(key)
+                return doc
+            doc.close()
+            del self._docs[key]
+        doc = fitz.open(key)
+        self._docs[key] = (st.st_mtime_ns, st.st_size, doc)
+        while len(self._docs) > self.max_docs:
+            _, (_, _, old) = self._docs.popitem(last=False)
+            old.close()
+        return doc
+
+    def page_count(self, path: str) -> int:
+        with self._fitz_lock:
+            return self._document(path).page_count
+
+    def page_sizes(self, path: str) -> List[Tuple[float, float]]:
+        """Page (width, height) in points, without rendering."""
+        with self._fitz_lock:
+            return [(p.rect.width, p.rect.height) for p in self._document(path)]
+
+    def close(self) -> None:
+        with self._fitz_lock:
+            for _, _, doc in self._docs.values():
+                doc.close()
+            self._docs.clear()
+
+    # ── Rendering ───────────────────────────────────────────────────────────
+
+    def _encode(self, pdf_path: str, page_num: int, dpi: int, fmt: str, out_path: str) -> None:
+        with self._fitz_lock:
+            doc = self._document(pdf_path)
+            if not 0 <= page_num < doc.page_count:
+                raise IndexError(f"page {page_num} out of range")
+            pix = doc[page_num].get_pixmap(dpi=dpi)
+            if fmt == "jpg":
+                data = pix.tobytes("jpg", jpg_quality=_JPEG_QUALITY)
+            else:
+                mode = "RGBA" if pix.alpha else "RGB"
+                img = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+                data = image_formats.encode(img, fmt, _WEBP_QUALITY if fmt == "webp" else None)
+            pix = None
+        with open(out_path, "wb") as f:
+            f.write(data)
+
+    def render(self, pdf_path: str, page_num: int, dpi: int, fmt: str = "jpg") -> str:
+        """Path of the cached rendering of one page (rendered on first use)."""
+        if fmt not in image_formats.available():
+            raise ValueError(f"Unsupported format: {fmt}")
+        return self.store.get(
+            pdf_path, f"p{page_num}-{dpi}dpi", fmt,
+            lambda src, out: self._encode(src, page_num, dpi, fmt, out),
+        )
+
+    def prerender(self, pdf_path: str, sizes: Iterable[str] = PRERENDER_SIZES, fmt: Optional[str] = None) -> int:
+        """Render every page at the given named sizes; returns pages rendered or found cached.
+
+        ``fmt`` defaults to the format browsers will negotiate.
+        """
+        fmt = fmt or image_formats.preferred()
+        done = 0
+        for page_num in range(self.page_count(pdf_path)):
+            for size in sizes:
+                self.render(pdf_path, page_num, PAGE_DPI[size], fmt)
+                done += 1
+        return done
+
+
+_services: Dict[str, PdfRenderService] = {}
+_services_lock = threading.Lock()
+
+
+def get_render_service(store_root: str) -> PdfRenderService:
+    """Shared render service backed by the derivative store at ``store_root``."""
+    key = os.path.realpath(store_root)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = _services[key] = PdfRenderService(get_store(store_root))
+        return service
+
+
+def prerender_in_background(store_root: str, pdf_paths: List[str]) -> Optional[threading.Thread]:
+    """Warm page previews for freshly written PDFs without blocking the caller."""
+    paths = [p for p in pdf_paths if p and os.path.exists(p)]
+    if not paths:
+        return None
+
+    def _run():
+        service = get_render_service(store_root)
+        for path in paths:
+            try:
+                n = service.prerender(path)
+                print(f"🖼️  Pre-rendered {n} page preview(s) for {os.path.basename(path)}")
+            except Exception as e:
+                print(f"⚠️  Page pre-render failed for {os.path.basename(path)}: {e}")
+
+    t = threading.Thread(target=_run, daemon=True, name="pdf-prerender")
+    t.start()
+    return t
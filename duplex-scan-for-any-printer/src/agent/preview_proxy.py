@@ -0,0 +1,217 @@
+"""Low-latency crop/adjust previews for the editor.
+
+``crop_from_metadata`` decodes the full-resolution scan, rotates, deskews
+(full-image ``warpAffine``), PNG-encodes and base64s the crop on every call,
+which is far too slow for live bbox dragging. The preview engine instead:
+
+- builds a *working proxy* per (source, rotation, deskew): decoded at reduced
+  scale where the codec allows (JPEG DCT scaling), rotated and deskewed once,
+  fit to ``proxy_size`` px. Proxies are kept in a small in-memory LRU and
+  persisted in the derivative store, so a restart only pays a small decode;
+- crops the bbox (given in full-resolution coordinates) from the proxy,
+  scales it to the requested viewport, applies brightness/contrast to the
+  crop only and encodes JPEG/WebP;
+- drops superseded requests: callers pass a monotonically increasing ``seq``
+  per editor session, and a request whose ``seq`` is no longer the newest is
+  skipped before doing any work (``Superseded``).
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from agent import tuning
+from agent.derivative_store import DerivativeStore
+
+DEFAULT_PROXY_SIZE = 1600
+_MAX_PROXIES = 6  # ~6 MB each at 1600 px
+_MAX_SESSIONS = 256
+_PROXY_JPEG_QUALITY = 92
+_PREVIEW_QUALITY = {"jpg": 80, "webp": 75}
+FORMATS = {"jpg": "image/jpeg", "webp": "image/webp"}
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                  (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+class Superseded(Exception):
+    """A newer preview request for the same session arrived; this one was skipped."""
+
+
+@dataclass
+class Proxy:
+    image: np.ndarray  # BGR, rotated + deskewed
+    scale: float       # proxy px per full-resolution px
+
+
+def _rotate_quarter(img: np.ndarray, rotation: int) -> np.ndarray:
+    if rotation == 90:
+        return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    if rotation == 180:
+        return cv2.rotate(img, cv2.ROTATE_180)
+    if rotation == 270:
+        return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return img
+
+
+def _decode_reduced(source_path: str, min_size: int) -> np.ndarray:
+    """Decode at the largest DCT reduction that still leaves ``min_size`` px on the long side."""
+    with Image.open(source_path) as im:
+        long_side = max(im.size)
+    for factor, flag in _REDUCED_FLAGS:
+        if long_side // factor >= min_size:
+            img = cv2.imread(source_path, flag)
+            if img is not None:
+                return img
+    img = cv2.imread(source_path)
+    if img is None:
+        raise ValueError(f"Failed to load image: {source_path}")
+    return img
+
+
+class PreviewEngine:
+    def __init__(self, store: DerivativeStore, proxy_size: int = DEFAULT_PROXY_SIZE,
+                 max_proxies: int = _MAX_PROXIES):
+        self.store = store
+        self.proxy_size = proxy_size
+        self.max_proxies = max_proxies
+        self._lock = threading.Lock()
+        self._proxies: "OrderedDict[Tuple, Proxy]" = OrderedDict()
+        self._latest: "OrderedDict[str, int]" = OrderedDict()
+
+    # ── Supersession ────────────────────────────────────────────────────────
+
+    def announce(self, session: Optional[str], seq: Optional[int]) -> None:
+        """Record ``seq`` as the newest request for ``session`` (call on arrival)."""
+        if session is None or seq is None:
+            return
+        with self._lock:
+            if seq > self._latest.get(session, -1):
+                self._latest[session] = seq
+                self._latest.move_to_end(session)
+                while len(self._latest) > _MAX_SESSIONS:
+                    self._latest.popitem(last=False)
+
+    def _check_current(self, session: Optional[str], seq: Optional[int]) -> None:
+        if session is None or seq is None:
+            return
+        with self._lock:
+            if self._latest.get(session, seq) > seq:
+                raise Superseded(f"preview {seq} superseded in session {session}")
+
+    # ── Proxies ─────────────────────────────────────────────────────────────
+
+    def proxy(self, source_path: str, rotation: int = 0, deskew_angle: float = 0.0) -> Proxy:
+        """Rotated + deskewed working copy of ``source_path`` (cached)."""
+        rotation = int(rotation or 0) % 360
+        deskew_angle = round(float(deskew_angle or 0.0), 2)
+        digest = self.store.source_digest(source_path)
+        key = (digest, rotation, deskew_angle, self.proxy_size)
+        with self._lock:
+            cached = self._proxies.get(key)
+            if cached is not None:
+                self._proxies.move_to_end(key)
+                return cached
+
+        with Image.open(source_path) as im:
+            full_w, full_h = im.size
+        if rotation in (90, 270):
+            full_w, full_h = full_h, full_w
+
+        variant = f"proxy{self.proxy_size}-r{rotation}-d{deskew_angle:g}"
+        path = self.store.get(source_path, variant, "jpg",
+                              lambda src, out: self._build(src, out, rotation, deskew_angle))
+        image = cv2.imread(path)
+        if image is None:
+            raise ValueError(f"Failed to load preview proxy for {source_path}")
+        proxy = Proxy(image, image.shape[1] / float(full_w))
+
+        with self._lock:
+            self._proxies[key] = proxy
+            while len(self._proxies) > self.max_proxies:
+                self._proxies.popitem(last=False)
+        return proxy
+
+    def _build(self, source_path: str, out_path: str, rotation: int, deskew_angle: float) -> None:
+        img = _rotate_quarter(_decode_reduced(source_path, self.proxy_size), rotation)
+        h, w = img.shape[:2]
+        fit = min(1.0, self.proxy_size / float(max(w, h)))
+        if fit < 1.0:
+            img = cv2.resize(img, (max(1, int(w * fit)), max(1, int(h * fit))), interpolation=cv2.INTER_AREA)
+        if deskew_angle != 0:
+            # Same rotation about the centre as crop_from_metadata, at proxy scale
+            h, w = img.shape[:2]
+            matrix = cv2.getRotationMatrix2D((w // 2, h // 2), deskew_angle, 1.0)
+            img = cv2.warpAffine(img, matrix, (w, h))
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, _PROXY_JPEG_QUALITY])
+        if not ok:
+            raise ValueError("Failed to encode preview proxy")
+        with open(out_path, "wb") as f:
+            f.write(buf.tobytes())
+
+    # ── Previews ────────────────────────────────────────────────────────────
+
+    def render(self, source_path: str, bbox: Optional[Tuple[float, float, float, float]] = None,
+               rotation: int = 0, deskew_angle: float = 0.0,
+               brightness: float = 1.0, contrast: float = 1.0,
+               max_width: int = 800, max_height: int = 800, fmt: str = "jpg",
+               session: Optional[str] = None, seq: Optional[int] = None) -> Tuple[bytes, Tuple[int, int]]:
+        """Encoded preview of ``bbox`` (full-resolution coords) and its pixel size.
+
+        Raises ``Superseded`` when a newer request for ``session`` has arrived.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        self._check_current(session, seq)
+        proxy = self.proxy(source_path, rotation, deskew_angle)
+        self._check_current(session, seq)
+
+        img = proxy.image
+        ph, pw = img.shape[:2]
+        if bbox is not None:
+            x, y, w, h = (v * proxy.scale for v in bbox)
+            x0 = max(0, min(int(round(x)), pw))
+            y0 = max(0, min(int(round(y)), ph))
+            x1 = max(x0, min(int(round(x + w)), pw))
+            y1 = max(y0, min(int(round(y + h)), ph))
+            img = img[y0:y1, x0:x1]
+        if img.size == 0:
+            raise ValueError("Empty crop")
+
+        h, w = img.shape[:2]
+        fit = min(1.0, max_width / float(w), max_height / float(h))
+        if fit < 1.0:
+            img = cv2.resize(img, (max(1, int(w * fit)), max(1, int(h * fit))), interpolation=cv2.INTER_AREA)
+
+        brightness = 1.0 if brightness is None else brightness
+        contrast = 1.0 if contrast is None else contrast
+        if brightness != 1.0 or contrast != 1.0:
+            img = cv2.convertScaleAbs(img, alpha=contrast, beta=int((brightness - 1.0) * 100))
+
+        if fmt == "webp":
+            params = [cv2.IMWRITE_WEBP_QUALITY, _PREVIEW_QUALITY["webp"]]
+        else:
+            params = [cv2.IMWRITE_JPEG_QUALITY, _PREVIEW_QUALITY["jpg"]]
+        ok, buf = cv2.imencode(f".{fmt}", img, params)
+        if not ok:
+            raise ValueError("Failed to encode preview")
+        return buf.tobytes(), (img.shape[1], img.shape[0])
+
+
+_engines: Dict[str, PreviewEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_preview_engine(store: DerivativeStore) -> PreviewEngine:
+    """Shared engine for ``store``."""
+    with _engines_lock:
+        engine = _engines.get(store.root)
+        if engine is None:
+            engine = _engines[store.root] = PreviewEngine(
+                store, max_proxies=tuning.settings()["preview_proxies"])
+        return engine
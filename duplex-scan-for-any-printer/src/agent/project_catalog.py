@@ -0,0 +1,349 @@
+"""Persistent catalog of generated projects in ``scan_out``.
+
+Listing endpoints used to open every PDF with PyMuPDF (page count plus a
+base64 first-page render) and ``json.load`` every metadata file on each
+request. The catalog keeps one SQLite row per project stem so a listing is a
+single indexed query:
+
+- The agent calls ``record`` after writing a project (incremental).
+- ``reconcile`` re-indexes only files whose mtime/size changed and drops rows
+  for deleted files. It is stat-only for unchanged projects and runs at most
+  every ``_RECONCILE_INTERVAL_SECS`` unless the directory itself changed.
+
+The database lives in ``scan_out/.catalog/projects.sqlite3`` in WAL mode so
+the agent and the web UI can write and read it from separate processes.
+"""
+from __future__ import annotations
+
+import importlib.util
+import json
+import os
+import sqlite3
+import stat
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# agent.pdf_render (PyMuPDF) is imported when a PDF is first indexed
+HAS_PYMUPDF = importlib.util.find_spec("fitz") is not None
+
+# Inside a subfolder so WAL/SHM churn never touches scan_out's own mtime
+CATALOG_PATH = os.path.join(".catalog", "projects.sqlite3")
+_RECONCILE_INTERVAL_SECS = 30.0
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id            TEXT PRIMARY KEY,
+    filename      TEXT,            -- PDF filename, NULL for metadata-only projects
+    mode          TEXT NOT NULL,
+    pages         INTEGER,
+    size          INTEGER NOT NULL DEFAULT 0,
+    created       INTEGER NOT NULL,
+    updated       INTEGER NOT NULL,
+    has_metadata  INTEGER NOT NULL DEFAULT 0,
+    image_count   INTEGER NOT NULL DEFAULT 0,
+    first_image   TEXT,
+    pdf_mtime_ns  INTEGER NOT NULL DEFAULT 0,
+    md_mtime_ns   INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS projects_recent ON projects (created DESC, id DESC);
+CREATE TABLE IF NOT EXISTS catalog_state (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def detect_mode(filename: str) -> str:
+    """Scan mode from a project filename (``scan_duplex-...``, ``test_card_2in1`` ...)."""
+    if "scan_document" in filename:
+        return "scan_document"
+    if "card" in filename or "2in1" in filename:
+        return "card_2in1"
+    if "duplex" in filename or "copy" in filename:
+        return "scan_duplex"
+    return "unknown"
+
+
+def _int_ts(value) -> Optional[int]:
+    if isinstance(value, (int, float, str)) and str(value).isdigit():
+        return int(value)
+    return None
+
+
+@dataclass
+class ProjectEntry:
+    id: str
+    filename: Optional[str]
+    mode: str
+    pages: Optional[int]
+    size: int
+    created: int
+    updated: int
+    has_metadata: bool
+    image_count: int
+    first_image: Optional[str] = None
+    pdf_mtime_ns: int = 0
+    md_mtime_ns: int = 0
+
+    @property
+    def version(self) -> str:
+        """Changes whenever the PDF changes — used to version thumbnail URLs."""
+        return f"{self.pdf_mtime_ns:x}"
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class ProjectCatalog:
+    def __init__(self, out_dir: str, db_path: Optional[str] = None):
+        self.out_dir = out_dir
+        self.db_path = db_path or os.path.join(out_dir, CATALOG_PATH)
+        self._lock = threading.Lock()
+        self._last_reconcile = float("-inf")
+        self._init_db()
+
+    # ── Storage ─────────────────────────────────────────────────────────────
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=5.0)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:  # commit on success, roll back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self) -> None:
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row) -> ProjectEntry:
+        return ProjectEntry(
+            id=row["id"],
+            filename=row["filename"],
+            mode=row["mode"],
+            pages=row["pages"],
+            size=row["size"],
+            created=row["created"],
+            updated=row["updated"],
+            has_metadata=bool(row["has_metadata"]),
+            image_count=row["image_count"],
+            first_image=row["first_image"],
+            pdf_mtime_ns=row["pdf_mtime_ns"],
+            md_mtime_ns=row["md_mtime_ns"],
+        )
+
+    # ── Indexing ────────────────────────────────────────────────────────────
+
+    def _stat(self, name: str) -> Optional[os.stat_result]:
+        try:
+            st = os.stat(os.path.join(self.out_dir, name))
+        except OSError:
+            return None
+        return st if stat.S_ISREG(st.st_mode) else None
+
+    def _index(self, project_id: str, pdf_st, md_st) -> Optional[ProjectEntry]:
+        """Read one project from disk (the only place that opens PDFs/JSON)."""
+        if pdf_st is None and md_st is None:
+            return None
+        filename = f"{project_id}.pdf" if pdf_st is not None else None
+
+        md: Dict = {}
+        if md_st is not None:
+            try:
+                with open(os.path.join(self.out_dir, f"{project_id}.json"), "r", encoding="utf-8") as f:
+                    md = json.load(f) or {}
+            except Exception:
+                md = {}
+
+        pages = None
+        if pdf_st is not None and HAS_PYMUPDF:
+            try:
+                from agent.pdf_render import open_document  # serialised per process
+                with open_document(os.path.join(self.out_dir, filename)) as doc:
+                    pages = doc.page_count
+            except Exception as e:
+                print(f"[Catalog] ⚠️  Cannot read {filename}: {e}")
+                return None  # unreadable/half-written PDF — retried on next reconcile
+        if pages is None:
+            pages = md.get("pages") or md.get("page_count")
+
+        base_st = pdf_st or md_st
+        images = md.get("images") if isinstance(md.get("images"), list) else []
+        mode = detect_mode(filename or project_id)
+        if mode == "unknown" and isinstance(md.get("mode"), str):
+            mode = md["mode"]
+        created = _int_ts(md.get("created"))
+        updated = _int_ts(md.get("updated"))
+        return ProjectEntry(
+            id=project_id,
+            filename=filename,
+            mode=mode,
+            pages=pages,
+            size=pdf_st.st_size if pdf_st is not None else 0,
+            created=created if created is not None else int(base_st.st_ctime),
+            updated=updated if updated is not None else int(base_st.st_mtime),
+            has_metadata=md_st is not None,
+            image_count=len(images),
+            first_image=(images[0].get("path") if images and isinstance(images[0], dict) else None),
+            pdf_mtime_ns=pdf_st.st_mtime_ns if pdf_st is not None else 0,
+            md_mtime_ns=md_st.st_mtime_ns if md_st is not None else 0,
+        )
+
+    def _upsert(self, conn: sqlite3.Connection, entry: ProjectEntry) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO projects (id, filename, mode, pages, size, created, updated,"
+            " has_metadata, image_count, first_image, pdf_mtime_ns, md_mtime_ns)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (entry.id, entry.filename, entry.mode, entry.pages, entry.size, entry.created,
+             entry.updated, int(entry.has_metadata), entry.image_count, entry.first_image,
+             entry.pdf_mtime_ns, entry.md_mtime_ns),
+        )
+
+    def record(self, project_id: str) -> Optional[ProjectEntry]:
+        """Re-index one project now (call after writing its PDF or metadata)."""
+        entry = self._index(project_id, self._stat(f"{project_id}.pdf"), self._stat(f"{project_id}.json"))
+        with self._lock, self._connect() as conn:
+            if entry is None:
+                conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+            else:
+                self._upsert(conn, entry)
+        return entry
+
+    def remove(self, project_id: str) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+
+    def reconcile(self, force: bool = False) -> int:
+        """Bring the catalog in line with ``out_dir``; returns rows changed."""
+        try:
+            dir_mtime = str(os.stat(self.out_dir).st_mtime_ns)
+        except OSError:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            with self._connect() as conn:
+                row = conn.execute("SELECT value FROM catalog_state WHERE key = 'dir_mtime_ns'").fetchone()
+                if (not force and row is not None and row["value"] == dir_mtime
+                        and now - self._last_reconcile < _RECONCILE_INTERVAL_SECS):
+                    return 0
+                known = {
+                    r["id"]: (r["pdf_mtime_ns"], r["size"], r["md_mtime_ns"])
+                    for r in conn.execute("SELECT id, pdf_mtime_ns, size, md_mtime_ns FROM projects")
+                }
+
+            on_disk: Dict[str, Tuple] = {}
+            for name in os.listdir(self.out_dir):
+                if name.startswith("."):
+                    continue
+                stem, ext = os.path.splitext(name)
+                if ext == ".pdf" and not stem.endswith("_mono"):
+                    on_disk.setdefault(stem, [None, None])[0] = self._stat(name)
+                elif ext == ".json":
+                    on_disk.setdefault(stem, [None, None])[1] = self._stat(name)
+
+            changed: List[ProjectEntry] = []
+            stale = [pid for pid in known if pid not in on_disk]
+            for pid, (pdf_st, md_st) in on_disk.items():
+                sig = (
+                    pdf_st.st_mtime_ns if pdf_st is not None else 0,
+                    pdf_st.st_size if pdf_st is not None else 0,
+                    md_st.st_mtime_ns if md_st is not None else 0,
+                )
+                if known.get(pid) == sig:
+                    continue
+                entry = self._index(pid, pdf_st, md_st)
+                if entry is None:
+                    if pid in known:
+                        stale.append(pid)
+                    continue
+                changed.append(entry)
+
+            with self._connect() as conn:
+                for entry in changed:
+                    self._upsert(conn, entry)
+                conn.executemany("DELETE FROM projects WHERE id = ?", [(pid,) for pid in stale])
+                conn.execute(
+                    "INSERT OR REPLACE INTO catalog_state (key, value) VALUES ('dir_mtime_ns', ?)",
+                    (dir_mtime,),
+                )
+            self._last_reconcile = now
+        if changed or stale:
+            print(f"[Catalog] Reconciled: {len(changed)} updated, {len(stale)} removed")
+        return len(changed) + len(stale)
+
+    # ── Queries ─────────────────────────────────────────────────────────────
+
+    def get(self, project_id: str) -> Optional[ProjectEntry]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM projects WHERE id = ?", (project_id,)).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def count(self, require_pdf: bool = True, require_metadata: bool = False) -> int:
+        where, _ = self._filters(require_pdf, require_metadata)
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM projects{where}").fetchone()[0]
+
+    @staticmethod
+    def _filters(require_pdf: bool, require_metadata: bool) -> Tuple[str, List]:
+        clauses = []
+        if require_pdf:
+            clauses.append("filename IS NOT NULL")
+        if require_metadata:
+            clauses.append("has_metadata = 1")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", []
+
+    def page(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        require_pdf: bool = True,
+        require_metadata: bool = False,
+    ) -> Tuple[List[ProjectEntry], Optional[str]]:
+        """Newest-first page of projects and the cursor for the next page.
+
+        The cursor is ``"<created>:<id>"`` of the last returned entry, so pages
+        stay stable while new projects arrive.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        where, params = self._filters(require_pdf, require_metadata)
+        if cursor:
+            created_s, _, last_id = cursor.partition(":")
+            try:
+                created = int(created_s)
+            except ValueError:
+                raise ValueError(f"Invalid cursor: {cursor!r}")
+            where += (" AND " if where else " WHERE ") + "(created < ? OR (created = ? AND id < ?))"
+            params += [created, created, last_id]
+        sql = f"SELECT * FROM projects{where} ORDER BY created DESC, id DESC LIMIT ?"
+        with self._connect() as conn:
+            rows = conn.execute(sql, params + [limit + 1]).fetchall()
+        entries = [self._row_to_entry(r) for r in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = entries[-1]
+            next_cursor = f"{last.created}:{last.id}"
+        return entries, next_cursor
+
+
+_catalogs: Dict[str, ProjectCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(out_dir: str) -> ProjectCatalog:
+    """Shared catalog instance for ``out_dir`` (one per process)."""
+    key = os.path.realpath(out_dir)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = ProjectCatalog(out_dir)
+        return catalog
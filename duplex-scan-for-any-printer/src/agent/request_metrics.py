@@ -0,0 +1,241 @@
+"""Per-route latency metrics and slow-request log for the web UI server.
+
+``RequestMetricsMiddleware`` (plain ASGI) times every HTTP request and
+records, per route template (``/api/projects/{project_id}/thumbnail``):
+
+- ``webui_request_duration_seconds{method,route,status}``;
+- ``webui_requests_in_progress{route}``;
+- ``webui_response_size_bytes{route}`` (body bytes sent);
+- ``webui_cache_lookups_total{route,result}``: derivative-store ``hit``,
+  ``miss`` or ``wait`` (on another request's generation), see ``cache()``.
+
+Inside a request, ``stage(name)`` and ``timed(fn)`` add to the request's
+stage breakdown; ``timed`` wraps work handed to the worker pool, records its
+queue wait and run time, and keeps the request visible to ``cache()`` in the
+worker thread. The last ``RECENT_REQUESTS`` requests are kept for
+``slowest()`` (``/api/debug/perf``); those over ``WEB_UI_SLOW_MS`` are also
+printed as they finish. Event streams count as in progress but are not
+timed.
+"""
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from starlette.routing import Match
+
+from agent import tracing
+
+SLOW_MS = float(os.getenv("WEB_UI_SLOW_MS", "1000"))
+RECENT_REQUESTS = 256
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+
+REQUEST_SECONDS = tracing.Histogram("webui_request_duration_seconds", "Web UI request latency.",
+                                    ("method", "route", "status"), buckets=LATENCY_BUCKETS)
+IN_PROGRESS = tracing.Gauge("webui_requests_in_progress", "Web UI requests being served.", ("route",))
+RESPONSE_BYTES = tracing.Histogram("webui_response_size_bytes", "Web UI response body size.",
+                                   ("route",), buckets=SIZE_BUCKETS)
+CACHE_LOOKUPS = tracing.Counter("webui_cache_lookups_total", "Derivative cache lookups by result.",
+                                ("route", "result"))
+
+
+class RequestRecord:
+    __slots__ = ("method", "path", "route", "status", "start", "duration", "bytes",
+                 "stages", "cache", "_t0", "_lock")
+
+    def __init__(self, method: str, path: str, route: str):
+        self.method = method
+        self.path = path
+        self.route = route
+        self.status = 0
+        self.start = time.time()
+        self.duration = 0.0
+        self.bytes = 0
+        self.stages: Dict[str, List[float]] = {}  # name -> [count, seconds, wait seconds]
+        self.cache: Dict[str, int] = {}
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, seconds: float, wait: float = 0.0) -> None:
+        with self._lock:
+            entry = self.stages.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += wait
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {name: {"count": int(c), "ms": round(s * 1000, 1), "wait_ms": round(w * 1000, 1)}
+                      for name, (c, s, w) in self.stages.items()}
+            cache = dict(self.cache)
+        out: Dict[str, Any] = {
+            "method": self.method, "path": self.path, "route": self.route, "status": self.status,
+            "start": round(self.start, 3), "duration_ms": round(self.duration * 1000, 1), "bytes": self.bytes,
+        }
+        if stages:
+            out["stages"] = stages
+        if cache:
+            out["cache"] = cache
+        return out
+
+    def summary(self) -> str:
+        with self._lock:
+            parts = [f"{name} {s * 1000:.0f}ms" + (f" (+{w * 1000:.0f}ms queued)" if w >= 0.001 else "")
+                     for name, (_, s, w) in sorted(self.stages.items(), key=lambda kv: -kv[1][1])]
+            parts += [f"cache {result}×{n}" for result, n in self.cache.items()]
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestRecord]] = contextvars.ContextVar("webui_request", default=None)
+_recent: deque = deque(maxlen=RECENT_REQUESTS)
+_recent_lock = threading.Lock()
+
+
+def current_request() -> Optional[RequestRecord]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Add the block's duration to the current request's stage breakdown."""
+    rec = _current.get()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if rec is not None:
+            rec.add_stage(name, time.perf_counter() - t0)
+
+
+def timed(fn: Callable, name: Optional[str] = None, wait: bool = True) -> Callable:
+    """Wrap ``fn`` for the worker pool: times the run (and, with ``wait``, the
+    queue wait since this call) as a stage of the current request."""
+    rec = _current.get()
+    if rec is None:
+        return fn
+    label = name or getattr(fn, "__name__", "job")
+    queued = time.perf_counter()
+
+    def run(*args, **kwargs):
+        started = time.perf_counter()
+        token = _current.set(rec)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+            rec.add_stage(label, time.perf_counter() - started, started - queued if wait else 0.0)
+
+    return run
+
+
+def cache(result: str) -> None:
+    """Tag a cache lookup (``hit`` / ``miss`` / ``wait``) on the current request."""
+    rec = _current.get()
+    if rec is None:
+        return
+    with rec._lock:
+        rec.cache[result] = rec.cache.get(result, 0) + 1
+    CACHE_LOOKUPS.inc(route=rec.route, result=result)
+
+
+def _route_template(scope: Dict[str, Any]) -> str:
+    app = scope.get("app")
+    partial = None
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "") or getattr(route, "name", "") or "/"
+        if match == Match.PARTIAL and partial is None:
+            partial = getattr(route, "path", None)
+    return partial or "unmatched"
+
+
+def _observe(rec: RequestRecord) -> None:
+    status = str(rec.status or 500)
+    REQUEST_SECONDS.observe(rec.duration, method=rec.method, route=rec.route, status=status)
+    RESPONSE_BYTES.observe(rec.bytes, route=rec.route)
+    with _recent_lock:
+        _recent.append(rec)
+    if rec.duration * 1000 >= SLOW_MS:
+        detail = rec.summary()
+        print(f"🐢 Slow request: {rec.method} {rec.path} → {status} in {rec.duration * 1000:.0f} ms"
+              + (f" [{detail}]" if detail else ""))
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rec = RequestRecord(scope["method"], scope["path"], _route_template(scope))
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal streaming
+            if message["type"] == "http.response.start":
+                rec.status = message["status"]
+                for key, value in message.get("headers", ()):
+                    if key.lower() == b"content-type" and value.startswith(b"text/event-stream"):
+                        streaming = True
+            elif message["type"] == "http.response.body":
+                rec.bytes += len(message.get("body", b""))
+            await send(message)
+
+        token = _current.set(rec)
+        IN_PROGRESS.inc(route=rec.route)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_PROGRESS.dec(route=rec.route)
+            _current.reset(token)
+            rec.duration = time.perf_counter() - rec._t0
+            if not streaming:
+                _observe(rec)
+
+
+def slowest(limit: int = 20) -> List[Dict[str, Any]]:
+    """The slowest of the last ``RECENT_REQUESTS`` requests, slowest first."""
+    with _recent_lock:
+        recent = list(_recent)
+    recent.sort(key=lambda r: -r.duration)
+    return [r.to_dict() for r in recent[:max(0, limit)]]
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def routes() -> List[Dict[str, Any]]:
+    """Latency percentiles (estimated from the histogram buckets) per method, route and status."""
+    rows = []
+    for method, route, status in REQUEST_SECONDS.label_values():
+        labels = {"method": method, "route": route, "status": status}
+        count = REQUEST_SECONDS.count(**labels)
+        rows.append({
+            **labels,
+            "count": count,
+            "avg_ms": _ms(REQUEST_SECONDS.total(**labels) / count) if count else None,
+            "p50_ms": _ms(REQUEST_SECONDS.quantile(0.5, **labels)),
+            "p95_ms": _ms(REQUEST_SECONDS.quantile(0.95, **labels)),
+            "p99_ms": _ms(REQUEST_SECONDS.quantile(0.99, **labels)),
+            "in_progress": int(IN_PROGRESS.value(route=route)),
+            "avg_bytes": int(RESPONSE_BYTES.total(route=route) / max(1, RESPONSE_BYTES.count(route=route))),
+        })
+    rows.sort(key=lambda r: -(r["count"] * (r["avg_ms"] or 0)))
+    return rows
+
+
+def cache_results() -> Dict[str, Dict[str, int]]:
+    out: Dict[str, Dict[str, int]] = {}
+    for route, result in CACHE_LOOKUPS.label_values():
+        out.setdefault(route, {})[result] = int(CACHE_LOOKUPS.value(route=route, result=result))
+    return out
@@ -18,6 +18,32 @@ from datetime import datetime, timedelta
 from agent import logger
 
 
+def _meminfo_available_mb() -> Optional[float]:
+    """MemAvailable from /proc/meminfo, or None where it does not exist."""
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _cgroup_available_mb() -> Optional[float]:
+    """Headroom below the cgroup v2 memory limit, or None when unlimited."""
+    try:
+        with open("/sys/fs/cgroup/memory.max", "r", encoding="utf-8") as f:
+            limit = f.read().strip()
+        if limit == "max":
+            return None
+        with open("/sys/fs/cgroup/memory.current", "r", encoding="utf-8") as f:
+            current = int(f.read().strip())
+        return max(0, int(limit) - current) / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
 class ResourceMonitor:
     """Monitor and manage system resources."""
     
@@ -72,16 +98,25 @@ class ResourceMonitor:
     
     def check_memory(self) -> Tuple[bool, float]:
         """
-        Check memory availability (requires psutil).
+        Check memory availability (psutil, else /proc/meminfo).
+        
+        The container's cgroup memory limit caps the result, since that is
+        what triggers the OOM killer inside the add-on.
         
         Returns:
             Tuple of (is_sufficient, available_mb)
         """
         try:
-            import psutil
-            
-            mem = psutil.virtual_memory()
-            available_mb = mem.available / (1024 * 1024)
+            try:
+                import psutil
+                available_mb = psutil.virtual_memory().available / (1024 * 1024)
+            except ImportError:
+                available_mb = _meminfo_available_mb()
+                if available_mb is None:
+                    raise
+            cgroup_mb = _cgroup_available_mb()
+            if cgroup_mb is not None:
+                available_mb = min(available_mb, cgroup_mb)
             is_sufficient = available_mb >= self.min_memory_mb
             
             if not is_sufficient:
@@ -92,7 +127,7 @@ class ResourceMonitor:
             
             return is_sufficient, available_mb
         except ImportError:
-            # psutil not installed, skip check
+            # Neither psutil nor /proc/meminfo, skip check
             return True, 0.0
         except Exception as e:
             logger.error(f"Failed to check memory: {str(e)}", exc_info=True)
@@ -0,0 +1,283 @@
+"""Push-based session events (Server-Sent Events) for the web UI.
+
+The dashboard used to poll ``/api/session/status`` every few seconds, each
+poll opening a new HTTP client in the web UI and a request to the agent API.
+Instead:
+
+- ``EventStreamChannel`` is a ``NotificationChannel``, so the agent's existing
+  hooks (image added, session ready / action / processed) feed it like any
+  other channel. Every event carries a snapshot of the active sessions, so a
+  subscriber never needs a follow-up request;
+- ``EventBroadcaster`` fans events out to SSE subscribers on any event loop
+  (hooks fire from agent threads) with a short replay history for
+  ``Last-Event-ID`` reconnects and a heartbeat that keeps proxies from
+  closing idle streams;
+- ``EventRelay`` (web UI side) holds one upstream stream to the agent while
+  at least one browser listens and fans it out to all of them.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from agent.notification_manager import NotificationChannel
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15.0
+_HISTORY = 64
+_QUEUE_SIZE = 64
+_RECONNECT_MAX = 15.0
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    return f"id: {event['id']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+class EventBroadcaster:
+    """Thread-safe publish, asyncio subscribe."""
+
+    def __init__(self, snapshot: Optional[Callable[[], Dict[str, Any]]] = None,
+                 history: int = _HISTORY, queue_size: int = _QUEUE_SIZE):
+        self.snapshot = snapshot
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._history: deque = deque(maxlen=history)
+        self._subscribers: Dict[asyncio.Queue, asyncio.AbstractEventLoop] = {}
+        self.published = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def _event(self, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        event: Dict[str, Any] = {"type": event_type, "ts": time.time(), "data": data}
+        if self.snapshot is not None:
+            try:
+                event.update(self.snapshot())
+            except Exception as e:
+                logger.error("Session snapshot for event stream failed: %s", e)
+        return event
+
+    def publish(self, event_type: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Record and deliver an event; callable from any thread."""
+        event = self._event(event_type, data or {})
+        with self._lock:
+            event["id"] = next(self._ids)
+            self._history.append(event)
+            self.published += 1
+            targets = list(self._subscribers.items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:  # subscriber's loop is gone
+                self._drop(queue)
+        return event
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: Dict[str, Any]) -> None:
+        if queue.full():  # slow consumer: drop the oldest, every event carries a full snapshot
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def _drop(self, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Tuple[asyncio.Queue, List[Dict[str, Any]]]:
+        """Register a queue on the running loop; returns it with the events to send first.
+
+        Reconnects with a ``last_event_id`` still in history get the missed
+        events replayed; everyone else starts from a fresh snapshot.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+            history = list(self._history)
+        if (last_event_id is not None and history
+                and history[0]["id"] <= last_event_id + 1 <= history[-1]["id"] + 1):
+            backlog = [e for e in history if e["id"] > last_event_id]
+        else:
+            backlog = [self._snapshot_event(history)]
+        return queue, backlog
+
+    def _snapshot_event(self, history: List[Dict[str, Any]]) -> Dict[str, Any]:
+        event = self._event("snapshot", {})
+        event["id"] = history[-1]["id"] if history else 0  # not a new event: keeps replay ids intact
+        return event
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._drop(queue)
+
+    async def stream(self, last_event_id: Optional[int] = None,
+                     heartbeat: float = HEARTBEAT_SECONDS) -> AsyncIterator[str]:
+        """SSE text for one subscriber, with ``: ping`` comments while idle."""
+        queue, backlog = self.subscribe(last_event_id)
+        try:
+            yield "retry: 3000\n\n"
+            for event in backlog:
+                yield format_sse(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            self.unsubscribe(queue)
+
+
+class EventStreamChannel(NotificationChannel):
+    """Publishes the agent's notification hooks to the SSE broadcaster."""
+
+    def __init__(self, broadcaster: EventBroadcaster):
+        self.broadcaster = broadcaster
+
+    @property
+    def name(self) -> str:
+        return "events"
+
+    def notify_session_ready(self, session_info: Dict[str, Any]) -> None:
+        self.broadcaster.publish("session_ready", dict(session_info))
+
+    def notify_session_processed(
+        self, session_id: str, mode: str, success: bool, pdf_path: Optional[str] = None
+    ) -> None:
+        self.broadcaster.publish("session_processed", {
+            "session_id": session_id, "mode": mode, "success": success, "pdf_path": pdf_path,
+        })
+
+    def notify_image_added(self, session_info: Dict[str, Any]) -> None:
+        self.broadcaster.publish("image_added", dict(session_info))
+
+    def notify_session_action(
+        self, confirmed: bool, action_by: str = "external", session_id: Optional[str] = None
+    ) -> None:
+        self.broadcaster.publish("session_action", {
+            "confirmed": confirmed, "action_by": action_by, "session_id": session_id,
+        })
+
+    @property
+    def status(self) -> Dict[str, Any]:
+        n = self.broadcaster.subscriber_count
+        return {"enabled": True, "connected": n > 0, "subscribers": n,
+                "message": f"{n} event stream subscriber(s)"}
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+# ─── Web UI side ──────────────────────────────────────────────────────────────
+
+async def parse_sse(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[Optional[str], Optional[str]]]:
+    """(id, data) per SSE event from a line iterator; a comment (heartbeat) yields (None, None)."""
+    event_id: Optional[str] = None
+    data: List[str] = []
+    async for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:
+            if data:
+                yield event_id, "\n".join(data)
+            event_id, data = None, []
+        elif line.startswith(":"):
+            yield None, None
+        else:
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "data":
+                data.append(value)
+            elif field == "id":
+                event_id = value
+
+
+# open_stream(last_event_id) -> async iterator over the upstream's text lines
+StreamOpener = Callable[[Optional[str]], AsyncIterator[str]]
+
+
+class EventRelay:
+    """One upstream SSE connection shared by every local subscriber (single event loop)."""
+
+    def __init__(self, open_stream: StreamOpener, heartbeat: float = HEARTBEAT_SECONDS,
+                 queue_size: int = _QUEUE_SIZE):
+        self.open_stream = open_stream
+        self.heartbeat = heartbeat
+        self.queue_size = queue_size
+        self.latest: Optional[Dict[str, Any]] = None
+        self.connected = False
+        self.upstream_connects = 0
+        self._queues: List[asyncio.Queue] = []
+        self._task: Optional[asyncio.Task] = None
+        self._last_id: Optional[str] = None
+
+    def _fan_out(self, event: Dict[str, Any]) -> None:
+        for queue in list(self._queues):
+            EventBroadcaster._offer(queue, event)
+
+    async def _run(self) -> None:
+        delay = 1.0
+        while self._queues:
+            try:
+                self.upstream_connects += 1
+                async for event_id, data in parse_sse(self.open_stream(self._last_id)):
+                    self.connected, delay = True, 1.0
+                    if not self._queues:
+                        return  # last subscriber left; drop the upstream at the next event or ping
+                    if data is None:
+                        continue
+                    self._last_id = event_id or self._last_id
+                    try:
+                        event = json.loads(data)
+                    except ValueError:
+                        continue
+                    self.latest = event
+                    self._fan_out(event)
+                raise ConnectionError("agent event stream ended")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.connected:
+                    self._fan_out({"type": "disconnected", "ts": time.time(), "data": {"reason": str(e)}})
+                self.connected = False
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, _RECONNECT_MAX)
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stream(self) -> AsyncIterator[Dict[str, Any]]:
+        """Events for one local subscriber (starting with the latest known state), or None as a heartbeat."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._queues.append(queue)
+        self._ensure_running()
+        try:
+            if self.latest is not None:
+                yield self.latest
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._queues.remove(queue)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
@@ -4,7 +4,7 @@ import os
 import time
 import threading
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Callable, Any, Any
+from typing import List, Dict, Optional, Callable, Iterable, Tuple
 
 
 STATE_COLLECTING = "COLLECTING"
@@ -13,6 +13,12 @@ STATE_CONFIRMED = "CONFIRMED"
 STATE_REJECTED = "REJECTED"
 STATE_SUSPENDED = "SUSPENDED"
 
+ACTIVE_STATES = (STATE_COLLECTING, STATE_WAIT_CONFIRM)
+
+# Device used for uploads that carry no uploader identity (files dropped directly
+# into a mode folder, e.g. via SMB or an older FTP server build).
+DEFAULT_DEVICE = "default"
+
 
 @dataclass
 class Session:
@@ -24,9 +30,28 @@ class Session:
     state: str = STATE_COLLECTING
     print_requested: bool = False  # True if confirm_print, False if confirm
     confirmer_chat_id: Optional[int] = None  # chat that confirmed, used to send back the PDF
+    device: str = DEFAULT_DEVICE  # uploading scanner (FTP user or client IP)
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.device, self.mode)
+
+
+def _new_session_id(device: str, mode: str) -> str:
+    """Session ids double as project folder names, so keep them [\\w-] only."""
+    if device == DEFAULT_DEVICE:
+        return f"{mode}-{int(time.time())}"
+    return f"{mode}-{device}-{int(time.time())}"
 
 
 class SessionManager:
+    """Tracks one active session per (device, mode).
+
+    Each scanner collects into its own sessions, so two devices scanning at the
+    same time never mix pages. Switching mode on a device suspends that device's
+    other sessions only.
+    """
+
     def __init__(
         self,
         timeout_seconds: int,
@@ -40,8 +65,8 @@ class SessionManager:
         self.on_reject_cb = on_reject
         self.on_state_change_cb = on_state_change
         self.on_image_added_cb = on_image_added
-        self._by_mode: Dict[str, Session] = {}
-        self._suspended_by_mode: Dict[str, Session] = {}
+        self._active: Dict[Tuple[str, str], Session] = {}
+        self._suspended: Dict[Tuple[str, str], Session] = {}
         self._lock = threading.Lock()
         self._start_timeout_watcher()
 
@@ -49,48 +74,51 @@ class SessionManager:
         def _watch():
             while True:
                 time.sleep(2)
-                now = time.time()
-                with self._lock:
-                    # Active sessions
-                    for mode, s in list(self._by_mode.items()):
-                        if s.state in (STATE_COLLECTING, STATE_WAIT_CONFIRM):
-                            if now - s.last_activity > self.timeout_seconds:
-                                s.state = STATE_REJECTED
-                                self._cleanup_session_files(s)
-                                self.on_reject_cb(s)
-                                if self.on_state_change_cb:
-                                    self.on_state_change_cb(s, STATE_WAIT_CONFIRM, STATE_REJECTED)
-                                del self._by_mode[mode]
-                    # Suspended sessions
-                    for mode, s in list(self._suspended_by_mode.items()):
-                        if s.state == STATE_SUSPENDED and now - s.last_activity > self.timeout_seconds:
-                            s.state = STATE_REJECTED
-                            self._cleanup_session_files(s)
-                            self.on_reject_cb(s)
-                            del self._suspended_by_mode[mode]
+                self._expire_idle(time.time())
         t = threading.Thread(target=_watch, daemon=True)
         t.start()
 
-    def add_image(self, mode: str, path: str):
+    def _expire_idle(self, now: float) -> None:
+        expired: List[Tuple[Session, str]] = []
         with self._lock:
-            # Revive suspended session if returning to same mode
-            s = self._by_mode.get(mode)
+            for key, s in list(self._active.items()):
+                if s.state in ACTIVE_STATES and now - s.last_activity > self.timeout_seconds:
+                    expired.append((s, s.state))
+                    s.state = STATE_REJECTED
+                    del self._active[key]
+            for key, s in list(self._suspended.items()):
+                if s.state == STATE_SUSPENDED and now - s.last_activity > self.timeout_seconds:
+                    expired.append((s, s.state))
+                    s.state = STATE_REJECTED
+                    del self._suspended[key]
+        for s, old_state in expired:
+            self._cleanup_session_files(s)
+            self.on_reject_cb(s)
+            if self.on_state_change_cb and old_state != STATE_SUSPENDED:
+                self.on_state_change_cb(s, old_state, STATE_REJECTED)
+
+    def add_image(self, mode: str, path: str, device: str = DEFAULT_DEVICE):
+        key = (device, mode)
+        with self._lock:
+            # Revive suspended session if the device returns to the same mode
+            s = self._active.get(key)
             if s is None:
-                sus = self._suspended_by_mode.pop(mode, None)
+                sus = self._suspended.pop(key, None)
                 if sus is not None:
                     sus.state = STATE_COLLECTING
-                    self._by_mode[mode] = sus
+                    self._active[key] = sus
                     s = sus
-            if s is None or s.state not in (STATE_COLLECTING, STATE_WAIT_CONFIRM):
-                s = Session(id=f"{mode}-{int(time.time())}", mode=mode)
-                self._by_mode[mode] = s
+            if s is None or s.state not in ACTIVE_STATES:
+                s = Session(id=_new_session_id(device, mode), mode=mode, device=device)
+                self._active[key] = s
 
-            # Suspend other active sessions to avoid accidental mixing
-            for other_mode, other_s in list(self._by_mode.items()):
-                if other_mode != mode and other_s.state in (STATE_COLLECTING, STATE_WAIT_CONFIRM):
+            # Suspend this device's other sessions to avoid accidental mixing.
+            # Sessions from other devices keep collecting in parallel.
+            for other_key, other_s in list(self._active.items()):
+                if other_key[0] == device and other_key != key and other_s.state in ACTIVE_STATES:
                     other_s.state = STATE_SUSPENDED
-                    self._suspended_by_mode[other_mode] = other_s
-                    del self._by_mode[other_mode]
+                    self._suspended[other_key] = other_s
+                    del self._active[other_key]
 
             s.images.append(path)
             s.last_activity = time.time()
@@ -99,51 +127,111 @@ class SessionManager:
         if cb_session and self.on_image_added_cb:
             self.on_image_added_cb(cb_session)
 
-    def hint_wait_confirm(self, mode: str):
+    def hint_wait_confirm(self, mode: str, device: str = DEFAULT_DEVICE):
+        changed = None
         with self._lock:
-            s = self._by_mode.get(mode)
+            s = self._active.get((device, mode))
             if s and s.state == STATE_COLLECTING:
-                old_state = s.state
+                changed = (s, s.state)
                 s.state = STATE_WAIT_CONFIRM
-                if self.on_state_change_cb:
-                    self.on_state_change_cb(s, old_state, STATE_WAIT_CONFIRM)
+        # Outside the lock: listeners (the event stream) snapshot active_sessions()
+        if changed and self.on_state_change_cb:
+            self.on_state_change_cb(changed[0], changed[1], STATE_WAIT_CONFIRM)
 
-    def confirm_latest(self, print_requested: bool = False):
+    def active_sessions(self) -> List[Session]:
+        """Snapshot of sessions currently collecting or awaiting confirmation."""
         with self._lock:
-            s = self._latest_active_session()
-            if s:
-                old_state = s.state
-                s.state = STATE_CONFIRMED
-                s.print_requested = print_requested
-                # copy ref; processing may be long
-                self.on_confirm_cb(s)
-                del self._by_mode[s.mode]
-                # After processing, clear any suspended sessions/files to keep server light
-                for mode, sus in list(self._suspended_by_mode.items()):
-                    try:
-                        self._cleanup_session_files(sus)
-                    except Exception:
-                        pass
-                    del self._suspended_by_mode[mode]
-                if self.on_state_change_cb:
-                    self.on_state_change_cb(s, old_state, STATE_CONFIRMED)
-
-    def reject_latest(self):
+            return [s for s in self._active.values() if s.state in ACTIVE_STATES]
+
+    def get_session(self, session_id: str) -> Optional[Session]:
         with self._lock:
-            s = self._latest_active_session()
-            if s:
-                old_state = s.state
-                s.state = STATE_REJECTED
-                self._cleanup_session_files(s)
-                self.on_reject_cb(s)
-                del self._by_mode[s.mode]
-                if self.on_state_change_cb:
-                    self.on_state_change_cb(s, old_state, STATE_REJECTED)
-
-    def _latest_active_session(self) -> Optional[Session]:
+            for s in self._active.values():
+                if s.id == session_id:
+                    return s
+        return None
+
+    def confirm_latest(
+        self,
+        print_requested: bool = False,
+        device: Optional[str] = None,
+        session_id: Optional[str] = None,
+        states: Iterable[str] = ACTIVE_STATES,
+    ) -> Optional[Session]:
+        """Confirm a session and hand it to ``on_confirm``.
+
+        The target is ``session_id`` when given, otherwise the most recently
+        active session of ``device`` (any device when None). Returns the
+        confirmed session, or None when nothing matched.
+        """
+        with self._lock:
+            s = self._take_session(device, session_id, states)
+            if s is None:
+                return None
+            old_state = s.state
+            s.state = STATE_CONFIRMED
+            s.print_requested = print_requested
+            # Clear the device's suspended sessions/files to keep server light
+            stale = self._drop_suspended(s.device)
+        for sus in stale:
+            try:
+                self._cleanup_session_files(sus)
+            except Exception:
+                pass
+        # Outside the lock: processing may be long and other devices keep scanning
+        self.on_confirm_cb(s)
+        if self.on_state_change_cb:
+            self.on_state_change_cb(s, old_state, STATE_CONFIRMED)
+        return s
+
+    def reject_latest(
+        self,
+        device: Optional[str] = None,
+        session_id: Optional[str] = None,
+        states: Iterable[str] = ACTIVE_STATES,
+    ) -> Optional[Session]:
+        """Reject a session (same targeting rules as :meth:`confirm_latest`)."""
+        with self._lock:
+            s = self._take_session(device, session_id, states)
+            if s is None:
+                return None
+            old_state = s.state
+            s.state = STATE_REJECTED
+        self._cleanup_session_files(s)
+        self.on_reject_cb(s)
+        if self.on_state_change_cb:
+            self.on_state_change_cb(s, old_state, STATE_REJECTED)
+        return s
+
+    def _take_session(
+        self, device: Optional[str], session_id: Optional[str], states: Iterable[str]
+    ) -> Optional[Session]:
+        """Pick and untrack the target session. Caller must hold the lock."""
+        states = tuple(states)
+        if session_id is not None:
+            s = next((x for x in self._active.values() if x.id == session_id), None)
+            if s is not None and s.state not in states:
+                s = None
+        else:
+            s = self._latest_active_session(device, states)
+        if s is not None:
+            del self._active[s.key]
+        return s
+
+    def _drop_suspended(self, device: str) -> List[Session]:
+        dropped = [s for key, s in self._suspended.items() if key[0] == device]
+        for s in dropped:
+            del self._suspended[s.key]
+        return dropped
+
+    def _latest_active_session(
+        self, device: Optional[str] = None, states: Iterable[str] = ACTIVE_STATES
+    ) -> Optional[Session]:
+        states = tuple(states)
         latest: Optional[Session] = None
-        for s in self._by_mode.values():
-            if s.state in (STATE_COLLECTING, STATE_WAIT_CONFIRM):
+        for s in self._active.values():
+            if device is not None and s.device != device:
+                continue
+            if s.state in states:
                 if latest is None or s.last_activity > latest.last_activity:
                     latest = s
         return latest
@@ -152,7 +240,7 @@ class SessionManager:
         """Best-effort cleanup of session files with logging."""
         deleted_count = 0
         failed_count = 0
-        
+
         for p in s.images:
             try:
                 if os.path.exists(p):
@@ -161,7 +249,7 @@ class SessionManager:
             except Exception as e:
                 failed_count += 1
                 print(f"[SessionManager] ⚠️  Failed to delete {os.path.basename(p)}: {str(e)}")
-        
+
         if deleted_count > 0:
             print(f"[SessionManager] 🗑️  Cleaned up {deleted_count} rejected/timeout files")
         if failed_count > 0:
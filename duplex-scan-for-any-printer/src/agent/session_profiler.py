@@ -0,0 +1,244 @@
+"""On-demand sampling profiler and memory tracer for processed sessions.
+
+``arm(n)`` (agent API ``POST /api/profiling``, or ``profile_sessions`` in the
+config) makes the next *n* sessions run under:
+
+- a wall-clock sampling profiler: a daemon thread reads the session thread's
+  stack from ``sys._current_frames()`` every ``SAMPLE_INTERVAL`` seconds and
+  counts collapsed stacks (``outer;inner count``, the input of flamegraph.pl
+  and speedscope). Time spent in C code (OpenCV, PyMuPDF, the model) shows
+  up under the Python frame that called it;
+- ``tracemalloc`` plus RSS, sampled alongside; the curve is cut into the
+  session's timing spans (``agent.tracing``) for per-stage peaks.
+
+The results are written next to the project, in
+``<output_dir>/<session_id>/profile/`` (``stacks.collapsed``, ``memory.json``),
+and the web UI serves them for download. tracemalloc is process-wide, so
+memory numbers of sessions profiled in parallel include each other.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from agent import logger, tracing
+
+SAMPLE_INTERVAL = 0.01  # 100 Hz
+MAX_STACK_DEPTH = 128
+MAX_ARMED = 100
+PROFILE_DIR = "profile"
+STACKS_FILE = "stacks.collapsed"
+MEMORY_FILE = "memory.json"
+PROFILE_FILES = (STACKS_FILE, MEMORY_FILE)
+
+_lock = threading.Lock()
+_armed = 0
+_active: Dict[str, "SessionProfile"] = {}
+_recent: deque = deque(maxlen=20)
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+def arm(sessions: int) -> int:
+    """Profile the next ``sessions`` sessions (0 disarms); returns the armed count."""
+    global _armed
+    with _lock:
+        _armed = max(0, min(MAX_ARMED, int(sessions)))
+        return _armed
+
+
+def _take() -> bool:
+    global _armed
+    with _lock:
+        if _armed <= 0:
+            return False
+        _armed -= 1
+        return True
+
+
+def status() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "armed": _armed,
+            "interval_s": SAMPLE_INTERVAL,
+            "active": sorted(_active),
+            "recent": list(_recent)[::-1],
+        }
+
+
+def profile_dir(output_dir: str, session_id: str) -> str:
+    return os.path.join(output_dir, session_id, PROFILE_DIR)
+
+
+def _tracemalloc_acquire() -> None:
+    global _tracemalloc_users, _tracemalloc_owned
+    with _lock:
+        if _tracemalloc_users == 0:
+            _tracemalloc_owned = not tracemalloc.is_tracing()
+            if _tracemalloc_owned:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        _tracemalloc_users += 1
+
+
+def _tracemalloc_release() -> None:
+    global _tracemalloc_users
+    with _lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)})".replace(";", ":")
+
+
+class SessionProfile:
+    """Samples one thread's stack and the process memory until ``stop()``."""
+
+    def __init__(self, session_id: str, thread_id: Optional[int] = None,
+                 interval: float = SAMPLE_INTERVAL):
+        self.session_id = session_id
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks: Dict[str, int] = {}
+        self.memory: List[Tuple[float, Optional[int], Optional[float]]] = []  # (time, traced, rss)
+        self.started = 0.0
+        self.duration = 0.0
+        self.traced_peak: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        _tracemalloc_acquire()
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name=f"profile-{self.session_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        self.duration = time.time() - self.started
+        if tracemalloc.is_tracing():
+            self.traced_peak = tracemalloc.get_traced_memory()[1]
+        _tracemalloc_release()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        now = time.time()
+        if frame is not None:
+            stack: List[str] = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+        traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        self.memory.append((now, traced, tracing.rss_bytes()))
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format, heaviest first."""
+        rows = sorted(self.stacks.items(), key=lambda kv: -kv[1])
+        return "".join(f"{stack} {count}\n" for stack, count in rows)
+
+    def _window(self, start: float, end: float) -> Dict[str, Any]:
+        samples = [m for m in self.memory if start <= m[0] <= end]
+        traced = [m[1] for m in samples if m[1] is not None]
+        rss = [m[2] for m in samples if m[2] is not None]
+        return {
+            "samples": len(samples),
+            "traced_peak_bytes": max(traced) if traced else None,
+            "rss_peak_bytes": int(max(rss)) if rss else None,
+        }
+
+    def stage_memory(self, root: Optional[tracing.Span]) -> List[Dict[str, Any]]:
+        """Peak memory inside every (nested) stage span of the session."""
+        rows: List[Dict[str, Any]] = []
+
+        def walk(span: tracing.Span, depth: int) -> None:
+            for child in span.children:
+                duration = child.duration or 0.0
+                rows.append({
+                    "stage": child.name,
+                    "depth": depth,
+                    "offset_s": round(child.start - self.started, 3),
+                    "duration_s": round(duration, 3),
+                    **self._window(child.start, child.start + duration),
+                })
+                walk(child, depth + 1)
+
+        if root is not None:
+            walk(root, 0)
+        return rows
+
+    def report(self, root: Optional[tracing.Span]) -> Dict[str, Any]:
+        rss = [m[2] for m in self.memory if m[2] is not None]
+        return {
+            "session_id": self.session_id,
+            "started": round(self.started, 3),
+            "duration_s": round(self.duration, 3),
+            "interval_s": self.interval,
+            "stack_samples": sum(self.stacks.values()),
+            "traced_peak_bytes": self.traced_peak,
+            "rss_peak_bytes": int(max(rss)) if rss else None,
+            "stages": self.stage_memory(root),
+            "memory": [
+                {"offset_s": round(t - self.started, 3), "traced_bytes": traced,
+                 "rss_bytes": int(r) if r is not None else None}
+                for t, traced, r in self.memory
+            ],
+        }
+
+    def write(self, directory: str, root: Optional[tracing.Span]) -> List[str]:
+        os.makedirs(directory, exist_ok=True)
+        paths = [os.path.join(directory, STACKS_FILE), os.path.join(directory, MEMORY_FILE)]
+        with open(paths[0], "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        with open(paths[1], "w", encoding="utf-8") as f:
+            json.dump(self.report(root), f, indent=1)
+        return paths
+
+
+@contextmanager
+def profile_session(session_id: str, output_dir: str,
+                    root: Optional[tracing.Span] = None) -> Iterator[Optional[SessionProfile]]:
+    """Profile the block if a run is armed (yields None otherwise).
+
+    ``root`` is the session's span; its stages are read when the block ends.
+    """
+    if not _take():
+        yield None
+        return
+    prof = SessionProfile(session_id)
+    with _lock:
+        _active[session_id] = prof
+    logger.info(f"🔬 Profiling session {session_id}")
+    prof.start()
+    try:
+        yield prof
+    finally:
+        prof.stop()
+        with _lock:
+            _active.pop(session_id, None)
+        try:
+            directory = profile_dir(output_dir, session_id)
+            prof.write(directory, root)
+            with _lock:
+                _recent.append({"session_id": session_id, "finished": round(time.time(), 3),
+                                "samples": sum(prof.stacks.values()), "files": list(PROFILE_FILES)})
+            logger.info(f"🔬 Session profile written to {directory}")
+        except Exception as e:
+            logger.warning(f"Session profile not written for {session_id}: {e}")
@@ -5,10 +5,11 @@ Provides command interface for confirming/rejecting scan sessions via Telegram.
 """
 from __future__ import annotations
 
+import hashlib
 import os
 import logging
 import threading
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set
 from dataclasses import dataclass, field
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -32,10 +33,19 @@ logger = logging.getLogger(__name__)
 # is populated before the edit is attempted.
 _IMAGE_COUNT_DEBOUNCE_SECS = 1.5
 
+# Telegram caps callback_data at 64 bytes, which "cmd_confirm_print:<session id>"
+# exceeds for long device names, so buttons carry a short token of the id instead.
+_CALLBACK_TOKEN_LEN = 12
+
 
 @dataclass
 class TelegramBot(NotificationChannel):
-    """Telegram bot for handling scan session confirmations."""
+    """Telegram bot for handling scan session confirmations.
+
+    Several scanners can have sessions pending at once, so every piece of
+    per-session state (info, tracked messages, confirmer, debounce timer) is
+    keyed by session id and inline buttons carry a token of the id they act on.
+    """
 
     config: TelegramConfig
     session_timeout_seconds: int = 300  # mirrors Config.session_timeout_seconds for display
@@ -44,15 +54,20 @@ class TelegramBot(NotificationChannel):
     _polling_loop: Optional[Any] = field(default=None, repr=False)  # event loop running run_polling
     _authorized_chats: Dict[int, int] = field(default_factory=dict)  # user_id -> chat_id
     _session_callback: Optional[Any] = field(default=None, repr=False)
+    # Most recently updated pending session — target of bare /confirm and /reject
     _latest_session_info: Optional[Dict] = field(default=None, repr=False)
-    _confirmer_chat_id: Optional[int] = field(default=None, repr=False)  # who confirmed — gets the PDF
-    # Track message_ids sent per chat so we can edit them (remove buttons) when session resolves.
-    _notification_messages: Dict[int, int] = field(default_factory=dict, repr=False)  # chat_id -> message_id
+    # Every session awaiting confirmation: session_id -> session info
+    _pending_sessions: Dict[str, Dict] = field(default_factory=dict, repr=False)
+    # Who confirmed each session — gets the PDF: session_id -> chat_id
+    _confirmer_chat_ids: Dict[str, int] = field(default_factory=dict, repr=False)
+    # Track message_ids sent per session so we can edit them (remove buttons) when it resolves.
+    # session_id -> {chat_id -> message_id}
+    _notification_messages: Dict[str, Dict[int, int]] = field(default_factory=dict, repr=False)
     # Debounce timers for live image-count edits: session_id -> threading.Timer
     _update_timers: Dict[str, Any] = field(default_factory=dict, repr=False)
-    # Set synchronously in notify_session_ready (before async send) so notify_image_added
-    # can start debounce timers even while the initial send is still in-flight.
-    _session_ready_notified: bool = field(default=False, repr=False)
+    # Session ids added synchronously in notify_session_ready (before async send) so
+    # notify_image_added can start debounce timers even while the initial send is in-flight.
+    _ready_notified: Set[str] = field(default_factory=set, repr=False)
 
     @property
     def name(self) -> str:
@@ -66,45 +81,72 @@ class TelegramBot(NotificationChannel):
             "authorized_users": len(self._authorized_chats),
             "notify_chat_ids": self.config.notify_chat_ids,
             "registered_chats": {str(uid): cid for uid, cid in self._authorized_chats.items()},
-            "pending_session": self._latest_session_info is not None,
+            "pending_session": bool(self._pending_sessions),
+            "pending_sessions": len(self._pending_sessions),
             "message": "Bot operational" if self._running else "Bot stopped",
         }
 
-    @property
-    def _session_keyboard(self) -> InlineKeyboardMarkup:
-        """Confirm/reject keyboard shared by initial notification and live-count edits."""
+    @staticmethod
+    def _callback_token(session_id: str) -> str:
+        """Short stand-in for ``session_id`` in inline button callback data."""
+        return hashlib.sha1(session_id.encode()).hexdigest()[:_CALLBACK_TOKEN_LEN]
+
+    def _session_from_token(self, token: str) -> str:
+        """Session id a button token stands for (pending or still tracked sessions)."""
+        for session_id in list(self._pending_sessions) + list(self._notification_messages):
+            if self._callback_token(session_id) == token:
+                return session_id
+        return token  # unknown session, or a button carrying the full id
+
+    @classmethod
+    def _session_keyboard(cls, session_id: str) -> InlineKeyboardMarkup:
+        """Confirm/reject keyboard bound to one session (initial notification and live edits)."""
+        token = cls._callback_token(session_id)
         return InlineKeyboardMarkup([
             [
-                InlineKeyboardButton("\u2705 Confirm", callback_data="cmd_confirm"),
-                InlineKeyboardButton("\U0001f5a8 Confirm + Print", callback_data="cmd_confirm_print"),
+                InlineKeyboardButton("✅ Confirm", callback_data=f"cmd_confirm:{token}"),
+                InlineKeyboardButton(
+                    "\U0001f5a8 Confirm + Print", callback_data=f"cmd_confirm_print:{token}"
+                ),
             ],
-            [InlineKeyboardButton("\u274c Reject", callback_data="cmd_reject")],
+            [InlineKeyboardButton("❌ Reject", callback_data=f"cmd_reject:{token}")],
         ])
 
+    @staticmethod
+    def _session_ready_text(session_info: Dict[str, Any]) -> str:
+        device = session_info.get("device")
+        device_line = f"<b>Device:</b> {device}\n" if device and device != "default" else ""
+        return (
+            f"\U0001f4c4 <b>Session Ready for Confirmation</b>\n\n"
+            f"<b>ID:</b> {session_info.get('id', 'N/A')}\n"
+            f"<b>Mode:</b> {session_info.get('mode', 'N/A')}\n"
+            f"{device_line}"
+            f"<b>Images:</b> {session_info.get('image_count', 0)}"
+        )
+
     def notify_session_ready(self, session_info: Dict[str, Any]) -> None:
         """Store session info and notify all registered chats with inline confirm/reject buttons."""
         self.update_session_info(session_info)
-        self._session_ready_notified = True  # sync flag — set before async send
+        session_id = session_info.get("id", "")
+        self._ready_notified.add(session_id)  # sync flag — set before async send
         if not self.config.notify_on_session_ready:
             return
-        msg = (
-            f"\U0001f4c4 <b>Session Ready for Confirmation</b>\n\n"
-            f"<b>ID:</b> {session_info.get('id', 'N/A')}\n"
-            f"<b>Mode:</b> {session_info.get('mode', 'N/A')}\n"
-            f"<b>Images:</b> {session_info.get('image_count', 0)}"
+        self.send_notification(
+            self._session_ready_text(session_info),
+            reply_markup=self._session_keyboard(session_id),
+            session_id=session_id,
         )
-        self.send_notification(msg, reply_markup=self._session_keyboard)
 
     def notify_image_added(self, session_info: Dict[str, Any]) -> None:
-        """Debounced: edit tracked notification messages with updated image count."""
+        """Debounced: edit the session's tracked notification messages with updated image count."""
         self.update_session_info(session_info)
+        session_id = session_info.get("id", "")
         # Gate on the synchronous flag, not _notification_messages.
         # When 2 images arrive fast, the initial send may still be in-flight
-        # (_notification_messages empty) but _session_ready_notified is already True.
-        # The 1.5s debounce ensures _notification_messages is populated by fire time.
-        if not self._session_ready_notified:
+        # (no tracked messages yet) but the session is already in _ready_notified.
+        # The 1.5s debounce ensures the messages are tracked by fire time.
+        if session_id not in self._ready_notified:
             return
-        session_id = session_info.get("id", "")
         # Cancel existing pending timer for this session
         existing = self._update_timers.pop(session_id, None)
         if existing:
@@ -117,23 +159,22 @@ class TelegramBot(NotificationChannel):
         """Timer callback: edit the Telegram message with the latest image count."""
         session_id = session_info.get("id", "")
         self._update_timers.pop(session_id, None)
-        if not self._notification_messages:
+        messages = self._notification_messages.get(session_id)
+        if not messages:
             return
-        # Prefer the live-updated _latest_session_info for freshest count
-        info = self._latest_session_info or session_info
-        msg = (
-            f"\U0001f4c4 <b>Session Ready for Confirmation</b>\n\n"
-            f"<b>ID:</b> {info.get('id', 'N/A')}\n"
-            f"<b>Mode:</b> {info.get('mode', 'N/A')}\n"
-            f"<b>Images:</b> {info.get('image_count', session_info.get('image_count', 0))}"
+        # Prefer the live-updated pending info for freshest count
+        info = self._pending_sessions.get(session_id) or session_info
+        self._schedule(
+            self._edit_notifications_with_keyboard(
+                dict(messages), self._session_ready_text(info), self._session_keyboard(session_id)
+            )
         )
-        self._schedule(self._edit_notifications_with_keyboard(msg, self._session_keyboard))
 
     async def _edit_notifications_with_keyboard(
-        self, new_text: str, keyboard: InlineKeyboardMarkup
+        self, messages: Dict[int, int], new_text: str, keyboard: InlineKeyboardMarkup
     ) -> None:
-        """Edit all tracked session-notification messages and re-attach the given keyboard."""
-        for chat_id, message_id in list(self._notification_messages.items()):
+        """Edit a snapshot of session-notification messages and re-attach the given keyboard."""
+        for chat_id, message_id in messages.items():
             try:
                 await self._application.bot.edit_message_text(
                     chat_id=chat_id,
@@ -145,12 +186,26 @@ class TelegramBot(NotificationChannel):
             except Exception as e:
                 logger.debug(f"Could not edit notification in chat {chat_id}: {e}")
 
-    def _cancel_update_timers(self) -> None:
-        """Cancel all pending debounce timers (called on session resolve)."""
-        for t in self._update_timers.values():
-            t.cancel()
-        self._update_timers.clear()
-        self._session_ready_notified = False
+    def _forget_session(self, session_id: str) -> Dict[int, int]:
+        """Drop all tracking for a resolved session; returns its tracked messages."""
+        timer = self._update_timers.pop(session_id, None)
+        if timer:
+            timer.cancel()
+        self._ready_notified.discard(session_id)
+        self._pending_sessions.pop(session_id, None)
+        messages = self._notification_messages.pop(session_id, {})
+        if self._latest_session_info and self._latest_session_info.get("id") == session_id:
+            remaining = list(self._pending_sessions.values())
+            self._latest_session_info = remaining[-1] if remaining else None
+        return messages
+
+    def _resolve_session_id(self, session_id: Optional[str]) -> Optional[str]:
+        """Pending session an action targets: the given id, else the most recent one."""
+        if session_id:
+            return session_id if session_id in self._pending_sessions else None
+        if self._latest_session_info:
+            return self._latest_session_info.get("id")
+        return None
 
     def notify_session_processed(
         self,
@@ -160,20 +215,18 @@ class TelegramBot(NotificationChannel):
         pdf_path: Optional[str] = None,
     ) -> None:
         """Notify chats that a session has been processed, and send the PDF to the confirmer."""
-        icon = "\u2705" if success else "\u274c"
+        icon = "✅" if success else "❌"
         action = "ready" if success else "failed"
         summary = f"{icon} <b>Session {action}</b>\n<b>ID:</b> {session_id}\n<b>Mode:</b> {mode}"
         self.send_notification(summary)
 
         # Send PDF document to whoever pressed Confirm (if available)
-        if success and pdf_path and self._confirmer_chat_id:
+        confirmer_chat_id = self._confirmer_chat_ids.pop(session_id, None)
+        if success and pdf_path and confirmer_chat_id:
             self._schedule(
-                self._send_pdf(self._confirmer_chat_id, pdf_path, session_id)
+                self._send_pdf(confirmer_chat_id, pdf_path, session_id)
             )
-        self._cancel_update_timers()
-        self._latest_session_info = None
-        self._confirmer_chat_id = None
-        self._notification_messages.clear()
+        self._forget_session(session_id)
 
     async def _send_pdf(self, chat_id: int, pdf_path: str, session_id: str) -> None:
         """Send the finished PDF as a document to a specific chat."""
@@ -193,22 +246,6 @@ class TelegramBot(NotificationChannel):
         except Exception as e:
             logger.error(f"Failed to send PDF to chat {chat_id}: {e}")
 
-    async def _edit_all_notifications(self, new_text: str) -> None:
-        """Edit all tracked session-notification messages: update text and remove buttons."""
-        _empty_kb = InlineKeyboardMarkup([])
-        for chat_id, message_id in list(self._notification_messages.items()):
-            try:
-                await self._application.bot.edit_message_text(
-                    chat_id=chat_id,
-                    message_id=message_id,
-                    text=new_text,
-                    parse_mode="HTML",
-                    reply_markup=_empty_kb,
-                )
-            except Exception as e:
-                logger.debug(f"Could not edit notification in chat {chat_id}: {e}")
-        self._notification_messages.clear()
-
     async def _edit_messages(self, messages: Dict[int, int], new_text: str) -> None:
         """Edit an explicit snapshot of messages (chat_id → message_id) and remove buttons.
 
@@ -229,25 +266,30 @@ class TelegramBot(NotificationChannel):
             except Exception as e:
                 logger.debug(f"Could not edit notification in chat {chat_id}: {e}")
 
-    def notify_session_action(self, confirmed: bool, action_by: str = "Web UI") -> None:
+    def notify_session_action(
+        self, confirmed: bool, action_by: str = "Web UI", session_id: Optional[str] = None
+    ) -> None:
         """NotificationChannel hook: edit tracked messages when action came from an external
         source (e.g. Web UI).  When Telegram itself triggered the action, _do_confirm /
-        reject_command already snapshot+cleared _notification_messages synchronously, so
-        this dict is empty and the edit part becomes a safe no-op.
+        reject_command already snapshot+cleared the session's messages synchronously, so
+        the edit part becomes a safe no-op.
         Always clears session state so /status reflects the resolved session.
+        ``session_id`` None resolves every pending session (legacy single-session callers).
         """
-        self._cancel_update_timers()
-        messages_snapshot = dict(self._notification_messages)
-        self._notification_messages.clear()
-        # Clear session state regardless of source so /status returns "no active session"
-        self._latest_session_info = None
-        self._confirmer_chat_id = None
-        if not messages_snapshot:
-            return
+        if session_id is not None:
+            session_ids = [session_id]
+        else:
+            session_ids = list(set(self._pending_sessions) | set(self._notification_messages))
         label = "Confirmed" if confirmed else "Rejected"
         icon = "⏳" if confirmed else "❌"
         text = f"{icon} <b>Session {label}</b> from <i>{action_by}</i>"
-        self._schedule(self._edit_messages(messages_snapshot, text))
+        for sid in session_ids:
+            messages_snapshot = self._forget_session(sid)
+            if not confirmed:
+                # Keep the confirmer of a confirmed session: it still needs the PDF
+                self._confirmer_chat_ids.pop(sid, None)
+            if messages_snapshot:
+                self._schedule(self._edit_messages(messages_snapshot, text))
 
     def start(self) -> None:
         """Implement NotificationChannel.start() by starting polling."""
@@ -276,12 +318,17 @@ class TelegramBot(NotificationChannel):
         return cls(config=config.telegram, session_timeout_seconds=config.session_timeout_seconds)
 
     def set_session_callback(self, callback: Any) -> None:
-        """Set callback for session state changes."""
+        """Set callback for session commands: (confirm, print_requested, session_id) -> None."""
         self._session_callback = callback
 
     def update_session_info(self, session_info: Dict[str, Any]) -> None:
-        """Update the latest session info for display in bot."""
+        """Update the pending session info for display in bot."""
         self._latest_session_info = session_info
+        session_id = session_info.get("id")
+        if session_id:
+            # Re-insert so dict order tracks recency
+            self._pending_sessions.pop(session_id, None)
+            self._pending_sessions[session_id] = session_info
 
     def is_authorized(self, user_id: int) -> bool:
         """Check if user is authorized to use bot commands."""
@@ -316,9 +363,9 @@ class TelegramBot(NotificationChannel):
             "📋 <b>Available Commands:</b>\n"
             "/start - Register and show this message\n"
             "/help - Show help and commands\n"
-            "/status - Show current session status\n"
-            "/confirm - Confirm current session\n"
-            "/reject - Reject current session\n\n"
+            "/status - Show pending sessions\n"
+            "/confirm [id] - Confirm a session (latest if no ID)\n"
+            "/reject [id] - Reject a session (latest if no ID)\n\n"
             "⏱️ Sessions will auto-timeout after "
             f"{self.session_timeout_seconds // 60} minutes of inactivity."
         )
@@ -335,10 +382,11 @@ class TelegramBot(NotificationChannel):
             "📖 <b>Help</b>\n\n"
             "<b>/start</b> - Register with the bot\n"
             "<b>/help</b> - Show this help message\n"
-            "<b>/status</b> - Show current session status and pending actions\n"
-            "<b>/confirm</b> - Confirm the current scanning session and process it\n"
-            "<b>/reject</b> - Reject and discard the current session\n\n"
-            "<b>Note:</b> Only one session can be active at a time.\n"
+            "<b>/status</b> - Show pending sessions and their actions\n"
+            "<b>/confirm [id]</b> - Confirm a scanning session and process it\n"
+            "<b>/reject [id]</b> - Reject and discard a scanning session\n\n"
+            "<b>Note:</b> Each scanner has its own session. Buttons act on the session "
+            "they were sent with; commands without an ID act on the most recent one.\n"
             f"Auto-timeout: {self.session_timeout_seconds // 60} minutes"
         )
 
@@ -352,35 +400,33 @@ class TelegramBot(NotificationChannel):
         await update.message.reply_text(help_text, parse_mode="HTML", reply_markup=reply_markup)
 
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Handle /status command."""
+        """Handle /status command: one message per pending session, most recent last."""
         if not self.is_authorized(update.effective_user.id):
-            await update.message.reply_text("❌ You are not authorized to use this bot.")
+            await update.effective_message.reply_text("❌ You are not authorized to use this bot.")
             return
 
-        if not self._latest_session_info:
-            await update.message.reply_text(
+        if not self._pending_sessions:
+            await update.effective_message.reply_text(
                 "📭 No active session.\n"
                 "Scans will automatically appear here when images are uploaded."
             )
             return
 
-        session = self._latest_session_info
-        status_text = (
-            f"📊 <b>Session Status</b>\n\n"
-            f"<b>Session ID:</b> {session.get('id', 'N/A')}\n"
-            f"<b>Mode:</b> {session.get('mode', 'N/A')}\n"
-            f"<b>State:</b> {session.get('state', 'N/A')}\n"
-            f"<b>Images:</b> {session.get('image_count', 0)}\n"
-            f"<b>Timeout:</b> {self.session_timeout_seconds // 60} minutes"
-        )
-
-        keyboard = [
-            [InlineKeyboardButton("✅ Confirm", callback_data="cmd_confirm")],
-            [InlineKeyboardButton("❌ Reject", callback_data="cmd_reject")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        await update.message.reply_text(status_text, parse_mode="HTML", reply_markup=reply_markup)
+        for session_id, session in list(self._pending_sessions.items()):
+            device = session.get("device")
+            device_line = f"<b>Device:</b> {device}\n" if device and device != "default" else ""
+            status_text = (
+                f"📊 <b>Session Status</b>\n\n"
+                f"<b>Session ID:</b> {session.get('id', 'N/A')}\n"
+                f"<b>Mode:</b> {session.get('mode', 'N/A')}\n"
+                f"{device_line}"
+                f"<b>State:</b> {session.get('state', 'N/A')}\n"
+                f"<b>Images:</b> {session.get('image_count', 0)}\n"
+                f"<b>Timeout:</b> {self.session_timeout_seconds // 60} minutes"
+            )
+            await update.effective_message.reply_text(
+                status_text, parse_mode="HTML", reply_markup=self._session_keyboard(session_id)
+            )
 
     async def _reply(self, update: Update, text: str) -> None:
         """Reply to either a message or a callback_query edit.
@@ -399,13 +445,22 @@ class TelegramBot(NotificationChannel):
         elif update.message:
             await update.message.reply_text(text, parse_mode="HTML")
 
-    async def _do_confirm(self, update: Update, print_requested: bool = False) -> None:
+    @staticmethod
+    def _command_session_id(context: Optional[ContextTypes.DEFAULT_TYPE]) -> Optional[str]:
+        """Optional session id argument of /confirm and /reject."""
+        args = getattr(context, "args", None) if context is not None else None
+        return args[0] if args else None
+
+    async def _do_confirm(
+        self, update: Update, print_requested: bool = False, session_id: Optional[str] = None
+    ) -> None:
         """Shared confirm logic used by /confirm command and inline buttons."""
         user = update.effective_user
         if not self.is_authorized(user.id):
             await self._reply(update, "❌ You are not authorized to use this bot.")
             return
-        if not self._latest_session_info:
+        target = self._resolve_session_id(session_id)
+        if not target:
             await self._reply(update, "❌ No active session to confirm.")
             return
         if not self._session_callback:
@@ -420,14 +475,13 @@ class TelegramBot(NotificationChannel):
         )
 
         # Remember who confirmed so we can send them the finished PDF
-        self._confirmer_chat_id = update.effective_chat.id if update.effective_chat else user.id
+        self._confirmer_chat_ids[target] = update.effective_chat.id if update.effective_chat else user.id
 
         # Snapshot and sync-clear tracked messages BEFORE scheduling the edit.
         # This prevents a race where _handle_telegram_command (called right after
-        # _session_callback below) sees a non-empty dict and double-edits.
+        # _session_callback below) sees tracked messages and double-edits.
         confirmer_name = user.first_name or str(user.id)
-        messages_snapshot = dict(self._notification_messages)
-        self._notification_messages.clear()
+        messages_snapshot = self._notification_messages.pop(target, {})
         if messages_snapshot:
             self._schedule(
                 self._edit_messages(
@@ -437,50 +491,59 @@ class TelegramBot(NotificationChannel):
             )
 
         try:
-            self._session_callback(confirm=True, print_requested=print_requested)
+            self._session_callback(confirm=True, print_requested=print_requested, session_id=target)
         except Exception as e:
             logger.error(f"Error confirming session: {e}")
-            self._confirmer_chat_id = None
+            self._confirmer_chat_ids.pop(target, None)
             await self._reply(update, f"❌ Error confirming session: {e}")
 
     async def confirm_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Handle /confirm command."""
-        await self._do_confirm(update, print_requested=False)
+        """Handle /confirm [session_id] command."""
+        await self._do_confirm(
+            update, print_requested=False, session_id=self._command_session_id(context)
+        )
 
-    async def reject_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Handle /reject command."""
+    async def reject_command(
+        self,
+        update: Update,
+        context: ContextTypes.DEFAULT_TYPE,
+        session_id: Optional[str] = None,
+    ) -> None:
+        """Handle /reject [session_id] command (and the inline Reject button)."""
         user = update.effective_user
         if not self.is_authorized(user.id):
             await self._reply(update, "❌ You are not authorized to use this bot.")
             return
-        if not self._latest_session_info:
+        if session_id is None and not update.callback_query:
+            session_id = self._command_session_id(context)
+        target = self._resolve_session_id(session_id)
+        if not target:
             await self._reply(update, "❌ No active session to reject.")
             return
         if not self._session_callback:
             await self._reply(update, "⚠️ Bot not connected to session manager.")
             return
-        await self._reply(update, "\u23f3 Reject received \u2014 cleaning up\u2026")
+        await self._reply(update, "⏳ Reject received — cleaning up…")
         # Snapshot and sync-clear before scheduling edit (prevents race with _handle_telegram_command)
         rejecter_name = user.first_name or str(user.id)
-        messages_snapshot = dict(self._notification_messages)
-        self._notification_messages.clear()
+        messages_snapshot = self._notification_messages.pop(target, {})
         if messages_snapshot:
             self._schedule(
                 self._edit_messages(
                     messages_snapshot,
-                    f"\u274c <b>Session rejected</b> by {rejecter_name}",
+                    f"❌ <b>Session rejected</b> by {rejecter_name}",
                 )
             )
         try:
-            self._session_callback(confirm=False, print_requested=False)
-            self._latest_session_info = None
-            self._confirmer_chat_id = None
+            self._session_callback(confirm=False, print_requested=False, session_id=target)
+            self._forget_session(target)
+            self._confirmer_chat_ids.pop(target, None)
         except Exception as e:
             logger.error(f"Error rejecting session: {e}")
             await self._reply(update, f"❌ Error rejecting session: {e}")
 
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Handle inline button callbacks."""
+        """Handle inline button callbacks (``cmd_<action>[:<session token>]``)."""
         query = update.callback_query
         await query.answer()
 
@@ -488,16 +551,17 @@ class TelegramBot(NotificationChannel):
             await query.edit_message_text("❌ You are not authorized.")
             return
 
-        data = query.data
+        data, _, token = (query.data or "").partition(":")
+        session_id = self._session_from_token(token) if token else None
 
         if data == "cmd_status":
             await self.status_command(update, context)
         elif data == "cmd_confirm":
-            await self._do_confirm(update, print_requested=False)
+            await self._do_confirm(update, print_requested=False, session_id=session_id)
         elif data == "cmd_confirm_print":
-            await self._do_confirm(update, print_requested=True)
+            await self._do_confirm(update, print_requested=True, session_id=session_id)
         elif data == "cmd_reject":
-            await self.reject_command(update, context)
+            await self.reject_command(update, context, session_id=session_id)
 
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle errors."""
@@ -617,8 +681,13 @@ class TelegramBot(NotificationChannel):
         message: str,
         parse_mode: str = "HTML",
         reply_markup: Optional[InlineKeyboardMarkup] = None,
+        session_id: Optional[str] = None,
     ) -> None:
-        """Send a message to all configured and registered chat IDs."""
+        """Send a message to all configured and registered chat IDs.
+
+        Messages sent for a ``session_id`` are tracked so they can be edited
+        when that session resolves.
+        """
         if not self._running or not self._application:
             logger.warning("Cannot send notification: bot not running")
             return
@@ -649,7 +718,8 @@ class TelegramBot(NotificationChannel):
                         reply_markup=reply_markup,
                     )
                     # Track message_id so we can edit/clear it later
-                    self._notification_messages[chat_id] = msg.message_id
+                    if session_id is not None:
+                        self._notification_messages.setdefault(session_id, {})[chat_id] = msg.message_id
                 except Exception as e:
                     err = str(e)
                     if "Forbidden" in err or "bot can't initiate" in err:
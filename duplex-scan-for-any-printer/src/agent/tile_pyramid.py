@@ -0,0 +1,205 @@
+"""Deep Zoom (DZI) tile pyramid for inspecting full-resolution scans.
+
+``/api/images`` only offers fixed widths or the whole original, so zooming
+into a 600-DPI scan meant downloading 10–30 MB through ingress. This serves
+the source as a Deep Zoom pyramid instead (the layout OpenSeadragon reads):
+
+- level ``max_level`` is the full image, each level below halves it (rounding
+  up) down to 1×1; levels are cut into ``tile_size`` tiles with ``overlap``
+  px shared with each neighbour;
+- tiles are made lazily. A level is decoded once (JPEG DCT-reduced where the
+  codec allows, then resized) and kept in a byte-bounded in-memory LRU, so
+  neighbouring tiles of the same level are plain crops;
+- every tile is cached in the derivative store keyed by the source hash, so a
+  tile is encoded once and the URL can be served as immutable.
+"""
+from __future__ import annotations
+
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from agent.derivative_store import DerivativeStore
+from agent import tuning
+from agent.image_buffers import view_bgr
+
+DEFAULT_TILE_SIZE = 254
+DEFAULT_OVERLAP = 1
+DEFAULT_CACHE_MB = 128
+FORMATS = {"jpg": "image/jpeg", "webp": "image/webp"}
+_TILE_QUALITY = {"jpg": 85, "webp": 80}
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                  (2, cv2.IMREAD_REDUCED_COLOR_2))
+_MAX_INFOS = 1024
+
+
+@dataclass(frozen=True)
+class PyramidInfo:
+    width: int
+    height: int
+    tile_size: int = DEFAULT_TILE_SIZE
+    overlap: int = DEFAULT_OVERLAP
+
+    @property
+    def max_level(self) -> int:
+        return int(math.ceil(math.log2(max(self.width, self.height, 1))))
+
+    def level_size(self, level: int) -> Tuple[int, int]:
+        scale = 2 ** (self.max_level - level)
+        return max(1, -(-self.width // scale)), max(1, -(-self.height // scale))
+
+    def tile_counts(self, level: int) -> Tuple[int, int]:
+        w, h = self.level_size(level)
+        return -(-w // self.tile_size), -(-h // self.tile_size)
+
+    def tile_rect(self, level: int, col: int, row: int) -> Tuple[int, int, int, int]:
+        """(x0, y0, x1, y1) of a tile within its level, overlap included.
+
+        Raises ``IndexError`` for a level or tile outside the pyramid.
+        """
+        if not 0 <= level <= self.max_level:
+            raise IndexError(f"Level {level} out of range")
+        cols, rows = self.tile_counts(level)
+        if not (0 <= col < cols and 0 <= row < rows):
+            raise IndexError(f"Tile {col}_{row} out of range at level {level}")
+        w, h = self.level_size(level)
+        ts, ov = self.tile_size, self.overlap
+        x0 = col * ts - (ov if col else 0)
+        y0 = row * ts - (ov if row else 0)
+        return x0, y0, min(w, (col + 1) * ts + ov), min(h, (row + 1) * ts + ov)
+
+    def dzi_xml(self, fmt: str) -> str:
+        return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" '
+                f'Format="{fmt}" Overlap="{self.overlap}" TileSize="{self.tile_size}">'
+                f'<Size Width="{self.width}" Height="{self.height}"/></Image>')
+
+
+class TilePyramid:
+    def __init__(self, store: DerivativeStore, tile_size: int = DEFAULT_TILE_SIZE,
+                 overlap: int = DEFAULT_OVERLAP, cache_bytes: int = DEFAULT_CACHE_MB * 1024 * 1024):
+        self.store = store
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.cache_bytes = cache_bytes
+        self._lock = threading.Lock()
+        self._infos: "OrderedDict[str, PyramidInfo]" = OrderedDict()
+        self._levels: "OrderedDict[Tuple[str, int], np.ndarray]" = OrderedDict()
+        self._level_bytes = 0
+        self._level_locks: Dict[Tuple[str, int], threading.Lock] = {}
+
+    def info(self, source_path: str) -> PyramidInfo:
+        """Pyramid geometry of ``source_path`` (header read only, memoised by content)."""
+        digest = self.store.source_digest(source_path)
+        with self._lock:
+            info = self._infos.get(digest)
+            if info is not None:
+                self._infos.move_to_end(digest)
+                return info
+        with Image.open(source_path) as im:
+            width, height = im.size
+        info = PyramidInfo(width, height, self.tile_size, self.overlap)
+        with self._lock:
+            self._infos[digest] = info
+            while len(self._infos) > _MAX_INFOS:
+                self._infos.popitem(last=False)
+        return info
+
+    def version(self, source_path: str) -> str:
+        """Short content hash; tile URLs carrying it never change meaning."""
+        return self.store.source_digest(source_path)[:16]
+
+    # ── Levels ──────────────────────────────────────────────────────────────
+
+    def _level(self, source_path: str, info: PyramidInfo, level: int) -> np.ndarray:
+        key = (self.store.source_digest(source_path), level)
+        with self._lock:
+            cached = self._levels.get(key)
+            if cached is not None:
+                self._levels.move_to_end(key)
+                return cached
+            build_lock = self._level_locks.setdefault(key, threading.Lock())
+
+        with build_lock:  # one decode per level, however many tiles ask at once
+            with self._lock:
+                cached = self._levels.get(key)
+            if cached is None:
+                cached = self._decode_level(source_path, info, level)
+                with self._lock:
+                    self._levels[key] = cached
+                    self._level_bytes += cached.nbytes
+                    # Soft cap: a single level larger than the budget is still kept alone
+                    while self._level_bytes > self.cache_bytes and len(self._levels) > 1:
+                        _, old = self._levels.popitem(last=False)
+                        self._level_bytes -= old.nbytes
+        with self._lock:
+            self._level_locks.pop(key, None)
+        return cached
+
+    @staticmethod
+    def _decode_level(source_path: str, info: PyramidInfo, level: int) -> np.ndarray:
+        factor = 2 ** (info.max_level - level)
+        img = None
+        for reduce_by, flag in _REDUCED_FLAGS:
+            if reduce_by <= factor:
+                img = cv2.imread(source_path, flag)
+                break
+        if img is None:
+            # Full resolution: the page the agent already decoded, if still shared
+            img = view_bgr(source_path)
+        if img is None:
+            img = cv2.imread(source_path)
+        if img is None:
+            raise ValueError(f"Failed to load image: {source_path}")
+        w, h = info.level_size(level)
+        if (img.shape[1], img.shape[0]) != (w, h):
+            img = cv2.resize(img, (w, h), interpolation=cv2.INTER_AREA)
+        return img
+
+    # ── Tiles ───────────────────────────────────────────────────────────────
+
+    def tile(self, source_path: str, level: int, col: int, row: int, fmt: str = "jpg") -> str:
+        """Path of the cached tile, generated on first request.
+
+        Raises ``IndexError`` outside the pyramid and ``ValueError`` for an
+        unsupported format.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        info = self.info(source_path)
+        x0, y0, x1, y1 = info.tile_rect(level, col, row)
+
+        def generate(src: str, out: str) -> None:
+            crop = self._level(src, info, level)[y0:y1, x0:x1]
+            if fmt == "webp":
+                params = [cv2.IMWRITE_WEBP_QUALITY, _TILE_QUALITY["webp"]]
+            else:
+                params = [cv2.IMWRITE_JPEG_QUALITY, _TILE_QUALITY["jpg"]]
+            ok, buf = cv2.imencode(f".{fmt}", crop, params)
+            if not ok:
+                raise ValueError("Failed to encode tile")
+            with open(out, "wb") as f:
+                f.write(buf.tobytes())
+
+        variant = f"dz{self.tile_size}o{self.overlap}-{level}-{col}_{row}"
+        return self.store.get(source_path, variant, fmt, generate)
+
+
+_pyramids: Dict[str, TilePyramid] = {}
+_pyramids_lock = threading.Lock()
+
+
+def get_tile_pyramid(store: DerivativeStore) -> TilePyramid:
+    """Shared pyramid for ``store``."""
+    with _pyramids_lock:
+        pyramid = _pyramids.get(store.root)
+        if pyramid is None:
+            cache_mb = tuning.settings()["tile_cache_mb"]
+            pyramid = _pyramids[store.root] = TilePyramid(store, cache_bytes=cache_mb * 1024 * 1024)
+        return pyramid
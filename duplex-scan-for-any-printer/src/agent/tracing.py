@@ -0,0 +1,356 @@
+"""Timing spans and Prometheus metrics for the scan pipeline.
+
+- ``span(name, **attrs)`` times a block and nests inside the enclosing span
+  (per thread / asyncio task). A session is the outermost span
+  (``session_span``); each span that ends inside it is observed in
+  ``scan_stage_duration_seconds{mode,stage}``, the session itself in
+  ``scan_session_duration_seconds{mode,outcome}``. ``record(name, seconds)``
+  adds a stage the pipeline already timed itself. The span trees of recent
+  sessions are kept for ``/api/traces``.
+- ``Counter``, ``Gauge`` and ``Histogram`` are minimal thread-safe metrics
+  with labels. ``render()`` writes every registered metric in the
+  Prometheus text format (``/metrics`` on the agent API), so no client
+  library is needed.
+
+Metrics are per process: the agent's pipeline is what is instrumented here.
+"""
+from __future__ import annotations
+
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+TRACE_HISTORY = 50
+
+_lock = threading.Lock()
+_registry: List["_Metric"] = []
+
+
+def _fmt(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labelset(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), register: bool = True):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        if register:
+            with _lock:
+                _registry.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def label_values(self) -> List[Tuple[str, ...]]:
+        with _lock:
+            return list(self._values)
+
+    def _samples(self) -> List[Tuple[str, Sequence[Tuple[str, str]], float]]:
+        with _lock:
+            items = list(self._values.items())
+        return [("", tuple(zip(self.labels, key)), value) for key, value in items]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, pairs, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_labelset(pairs)} {_fmt(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with _lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    """Set directly, or computed at scrape time from ``fn`` (label-less)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 fn: Optional[Callable[[], Optional[float]]] = None, register: bool = True):
+        super().__init__(name, documentation, labels, register)
+        self.fn = fn
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: Any) -> float:
+        if self.fn is not None:
+            return self.fn() or 0.0
+        with _lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        if self.fn is None:
+            return super()._samples()
+        try:
+            value = self.fn()
+        except Exception:
+            value = None
+        return [] if value is None else [("", (), value)]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS, register: bool = True):
+        super().__init__(name, documentation, labels, register)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels: Any) -> int:
+        with _lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def total(self, **labels: Any) -> float:
+        with _lock:
+            state = self._values.get(self._key(labels))
+            return state[1] if state else 0.0
+
+    def quantile(self, q: float, **labels: Any) -> Optional[float]:
+        """Estimate from the buckets (linear within a bucket, like ``histogram_quantile``)."""
+        with _lock:
+            state = self._values.get(self._key(labels))
+            if not state or not state[2]:
+                return None
+            counts, n = list(state[0]), state[2]
+        rank = q * n
+        cumulative, lower = 0, 0.0
+        for bound, c in zip(self.buckets, counts):
+            if c and cumulative + c >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / c
+            cumulative += c
+            lower = bound
+        return self.buckets[-1] if self.buckets else None
+
+    def _samples(self):
+        with _lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        samples = []
+        for key, (counts, total, n) in items:
+            pairs = tuple(zip(self.labels, key))
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                samples.append(("_bucket", pairs + (("le", _fmt(bound)),), cumulative))
+            samples.append(("_bucket", pairs + (("le", "+Inf"),), n))
+            samples.append(("_sum", pairs, total))
+            samples.append(("_count", pairs, n))
+        return samples
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+    with _lock:
+        metrics = list(_registry)
+    lines: List[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ─── Process metrics ──────────────────────────────────────────────────────────
+
+_START_TIME = time.time()
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> Optional[float]:
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return float(int(f.read().split()[1]) * _PAGE_SIZE)
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+        return float(psutil.Process().memory_info().rss)
+    except Exception:
+        return None
+
+
+Gauge("process_resident_memory_bytes", "Resident memory size in bytes.", fn=rss_bytes)
+Gauge("process_start_time_seconds", "Start time of the process since unix epoch in seconds.",
+      fn=lambda: _START_TIME)
+
+# ─── Pipeline metrics ─────────────────────────────────────────────────────────
+
+SESSION_SECONDS = Histogram("scan_session_duration_seconds",
+                            "Processing time of a confirmed session.", ("mode", "outcome"))
+STAGE_SECONDS = Histogram("scan_stage_duration_seconds",
+                          "Time spent in one pipeline stage.", ("mode", "stage"))
+SESSIONS_IN_PROGRESS = Gauge("scan_sessions_in_progress", "Sessions being processed right now.")
+IMAGES = Counter("scan_images_total", "Scanned images loaded for processing.", ("mode",))
+INPUT_BYTES = Counter("scan_input_bytes_total", "Bytes of scanned images processed.", ("mode",))
+PDF_PAGES = Counter("scan_pdf_pages_total", "Pages written to output PDFs.", ("mode", "variant"))
+PDF_BYTES = Counter("scan_pdf_bytes_total", "Bytes written to output PDFs.", ("mode", "variant"))
+MODEL_LOADS = Counter("scan_model_loads_total", "Background-removal model loads.")
+MODEL_LOADED = Gauge("scan_model_loaded", "1 while the background-removal model is in memory.")
+
+
+# ─── Spans ────────────────────────────────────────────────────────────────────
+
+class Span:
+    __slots__ = ("name", "attrs", "parent", "children", "start", "duration", "error", "_t0")
+
+    def __init__(self, name: str, attrs: Dict[str, Any], parent: Optional["Span"]):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.children: List[Span] = []
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self._t0 = time.perf_counter()
+
+    @property
+    def root(self) -> "Span":
+        span = self
+        while span.parent is not None:
+            span = span.parent
+        return span
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def fail(self, exc: BaseException) -> None:
+        """Mark the span failed (for errors that are handled inside it)."""
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"name": self.name, "start": round(self.start, 3),
+                               "duration_ms": round((self.duration or 0.0) * 1000, 1)}
+        if self.attrs:
+            out["attrs"] = dict(self.attrs)
+        if self.error:
+            out["error"] = self.error
+        if self.children:
+            out["children"] = [c.to_dict() for c in self.children]
+        return out
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("scan_span", default=None)
+_traces: deque = deque(maxlen=TRACE_HISTORY)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """Time a block as a child of the current span; ``.duration`` is set on exit."""
+    parent = _current.get()
+    sp = Span(name, attrs, parent)
+    if parent is not None:
+        parent.children.append(sp)
+    token = _current.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.fail(e)
+        raise
+    finally:
+        sp.duration = time.perf_counter() - sp._t0
+        _current.reset(token)
+        _finish(sp)
+
+
+def record(name: str, seconds: float, **attrs: Any) -> Span:
+    """Add a stage that was timed elsewhere as a finished child of the current span."""
+    parent = _current.get()
+    sp = Span(name, attrs, parent)
+    sp.start -= seconds
+    sp.duration = seconds
+    if parent is not None:
+        parent.children.append(sp)
+    _finish(sp)
+    return sp
+
+
+@contextmanager
+def session_span(session_id: str, mode: str) -> Iterator[Span]:
+    """Root span of one session; counted in ``scan_sessions_in_progress`` while open."""
+    SESSIONS_IN_PROGRESS.inc()
+    try:
+        with span("session", session_id=session_id, mode=mode) as sp:
+            yield sp
+    finally:
+        SESSIONS_IN_PROGRESS.dec()
+
+
+def _finish(sp: Span) -> None:
+    root = sp.root
+    mode = str(root.attrs.get("mode", "none"))
+    if sp is root and sp.name == "session":
+        SESSION_SECONDS.observe(sp.duration, mode=mode, outcome="error" if sp.error else "ok")
+        with _lock:
+            _traces.append(sp.to_dict())
+    else:
+        STAGE_SECONDS.observe(sp.duration, mode=mode, stage=sp.name)
+
+
+def recent_traces(limit: int = 20) -> List[Dict[str, Any]]:
+    """Span trees of the most recent sessions, newest first."""
+    with _lock:
+        traces = list(_traces)
+    return traces[::-1][:max(0, limit)]
@@ -17,6 +17,8 @@ from typing import Dict, Tuple, Optional
 import os
 import math
 
+from agent.image_buffers import get_buffer_store
+
 
 def apply_brightness_contrast(img: Image.Image, brightness: int, contrast: int) -> Image.Image:
     """
@@ -220,21 +222,28 @@ def apply_metadata_transforms_fast_cv2(
     if not os.path.exists(img_path):
         raise FileNotFoundError(f"Image not found: {img_path}")
 
-    # Load image robustly (support Windows unicode paths)
-    try:
-        if os.name == 'nt':
-            arr = np.fromfile(img_path, dtype=np.uint8)
-            img_bgr = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-        else:
-            img_bgr = cv2.imread(img_path, cv2.IMREAD_COLOR)
-    except Exception:
-        img_bgr = None
+    # The agent's decoded page, if still shared (read-only RGB/L mapping;
+    # every step below returns a new array)
+    img_rgb = get_buffer_store().view(img_path)
+    if img_rgb is not None and img_rgb.ndim == 2:
+        img_rgb = cv2.cvtColor(img_rgb, cv2.COLOR_GRAY2RGB)
+
+    if img_rgb is None:
+        # Load image robustly (support Windows unicode paths)
+        try:
+            if os.name == 'nt':
+                arr = np.fromfile(img_path, dtype=np.uint8)
+                img_bgr = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+            else:
+                img_bgr = cv2.imread(img_path, cv2.IMREAD_COLOR)
+        except Exception:
+            img_bgr = None
 
-    if img_bgr is None:
-        raise IOError(f"Failed to load image via OpenCV: {img_path}")
+        if img_bgr is None:
+            raise IOError(f"Failed to load image via OpenCV: {img_path}")
 
-    # Convert BGR -> RGB
-    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
+        # Convert BGR -> RGB
+        img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
 
     def _rotate_cv2(img_np, angle_deg, expand=True, bg_color=(255, 255, 255)):
         if angle_deg == 0:
@@ -0,0 +1,295 @@
+"""Hardware-aware performance profile, calibrated once per machine.
+
+The pipeline's speed/quality knobs (analysis and crop widths, web UI pool
+size, in-memory caches, model residency) default to values chosen for a
+Raspberry Pi, which leaves a faster host mostly idle. On first start the
+agent runs a short micro-benchmark (``calibrate``, about a second on a Pi):
+
+- cores and RAM, including container (cgroup v2) limits;
+- JPEG decode (OpenCV) and encode (PIL) throughput on a synthetic page;
+- float32 matrix-multiply throughput as a proxy for model inference, since
+  the background-removal model may not be downloaded yet.
+
+``classify`` maps the measurements to a tier (``low`` is exactly the old
+built-in defaults) and ``derive`` turns the tier into settings. The result is
+persisted as ``<output_dir>/.tuning.json`` and reused until the hardware
+fingerprint changes; the web UI reads the same file. The ``performance_profile``
+option forces a tier and the ``tuning`` config mapping overrides single
+settings; environment variables that already size a component
+(``WEB_UI_WORKERS``, ``SCAN_BUFFER_MAX_MB``) still win over the profile.
+Delete the file to re-measure.
+"""
+from __future__ import annotations
+
+import json
+import os
+import platform
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+PROFILE_FILE = ".tuning.json"
+PROFILE_VERSION = 1
+PROFILES = ("auto", "low", "medium", "high")
+
+# The settings every tier defines; "low" keeps the values the code used before
+DEFAULTS: Dict[str, Any] = {
+    "analysis_width": 600,  # image_processing.ANALYSIS_WIDTH (orientation/deskew/contours)
+    "document_crop_width": 300,  # main.SCAN_DOCUMENT_CROP_WIDTH
+    "card_crop_width": 200,  # main.CARD_CROP_WIDTH
+    "web_ui_workers": 2,  # work_pool.DEFAULT_WORKERS
+    "tile_cache_mb": 128,  # tile_pyramid.DEFAULT_CACHE_MB
+    "preview_proxies": 6,  # preview_proxy._MAX_PROXIES
+    "page_buffer_mb": 512,  # image_buffers.MAX_BYTES
+    "keep_bg_model_loaded": False,  # unload the ~750 MB model after each session
+}
+
+_TIERS: Dict[str, Dict[str, Any]] = {
+    "low": {},
+    "medium": {
+        "analysis_width": 800, "document_crop_width": 400, "card_crop_width": 300,
+        "web_ui_workers": 4, "tile_cache_mb": 256, "preview_proxies": 12, "page_buffer_mb": 1024,
+    },
+    "high": {
+        "analysis_width": 1000, "document_crop_width": 500, "card_crop_width": 400,
+        "web_ui_workers": 8, "tile_cache_mb": 512, "preview_proxies": 24, "page_buffer_mb": 2048,
+    },
+}
+
+# (min cores, min RAM MB, min decode MP/s, min GFLOPS) per tier, best first.
+# A Raspberry Pi 4 measures ~40-60 MP/s and ~10-20 GFLOPS.
+_THRESHOLDS = (
+    ("high", 4, 7000, 120.0, 80.0),
+    ("medium", 4, 3500, 90.0, 30.0),
+)
+_KEEP_MODEL_MIN_RAM_MB = 6144
+
+_PAGE_SIZE = (1754, 1240)  # A4 at 150 dpi
+_GEMM_SIZE = 512
+_GEMM_SECS = 0.2
+
+_current: Dict[str, Any] = dict(DEFAULTS)
+_lock = threading.Lock()
+
+
+# ── Measurement ─────────────────────────────────────────────────────────────
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            value = f.read().strip()
+        return int(value)
+    except (OSError, ValueError):
+        return None  # missing, or "max"
+
+
+def cpu_count() -> int:
+    """Usable cores: affinity mask, capped by a cgroup v2 CPU quota."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r", encoding="utf-8") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            cores = min(cores, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cores)
+
+
+def ram_mb() -> int:
+    """Total RAM in MB, capped by a cgroup v2 memory limit."""
+    total = 0
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    total = int(line.split()[1]) // 1024
+                    break
+    except (OSError, ValueError, IndexError):
+        pass
+    limit = _read_int("/sys/fs/cgroup/memory.max")
+    if limit:
+        total = min(total, limit // (1024 * 1024)) if total else limit // (1024 * 1024)
+    return total
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.lower().startswith(("model name", "hardware", "cpu model")):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def fingerprint() -> Dict[str, Any]:
+    """What the profile was measured on; a change triggers recalibration."""
+    return {"machine": platform.machine(), "cpu": _cpu_model(),
+            "cores": cpu_count(), "ram_mb": ram_mb()}
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def calibrate(repeat: int = 3) -> Dict[str, Any]:
+    """Run the micro-benchmark; returns the measurements."""
+    import io
+
+    import cv2
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    h, w = _PAGE_SIZE
+    # Scan-like page: paper gradient plus sensor noise (compresses like a real scan)
+    paper = np.linspace(225, 245, h, dtype=np.float32)[:, None, None]
+    page = np.clip(paper + rng.normal(0, 12, (h, w, 1)), 0, 255).astype(np.uint8).repeat(3, axis=2)
+    ok, encoded = cv2.imencode(".jpg", page, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise RuntimeError("JPEG encoder unavailable")
+    megapixels = h * w / 1e6
+    decode_s = _best_of(lambda: cv2.imdecode(encoded, cv2.IMREAD_COLOR), repeat)
+    encode_s = _best_of(lambda: Image.fromarray(page).save(io.BytesIO(), "JPEG", quality=90), repeat)
+
+    a = rng.random((_GEMM_SIZE, _GEMM_SIZE), dtype=np.float32)
+    a @ a  # BLAS thread start-up
+    runs, start = 0, time.perf_counter()
+    while time.perf_counter() - start < _GEMM_SECS:
+        a @ a
+        runs += 1
+    gflops = 2 * _GEMM_SIZE ** 3 * runs / (time.perf_counter() - start) / 1e9
+
+    return {
+        "cores": cpu_count(),
+        "ram_mb": ram_mb(),
+        "decode_mps": round(megapixels / decode_s, 1),
+        "encode_mps": round(megapixels / encode_s, 1),
+        "gflops": round(gflops, 1),
+    }
+
+
+# ── Profile ─────────────────────────────────────────────────────────────────
+
+def classify(measured: Dict[str, Any]) -> str:
+    for tier, cores, ram, decode, gflops in _THRESHOLDS:
+        if (measured.get("cores", 1) >= cores and measured.get("ram_mb", 0) >= ram
+                and measured.get("decode_mps", 0) >= decode and measured.get("gflops", 0) >= gflops):
+            return tier
+    return "low"
+
+
+def derive(measured: Dict[str, Any], tier: str,
+           overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Settings for ``tier`` on the measured machine, then ``overrides``.
+
+    Tier values are capped by the hardware (one core is left for the agent,
+    in-memory caches stay within a fraction of RAM) but never go below the
+    old defaults. Unknown override keys raise ValueError.
+    """
+    settings = dict(DEFAULTS)
+    settings.update(_TIERS[tier])
+    cores, ram = measured.get("cores", 1), measured.get("ram_mb", 0)
+    settings["web_ui_workers"] = min(settings["web_ui_workers"], max(1, cores - 1))
+    if ram:
+        settings["tile_cache_mb"] = min(settings["tile_cache_mb"], ram // 16)
+        settings["page_buffer_mb"] = min(settings["page_buffer_mb"], ram // 8)
+        settings["keep_bg_model_loaded"] = tier != "low" and ram >= _KEEP_MODEL_MIN_RAM_MB
+    for key, default in DEFAULTS.items():
+        if not isinstance(default, bool):
+            settings[key] = max(settings[key], default)
+
+    for key, value in (overrides or {}).items():
+        if key not in DEFAULTS:
+            raise ValueError(f"Unknown tuning setting '{key}' (known: {', '.join(DEFAULTS)})")
+        if isinstance(DEFAULTS[key], bool) and isinstance(value, str):
+            value = value.strip().lower() in ("1", "true", "yes", "on")
+        settings[key] = type(DEFAULTS[key])(value)
+    return settings
+
+
+def profile_path(output_dir: str) -> str:
+    return os.path.join(output_dir, PROFILE_FILE)
+
+
+def read_profile(output_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(profile_path(output_dir), "r", encoding="utf-8") as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(profile, dict) or profile.get("version") != PROFILE_VERSION:
+        return None
+    return profile
+
+
+def _write_profile(output_dir: str, profile: Dict[str, Any]) -> None:
+    os.makedirs(output_dir, exist_ok=True)
+    path = profile_path(output_dir)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_or_calibrate(output_dir: str, profile: Optional[str] = "auto",
+                      overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """The persisted profile for this machine, calibrating on first use.
+
+    ``profile`` is the requested tier (``auto`` picks from the measurements);
+    None keeps whatever the stored profile was resolved with, which is how the
+    web UI reads the agent's choice. Measurements are reused when only the
+    requested tier or the overrides change.
+    """
+    if profile is not None and profile not in PROFILES:
+        raise ValueError(f"performance_profile must be one of {', '.join(PROFILES)}")
+    stored = read_profile(output_dir)
+    current = fingerprint()
+    if stored is not None and stored.get("fingerprint") == current:
+        if profile is None or (stored.get("requested") == profile
+                               and stored.get("overrides", {}) == (overrides or {})):
+            return use(stored)
+        measured, calibrated_at = stored["measured"], stored.get("calibrated_at")
+    else:
+        measured, calibrated_at = calibrate(), datetime.now().isoformat(timespec="seconds")
+    requested = profile or "auto"
+    tier = classify(measured) if requested == "auto" else requested
+    result = {
+        "version": PROFILE_VERSION,
+        "calibrated_at": calibrated_at,
+        "fingerprint": current,
+        "measured": measured,
+        "requested": requested,
+        "overrides": dict(overrides or {}),
+        "tier": tier,
+        "settings": derive(measured, tier, overrides),
+    }
+    _write_profile(output_dir, result)
+    return use(result)
+
+
+def use(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Make ``profile``'s settings the process-wide ``settings()``."""
+    merged = dict(DEFAULTS)
+    merged.update({k: v for k, v in profile.get("settings", {}).items() if k in DEFAULTS})
+    with _lock:
+        _current.clear()
+        _current.update(merged)
+    return profile
+
+
+def settings() -> Dict[str, Any]:
+    """Current settings (the built-in defaults until a profile is loaded)."""
+    with _lock:
+        return dict(_current)
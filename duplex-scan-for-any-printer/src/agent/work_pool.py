@@ -0,0 +1,237 @@
+"""Process-wide bounded worker pool for blocking work in async routes.
+
+Heavy calls (PDF rasterisation, OpenCV, thumbnailing) must never run on the
+event loop, and must not get a fresh executor per request either. Every such
+call goes through one ``WorkPool``:
+
+- a fixed number of worker threads;
+- one FIFO per *key* (usually one key per HTTP request), served round-robin,
+  so a 40-image PDF generation cannot starve a single page preview;
+- a global queue cap — beyond it ``run`` raises ``PoolOverloaded`` and the
+  web server answers 503 with a ``Retry-After`` estimate;
+- counters and timing averages for monitoring.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from agent import tuning
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_QUEUE = 32
+# Jobs a single batch keeps queued at once (see map_unordered)
+DEFAULT_BATCH_WINDOW = 2
+_EWMA_ALPHA = 0.2
+
+
+class PoolOverloaded(Exception):
+    """The queue is full; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after: int, queued: int):
+        super().__init__(f"Worker pool overloaded ({queued} queued), retry in {retry_after}s")
+        self.retry_after = retry_after
+        self.queued = queued
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "loop", "future", "enqueued")
+
+    def __init__(self, fn, args, kwargs, loop, future):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.loop = loop
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class WorkPool:
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_queue: int = DEFAULT_MAX_QUEUE,
+                 name: str = "work-pool"):
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.name = name
+        self._cond = threading.Condition()
+        self._queues: "OrderedDict[Any, Deque[_Job]]" = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._threads: list = []
+        self._closed = False
+        self._keys = itertools.count()
+        # metrics
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._avg_wait = 0.0
+        self._avg_run = 0.0
+
+    # ── Lifecycle ───────────────────────────────────────────────────────────
+
+    def _ensure_started(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, daemon=True, name=f"{self.name}-{i}")
+            t.start()
+            self._threads.append(t)
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    # ── Submission ──────────────────────────────────────────────────────────
+
+    def new_key(self, prefix: str = "req") -> str:
+        """A fresh fairness key (one per request or batch)."""
+        return f"{prefix}-{next(self._keys)}"
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained."""
+        per_job = self._avg_run or 1.0
+        return max(1, math.ceil(per_job * (self._queued + self._running) / self.workers))
+
+    def check_admission(self) -> None:
+        """Raise ``PoolOverloaded`` if a new job would be rejected."""
+        with self._cond:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                raise PoolOverloaded(self.retry_after(), self._queued)
+
+    def _enqueue(self, key: Any, job: _Job) -> None:
+        with self._cond:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                raise PoolOverloaded(self.retry_after(), self._queued)
+            self._ensure_started()
+            self._queues.setdefault(key, deque()).append(job)
+            self._queued += 1
+            self._submitted += 1
+            self._cond.notify()
+
+    async def run(self, fn: Callable, *args, key: Any = None, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on the pool and await its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._enqueue(key if key is not None else self.new_key(), _Job(fn, args, kwargs, loop, future))
+        return await future
+
+    async def map_unordered(self, fn: Callable, arg_tuples: Iterable[Tuple], key: Any = None,
+                            window: int = DEFAULT_BATCH_WINDOW) -> AsyncIterator[Tuple[Tuple, Any, Optional[BaseException]]]:
+        """Run ``fn(*args)`` for each tuple, yielding ``(args, result, error)`` as they finish.
+
+        At most ``window`` jobs of the batch are queued at a time, so a large
+        batch neither fills the global queue nor jumps ahead of other requests.
+        """
+        key = key if key is not None else self.new_key("batch")
+        pending: Dict[asyncio.Future, Tuple] = {}
+        items = iter(arg_tuples)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max(1, window):
+                try:
+                    args = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                task = asyncio.ensure_future(self.run(fn, *args, key=key))
+                pending[task] = args
+            if not pending:
+                return
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                args = pending.pop(task)
+                err = task.exception()
+                yield args, (None if err else task.result()), err
+
+    # ── Workers ─────────────────────────────────────────────────────────────
+
+    def _next_job(self) -> Optional[_Job]:
+        """Round-robin across keys. Caller holds the condition."""
+        while not self._queues and not self._closed:
+            self._cond.wait()
+        if not self._queues:
+            return None
+        key, queue = self._queues.popitem(last=False)
+        job = queue.popleft()
+        if queue:
+            self._queues[key] = queue  # back of the line
+        self._queued -= 1
+        self._running += 1
+        return job
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next_job()
+            if job is None:
+                return
+            started = time.monotonic()
+            if job.future.cancelled():
+                error, result = None, None
+            else:
+                try:
+                    result, error = job.fn(*job.args, **job.kwargs), None
+                except BaseException as e:
+                    result, error = None, e
+            finished = time.monotonic()
+            with self._cond:
+                self._running -= 1
+                if error is None:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+                self._avg_wait += _EWMA_ALPHA * ((started - job.enqueued) - self._avg_wait)
+                self._avg_run += _EWMA_ALPHA * ((finished - started) - self._avg_run)
+            job.loop.call_soon_threadsafe(_settle, job.future, result, error)
+
+    # ── Metrics ─────────────────────────────────────────────────────────────
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+                "active_keys": len(self._queues),
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._avg_wait * 1000, 1),
+                "avg_run_ms": round(self._avg_run * 1000, 1),
+            }
+
+
+def _settle(future: asyncio.Future, result, error) -> None:
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+_pool: Optional[WorkPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> WorkPool:
+    """The process-wide pool (sized by WEB_UI_WORKERS, else the performance profile, / WEB_UI_MAX_QUEUE)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkPool(
+                workers=int(os.getenv("WEB_UI_WORKERS") or 0) or tuning.settings()["web_ui_workers"],
+                max_queue=int(os.getenv("WEB_UI_MAX_QUEUE", str(DEFAULT_MAX_QUEUE))),
+            )
+        return _pool
@@ -13,7 +13,6 @@ from fastapi.responses import JSONResponse
 from typing import Dict, List, Any, Optional
 import os
 import json
-import glob
 from pathlib import Path as PathLib
 from datetime import datetime
 
@@ -25,9 +24,12 @@ SCAN_INBOX_DIR = "scan_inbox"
 
 
 @router.get("/projects")
-async def list_projects():
+async def list_projects(limit: int = 50, cursor: Optional[str] = None):
     """
-    List all scan projects (sessions) with metadata.
+    List scan projects (sessions) with metadata, newest first.
+    
+    Served from the project catalog (no per-request JSON parsing).
+    Pass ``next_cursor`` back as ``cursor`` to fetch the next page.
     
     Returns list of projects with:
     - id: project identifier (metadata filename without .json)
@@ -36,52 +38,35 @@ async def list_projects():
     - created_at: timestamp
     - thumbnail: path to first image (for preview)
     """
+    from ..agent.project_catalog import get_catalog
+
     try:
-        projects = []
-        
-        # Find all metadata JSON files in scan_out
-        metadata_files = glob.glob(os.path.join(SCAN_OUT_DIR, "*.json"))
-        
-        for metadata_path in metadata_files:
-            try:
-                # Read metadata
-                with open(metadata_path, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-                
-                # Extract project info
-                project_id = os.path.splitext(os.path.basename(metadata_path))[0]
-                
-                # Get file stats
-                stat = os.stat(metadata_path)
-                created_at = datetime.fromtimestamp(stat.st_ctime).isoformat()
-                
-                # Get thumbnail (first image)
-                thumbnail = None
-                if metadata.get('images') and len(metadata['images']) > 0:
-                    first_image = metadata['images'][0]
-                    thumbnail = first_image.get('path', '')
-                
-                projects.append({
-                    'id': project_id,
-                    'name': project_id.replace('_', ' ').title(),
-                    'image_count': len(metadata.get('images', [])),
-                    'created_at': created_at,
-                    'thumbnail': thumbnail,
-                    'mode': metadata.get('mode', 'unknown')
-                })
-            
-            except Exception as e:
-                print(f"Error reading project {metadata_path}: {e}")
-                continue
-        
-        # Sort by creation time (newest first)
-        projects.sort(key=lambda x: x['created_at'], reverse=True)
+        catalog = get_catalog(SCAN_OUT_DIR)
+        catalog.reconcile()
+        try:
+            entries, next_cursor = catalog.page(
+                limit=limit, cursor=cursor, require_pdf=False, require_metadata=True
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        projects = [{
+            'id': e.id,
+            'name': e.id.replace('_', ' ').title(),
+            'image_count': e.image_count,
+            'created_at': datetime.fromtimestamp(e.created).isoformat(),
+            'thumbnail': (e.first_image or '') if e.image_count else None,
+            'mode': e.mode
+        } for e in entries]
         
         return JSONResponse(content={
             'projects': projects,
-            'total': len(projects)
+            'next_cursor': next_cursor,
+            'total': catalog.count(require_pdf=False, require_metadata=True)
         })
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list projects: {str(e)}")
 
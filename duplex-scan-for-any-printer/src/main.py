@@ -7,44 +7,20 @@ import signal
 import time
 import threading
 import queue
-import numpy as np
-import cv2
+from concurrent.futures import ThreadPoolExecutor
 import re
-from typing import List, Tuple
-from PIL import Image
+from contextlib import nullcontext
+from typing import List, Optional, Tuple
+
+# Startup is timed from here: agent imports, then ScanAgent until start() returns
+_MODULE_START = time.perf_counter()
 
 from agent.config import Config
-from agent.session_manager import SessionManager, Session
-from agent.image_processing import (
-    load_image,
-    rotate_180,
-    batch_correct_orientation,
-    deskew_image,
-    _unload_bg_removal_model,
-    crop_document_v2
-)
-from agent.pdf_generator import (
-    save_pdf_from_images_interleaved,
-    save_pdf_card_2in1_grid,
-    save_pdf_from_images_interleaved_fast,
-    save_pdf_from_images_interleaved_mono_fast,
-    save_pdf_scan_document_fast,
-    save_pdf_scan_document_mono_fast,
-    save_pdf_card_2in1_grid_fast,
-    save_pdf_card_2in1_grid_mono_fast
-)
+from agent.session_manager import SessionManager, Session, DEFAULT_DEVICE, STATE_WAIT_CONFIRM
 from agent.print_dispatcher import print_pdf_duplex, print_pdf_monochrome
 from agent.ftp_watcher import FTPWatcher
-from agent.layout_engine import (
-    determine_document_span,
-    layout_documents_smart,
-    layout_items_by_orientation
-)
-from agent.metadata_generator import (
-    generate_scan_duplex_metadata,
-    generate_scan_document_metadata,
-    generate_card_2in1_metadata
-)
+from agent.ingest_storage import place_file
+from agent.project_catalog import get_catalog
 from agent import logger
 from agent.error_handler import (safe_execute, retry_on_failure, handle_session_error,
                                  handle_image_processing_error, handle_pdf_generation_error,
@@ -52,12 +28,141 @@ from agent.error_handler import (safe_execute, retry_on_failure, handle_session_
                                  ImageProcessingError, PDFGenerationError, PrinterError)
 from agent.config_validator import validate_config
 from agent.resource_monitor import ResourceMonitor, schedule_periodic_cleanup
-from agent.telegram_bot import TelegramBot
+from agent.admission import Admission, AdmissionController
 from agent.notification_manager import NotificationManager
 from agent import agent_api
+from agent import session_profiler, tracing, tuning
+
+# Width crop_document_v2 runs background removal at, per mode (raised by the
+# performance profile on faster hardware, see _apply_performance_profile)
+SCAN_DOCUMENT_CROP_WIDTH = 300  # reduced for speed - still accurate for bbox
+CARD_CROP_WIDTH = 200  # cards are small; enough for their outline
+
+# Imaging/ML modules the pipeline needs; imported on first use (or by the
+# warm-up thread once the agent is up) so startup does not wait for them
+PIPELINE_MODULES = (
+    "numpy", "cv2",
+    "agent.image_processing", "agent.pdf_generator",
+    "agent.layout_engine", "agent.metadata_generator", "agent.image_buffers",
+)
+
+
+def _warm_pipeline_imports() -> None:
+    """Import the pipeline modules in the background after startup."""
+    import importlib
+
+    start = time.perf_counter()
+    for name in PIPELINE_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.warning(f"Pipeline warm-up: import {name} failed: {e}")
+    logger.info(f"🔥 Pipeline modules imported in {time.perf_counter() - start:.2f}s")
+    try:
+        from agent.image_buffers import get_buffer_store
+        get_buffer_store().sweep(force=True)  # page buffers left by a previous run
+    except Exception as e:
+        logger.warning(f"Page buffer sweep failed: {e}")
+
+
+def _apply_performance_profile(cfg: Config) -> None:
+    """Load (or on first start, measure) the hardware profile and apply it."""
+    global SCAN_DOCUMENT_CROP_WIDTH, CARD_CROP_WIDTH
+    try:
+        profile = tuning.load_or_calibrate(cfg.output_dir, cfg.performance_profile, cfg.tuning)
+    except Exception as e:
+        logger.warning(f"Performance profile unavailable, using built-in defaults: {e}")
+        return
+    settings = profile["settings"]
+    from agent import image_processing
+    image_processing.ANALYSIS_WIDTH = settings["analysis_width"]
+    SCAN_DOCUMENT_CROP_WIDTH = settings["document_crop_width"]
+    CARD_CROP_WIDTH = settings["card_crop_width"]
+    if not os.getenv("SCAN_BUFFER_MAX_MB"):
+        from agent.image_buffers import get_buffer_store
+        get_buffer_store().max_bytes = settings["page_buffer_mb"] * 1024 * 1024
+    m = profile["measured"]
+    logger.info(
+        f"⚙️  Performance profile '{profile['tier']}' ({m['cores']} cores, {m['ram_mb']} MB, "
+        f"decode {m['decode_mps']} MP/s, {m['gflops']} GFLOPS): analysis {settings['analysis_width']}px, "
+        f"crop {SCAN_DOCUMENT_CROP_WIDTH}/{CARD_CROP_WIDTH}px, "
+        f"model {'resident' if settings['keep_bg_model_loaded'] else 'unloaded after sessions'}"
+    )
+
+
+def _warm_up(cfg: Config) -> None:
+    """Background start-up work: pipeline imports, then the performance profile."""
+    _warm_pipeline_imports()
+    _apply_performance_profile(cfg)
+
+
+def _expand_container(path: str, project_dir: str, images_dir: str) -> List[str]:
+    """Split multi-page TIFF/PDF uploads into per-page images.
+
+    The container is parked in ``<project>/source`` so the images folder only
+    holds pages. On failure the container is kept and load_image reports it.
+    """
+    from agent.page_source import needs_expansion, expand_pages
+
+    if not needs_expansion(path):
+        return [path]
+    try:
+        pages = expand_pages(path, images_dir)
+    except Exception as e:
+        logger.warning(f"Failed to extract pages from {os.path.basename(path)}: {e}")
+        return [path]
+    source_dir = os.path.join(project_dir, 'source')
+    os.makedirs(source_dir, exist_ok=True)
+    os.replace(path, os.path.join(source_dir, os.path.basename(path)))
+    return pages
+
+
+def _record_in_catalog(cfg: Config, pdf_path: str) -> None:
+    """Index the new project right away so the web UI lists it without a rescan."""
+    try:
+        get_catalog(cfg.output_dir).record(os.path.splitext(os.path.basename(pdf_path))[0])
+    except Exception as e:
+        logger.warning(f"Project catalog update failed for {pdf_path}: {e}")
+
+
+def _prerender_previews(cfg: Config, pdf_path: str) -> None:
+    """Render the editor's page previews in the background so the first open is instant."""
+    try:
+        from agent.derivative_store import store_root
+        from agent.pdf_render import prerender_in_background
+        prerender_in_background(store_root(cfg.output_dir), [pdf_path])
+    except Exception as e:
+        logger.warning(f"Page preview pre-render not started for {pdf_path}: {e}")
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
 
-def process_session(cfg: Config, s: Session, notification_manager=None):
-    """Process a confirmed session with error handling."""
+
+def _record_output_metrics(mode: str, pdf_path: str) -> None:
+    """Count the pages and bytes of every PDF variant the session wrote."""
+    if not pdf_path:
+        return
+    try:
+        from agent.page_source import page_count
+        stem = os.path.splitext(pdf_path)[0]
+        for variant, path in (("color", pdf_path), ("mono", f"{stem}_mono.pdf"), ("test", f"{stem}_test.pdf")):
+            if os.path.exists(path):
+                tracing.PDF_BYTES.inc(_file_size(path), mode=mode, variant=variant)
+                tracing.PDF_PAGES.inc(page_count(path), mode=mode, variant=variant)
+    except Exception as e:
+        logger.warning(f"Output metrics not recorded for {pdf_path}: {e}")
+
+
+def process_session(cfg: Config, s: Session, notification_manager=None,
+                    admission: Optional[AdmissionController] = None):
+    """Process a confirmed session with error handling.
+
+    With ``admission``, processing waits for (or adapts to) the free memory.
+    """
     session_start = time.time()
     
     # Set logging context for this session
@@ -65,67 +170,140 @@ def process_session(cfg: Config, s: Session, notification_manager=None):
     
     success = False
     out_pdf = None
-    try:
-        logger.info("="*80)
-        logger.info(f"Session processing started: {s.id} (mode: {s.mode})")
-        logger.info("="*80)
-        
-        # Check disk space before processing (require 100MB free)
-        check_disk_space(cfg.output_dir, required_mb=100)
-        # Prepare project directory and copy source images into project's own storage.
-        # Original inbox paths are saved separately for later cleanup so the project
-        # images are never deleted by the delete_inbox_files_after_process logic.
-        _inbox_paths_to_delete = list(s.images)  # Save originals BEFORE copying
-        try:
-            project_dir = os.path.join(cfg.output_dir, s.id)
-            images_dir = os.path.join(project_dir, 'images')
-            os.makedirs(images_dir, exist_ok=True)
+    from agent.image_buffers import get_buffer_store
 
-            moved_paths = []
-            import shutil
-            for idx, p in enumerate(s.images):
+    # The session's lease keeps its decoded-page buffers alive while it runs
+    with (tracing.session_span(s.id, s.mode) as trace,
+          session_profiler.profile_session(s.id, cfg.output_dir, trace),
+          get_buffer_store().session(s.id)):
+        try:
+            logger.info("="*80)
+            logger.info(f"Session processing started: {s.id} (mode: {s.mode})")
+            logger.info("="*80)
+        
+            # Check disk space before processing (require 100MB free)
+            check_disk_space(cfg.output_dir, required_mb=100)
+            # Prepare project directory and copy source images into project's own storage.
+            # Original inbox paths are saved separately for later cleanup so the project
+            # images are never deleted by the delete_inbox_files_after_process logic.
+            _inbox_paths_to_delete = list(s.images)  # Save originals BEFORE copying
+            with tracing.span("prepare"):
                 try:
-                    if not os.path.exists(p):
-                        logger.warning(f"Source image missing when preparing project: {p}")
-                        continue
-                    base = os.path.basename(p)
-                    # Ensure unique filename in project images folder
-                    target_name = base
-                    if os.path.exists(os.path.join(images_dir, target_name)):
-                        name, ext = os.path.splitext(base)
-                        target_name = f"{name}_{idx}{ext}"
-                    target_path = os.path.join(images_dir, target_name)
-                    shutil.copy2(p, target_path)  # Copy — inbox cleanup happens separately
-                    moved_paths.append(target_path)
-                except Exception as e:
-                    logger.warning(f"Failed to copy {p} to project folder: {e}")
+                    project_dir = os.path.join(cfg.output_dir, s.id)
+                    images_dir = os.path.join(project_dir, 'images')
+                    os.makedirs(images_dir, exist_ok=True)
+
+                    # Inbox files that are deleted after processing can simply be moved;
+                    # otherwise reflink/hardlink, copying only across filesystems.
+                    keep_source = not (cfg.delete_inbox_files_after_process and not getattr(cfg, "test_mode", False))
+                    moved_paths = []
+                    placed = {}
+                    for idx, p in enumerate(s.images):
+                        try:
+                            if not os.path.exists(p):
+                                logger.warning(f"Source image missing when preparing project: {p}")
+                                continue
+                            base = os.path.basename(p)
+                            # Ensure unique filename in project images folder
+                            target_name = base
+                            if os.path.exists(os.path.join(images_dir, target_name)):
+                                name, ext = os.path.splitext(base)
+                                target_name = f"{name}_{idx}{ext}"
+                            target_path = os.path.join(images_dir, target_name)
+                            method = place_file(p, target_path, keep_source=keep_source)
+                            placed[method] = placed.get(method, 0) + 1
+                            moved_paths.extend(_expand_container(target_path, project_dir, images_dir))
+                        except Exception as e:
+                            logger.warning(f"Failed to copy {p} to project folder: {e}")
+                    if placed:
+                        logger.info(f"Project images placed: {placed}")
+
+                    # Replace session images list with project paths for processing
+                    if moved_paths:
+                        s.images = moved_paths
 
-            # Replace session images list with project paths for processing
-            if moved_paths:
-                s.images = moved_paths
+                except Exception as e:
+                    logger.warning(f"Failed to prepare project storage for session {s.id}: {e}")
+                    _inbox_paths_to_delete = []  # Don't delete if copy failed
+
+            mode_key = {v: k for k, v in cfg.subdirs.items()}.get(s.mode, s.mode)
+            with (admission.admit(s.id, mode_key, s.images) if admission is not None
+                  else nullcontext()) as admitted, _bg_model_scope(mode_key, admitted):
+                out_pdf = _process_session_inner(cfg, s, session_start, inbox_paths=_inbox_paths_to_delete,
+                                                 admission=admitted)
+            success = True
+            _record_in_catalog(cfg, out_pdf)
+            _prerender_previews(cfg, out_pdf)
+            _record_output_metrics(s.mode, out_pdf)
 
         except Exception as e:
-            logger.warning(f"Failed to prepare project storage for session {s.id}: {e}")
-            _inbox_paths_to_delete = []  # Don't delete if copy failed
+            trace.fail(e)
+            handle_session_error(s.id, s.mode, e)
+            logger.error(f"❌ Session processing failed: {s.id}")
+        finally:
+            logger.clear_session_context()
+            if notification_manager is not None:
+                notification_manager.notify_session_processed(
+                    s.id, s.mode, success, pdf_path=out_pdf
+                )
 
-        out_pdf = _process_session_inner(cfg, s, session_start, inbox_paths=_inbox_paths_to_delete)
-        success = True
-        
-    except Exception as e:
-        handle_session_error(s.id, s.mode, e)
-        logger.error(f"❌ Session processing failed: {s.id}")
-    finally:
-        logger.clear_session_context()
-        if notification_manager is not None:
-            notification_manager.notify_session_processed(
-                s.id, s.mode, success, pdf_path=out_pdf
-            )
 
+def _bg_model_scope(mode_key: str, admitted: Optional[Admission]):
+    """Hold the background removal model for a session of a mode that uses it.
+
+    The model is unloaded once the last such session finishes (~750MB saved;
+    +1s load time, worth it for a 24/7 agent on a Pi). The performance profile
+    keeps it resident when RAM allows, unless a session ran degraded.
+    """
+    if mode_key not in ("scan_document", "card_2in1"):
+        return nullcontext()
+    from agent.image_processing import bg_removal_model_session
+    degraded = admitted is not None and admitted.degraded
+    return bg_removal_model_session(unload=degraded or not tuning.settings()["keep_bg_model_loaded"])
 
-def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_paths: list = None):
+
+def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_paths: list = None,
+                           admission: Optional[Admission] = None):
     """Inner session processing logic (extracted for error handling)."""
-    
+    import numpy as np
+    import cv2
+    from PIL import Image
+    from agent.image_processing import (
+        load_image,
+        rotate_180,
+        batch_correct_orientation,
+        deskew_image,
+        crop_document_v2
+    )
+    from agent.pdf_generator import (
+        save_pdf_from_images_interleaved,
+        save_pdf_card_2in1_grid,
+        save_pdf_from_images_interleaved_fast,
+        save_pdf_from_images_interleaved_mono_fast,
+        save_pdf_scan_document_fast,
+        save_pdf_scan_document_mono_fast,
+        save_pdf_card_2in1_grid_fast,
+        save_pdf_card_2in1_grid_mono_fast
+    )
+    from agent.layout_engine import (
+        determine_document_span,
+        layout_documents_smart,
+        layout_items_by_orientation
+    )
+    from agent.metadata_generator import (
+        generate_scan_duplex_metadata,
+        generate_scan_document_metadata,
+        generate_card_2in1_metadata
+    )
+    from agent.image_buffers import put_image_async
+
     mode = s.mode
+    # Under memory pressure (see agent.admission): lighter settings, and
+    # streamed sessions decode each page only when its turn comes
+    degraded = admission is not None and admission.degraded
+    streamed = admission is not None and admission.streamed
+    # Passed down per call: the process-wide ANALYSIS_WIDTH stays as profiled for other sessions
+    analysis_width = admission.analysis_width if admission is not None else None
     out_dir = cfg.output_dir
     os.makedirs(out_dir, exist_ok=True)
     base_name = f"{s.id}.pdf"
@@ -180,7 +358,9 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
 
     load_start = time.time()
     ordered_paths = strict_order_paths(s.images)
-    print(f"[TIMING] File ordering: {time.time() - load_start:.3f}s ({len(s.images)} files)")
+    elapsed = time.time() - load_start
+    tracing.record("ordering", elapsed)
+    print(f"[TIMING] File ordering: {elapsed:.3f}s ({len(s.images)} files)")
 
     # Load all images in strict order and keep path+img together
     from typing import NamedTuple
@@ -188,15 +368,30 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
         path: str
         img: Image.Image
     
+    def open_page(p: str) -> bool:
+        with Image.open(p):
+            return True
+
     load_images_start = time.time()
     ordered_items: List[ImageItem] = []
     for p in ordered_paths:
-        img = safe_execute(
-            load_image, p,
-            default=None,
-            error_msg=f"Failed to load image: {os.path.basename(p)}"
-        )
-        if img is not None:
+        if streamed:
+            # Header check only; page_image() decodes it in the mode loop
+            ok = safe_execute(open_page, p, default=False,
+                              error_msg=f"Failed to load image: {os.path.basename(p)}")
+            img = None
+        else:
+            img = safe_execute(
+                load_image, p,
+                default=None,
+                error_msg=f"Failed to load image: {os.path.basename(p)}"
+            )
+            ok = img is not None
+        if ok:
+            # Decoded once here; the web UI maps the page instead of decoding it again.
+            # Written by a background thread (skipped when degraded: the buffers live in RAM too)
+            if img is not None and not degraded:
+                put_image_async(s.id, p, img)
             ordered_items.append(ImageItem(p, img))
         else:
             handle_image_processing_error(os.path.basename(p), "load", Exception("Load failed"))
@@ -204,17 +399,31 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
     if not ordered_items:
         raise ImageProcessingError("No valid images to process", "session", "load_all")
     
-    print(f"[TIMING] Loading {len(ordered_items)} images: {time.time() - load_images_start:.3f}s")
+    elapsed = time.time() - load_images_start
+    tracing.record("load", elapsed)
+    tracing.IMAGES.inc(len(ordered_items), mode=mode)
+    tracing.INPUT_BYTES.inc(sum(_file_size(item.path) for item in ordered_items), mode=mode)
+    print(f"[TIMING] Loading {len(ordered_items)} images: {elapsed:.3f}s")
     
     # For backward compatibility where needed
     imgs = [item.img for item in ordered_items]
 
+    def page_image(item: ImageItem) -> Optional[Image.Image]:
+        """The decoded page; streamed sessions decode it here, one at a time."""
+        if item.img is not None:
+            return item.img
+        img = safe_execute(load_image, item.path, default=None,
+                           error_msg=f"Failed to load image: {os.path.basename(item.path)}")
+        if img is None:
+            handle_image_processing_error(os.path.basename(item.path), "load", Exception("Load failed"))
+        return img
+
     # TEST PRINT MODE: Simple direct print without processing
     if mode == cfg.subdirs.get("test_print") or mode == "test_print":
         logger.info(f"🖨️  Test Print Mode: Printing {len(ordered_items)} images directly")
         
         # Convert images to simple PDF
-        # save_pdf_from_images_simple is imported at module top
+        # save_pdf_from_images_simple is imported at the top of this function
         
         test_pdf_path = out_path.replace('.pdf', '_test.pdf')
         
@@ -248,7 +457,9 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
             handle_pdf_generation_error(s.id, "test_print", e)
             raise
         
-        print(f"[TIMING] PDF generation: {time.time() - pdf_start:.3f}s")
+        elapsed = time.time() - pdf_start
+        tracing.record("pdf", elapsed)
+        print(f"[TIMING] PDF generation: {elapsed:.3f}s")
         
         # Auto-print if printer configured
         if cfg.printer.enabled:
@@ -268,7 +479,9 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
                 handle_printer_error(s.id, "test_print", e)
                 logger.warning(f"⚠️  Test print failed: {str(e)}")
             
-            print(f"[TIMING] Printing: {time.time() - print_start:.3f}s")
+            elapsed = time.time() - print_start
+            tracing.record("print", elapsed)
+            print(f"[TIMING] Printing: {elapsed:.3f}s")
         else:
             logger.info(f"ℹ️  Printer not enabled - PDF saved to {test_pdf_path}")
         
@@ -277,8 +490,11 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
     if mode == cfg.subdirs.get("scan_duplex") or mode == "scan_duplex":
         processing_start = time.time()
         # Batch-aware orientation correction with timestamps
-        rotation_angles = batch_correct_orientation(imgs, [item.path for item in ordered_items])
-        print(f"[TIMING] Orientation detection: {time.time() - processing_start:.3f}s")
+        rotation_angles = batch_correct_orientation(imgs, [item.path for item in ordered_items],
+                                                     analysis_width=analysis_width)
+        elapsed = time.time() - processing_start
+        tracing.record("orientation", elapsed)
+        print(f"[TIMING] Orientation detection: {elapsed:.3f}s")
         
         print("\n📋 Processing images:")
         print("-" * 90)
@@ -300,14 +516,19 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
                 log_parts.append("→ no rotation")
             
             # Step 2: Deskew (straighten small angles)
-            img, deskew_angle = deskew_image(filename, img)
+            img, deskew_angle = deskew_image(filename, img, analysis_width)
             
             print(" ".join(log_parts))
             corrected_items.append(ImageItem(item.path, img))
             rotation_info.append((angle, deskew_angle))
+            # Release the uncorrected page: only one decoded copy per page stays
+            ordered_items[i] = ImageItem(item.path, None)
+            imgs[i] = None
         
         print("-" * 90)
-        print(f"[TIMING] Rotation & deskew: {time.time() - rotate_start:.3f}s")
+        elapsed = time.time() - rotate_start
+        tracing.record("deskew", elapsed)
+        print(f"[TIMING] Rotation & deskew: {elapsed:.3f}s")
         
         print("-" * 90)
         
@@ -330,7 +551,7 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
         pairs = list(zip([item.img for item in front_items], [item.img for item in back_items]))
         
         # Fast PDF generation with PyMuPDF (memory buffers)
-        # fast pdf generators imported at module top
+        # fast pdf generators imported at the top of this function
         
         print("\n📊 PDF Generation Speed Test:")
         print("-" * 90)
@@ -338,6 +559,7 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
         # Color PDF with fast method
         pdf_start = time.time()
         time_fast_color = save_pdf_from_images_interleaved_fast(pairs, out_path)
+        tracing.record("pdf_color", time_fast_color)
         print(f"✅ [FAST] Color PDF (PyMuPDF):     {time_fast_color:.3f}s")
         
         # Monochrome PDF for better laser B/W output
@@ -345,6 +567,7 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
         
         mono_pdf_start = time.time()
         time_fast_mono = save_pdf_from_images_interleaved_mono_fast(pairs, out_path_mono)
+        tracing.record("pdf_mono", time_fast_mono)
         print(f"✅ [FAST] Mono PDF (PyMuPDF):      {time_fast_mono:.3f}s")
         
         print("-" * 90)
@@ -385,8 +608,11 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
     elif mode == cfg.subdirs.get("copy_duplex") or mode == "copy_duplex":
         processing_start = time.time()
         # Batch-aware orientation correction with timestamps
-        rotation_angles = batch_correct_orientation(imgs, [item.path for item in ordered_items])
-        print(f"[TIMING] Orientation detection: {time.time() - processing_start:.3f}s")
+        rotation_angles = batch_correct_orientation(imgs, [item.path for item in ordered_items],
+                                                     analysis_width=analysis_width)
+        elapsed = time.time() - processing_start
+        tracing.record("orientation", elapsed)
+        print(f"[TIMING] Orientation detection: {elapsed:.3f}s")
         
         print("\n📋 Processing images:")
         print("-" * 90)
@@ -408,14 +634,19 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
                 log_parts.append("→ no rotation")
             
             # Step 2: Deskew (straighten small angles)
-            img, deskew_angle = deskew_image(filename, img)
+            img, deskew_angle = deskew_image(filename, img, analysis_width)
             
             print(" ".join(log_parts))
             corrected_items.append(ImageItem(item.path, img))
             rotation_info.append((angle, deskew_angle))
+            # Release the uncorrected page: only one decoded copy per page stays
+            ordered_items[i] = ImageItem(item.path, None)
+            imgs[i] = None
         
         print("-" * 90)
-        print(f"[TIMING] Rotation & deskew: {time.time() - rotate_start:.3f}s")
+        elapsed = time.time() - rotate_start
+        tracing.record("deskew", elapsed)
+        print(f"[TIMING] Rotation & deskew: {elapsed:.3f}s")
         
         print("-" * 90)
         
@@ -439,7 +670,9 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
         
         pdf_start = time.time()
         save_pdf_from_images_interleaved(pairs, out_path)
-        print(f"[TIMING] PDF generation: {time.time() - pdf_start:.3f}s")
+        elapsed = time.time() - pdf_start
+        tracing.record("pdf", elapsed)
+        print(f"[TIMING] PDF generation: {elapsed:.3f}s")
         
         # In test mode, do not send to printer
         if not getattr(cfg, "test_mode", False):
@@ -457,7 +690,7 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
         processing_start = time.time()
         
         # Import the new background removal based cropping
-        # crop_document_v2 imported at module top
+        # crop_document_v2 imported at the top of this function
         
         def crop_document(img: Image.Image) -> List[Tuple[Image.Image, Tuple[int, int, int, int]]]:
             """Document detection and crop using background removal (v2).
@@ -471,7 +704,7 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
                 # Use crop_document_v2 - now returns both cropped image AND bbox
                 cropped, bbox = crop_document_v2(
                     img,
-                    processing_width=300,  # Reduced for speed - still accurate for bbox
+                    processing_width=document_crop_width,
                     img_name=img_name
                 )
                 
@@ -489,7 +722,11 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
                 original_width, original_height = img.size
                 return [(img, (0, 0, original_width, original_height))]
 
-        # Process each image sequentially (model is cached, but not thread-safe)
+        document_crop_width = SCAN_DOCUMENT_CROP_WIDTH
+        if degraded:
+            document_crop_width = min(document_crop_width, tuning.DEFAULTS["document_crop_width"])
+
+        # Process each image sequentially (the cached model is shared by the sessions; its inference is serialised)
         # Store: (span, position, image, scan_dpi, rotation_angle, deskew_angle, original_filename)
         doc_items: List[Tuple[str, Tuple[int, int], Image.Image, float, int, float, str]] = []
         
@@ -497,9 +734,11 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
         for item in ordered_items:
             img_path = item.path
             img_name = os.path.basename(img_path)
-            im = item.img
+            im = page_image(item)
+            if im is None:
+                continue
 
-            im, deskew_angle = deskew_image(img_name, im)
+            im, deskew_angle = deskew_image(img_name, im, analysis_width)
             rotation_angle = 0  # scan_document mode doesn't use batch rotation
             
             
@@ -560,7 +799,9 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
                 # Format: (span, bbox, cropped_img, dpi, rotation, deskew, source_path)
                 doc_items.append((span, bbox, cropped, scan_dpi, rotation_angle, deskew_angle, img_path))
         
-        print(f"[TIMING] Document detection & cropping: {time.time() - crop_start:.3f}s")
+        elapsed = time.time() - crop_start
+        tracing.record("crop", elapsed)
+        print(f"[TIMING] Document detection & cropping: {elapsed:.3f}s")
         
         if not doc_items:
             print("⚠️ scan_document: No documents detected")
@@ -573,7 +814,9 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
                 cfg.a4_page.height_pt,
                 cfg.margin_pt,
             )
-            print(f"[TIMING] Layout computation: {time.time() - layout_start:.3f}s")
+            elapsed = time.time() - layout_start
+            tracing.record("layout", elapsed)
+            print(f"[TIMING] Layout computation: {elapsed:.3f}s")
 
             # Generate metadata for web UI editing
             try:
@@ -585,7 +828,7 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
             out_path_mono = os.path.join(out_dir, f"{s.id}_mono.pdf")
             
             # Fast PDF generation with PyMuPDF
-            # save_pdf_scan_document_* imported at module top
+            # save_pdf_scan_document_* imported at the top of this function
             
             print("\n📊 PDF Generation Speed Test:")
             print("-" * 90)
@@ -598,6 +841,7 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
                 page_size=(cfg.a4_page.width_pt, cfg.a4_page.height_pt),
                 margin=cfg.margin_pt,
             )
+            tracing.record("pdf_color", time_fast_color)
             print(f"✅ [FAST] Color PDF (PyMuPDF):     {time_fast_color:.3f}s")
             
             # Monochrome PDF
@@ -608,6 +852,7 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
                 page_size=(cfg.a4_page.width_pt, cfg.a4_page.height_pt),
                 margin=cfg.margin_pt,
             )
+            tracing.record("pdf_mono", time_fast_mono)
             print(f"✅ [FAST] Mono PDF (PyMuPDF):      {time_fast_mono:.3f}s")
             
             print("-" * 90)
@@ -630,8 +875,11 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
 
     elif mode == cfg.subdirs.get("card_2in1") or mode == "card_2in1":
         # Import the new background removal based cropping (same as scan_document)
-        # crop_document_v2 imported at module top
-        
+        # crop_document_v2 imported at the top of this function
+        card_crop_width = CARD_CROP_WIDTH
+        if degraded:
+            card_crop_width = min(card_crop_width, tuning.DEFAULTS["card_crop_width"])
+
         def crop_card(img: Image.Image, img_name: str) -> Tuple[Image.Image, float]:
             """Card detection using background removal (v2).
             
@@ -642,12 +890,12 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
             4. Return tight crop and deskew angle
             """
             # Deskew first
-            img, deskew_angle = deskew_image(img_name, img)
+            img, deskew_angle = deskew_image(img_name, img, analysis_width)
             try:
                 # Use crop_document_v2 - now returns both cropped image AND bbox
                 cropped, bbox = crop_document_v2(
                     img,
-                    processing_width=200,  # Fast processing, sufficient for cards
+                    processing_width=card_crop_width,
                     img_name=img_name
                 )
                 return cropped, deskew_angle
@@ -657,10 +905,19 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
 
         # Crop each image to its card region first
         crop_start = time.time()
-        crop_results = [crop_card(item.img, os.path.basename(item.path)) for item in ordered_items]
+        crop_results = []
+        card_items = []  # pages that decoded (all of them unless streamed)
+        for item in ordered_items:
+            img = page_image(item)
+            if img is None:
+                continue
+            crop_results.append(crop_card(img, os.path.basename(item.path)))
+            card_items.append(item)
         cropped = [img for img, _ in crop_results]
         deskew_angles = [angle for _, angle in crop_results]
-        print(f"[TIMING] Card detection & cropping: {time.time() - crop_start:.3f}s ({len(cropped)} cards)")
+        elapsed = time.time() - crop_start
+        tracing.record("crop", elapsed)
+        print(f"[TIMING] Card detection & cropping: {elapsed:.3f}s ({len(cropped)} cards)")
 
         # Generate metadata for web UI editing
         try:
@@ -668,12 +925,12 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
             # For now, save basic metadata
             pages_layout = layout_items_by_orientation(cropped)
             # Pass original source filenames (which were moved into project images directory)
-            source_filenames = [os.path.basename(item.path) for item in ordered_items]
+            source_filenames = [os.path.basename(item.path) for item in card_items]
             generate_card_2in1_metadata(s.id, cropped, pages_layout, deskew_angles, out_dir, source_filenames)
         except Exception as e:
             print(f"⚠️  Metadata generation failed: {e}")
 
-        # Fast PDF generation with PyMuPDF (imported at module top)
+        # Fast PDF generation with PyMuPDF (imported at the top of this function)
         
         print("\n📊 PDF Generation Speed Test:")
         print("-" * 90)
@@ -686,6 +943,7 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
             page_size=(cfg.a4_page.width_pt, cfg.a4_page.height_pt),
             margin=cfg.margin_pt,
         )
+        tracing.record("pdf_color", time_fast_color)
         print(f"✅ [FAST] Color PDF (PyMuPDF):     {time_fast_color:.3f}s")
         
         # Prepare monochrome PDF
@@ -698,6 +956,7 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
             page_size=(cfg.a4_page.width_pt, cfg.a4_page.height_pt),
             margin=cfg.margin_pt,
         )
+        tracing.record("pdf_mono", time_fast_mono)
         print(f"✅ [FAST] Mono PDF (PyMuPDF):      {time_fast_mono:.3f}s")
         
         print("-" * 90)
@@ -720,12 +979,8 @@ def _process_session_inner(cfg: Config, s: Session, session_start: float, inbox_
         # Unknown mode: do nothing
         return None
 
-    # Unload background removal model to free RAM (~750MB saved)
-    # Applies to both scan_document and card_2in1 modes
-    # Trade-off: +1s load time vs 750MB RAM - worth it for 24/7 agent
-    if mode in (cfg.subdirs.get("scan_document"), "scan_document", 
-                cfg.subdirs.get("card_2in1"), "card_2in1"):
-        _unload_bg_removal_model()
+    # The background removal model is unloaded by _bg_model_scope once no
+    # other session needs it
     
     # Print total session processing time
     total_time = time.time() - session_start
@@ -762,16 +1017,31 @@ class ScanAgent:
 
         # Build notification channels (Telegram + any future channels)
         channels = []
-        bot = TelegramBot.from_config(cfg)
+        bot = None
+        if cfg.telegram.enabled:
+            # python-telegram-bot is only imported when the bot is on
+            from agent.telegram_bot import TelegramBot
+            bot = TelegramBot.from_config(cfg)
+        else:
+            logger.info("Telegram bot is disabled in configuration")
         if bot:
             bot.set_session_callback(self._handle_telegram_command)
             channels.append(bot)
         self.notification_manager = NotificationManager(channels)
 
+        # Confirmed sessions are processed off the event thread so other scanners
+        # keep collecting, and up to max_parallel_sessions process concurrently.
+        # Their PDF writers take pdf_render.FITZ_LOCK per PyMuPDF call (see there).
+        self.processing_pool = ThreadPoolExecutor(
+            max_workers=max(1, cfg.max_parallel_sessions), thread_name_prefix="session"
+        )
+        # ... as long as their estimated peak memory fits (else degraded or queued)
+        self.admission = AdmissionController(ResourceMonitor(cfg.output_dir, cfg.inbox_base))
+
         # Session manager with callbacks for processing and notifications
         self.sessions = SessionManager(
             cfg.session_timeout_seconds,
-            on_confirm=lambda s: process_session(cfg, s, self.notification_manager),
+            on_confirm=self._submit_session,
             on_reject=self._on_session_rejected,
             on_state_change=self._on_session_state_change,
             on_image_added=self._on_image_added,
@@ -788,6 +1058,23 @@ class ScanAgent:
 
         # Wire internal agent API so the web UI and other processes can reach us
         agent_api.init(self.sessions, self.notification_manager, self._handle_telegram_command, config=cfg)
+        if cfg.profile_sessions:
+            session_profiler.arm(cfg.profile_sessions)
+            logger.info(f"🔬 Profiling the next {cfg.profile_sessions} session(s)")
+
+    def _submit_session(self, session: Session) -> None:
+        """SessionManager on_confirm hook: queue the session for processing."""
+        logger.info(f"Queueing session for processing: {session.id} (device: {session.device})")
+        self.processing_pool.submit(process_session, self.cfg, session, self.notification_manager, self.admission)
+
+    def _session_info(self, session: Session, state: str) -> dict:
+        return {
+            "id": session.id,
+            "mode": session.mode,
+            "device": session.device,
+            "state": state,
+            "image_count": len(session.images),
+        }
 
     def _on_session_rejected(self, session: Session) -> None:
         """Called by SessionManager when a session is rejected or times out.
@@ -796,87 +1083,52 @@ class ScanAgent:
         pending-confirmation UI regardless of what triggered the rejection.
         """
         logger.info(f"Session rejected/timed-out: {session.id} (mode: {session.mode})")
-        self.notification_manager.notify_session_action(confirmed=False, action_by="timeout")
+        self.notification_manager.notify_session_action(
+            confirmed=False, action_by="timeout", session_id=session.id
+        )
 
     def _on_session_state_change(self, session: Session, old_state: str, new_state: str) -> None:
         """Broadcast session state changes to all notification channels."""
-        if new_state == "WAIT_CONFIRM":
-            session_info = {
-                "id": session.id,
-                "mode": session.mode,
-                "state": new_state,
-                "image_count": len(session.images),
-            }
-            self.notification_manager.notify_session_ready(session_info)
+        if new_state == STATE_WAIT_CONFIRM:
+            self.notification_manager.notify_session_ready(self._session_info(session, new_state))
             logger.info(f"Session {session.id} ready for confirmation (mode: {session.mode})")
 
     def _on_image_added(self, session: Session) -> None:
         """Notify channels when an image is added to an active session (live count update)."""
-        session_info = {
-            "id": session.id,
-            "mode": session.mode,
-            "state": session.state,
-            "image_count": len(session.images),
-        }
-        self.notification_manager.notify_image_added(session_info)
-
-    def _handle_telegram_command(self, confirm: bool, print_requested: bool) -> None:
-        """Handle commands from Telegram bot."""
-        session_to_process = None
-        is_confirm = confirm
-        request_print = print_requested
-
-        # Find session to process (outside of lock for callback)
-        with self.sessions._lock:
-            latest_session = None
-            for mode, s in self.sessions._by_mode.items():
-                if s.state == "WAIT_CONFIRM":
-                    if latest_session is None or s.last_activity > latest_session.last_activity:
-                        latest_session = s
-
-            if latest_session:
-                # Update session state while holding lock
-                if confirm:
-                    latest_session.state = "CONFIRMED"
-                    latest_session.print_requested = print_requested
-                else:
-                    latest_session.state = "REJECTED"
+        self.notification_manager.notify_image_added(self._session_info(session, session.state))
 
-                # Mark session for processing and clean up tracking
-                session_to_process = latest_session
-                # Clean up tracking references (but keep session object for callback)
-                del self.sessions._by_mode[latest_session.mode]
-                for mode, sus in list(self.sessions._suspended_by_mode.items()):
-                    try:
-                        self.sessions._cleanup_session_files(sus)
-                    except Exception:
-                        pass
-                    del self.sessions._suspended_by_mode[mode]
-
-        # Process session outside of lock to avoid blocking
-        if session_to_process:
-            if confirm:
-                logger.info(f"Session confirmed: {session_to_process.id}")
-                # Notify all channels to remove pending-confirmation UI (e.g. Telegram buttons).
-                # When the action came from Telegram, _do_confirm already snapshot+cleared the
-                # tracked messages, so this becomes a safe no-op for that channel.
-                self.notification_manager.notify_session_action(True, action_by="Web UI")
-                self.sessions.on_confirm_cb(session_to_process)
-            else:
-                logger.info(f"Session rejected: {session_to_process.id}")
-                self.notification_manager.notify_session_action(False, action_by="Web UI")
-                self.sessions._cleanup_session_files(session_to_process)
-                self.sessions.on_reject_cb(session_to_process)
+    def _handle_telegram_command(
+        self, confirm: bool, print_requested: bool, session_id: str = None
+    ) -> None:
+        """Handle confirm/reject commands from Telegram and the Web UI.
+
+        ``session_id`` selects the session; without it the most recent session
+        waiting for confirmation is used.
+        """
+        if confirm:
+            s = self.sessions.confirm_latest(
+                print_requested=print_requested, session_id=session_id, states=(STATE_WAIT_CONFIRM,)
+            )
         else:
-            if confirm:
-                logger.warning("Telegram confirm command received but no session in WAIT_CONFIRM state")
-            else:
-                logger.warning("Telegram reject command received but no session in WAIT_CONFIRM state")
+            s = self.sessions.reject_latest(session_id=session_id, states=(STATE_WAIT_CONFIRM,))
+
+        if s is None:
+            action = "confirm" if confirm else "reject"
+            logger.warning(
+                f"Telegram {action} command received but no matching session in WAIT_CONFIRM state"
+                + (f" (session: {session_id})" if session_id else "")
+            )
+            return
 
+        logger.info(f"Session {'confirmed' if confirm else 'rejected'}: {s.id}")
+        # Notify all channels to remove pending-confirmation UI (e.g. Telegram buttons).
+        # When the action came from Telegram, _do_confirm already snapshot+cleared the
+        # tracked messages, so this becomes a safe no-op for that channel.
+        self.notification_manager.notify_session_action(confirm, action_by="Web UI", session_id=s.id)
 
-    def _on_new_file(self, mode_folder_name: str, path: str):
+    def _on_new_file(self, mode_folder_name: str, path: str, device: str = DEFAULT_DEVICE):
         """Queue event for async processing (non-blocking)"""
-        print(f"[ScanAgent] Queuing file event: {path} in folder: {mode_folder_name}")
+        print(f"[ScanAgent] Queuing file event: {path} in folder: {mode_folder_name} (device: {device})")
         
         # Determine priority: signals get priority 0, images get priority 1
         if mode_folder_name in ("confirm", "confirm_print", "reject"):
@@ -886,7 +1138,7 @@ class ScanAgent:
             priority = 1  # Normal priority
         
         # Put with priority and counter for stable ordering
-        self.event_queue.put((priority, self.event_counter, mode_folder_name, path))
+        self.event_queue.put((priority, self.event_counter, mode_folder_name, path, device))
         self.event_counter += 1
     
     def _process_events(self):
@@ -895,8 +1147,8 @@ class ScanAgent:
         while self.running:
             try:
                 # Wait for event with timeout to check running flag
-                # PriorityQueue returns (priority, counter, mode_folder_name, path)
-                priority, counter, mode_folder_name, path = self.event_queue.get(timeout=0.5)
+                # PriorityQueue returns (priority, counter, mode_folder_name, path, device)
+                priority, counter, mode_folder_name, path, device = self.event_queue.get(timeout=0.5)
                 print(f"[ScanAgent] Processing event (priority={priority}): {path} in folder: {mode_folder_name}")
                 
                 # Map folder name to logical keys
@@ -905,18 +1157,25 @@ class ScanAgent:
                 print(f"[ScanAgent] Mapped to key: {key}")
                 
                 if key in ("confirm", "confirm_print", "reject"):
-                    print(f"[ScanAgent] Signal file detected: {key}")
+                    print(f"[ScanAgent] Signal file detected: {key} (device: {device})")
+                    # A signal from a known device acts on that device's session only;
+                    # anonymous signals fall back to the most recent session overall.
+                    target = None if device == DEFAULT_DEVICE else device
                     if key == "confirm":
                         # Confirm only: scan PDF without printing
                         print("[ScanAgent] Confirming session (no print)")
-                        self.sessions.confirm_latest(print_requested=False)
+                        s = self.sessions.confirm_latest(print_requested=False, device=target)
                     elif key == "confirm_print":
                         # Confirm + print: scan PDF and send to printer
                         print("[ScanAgent] Confirming session (with print)")
-                        self.sessions.confirm_latest(print_requested=True)
+                        s = self.sessions.confirm_latest(print_requested=True, device=target)
                     else:  # reject
                         print("[ScanAgent] Rejecting session")
-                        self.sessions.reject_latest()
+                        s = self.sessions.reject_latest(device=target)
+                    if s is not None:
+                        self.notification_manager.notify_session_action(
+                            key != "reject", action_by=f"scanner {s.device}", session_id=s.id
+                        )
                     # Delete the signal file to keep server light
                     try:
                         if os.path.exists(path):
@@ -925,10 +1184,10 @@ class ScanAgent:
                     except Exception as e:
                         print(f"[ScanAgent] Failed to delete signal file: {e}")
                 else:
-                    print(f"[ScanAgent] Adding image to session: {key}")
-                    self.sessions.add_image(key, path)
+                    print(f"[ScanAgent] Adding image to session: {key} (device: {device})")
+                    self.sessions.add_image(key, path, device=device)
                     # Hint that user navigated to confirm soon
-                    self.sessions.hint_wait_confirm(key)
+                    self.sessions.hint_wait_confirm(key, device=device)
                 
                 self.event_queue.task_done()
                 
@@ -953,7 +1212,8 @@ class ScanAgent:
         # Start internal agent API so web UI and other processes can reach us
         agent_api.start_in_thread()
 
-        print("[ScanAgent] Started (async mode)")
+        print(f"[ScanAgent] Started (async mode) in {time.perf_counter() - _MODULE_START:.2f}s")
+        threading.Thread(target=_warm_up, args=(self.cfg,), name="import-warmup", daemon=True).start()
 
     def stop(self):
         print("[ScanAgent] Stopping...")
@@ -961,6 +1221,7 @@ class ScanAgent:
         self.watcher.stop()
         self.notification_manager.stop_all()
         self.worker_thread.join(timeout=5)
+        self.processing_pool.shutdown(wait=False)
         print("[ScanAgent] Stopped")
 
 
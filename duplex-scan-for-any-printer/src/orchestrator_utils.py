@@ -10,6 +10,7 @@ import sys
 import threading
 from datetime import datetime
 from pathlib import Path
+from typing import List, NamedTuple, Optional
 
 # ANSI color codes (work on Windows 10+ with ENABLE_VIRTUAL_TERMINAL_PROCESSING)
 _RESET = "\033[0m"
@@ -136,6 +137,18 @@ def log_event(log_file, msg: str) -> None:
         log_file.flush()
 
 
+def _child_env(env: dict | None = None) -> dict:
+    """Child environment: unbuffered UTF-8 output, project root and src/ on PYTHONPATH."""
+    merged_env = {**os.environ, "PYTHONUNBUFFERED": "1", "PYTHONIOENCODING": "utf-8", **(env or {})}
+
+    project_root = os.getcwd()
+    src_dir = os.path.join(project_root, "src")
+    extra_paths = os.pathsep.join([project_root, src_dir])
+    existing = merged_env.get('PYTHONPATH', '')
+    merged_env['PYTHONPATH'] = f"{extra_paths}{os.pathsep}{existing}" if existing else extra_paths
+    return merged_env
+
+
 def spawn_child(name: str, cmd: list, log_file_handle=None, env: dict | None = None):
     """Spawn child process with optional log redirection.
 
@@ -145,16 +158,7 @@ def spawn_child(name: str, cmd: list, log_file_handle=None, env: dict | None = N
     Returns (name, proc, stdout_pipe) where stdout_pipe is the pipe to read from
     unless log_file_handle is provided (then returns None for pipe).
     """
-    merged_env = {**os.environ, "PYTHONUNBUFFERED": "1", "PYTHONIOENCODING": "utf-8", **(env or {})}
-
-    # Add project root and src/ to PYTHONPATH
-    project_root = os.getcwd()
-    src_dir = os.path.join(project_root, "src")
-    extra_paths = os.pathsep.join([project_root, src_dir])
-    existing = merged_env.get('PYTHONPATH', '')
-    merged_env['PYTHONPATH'] = f"{extra_paths}{os.pathsep}{existing}" if existing else extra_paths
-
-    kwargs: dict = {"env": merged_env, "cwd": os.getcwd()}
+    kwargs: dict = {"env": _child_env(env), "cwd": os.getcwd()}
     if log_file_handle is not None:
         kwargs["stdout"] = log_file_handle
         kwargs["stderr"] = subprocess.STDOUT
@@ -168,6 +172,59 @@ def spawn_child(name: str, cmd: list, log_file_handle=None, env: dict | None = N
     return (name, proc, stdout_pipe)
 
 
+# Modules each service imports at startup (what ``-m`` runs)
+SERVICE_MODULES = {
+    "agent": "src.main",
+    "ftp": "src.agent.ftp_server",
+    "web": "src.web_ui_server",
+}
+
+
+class ImportTime(NamedTuple):
+    module: str
+    self_s: float
+    cumulative_s: float
+    depth: int
+
+
+def parse_importtime(text: str) -> List[ImportTime]:
+    """Parse ``python -X importtime`` output (stderr) into one row per import."""
+    rows: List[ImportTime] = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # header row
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        rows.append(ImportTime(stripped, self_us / 1e6, cumulative_us / 1e6,
+                               (len(name) - len(stripped) - 1) // 2))
+    return rows
+
+
+def profile_imports(services: Optional[List[str]] = None, top: int = 15) -> None:
+    """Print where each service's startup import time goes (``-X importtime``)."""
+    for name in services or list(SERVICE_MODULES):
+        module = SERVICE_MODULES[name]
+        label = _SERVICE_LABELS.get(name, name)
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              env=_child_env(), cwd=os.getcwd(), capture_output=True, text=True)
+        rows = parse_importtime(proc.stderr)
+        total = sum(r.cumulative_s for r in rows if r.depth == 0)
+        status = "" if proc.returncode == 0 else f"  (import failed, exit code {proc.returncode})"
+        print(f"\n{_BOLD}{label}{_RESET}: import {module} took {total:.3f}s{status}")
+        print(f"  {'self':>8s} {'cumulative':>11s}  module")
+        for r in sorted(rows, key=lambda r: -r.self_s)[:top]:
+            print(f"  {r.self_s:7.3f}s {r.cumulative_s:10.3f}s  {r.module}")
+        if proc.returncode != 0:
+            print(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "")
+
+
 def print_banner(services: list, config_path: str) -> None:
     """Print startup banner with service info."""
     print()
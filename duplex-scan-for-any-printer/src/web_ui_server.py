@@ -4,7 +4,9 @@ FastAPI backend serving REST API and static files
 """
 from __future__ import annotations
 
+import asyncio
 import base64
+import importlib.util
 import io
 import json
 import mimetypes
@@ -13,27 +15,35 @@ import re
 import sys
 import time
 import traceback
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Dict, List, Optional
 
-import cv2
-import fitz  # PyMuPDF
 import httpx
-import numpy as np
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from PIL import Image
 from pydantic import BaseModel
 
-# Try to import pyvips for faster, low-memory image resizing when available
-try:
-    import pyvips
-    HAS_PYVIPS = True
-except Exception:
-    HAS_PYVIPS = False
+# pyvips (faster, low-memory image resizing) is used when installed; it is
+# imported on the first thumbnail, like OpenCV/NumPy in the edit endpoints,
+# so the server starts without loading native imaging libraries
+HAS_PYVIPS = importlib.util.find_spec("pyvips") is not None
+_pyvips_module = None
+
+
+def _pyvips():
+    """The pyvips module, or None if it cannot be loaded (e.g. libvips missing)."""
+    global HAS_PYVIPS, _pyvips_module
+    if _pyvips_module is None and HAS_PYVIPS:
+        try:
+            import pyvips
+            _pyvips_module = pyvips
+        except Exception as e:
+            HAS_PYVIPS = False
+            print(f"ℹ️  pyvips could not be loaded ({e}) — using Pillow (PIL) for thumbnails")
+    return _pyvips_module
 
 
 # Some OS/distro configs map .ts to Qt Linguist MIME type which breaks module
@@ -71,9 +81,11 @@ SCAN_INBOX_DIR = os.getenv("SCAN_INBOX_DIR", get_scan_inbox_dir())
 WEB_UI_PORT = int(os.getenv("WEB_UI_PORT", "8099"))
 # Internal agent API URL (scan agent exposes session/channel state here)
 AGENT_API_URL = os.getenv("AGENT_API_URL", "http://127.0.0.1:8098")
+# Unix socket the agent API also listens on (preferred when present)
+AGENT_API_SOCKET = os.getenv("AGENT_API_SOCKET", "")
 # Always operate in low-resource mode by default to support low-power devices (Raspberry Pi, etc.)
-# We'll cap background thumbnail workers to a small number and use memory-efficient resizing.
-DEFAULT_MAX_WORKERS = 2
+# Blocking work shares one small bounded pool (agent.work_pool; WEB_UI_WORKERS, default 2)
+# and thumbnails use memory-efficient resizing.
 
 # Fix broken SSL_CERT_FILE env var (may be set by another venv/project).
 # httpx creates an SSL context at client init time even for plain http:// calls,
@@ -87,13 +99,31 @@ if _ssl_cert and not os.path.exists(_ssl_cert):
         del os.environ["SSL_CERT_FILE"]
 
 
-def _local_client() -> httpx.AsyncClient:
-    """Return an httpx client suitable for localhost-only calls.
+_agent_http: Optional[httpx.AsyncClient] = None
+_agent_http_uds = False
+
 
-    Using verify=False is safe here because all traffic stays on the loopback
-    interface (127.0.0.1) and never leaves the machine.
+def _agent_client() -> httpx.AsyncClient:
+    """Shared keep-alive httpx client for the agent API (do not close it).
+
+    Goes over ``AGENT_API_SOCKET`` once the agent has created it, else TCP on
+    the loopback interface. Using verify=False is safe here because all
+    traffic stays on this machine.
     """
-    return httpx.AsyncClient(verify=False)
+    global _agent_http, _agent_http_uds
+    use_uds = bool(AGENT_API_SOCKET) and os.path.exists(AGENT_API_SOCKET)
+    if _agent_http is None or (use_uds and not _agent_http_uds):
+        old = _agent_http
+        transport = httpx.AsyncHTTPTransport(uds=AGENT_API_SOCKET) if use_uds else None
+        _agent_http = httpx.AsyncClient(
+            verify=False,
+            transport=transport,
+            limits=httpx.Limits(max_connections=8, max_keepalive_connections=4, keepalive_expiry=60),
+        )
+        _agent_http_uds = use_uds
+        if old is not None:
+            asyncio.get_running_loop().create_task(old.aclose())
+    return _agent_http
 
 app = FastAPI(title="Scan Editor API", version="1.0.0")
 
@@ -104,6 +134,9 @@ _src_dir = str(Path(__file__).resolve().parent)
 if _src_dir not in sys.path:
     sys.path.insert(0, _src_dir)
 
+from agent import image_formats, request_metrics, session_profiler
+from agent.work_pool import PoolOverloaded, get_pool
+
 # Startup info
 print(f"🚀 Scan Editor starting. pyvips available: {HAS_PYVIPS}. Platform: {os.name}/{os.sys.platform}")
 if HAS_PYVIPS:
@@ -120,6 +153,8 @@ app.add_middleware(
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["Content-Type", "Accept"],
 )
+# Per-route latency, in-flight and cache metrics; slowest requests at /api/debug/perf
+app.add_middleware(request_metrics.RequestMetricsMiddleware)
 
 # Models
 class CropBox(BaseModel):
@@ -148,6 +183,19 @@ class CropFromMetadataRequest(BaseModel):
     brightness: Optional[float] = None
     contrast: Optional[float] = None
 
+class CropPreviewRequest(BaseModel):
+    project_id: str
+    image_index: int
+    bbox: Optional[CropBox] = None  # full-resolution coords; None = whole image
+    rotation: Optional[float] = None
+    brightness: Optional[float] = None
+    contrast: Optional[float] = None
+    max_width: int = 800
+    max_height: int = 800
+    format: Optional[str] = None  # 'jpg' | 'webp'; default negotiated from Accept
+    session: Optional[str] = None  # editor tab id, for dropping superseded requests
+    seq: Optional[int] = None
+
 class ProjectMetadata(BaseModel):
     """Project metadata for scan editing"""
     project_id: str
@@ -195,10 +243,23 @@ def _safe_path(base_dir: str, *parts: str) -> str:
 def _safe_500(e: Exception, context: str = "Operation failed") -> HTTPException:
     """Log the real error server-side; return a generic message to the client."""
     print(f"ERROR [{context}]: {e}")
-    import traceback
     traceback.print_exc()
     return HTTPException(status_code=500, detail=context)
 
+async def _offload(fn, *args, key=None):
+    """Run blocking ``fn(*args)`` on the shared bounded worker pool (timed as a request stage)."""
+    return await get_pool().run(request_metrics.timed(fn), *args, key=key)
+
+
+@app.exception_handler(PoolOverloaded)
+async def _pool_overloaded(request: Request, exc: PoolOverloaded):
+    print(f"⏳ Rejecting {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry", "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # API Endpoints
 
 @app.get("/api/health")
@@ -207,15 +268,37 @@ async def health_check():
     return {"status": "ok", "service": "scan-editor"}
 
 
+@app.get("/api/debug/perf")
+async def debug_perf(limit: int = 20):
+    """Per-route latency percentiles, cache results and the slowest recent requests.
+
+    Each slow request carries its stage breakdown (worker pool queue wait and
+    run time per offloaded call) and cache hit/miss counts.
+    """
+    return {
+        "slow_ms": request_metrics.SLOW_MS,
+        "routes": request_metrics.routes(),
+        "cache": request_metrics.cache_results(),
+        "slowest": request_metrics.slowest(limit),
+        "pool": get_pool().metrics(),
+    }
+
+
+@app.get("/api/pool/stats")
+async def pool_stats():
+    """Worker pool queue depth, throughput and rejection counters"""
+    return get_pool().metrics()
+
+
 @app.get("/api/bot/status")
 async def bot_status():
     """Get notification channel statuses from the scan agent."""
     agent_reachable = False
     try:
-        async with _local_client() as client:
-            resp = await client.get(f"{AGENT_API_URL}/api/channels/status", timeout=2.0)
-            channels = resp.json().get("channels", {})
-            agent_reachable = True
+        client = _agent_client()
+        resp = await client.get(f"{AGENT_API_URL}/api/channels/status", timeout=2.0)
+        channels = resp.json().get("channels", {})
+        agent_reachable = True
     except Exception:
         channels = {}
 
@@ -246,194 +329,429 @@ async def bot_status():
 async def bot_info():
     """Return Telegram registered chats / notify_chat_ids for the settings UI."""
     try:
-        async with _local_client() as client:
-            resp = await client.get(f"{AGENT_API_URL}/api/channels/telegram/info", timeout=2.0)
-            return JSONResponse(resp.json())
+        client = _agent_client()
+        resp = await client.get(f"{AGENT_API_URL}/api/channels/telegram/info", timeout=2.0)
+        return JSONResponse(resp.json())
     except Exception:
         return JSONResponse({"registered_chats": {}, "notify_chat_ids": []})
 
 
-@app.get("/api/session/status")
-async def session_status():
-    """Get current session status from the scan agent."""
-    try:
-        async with _local_client() as client:
-            resp = await client.get(f"{AGENT_API_URL}/api/session/current", timeout=2.0)
-            data = resp.json()
-    except Exception:
-        return JSONResponse({
-            "current_session_id": None,
-            "state": "COLLECTING",
-            "mode": "unknown",
-            "image_count": 0,
-            "timeout_seconds": 300,
-            "message": "Agent not reachable",
-        })
-
-    session = data.get("session")
+def _session_status_payload(session: Optional[dict], message: Optional[str] = None) -> dict:
+    """``/api/session/status`` body for the agent's current session (or None)."""
     if not session:
-        return JSONResponse({
+        return {
             "current_session_id": None,
             "state": "COLLECTING",
             "mode": "unknown",
             "image_count": 0,
             "timeout_seconds": 300,
-            "message": "No active session",
-        })
-
-    return JSONResponse({
+            "message": message or "No active session",
+        }
+    return {
         "current_session_id": session.get("id"),
         "state": session.get("state", "COLLECTING"),
         "mode": session.get("mode", "unknown"),
+        "device": session.get("device"),
         "image_count": session.get("image_count", 0),
         "timeout_seconds": 300,
         "message": f"Session {session.get('id')} — {session.get('state')}",
-    })
+    }
+
+
+@app.get("/api/session/status")
+async def session_status():
+    """Get current session status from the scan agent."""
+    try:
+        client = _agent_client()
+        resp = await client.get(f"{AGENT_API_URL}/api/session/current", timeout=2.0)
+        data = resp.json()
+    except Exception:
+        return JSONResponse(_session_status_payload(None, "Agent not reachable"))
+
+    return JSONResponse(_session_status_payload(data.get("session")))
+
+
+async def _agent_event_lines(last_event_id: Optional[str]):
+    """Text lines of the agent's ``/api/events`` stream (pooled client, no read timeout)."""
+    headers = {"Last-Event-ID": last_event_id} if last_event_id else None
+    async with _agent_client().stream(
+        "GET", f"{AGENT_API_URL}/api/events", headers=headers,
+        timeout=httpx.Timeout(5.0, read=None),
+    ) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            yield line
+
+
+_event_relay = None
+
+
+def _session_events_relay():
+    """One upstream agent event stream shared by every browser tab."""
+    global _event_relay
+    if _event_relay is None:
+        from agent.session_events import EventRelay
+        _event_relay = EventRelay(_agent_event_lines)
+    return _event_relay
+
+
+@app.get("/api/session/events")
+async def session_events(request: Request):
+    """Server-Sent Events replacing ``/api/session/status`` polling.
+
+    Each event is the agent's event (``type``, ``data``, ``sessions``,
+    ``current``) plus ``status`` in the ``/api/session/status`` shape. The
+    first event is the latest known state; ``type: "disconnected"`` means the
+    agent went away (the relay reconnects on its own).
+    """
+    relay = _session_events_relay()
+
+    async def _stream():
+        yield "retry: 3000\n\n"
+        async for event in relay.stream():
+            if await request.is_disconnected():
+                break
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            if event.get("type") == "disconnected":
+                status = _session_status_payload(None, "Agent not reachable")
+            else:
+                status = _session_status_payload(event.get("current"))
+            payload = json.dumps({**event, "status": status}, separators=(',', ':'))
+            yield f"data: {payload}\n\n"
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/sessions")
+async def sessions_proxy():
+    """List all active sessions (one per scanner and mode) from the scan agent."""
+    try:
+        client = _agent_client()
+        resp = await client.get(f"{AGENT_API_URL}/api/sessions", timeout=2.0)
+        return JSONResponse(resp.json(), status_code=resp.status_code)
+    except Exception:
+        return JSONResponse({"sessions": [], "message": "Agent not reachable"})
 
 
 @app.post("/api/session/confirm")
-async def session_confirm_proxy(print_requested: bool = False):
+async def session_confirm_proxy(print_requested: bool = False, session_id: Optional[str] = None):
     """Forward confirm command to scan agent."""
+    params = {"print_requested": print_requested}
+    if session_id:
+        params["session_id"] = session_id
     try:
-        async with _local_client() as client:
-            resp = await client.post(
-                f"{AGENT_API_URL}/api/session/confirm",
-                params={"print_requested": print_requested},
-                timeout=5.0,
-            )
-            return JSONResponse(resp.json(), status_code=resp.status_code)
+        client = _agent_client()
+        resp = await client.post(
+            f"{AGENT_API_URL}/api/session/confirm",
+            params=params,
+            timeout=5.0,
+        )
+        return JSONResponse(resp.json(), status_code=resp.status_code)
     except Exception as e:
         return JSONResponse({"ok": False, "message": str(e)}, status_code=503)
 
 
 @app.post("/api/session/reject")
-async def session_reject_proxy():
+async def session_reject_proxy(session_id: Optional[str] = None):
     """Forward reject command to scan agent."""
+    params = {"session_id": session_id} if session_id else None
     try:
-        async with _local_client() as client:
-            resp = await client.post(f"{AGENT_API_URL}/api/session/reject", timeout=5.0)
-            return JSONResponse(resp.json(), status_code=resp.status_code)
+        client = _agent_client()
+        resp = await client.post(f"{AGENT_API_URL}/api/session/reject", params=params, timeout=5.0)
+        return JSONResponse(resp.json(), status_code=resp.status_code)
     except Exception as e:
         return JSONResponse({"ok": False, "message": str(e)}, status_code=503)
 
 
+@app.get("/api/profiling")
+async def profiling_status_proxy():
+    """Session profiler state from the scan agent (armed runs, recent profiles)."""
+    try:
+        client = _agent_client()
+        resp = await client.get(f"{AGENT_API_URL}/api/profiling", timeout=2.0)
+        return JSONResponse(resp.json(), status_code=resp.status_code)
+    except Exception as e:
+        return JSONResponse({"ok": False, "message": str(e)}, status_code=503)
+
+
+@app.post("/api/profiling")
+async def profiling_arm_proxy(sessions: int = 1):
+    """Ask the scan agent to profile the next ``sessions`` sessions (0 disarms)."""
+    try:
+        client = _agent_client()
+        resp = await client.post(f"{AGENT_API_URL}/api/profiling", params={"sessions": sessions}, timeout=5.0)
+        return JSONResponse(resp.json(), status_code=resp.status_code)
+    except Exception as e:
+        return JSONResponse({"ok": False, "message": str(e)}, status_code=503)
+
+
+# Derivative widths served by /api/images (and pre-generated by precache_thumbnails)
+THUMBNAIL_WIDTHS = {'thumbnail': 200, 'medium': 800, 'large': 1600}
+_LEGACY_THUMB_DIRS = ('thumbnail', 'medium', 'large')
+_legacy_thumbs_removed = False
+_pyvips_failed: set = set()
+
+
+def _thumb_store():
+    """Content-addressed derivative store under scan_out/.thumbnails/store."""
+    global _legacy_thumbs_removed
+    from agent.derivative_store import get_store, store_root
+    if not _legacy_thumbs_removed:
+        # Drop the old filename-keyed caches (they collided across projects and were never evicted)
+        import shutil
+        for legacy in _LEGACY_THUMB_DIRS:
+            shutil.rmtree(os.path.join(SCAN_OUT_DIR, '.thumbnails', legacy), ignore_errors=True)
+        _legacy_thumbs_removed = True
+    return get_store(store_root(SCAN_OUT_DIR))
+
+
+def _renderer():
+    """Shared PDF page render service (open-document LRU + cached page renders)."""
+    from agent.derivative_store import store_root
+    from agent.pdf_render import get_render_service
+    _thumb_store()  # one-time legacy cache cleanup
+    return get_render_service(store_root(SCAN_OUT_DIR))
+
+
+def _page_format(request: Optional[Request], fmt: Optional[str], formats=('jpg', 'webp')) -> str:
+    """Explicit ?format= wins; otherwise the smallest of ``formats`` the browser advertises."""
+    if fmt:
+        fmt = image_formats.normalize(fmt)
+        if fmt not in formats or fmt not in image_formats.available():
+            raise HTTPException(status_code=400, detail="Invalid format parameter")
+        return fmt
+    accept = request.headers.get('accept', '') if request is not None else ''
+    return image_formats.negotiate(accept, formats)
+
+
+async def _render_page(filepath: str, page_num: int, dpi: int, fmt: str = 'jpg') -> str:
+    try:
+        return await _offload(_renderer().render, filepath, page_num, dpi, fmt)
+    except IndexError:
+        raise HTTPException(status_code=400, detail="Invalid page number")
+
+
+def _data_url(path: str) -> str:
+    media_type = image_formats.MEDIA_TYPES.get(path.rsplit('.', 1)[-1], 'image/jpeg')
+    with open(path, 'rb') as f:
+        return f"data:{media_type};base64,{base64.b64encode(f.read()).decode()}"
+
+
+def _render_thumbnail(source_path: str, out_path: str, target_width: int, fmt: str = 'jpg') -> None:
+    """Write ``source_path`` scaled to ``target_width`` as ``fmt`` (pyvips, else PIL)."""
+    pyvips = _pyvips() if (source_path, fmt) not in _pyvips_failed else None
+    if pyvips is not None:
+        try:
+            # Sequential access + thumbnail_image: memory-efficient, preserves aspect ratio
+            img = pyvips.Image.new_from_file(source_path, access='sequential')
+            suffix = '.jpg' if fmt == 'jpg' else f".{fmt}[Q={image_formats.QUALITY[fmt]}]"
+            buf = img.thumbnail_image(int(target_width)).write_to_buffer(suffix)
+            with open(out_path, 'wb') as out_f:
+                out_f.write(bytes(buf))
+            return
+        except Exception as e:
+            # Skip pyvips for this file/format from now on and fall back to PIL
+            _pyvips_failed.add((source_path, fmt))
+            print(f"⚠️  pyvips thumbnail failed for {os.path.basename(source_path)}: {type(e).__name__}: {e!r}")
+
+    with Image.open(source_path) as img:
+        img_copy = img.copy()
+    img_copy.thumbnail((target_width, target_width * 3), Image.Resampling.LANCZOS)
+    with open(out_path, 'wb') as out_f:
+        out_f.write(image_formats.encode(img_copy, fmt))
+
+
+def _cached_thumbnail(source_path: str, target_width: int, fmt: str = 'jpg') -> str:
+    """Path of the cached thumbnail, generated once even under concurrent requests."""
+    return _thumb_store().get(
+        source_path, f"w{target_width}", fmt,
+        lambda src, out: _render_thumbnail(src, out, target_width, fmt),
+    )
+
+
+def _render_pdf_cover(pdf_path: str, out_path: str) -> None:
+    from agent.pdf_render import open_document
+    with open_document(pdf_path) as doc:
+        data = doc[0].get_pixmap(dpi=72).tobytes("png")
+    with open(out_path, 'wb') as f:
+        f.write(data)
+
+
+def _catalog():
+    """Project catalog for SCAN_OUT_DIR (reconciled with the directory by mtime)."""
+    from agent.project_catalog import get_catalog
+    catalog = get_catalog(SCAN_OUT_DIR)
+    catalog.reconcile()
+    return catalog
+
+
+def _catalog_page(catalog, limit: int, cursor: Optional[str]):
+    try:
+        return catalog.page(limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _catalog_record(project_id: str) -> None:
+    """Refresh one catalog row after this server changed the project's files."""
+    try:
+        from agent.project_catalog import get_catalog
+        get_catalog(SCAN_OUT_DIR).record(project_id)
+    except Exception as e:
+        print(f"⚠️  Catalog update failed for {project_id}: {e}")
+
+
+def _metadata_store():
+    """Cached, write-coalescing access to scan_out/<project>.json (flushes refresh the catalog)."""
+    from agent.metadata_store import get_metadata_store
+    return get_metadata_store(SCAN_OUT_DIR, on_flush=_catalog_record)
+
+
+def _project_snapshot(project_id: str, missing: str = "Project not found"):
+    """Current metadata snapshot of a project; 404 if it has none. Do not mutate ``.data``."""
+    try:
+        snapshot = _metadata_store().get(project_id)
+    except Exception as e:
+        raise _safe_500(e, "Failed to load project metadata")
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=missing)
+    return snapshot
+
+
+@app.on_event("startup")
+def _load_performance_profile() -> None:
+    """Size the pool and caches from the agent's hardware profile (scan_out/.tuning.json).
+
+    On first start the agent is still calibrating, so wait for the file in the
+    background; components created before it appears keep the defaults.
+    """
+    import threading
+    from agent import tuning
+
+    def _load() -> bool:
+        profile = tuning.read_profile(SCAN_OUT_DIR)
+        if profile is None:
+            return False
+        tuning.use(profile)
+        print(f"⚙️  Performance profile '{profile.get('tier')}' loaded")
+        return True
+
+    def _wait_for_profile() -> None:
+        for _ in range(120):
+            time.sleep(1)
+            if _load():
+                return
+
+    if not _load():
+        threading.Thread(target=_wait_for_profile, name="tuning-profile", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def _flush_metadata() -> None:
+    _metadata_store().flush()
+
+
+@app.on_event("shutdown")
+async def _close_agent_client() -> None:
+    if _event_relay is not None:
+        await _event_relay.close()
+    if _agent_http is not None:
+        await _agent_http.aclose()
+
+
+async def _catalog_refresh(*project_ids: str) -> None:
+    """``_catalog_record`` off the event loop; skipped under overload (reconcile catches up)."""
+    def _run():
+        for project_id in project_ids:
+            _catalog_record(project_id)
+    try:
+        await _offload(_run)
+    except PoolOverloaded:
+        print(f"⚠️  Catalog refresh deferred for {', '.join(project_ids)}: worker pool busy")
+
+
+def _thumbnail_url(entry) -> str:
+    # Versioned by PDF mtime so the browser can cache it forever; relative so it
+    # resolves under the HA ingress prefix like the UI's other api/ URLs
+    return f"api/projects/{entry.id}/thumbnail?v={entry.version}"
+
+
 @app.get("/api/activity")
-async def list_activity():
+async def list_activity(limit: int = 20, cursor: Optional[str] = None):
     """Lightweight list of recent processed scan sessions (no thumbnail generation)."""
     if not os.path.exists(SCAN_OUT_DIR):
-        return {"items": []}
+        return {"items": [], "next_cursor": None}
 
-    items = []
-    for filename in sorted(os.listdir(SCAN_OUT_DIR), reverse=True):
-        # Only color PDFs (skip _mono.pdf)
-        if not filename.endswith(".pdf") or filename.endswith("_mono.pdf"):
-            continue
-        filepath = os.path.join(SCAN_OUT_DIR, filename)
-        if not os.path.isfile(filepath):
-            continue
-        stat = os.stat(filepath)
-        base_name = os.path.splitext(filename)[0]
-
-        # Try to load lightweight metadata from companion JSON
-        md_path = os.path.join(SCAN_OUT_DIR, f"{base_name}.json")
-        pages = None
-        md_created = None
-        if os.path.exists(md_path):
-            try:
-                with open(md_path, "r", encoding="utf-8") as f:
-                    md = json.load(f)
-                    pages = md.get("pages") or md.get("page_count")
-                    md_created = md.get("created")
-            except Exception:
-                pass
-
-        mode = "unknown"
-        if "scan_document" in filename:
-            mode = "scan_document"
-        elif "card" in filename or "2in1" in filename:
-            mode = "card_2in1"
-        elif "duplex" in filename or "copy" in filename:
-            mode = "scan_duplex"
-
-        items.append({
-            "id": base_name,
-            "filename": filename,
-            "mode": mode,
-            "pages": pages,
-            "size_mb": round(stat.st_size / 1024 / 1024, 2),
-            "created": int(md_created) if md_created else int(stat.st_ctime),
-        })
-
-    return {"items": items[:20]}  # cap at 20 most recent
+    entries, next_cursor = _catalog_page(await _offload(_catalog), limit, cursor)
+    items = [{
+        "id": e.id,
+        "filename": e.filename,
+        "mode": e.mode,
+        "pages": e.pages,
+        "size_mb": round(e.size / 1024 / 1024, 2),
+        "created": e.created,
+    } for e in entries]
+    return {"items": items, "next_cursor": next_cursor}
 
 
 @app.get("/api/projects")
-async def list_projects():
-    """List all PDF projects (generated scans) with metadata"""
+async def list_projects(limit: int = 50, cursor: Optional[str] = None):
+    """List PDF projects (generated scans) newest first, paginated by cursor"""
     if not os.path.exists(SCAN_OUT_DIR):
-        return {"projects": []}
-    
-    projects = []
-    for filename in sorted(os.listdir(SCAN_OUT_DIR), reverse=True):
-        if filename.endswith('.pdf') and not filename.endswith('_mono.pdf'):
-            filepath = os.path.join(SCAN_OUT_DIR, filename)
-            stat = os.stat(filepath)
-            
-            # Get PDF info
-            try:
-                doc = fitz.open(filepath)
-                pages_count = len(doc)
-                
-                # Get first page as thumbnail
-                first_page = doc[0]
-                pix = first_page.get_pixmap(dpi=72)
-                thumb_bytes = pix.tobytes("png")
-                thumb_b64 = base64.b64encode(thumb_bytes).decode()
-                
-                doc.close()
-                
-                # Check for metadata file
-                base_name = os.path.splitext(filename)[0]
-                metadata_path = os.path.join(SCAN_OUT_DIR, f"{base_name}.json")
-                has_metadata = os.path.exists(metadata_path)
-                md_created = None
-                md_updated = None
-                if has_metadata:
-                    try:
-                        with open(metadata_path, 'r', encoding='utf-8') as f:
-                            md = json.load(f)
-                            md_created = int(md.get('created')) if isinstance(md.get('created'), (int, float, str)) and str(md.get('created')).isdigit() else None
-                            md_updated = int(md.get('updated')) if isinstance(md.get('updated'), (int, float, str)) and str(md.get('updated')).isdigit() else None
-                    except Exception:
-                        md_created = None
-                        md_updated = None
-                
-                # Extract mode from filename (test_scan_document, test_card_2in1, etc)
-                mode = "unknown"
-                if "scan_document" in filename:
-                    mode = "scan_document"
-                elif "card" in filename or "2in1" in filename:
-                    mode = "card_2in1"
-                elif "duplex" in filename:
-                    mode = "scan_duplex"
-                
-                projects.append({
-                    "id": base_name,
-                    "filename": filename,
-                    "mode": mode,
-                    "pages": pages_count,
-                    "size": stat.st_size,
-                    "size_mb": round(stat.st_size / 1024 / 1024, 2),
-                    "created": int(md_created) if md_created is not None else int(stat.st_ctime),
-                    "updated": int(md_updated) if md_updated is not None else int(stat.st_mtime),
-                    "has_metadata": has_metadata,
-                    "thumbnail": f"data:image/png;base64,{thumb_b64}"
-                })
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
-                continue
-    
-    return {"projects": projects}
+        return {"projects": [], "next_cursor": None, "total": 0}
+
+    catalog = await _offload(_catalog)
+    entries, next_cursor = _catalog_page(catalog, limit, cursor)
+    projects = [{
+        "id": e.id,
+        "filename": e.filename,
+        "mode": e.mode,
+        "pages": e.pages,
+        "size": e.size,
+        "size_mb": round(e.size / 1024 / 1024, 2),
+        "created": e.created,
+        "updated": e.updated,
+        "has_metadata": e.has_metadata,
+        "has_profile": os.path.exists(os.path.join(
+            session_profiler.profile_dir(SCAN_OUT_DIR, e.id), session_profiler.MEMORY_FILE)),
+        "thumbnail": _thumbnail_url(e),
+    } for e in entries]
+    return {"projects": projects, "next_cursor": next_cursor, "total": catalog.count()}
+
+
+@app.get("/api/projects/{project_id}/thumbnail")
+async def get_project_thumbnail(project_id: str, v: Optional[str] = None):
+    """First page of the project PDF at 72 dpi, rendered once into the derivative store"""
+    _validate_project_id(project_id)
+    pdf_path = _safe_path(SCAN_OUT_DIR, f"{project_id}.pdf")
+    if not os.path.exists(pdf_path):
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    try:
+        cache_path = await _offload(_thumb_store().get, pdf_path, 'p0-72dpi', 'png', _render_pdf_cover)
+        entry = (await _offload(_catalog)).get(project_id)
+    except PoolOverloaded:
+        raise
+    except Exception as e:
+        raise _safe_500(e, "Failed to render project thumbnail")
+
+    # Only a URL pinned to the current PDF may be cached forever (Generate rewrites it)
+    try:
+        current = entry is not None and entry.pdf_mtime_ns == os.stat(pdf_path).st_mtime_ns
+    except OSError:
+        current = False
+    pinned = bool(v) and current and v == entry.version
+    return FileResponse(
+        cache_path,
+        media_type="image/png",
+        headers={'Cache-Control': 'public, max-age=31536000, immutable' if pinned else 'no-cache'},
+    )
 
 
 @app.get("/api/projects/{project_id}/images")
@@ -445,31 +763,29 @@ async def get_project_images(project_id: str):
         raise HTTPException(status_code=404, detail="Project not found")
     
     try:
-        doc = fitz.open(pdf_path)
+        from agent.pdf_render import PAGE_DPI
+        renderer = _renderer()
         images = []
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            
-            # Get page as image
-            pix = page.get_pixmap(dpi=150)
-            img_bytes = pix.tobytes("png")
-            img_b64 = base64.b64encode(img_bytes).decode()
+        for page_num, (width, height) in enumerate(await _offload(renderer.page_sizes, pdf_path)):
+            # Page preview from the render cache (same entry the editor's medium size uses)
+            cache_path = await _render_page(pdf_path, page_num, PAGE_DPI["medium"])
             
             # Try to detect individual images on page (for scan_document mode)
             # For now, treat each page as one image
             images.append({
                 "id": f"img_{page_num}",
                 "page": page_num,
-                "width": int(page.rect.width),
-                "height": int(page.rect.height),
-                "thumbnail": f"data:image/png;base64,{img_b64}",
+                "width": int(width),
+                "height": int(height),
+                "thumbnail": _data_url(cache_path),
                 "url": f"/api/scan/{project_id}.pdf/page/{page_num}?size=medium"
             })
         
-        doc.close()
         return {"images": images}
         
+    except (HTTPException, PoolOverloaded):
+        raise
     except Exception as e:
         raise _safe_500(e, "Failed to extract project images")
 
@@ -478,16 +794,7 @@ async def get_project_images(project_id: str):
 async def get_project_metadata(project_id: str):
     """Get project metadata from pipeline-generated JSON"""
     _validate_project_id(project_id)
-    metadata_path = _safe_path(SCAN_OUT_DIR, f"{project_id}.json")
-
-    if not os.path.exists(metadata_path):
-        raise HTTPException(status_code=404, detail="Metadata not found")
-
-    try:
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-    except Exception as e:
-        raise _safe_500(e, "Failed to load project metadata")
+    metadata = _project_snapshot(project_id, "Metadata not found").copy()
 
     # Metadata now stores simple filenames (no paths)
     # Frontend will use /api/images/{project_id}/{filename} to access
@@ -502,6 +809,62 @@ async def get_project_metadata(project_id: str):
     return metadata
 
 
+@app.get("/api/projects/{project_id}/profile")
+async def get_project_profile(project_id: str):
+    """Profile files recorded for the project's session (empty when it was not profiled)."""
+    _validate_project_id(project_id)
+    directory = _safe_path(SCAN_OUT_DIR, project_id, session_profiler.PROFILE_DIR)
+    files = []
+    for name in session_profiler.PROFILE_FILES:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            files.append({
+                "name": name,
+                "size": os.path.getsize(path),
+                "url": f"api/projects/{project_id}/profile/{name}",
+            })
+    return {"files": files}
+
+
+@app.get("/api/projects/{project_id}/profile/{name}")
+async def download_project_profile(project_id: str, name: str):
+    """Download a profile file: ``stacks.collapsed`` (flamegraph input) or ``memory.json``."""
+    _validate_project_id(project_id)
+    if name not in session_profiler.PROFILE_FILES:
+        raise HTTPException(status_code=404, detail="Unknown profile file")
+    path = _safe_path(SCAN_OUT_DIR, project_id, session_profiler.PROFILE_DIR, name)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "application/json" if name.endswith(".json") else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=f"{project_id}_{name}")
+
+
+def _extract_pdf_pages(pdf_path: str, images_dir: str) -> List[str]:
+    """Rasterise every page of ``pdf_path`` to ``images_dir/page_<n>.jpg`` at 150 dpi."""
+    from agent.pdf_render import open_document
+    out_files = []
+    with open_document(pdf_path) as doc:
+        for i, page in enumerate(doc):
+            pix = page.get_pixmap(dpi=150)
+            outname = f"page_{i}.jpg"
+            outpath = os.path.join(images_dir, outname)
+            # Save page image (atomic write)
+            tmp_out = outpath + '.tmp'
+            try:
+                pix.save(tmp_out)
+                try:
+                    os.replace(tmp_out, outpath)
+                except Exception:
+                    os.rename(tmp_out, outpath)
+            except Exception:
+                # Fallback: write bytes directly
+                with open(outpath, 'wb') as w:
+                    w.write(pix.tobytes('jpg'))
+
+            out_files.append(outname)
+    return out_files
+
+
 @app.get("/api/projects/{project_id}/output")
 async def get_project_output(project_id: str):
     """Return list of output image filenames for a project.
@@ -534,42 +897,56 @@ async def get_project_output(project_id: str):
                 # Ensure images dir exists
                 os.makedirs(project_images_dir, exist_ok=True)
                 try:
-                    doc = fitz.open(pdf_path)
-                    out_files = []
-                    for i, page in enumerate(doc):
-                        pix = page.get_pixmap(dpi=150)
-                        outname = f"page_{i}.jpg"
-                        outpath = os.path.join(project_images_dir, outname)
-                        # Save page image (atomic write)
-                        tmp_out = outpath + '.tmp'
-                        try:
-                            pix.save(tmp_out)
-                            try:
-                                os.replace(tmp_out, outpath)
-                            except Exception:
-                                os.rename(tmp_out, outpath)
-                        except Exception:
-                            # Fallback: write bytes directly
-                            with open(outpath, 'wb') as w:
-                                w.write(pix.tobytes('jpg'))
-
-                        out_files.append(outname)
-                    doc.close()
+                    out_files = await _offload(_extract_pdf_pages, pdf_path, project_images_dir)
                     return {"images": out_files}
+                except PoolOverloaded:
+                    raise
                 except Exception as e:
                     raise HTTPException(status_code=500, detail=f"Failed to extract PDF pages: {e}")
 
         # Nothing found
         return {"images": []}
 
-    except HTTPException:
+    except (HTTPException, PoolOverloaded):
         raise
     except Exception as e:
         raise _safe_500(e, "Failed to get project output")
 
 
+def _project_image_path(project_id: str, filename: str) -> str:
+    """Source path of an image listed in the project's metadata (validated)."""
+    # Security: Prevent directory traversal
+    if '..' in filename or filename.startswith('/') or '\\' in filename:
+        raise HTTPException(status_code=400, detail="Invalid filename")
+
+    # Security: Validate project_id
+    _validate_project_id(project_id)
+
+    # Security: Validate project exists and the image belongs to it (cached metadata + filename index)
+    img_meta = _project_snapshot(project_id).image(filename)
+
+    if not img_meta:
+        raise HTTPException(status_code=404, detail=f"Image not in project: {filename}")
+
+    # Only serve images from the project's `images` folder under SCAN_OUT_DIR
+    project_images_dir = _safe_path(SCAN_OUT_DIR, project_id, 'images')
+
+    # Build expected path
+    source_path = _safe_path(project_images_dir, filename)
+
+    if not os.path.exists(source_path):
+        raise HTTPException(status_code=404, detail=f"Source image not found for: {filename}")
+
+    # Security: Check file size of original (limit 50MB)
+    source_size = os.path.getsize(source_path)
+    if source_size > 50 * 1024 * 1024:
+        raise HTTPException(status_code=413, detail="Source file too large")
+    return source_path
+
+
 @app.get("/api/images/{filename}")
-async def get_project_image(filename: str, project_id: str, size: str = "medium", request: Request = None):
+async def get_project_image(filename: str, project_id: str, size: str = "medium",
+                            format: Optional[str] = None, request: Request = None):
     """Serve image with smart resizing and caching
     
     Strategy:
@@ -591,62 +968,18 @@ async def get_project_image(filename: str, project_id: str, size: str = "medium"
     Performance:
     - Disk cache for generated thumbnails
     - ETags for browser caching
-    - Progressive JPEG for faster loading
+    - AVIF/WebP thumbnails when the browser's Accept header allows (Vary: Accept)
     
     Args:
         filename: Image filename
         project_id: Project ID
         size: Image size (thumbnail/medium/large/original)
+        format: jpg | webp | avif (default: negotiated from Accept)
     """
-    # Security: Prevent directory traversal
-    if '..' in filename or filename.startswith('/') or '\\' in filename:
-        raise HTTPException(status_code=400, detail="Invalid filename")
+    source_path = _project_image_path(project_id, filename)
 
-    # Security: Validate project_id
-    _validate_project_id(project_id)
-
-    # Security: Validate project exists and get source path
-    project_json = _safe_path(SCAN_OUT_DIR, f"{project_id}.json")
-    if not os.path.exists(project_json):
-        raise HTTPException(status_code=404, detail="Project not found")
-    
-    # Load metadata to get source_path
-    try:
-        with open(project_json, 'r') as f:
-            metadata = json.load(f)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Failed to load metadata")
-    
-    # Find image in metadata
-    img_meta = next((img for img in metadata.get('images', []) 
-                    if img.get('filename') == filename or img.get('source_file') == filename), None)
-
-    if not img_meta:
-        raise HTTPException(status_code=404, detail=f"Image not in project: {filename}")
-
-    # Only serve images from the project's `images` folder under SCAN_OUT_DIR
-    project_images_dir = _safe_path(SCAN_OUT_DIR, project_id, 'images')
-
-    # Build expected path
-    source_path = _safe_path(project_images_dir, filename)
-
-    if not os.path.exists(source_path):
-        raise HTTPException(status_code=404, detail=f"Source image not found for: {filename}")
-    
-    # Security: Check file size of original (limit 50MB)
-    source_size = os.path.getsize(source_path)
-    if source_size > 50 * 1024 * 1024:
-        raise HTTPException(status_code=413, detail="Source file too large")
-    
     # Size configuration
-    size_config = {
-        'thumbnail': 200,
-        'medium': 800,
-        'large': 1600,
-        'original': None
-    }
-    
-    target_width = size_config.get(size)
+    target_width = THUMBNAIL_WIDTHS.get(size)
     if target_width is None and size != 'original':
         raise HTTPException(status_code=400, detail="Invalid size parameter")
     
@@ -658,142 +991,34 @@ async def get_project_image(filename: str, project_id: str, size: str = "medium"
         
         # Check If-None-Match
         if request and request.headers.get('if-none-match') == etag:
-            return JSONResponse(status_code=304, content=None)
-        
-        return FileResponse(
-            source_path,
-            media_type="image/jpeg",
-            headers={
-                'ETag': etag,
-                'Last-Modified': last_modified,
-                'Cache-Control': 'public, max-age=31536000, immutable',
-            }
-        )
-    
-    # Thumbnail: check cache first
-    cache_dir = os.path.join(SCAN_OUT_DIR, '.thumbnails', size)
-    os.makedirs(cache_dir, exist_ok=True)
-    
-    cache_path = os.path.join(cache_dir, filename)
-    
-    # Generate thumbnail if not cached or source is newer
-    source_mtime = os.path.getmtime(source_path)
-    needs_generate = True
-    
-    if os.path.exists(cache_path):
-        cache_mtime = os.path.getmtime(cache_path)
-        if cache_mtime >= source_mtime:
-            needs_generate = False
-    
-    if needs_generate:
-        try:
-            # Generate thumbnail using PIL with efficient settings and atomic write
-            from PIL import Image as PILImage
-
-            # Prefer pyvips if available for speed + low memory
-            # Skip pyvips for files marked as problematic
-            no_pyvips_marker = cache_path + '.no_pyvips'
-            if HAS_PYVIPS and not os.path.exists(no_pyvips_marker):
-                try:
-                    # pyvips: use the class helper to get a JPEG buffer directly
-                    try:
-                        # Safer pyvips path: open file with sequential access and produce a resized image
-                        # This avoids pyvips returning unexpected types from convenience helpers.
-                        img = pyvips.Image.new_from_file(source_path, access='sequential')
-                        # Use thumbnail_image which preserves aspect ratio and is memory-efficient
-                        img_thumb = img.thumbnail_image(int(target_width))
-
-                        # Convert to JPEG buffer
-                        buf = img_thumb.write_to_buffer('.jpg')
-
-                        # Normalize buffer to bytes if necessary
-                        if isinstance(buf, memoryview):
-                            buf = bytes(buf)
-                        elif isinstance(buf, bytearray):
-                            buf = bytes(buf)
-                        elif isinstance(buf, str):
-                            try:
-                                buf = buf.encode('latin-1')
-                            except Exception:
-                                buf = buf.encode('utf-8', errors='ignore')
-
-                        tmp_cache = cache_path + '.tmp'
-                        with open(tmp_cache, 'wb') as out_f:
-                            out_f.write(buf)
-                        try:
-                            os.replace(tmp_cache, cache_path)
-                        except Exception:
-                            os.rename(tmp_cache, cache_path)
-                    except Exception as e:
-                        # If pyvips failed for this file, mark it so we skip it next time
-                        try:
-                            open(no_pyvips_marker, 'w').close()
-                        except Exception:
-                            pass
-                        # propagate to outer handler which logs and falls back to PIL
-                        raise
-                except Exception as e:
-                    print(f"⚠️  pyvips thumbnail failed for {filename}: {type(e).__name__}: {repr(e)}")
-                    try:
-                        print('pyvips version:', getattr(pyvips, '__version__', 'unknown'))
-                    except Exception:
-                        pass
-                    # show traceback
-                    traceback.print_exc()
-                    # show buf info if available
-                    try:
-                        if 'buf' in locals():
-                            b = locals().get('buf')
-                            print('pyvips buf type:', type(b))
-                            try:
-                                if isinstance(b, (bytes, bytearray, memoryview)):
-                                    print('pyvips buf len:', len(b))
-                                    print('pyvips buf head:', bytes(b)[:64])
-                                elif isinstance(b, str):
-                                    print('pyvips buf (str) len:', len(b))
-                                    print('pyvips buf head (repr):', repr(b[:64]))
-                                else:
-                                    print('pyvips buf repr:', repr(b)[:128])
-                            except Exception:
-                                pass
-                    except Exception:
-                        pass
-                    # fallback to PIL
-                    with PILImage.open(source_path) as img:
-                        img_copy = img.copy()
-                        img_copy.thumbnail((target_width, target_width * 3), PILImage.Resampling.LANCZOS)
-                        tmp_cache = cache_path + '.tmp'
-                        img_copy.save(tmp_cache, 'JPEG', quality=78)
-                        try:
-                            os.replace(tmp_cache, cache_path)
-                        except Exception:
-                            os.rename(tmp_cache, cache_path)
-            else:
-                with PILImage.open(source_path) as img:
-                    # Use in-place thumbnail to be memory efficient (low RAM)
-                    img_copy = img.copy()
-                    img_copy.thumbnail((target_width, int(target_width * 3)), PILImage.Resampling.LANCZOS)
-                    tmp_cache = cache_path + '.tmp'
-                    img_copy.save(tmp_cache, 'JPEG', quality=80)
-                    try:
-                        os.replace(tmp_cache, cache_path)
-                    except Exception:
-                        os.rename(tmp_cache, cache_path)
-
-            # Small log for debug
-            try:
-                print(f"🖼️  Generated {size} thumbnail: {filename} ({source_size // 1024}KB → {os.path.getsize(cache_path) // 1024}KB)")
-            except Exception:
-                pass
-
-        except Exception as e:
-            print(f"⚠️  Thumbnail generation failed for {filename}: {e}")
-            # Fallback to original
-            cache_path = source_path
+            return JSONResponse(status_code=304, content=None)
+        
+        return FileResponse(
+            source_path,
+            media_type="image/jpeg",
+            headers={
+                'ETag': etag,
+                'Last-Modified': last_modified,
+                'Cache-Control': 'public, max-age=31536000, immutable',
+            }
+        )
     
-    # Serve cached thumbnail
+    # Thumbnail: content-addressed cache (single-flight generation off the event loop)
+    fmt = _page_format(request, format, image_formats.available())
+    try:
+        cache_path = await _offload(_cached_thumbnail, source_path, target_width, fmt)
+        media_type = image_formats.MEDIA_TYPES[fmt]
+    except PoolOverloaded:
+        raise
+    except Exception as e:
+        print(f"⚠️  Thumbnail generation failed for {filename}: {e}")
+        # Fallback to original
+        cache_path = source_path
+        media_type = "image/jpeg"
+
+    # Serve cached thumbnail (file name embeds the source hash + variant)
     file_stat = os.stat(cache_path)
-    etag = f'"{file_stat.st_mtime}-{file_stat.st_size}-{size}"'
+    etag = f'"{os.path.basename(cache_path)}-{file_stat.st_size}"'
     last_modified = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(file_stat.st_mtime))
     
     # Check If-None-Match
@@ -802,20 +1027,117 @@ async def get_project_image(filename: str, project_id: str, size: str = "medium"
     
     return FileResponse(
         cache_path,
-        media_type="image/jpeg",
+        media_type=media_type,
         headers={
             'ETag': etag,
             'Last-Modified': last_modified,
             'Cache-Control': 'public, max-age=31536000, immutable',
+            'Vary': 'Accept',
         }
     )
 
 
+def _tiles():
+    """Shared Deep Zoom tile pyramid (tiles cached in the derivative store)."""
+    from agent.tile_pyramid import get_tile_pyramid
+    return get_tile_pyramid(_thumb_store())
+
+
+def _tile_descriptor(source_path: str):
+    pyramid = _tiles()
+    return pyramid.info(source_path), pyramid.version(source_path)
+
+
+def _tile_with_version(source_path: str, level: int, col: int, row: int, fmt: str):
+    pyramid = _tiles()
+    return pyramid.tile(source_path, level, col, row, fmt), pyramid.version(source_path)
+
+
+@app.get("/api/projects/{project_id}/tiles/{filename}.dzi")
+async def get_image_dzi(project_id: str, filename: str, request: Request, format: Optional[str] = None):
+    """Deep Zoom descriptor for a project image (OpenSeadragon-compatible).
+
+    Tiles live at ``{filename}_files/{level}/{col}_{row}.{format}``; append
+    ``?v=<version>`` (from the ETag or the ``.json`` descriptor) to get
+    immutable caching.
+    """
+    source_path = _project_image_path(project_id, filename)
+    fmt = _page_format(request, format)
+    try:
+        info, version = await _offload(_tile_descriptor, source_path)
+    except PoolOverloaded:
+        raise
+    except Exception as e:
+        raise _safe_500(e, "Failed to read image")
+    etag = f'"{version}-{fmt}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept'}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=info.dzi_xml(fmt), media_type="application/xml", headers=headers)
+
+
+@app.get("/api/projects/{project_id}/tiles/{filename}.json")
+async def get_image_tile_info(project_id: str, filename: str, request: Request, format: Optional[str] = None):
+    """Pyramid geometry plus a versioned tile URL template for a project image"""
+    source_path = _project_image_path(project_id, filename)
+    fmt = _page_format(request, format)
+    try:
+        info, version = await _offload(_tile_descriptor, source_path)
+    except PoolOverloaded:
+        raise
+    except Exception as e:
+        raise _safe_500(e, "Failed to read image")
+    return {
+        "width": info.width,
+        "height": info.height,
+        "tile_size": info.tile_size,
+        "overlap": info.overlap,
+        "max_level": info.max_level,
+        "format": fmt,
+        "version": version,
+        # Relative, like the UI's other api/ URLs, so it resolves under the HA ingress prefix
+        "tiles": f"api/projects/{project_id}/tiles/{filename}_files/{{level}}/{{col}}_{{row}}.{fmt}?v={version}",
+    }
+
+
+@app.get("/api/projects/{project_id}/tiles/{filename}_files/{level:int}/{col:int}_{row:int}.{fmt}")
+async def get_image_tile(project_id: str, filename: str, level: int, col: int, row: int, fmt: str,
+                         request: Request, v: Optional[str] = None):
+    """One Deep Zoom tile, generated on first request and cached by source content"""
+    from agent.tile_pyramid import FORMATS
+    fmt = fmt.lower().replace('jpeg', 'jpg')
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid format parameter")
+    source_path = _project_image_path(project_id, filename)
+    try:
+        # One fairness queue per image: a zoom burst of tiles does not crowd out other work
+        tile_path, version = await _offload(_tile_with_version, source_path, level, col, row, fmt,
+                                            key=f"tiles:{project_id}/{filename}")
+    except IndexError:
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    except PoolOverloaded:
+        raise
+    except Exception as e:
+        raise _safe_500(e, "Failed to render tile")
+
+    # Tile files are content-addressed; only a URL pinned to this version may be cached forever
+    etag = f'"{os.path.basename(tile_path)}"'
+    pinned = bool(v) and v == version
+    headers = {
+        'ETag': etag,
+        'Cache-Control': 'public, max-age=31536000, immutable' if pinned else 'no-cache',
+    }
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(tile_path, media_type=FORMATS[fmt], headers=headers)
+
+
 @app.post("/api/projects/{project_id}/precache_thumbnails")
 async def precache_thumbnails(project_id: str, request: Request):
-    """Pre-generate thumbnails for a project (background worker using thread pool).
+    """Pre-generate thumbnails for a project (on the shared worker pool).
 
-    Expects optional JSON body: { "sizes": ["thumbnail","medium","large"] }
+    Expects optional JSON body: { "sizes": ["thumbnail","medium","large"], "formats": ["avif","webp","jpg"] }
+    (formats default to the one negotiated from this request's Accept header).
     Returns a summary of generated/cached/missing files.
     """
     try:
@@ -824,105 +1146,47 @@ async def precache_thumbnails(project_id: str, request: Request):
         body = {}
 
     size_list = body.get('sizes') if isinstance(body.get('sizes'), list) else ['thumbnail', 'medium', 'large']
+    if isinstance(body.get('formats'), list):
+        format_list = [_page_format(None, str(f), image_formats.available()) for f in body['formats']]
+    else:
+        format_list = [_page_format(request, None, image_formats.available())]
 
-    metadata_path = os.path.join(SCAN_OUT_DIR, f"{project_id}.json")
-    if not os.path.exists(metadata_path):
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    try:
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read metadata: {e}")
+    _validate_project_id(project_id)
+    metadata = _project_snapshot(project_id).data
 
     images = [img.get('filename') or img.get('source_file') for img in metadata.get('images', []) if img.get('filename') or img.get('source_file')]
     if not images:
         return {"status": "no_images"}
 
     # Worker to generate one thumbnail
-    def generate_one(fname, sz):
+    store = _thumb_store()
+
+    def generate_one(fname, sz, fmt):
         try:
             project_images_dir = os.path.join(SCAN_OUT_DIR, project_id, 'images')
             source_path = os.path.join(project_images_dir, fname)
             if not os.path.exists(source_path):
                 return (fname, sz, 'missing')
 
-            cache_dir = os.path.join(SCAN_OUT_DIR, '.thumbnails', sz)
-            os.makedirs(cache_dir, exist_ok=True)
-            cache_path = os.path.join(cache_dir, fname)
-
-            try:
-                source_mtime = os.path.getmtime(source_path)
-                if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= source_mtime:
-                    return (fname, sz, 'cached')
-            except Exception:
-                pass
-
-            # Prefer pyvips when available, unless file marked to skip
-            cache_no_pyvips = os.path.join(SCAN_OUT_DIR, '.thumbnails', sz, fname + '.no_pyvips')
-            if HAS_PYVIPS and not os.path.exists(cache_no_pyvips):
-                try:
-                    w = {'thumbnail':200,'medium':800,'large':1600}.get(sz,800)
-                    # Safer: open with sequential access and thumbnail_image
-                    img = pyvips.Image.new_from_file(source_path, access='sequential')
-                    img_thumb = img.thumbnail_image(int(w))
-                    buf = img_thumb.write_to_buffer('.jpg')
-                    if isinstance(buf, memoryview):
-                        buf = bytes(buf)
-                    elif isinstance(buf, bytearray):
-                        buf = bytes(buf)
-                    elif isinstance(buf, str):
-                        try:
-                            buf = buf.encode('latin-1')
-                        except Exception:
-                            buf = buf.encode('utf-8', errors='ignore')
-                    tmp_cache = os.path.join(SCAN_OUT_DIR, '.thumbnails', sz, fname + '.tmp')
-                    with open(tmp_cache, 'wb') as out_f:
-                        out_f.write(buf)
-                    try:
-                        os.replace(tmp_cache, os.path.join(SCAN_OUT_DIR, '.thumbnails', sz, fname))
-                    except Exception:
-                        os.rename(tmp_cache, os.path.join(SCAN_OUT_DIR, '.thumbnails', sz, fname))
-                    return (fname, sz, 'generated')
-                except Exception:
-                    # mark file to skip pyvips for future runs
-                    try:
-                        open(cache_no_pyvips, 'w').close()
-                    except Exception:
-                        pass
-                    # fallback to PIL below
-                    pass
-
-            # PIL fallback
-            from PIL import Image as PILImage
-            with PILImage.open(source_path) as img:
-                aspect_ratio = img.height / img.width
-                target_width = {'thumbnail':200,'medium':800,'large':1600}.get(sz,800)
-                new_width = target_width
-                new_height = int(target_width * aspect_ratio)
-                img_resized = img.resize((new_width, new_height), PILImage.Resampling.LANCZOS)
-                tmp_cache = os.path.join(SCAN_OUT_DIR, '.thumbnails', sz, fname + '.tmp')
-                img_resized.save(tmp_cache, 'JPEG', quality=80)
-                try:
-                    os.replace(tmp_cache, os.path.join(SCAN_OUT_DIR, '.thumbnails', sz, fname))
-                except Exception:
-                    os.rename(tmp_cache, os.path.join(SCAN_OUT_DIR, '.thumbnails', sz, fname))
+            width = THUMBNAIL_WIDTHS.get(sz, 800)
+            variant = f"w{width}"
+            if os.path.exists(store.path_for(store.source_digest(source_path), variant, fmt)):
+                return (fname, sz, 'cached')
+            _cached_thumbnail(source_path, width, fmt)
             return (fname, sz, 'generated')
 
         except Exception as e:
             return (fname, sz, f'error:{str(e)[:200]}')
 
-    # Limit parallelism on low-resource devices like Raspberry Pi
-    # Always limit parallelism to a small number to avoid high CPU/RAM usage on embedded devices
-    max_workers = DEFAULT_MAX_WORKERS
+    # Shared worker pool: a small windowed batch, interleaved fairly with interactive requests
+    get_pool().check_admission()
     results = []
-    with ThreadPoolExecutor(max_workers=max_workers) as ex:
-        futures = [ex.submit(generate_one, fname, sz) for fname in images for sz in size_list]
-        for fut in as_completed(futures):
-            try:
-                results.append(fut.result())
-            except Exception as e:
-                results.append(('unknown', 'unknown', f'error:{str(e)[:200]}'))
+    jobs = [(fname, sz, fmt) for fname in images for sz in size_list for fmt in format_list]
+    async for _, result, error in get_pool().map_unordered(request_metrics.timed(generate_one, wait=False), jobs):
+        if error is not None:
+            results.append(('unknown', 'unknown', f'error:{str(error)[:200]}'))
+        else:
+            results.append(result)
 
     summary = {}
     for fname, sz, status in results:
@@ -941,7 +1205,7 @@ async def update_project_metadata(project_id: str, request: Request):
     metadata file. This prevents the client from overwriting server-
     managed fields like `created`, `original_pdf`, etc.
     """
-    metadata_path = os.path.join(SCAN_OUT_DIR, f"{project_id}.json")
+    _validate_project_id(project_id)
 
     try:
         payload = await request.json()
@@ -953,26 +1217,6 @@ async def update_project_metadata(project_id: str, request: Request):
     if incoming_images is None:
         raise HTTPException(status_code=400, detail="Request must include 'images' list")
 
-    # Load existing metadata if present, otherwise initialize a minimal structure
-    if os.path.exists(metadata_path):
-        try:
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to read existing metadata: {e}")
-    else:
-        metadata = {
-            'project_id': project_id,
-            'original_pdf': f"{project_id}.pdf",
-            'created': int(time.time()),
-            'updated': int(time.time()),
-            'images': [],
-            'layout': None
-        }
-
-    # Ensure images list exists
-    metadata.setdefault('images', [])
-
     # Helper to normalize bbox entries
     def sanitize_bbox(b):
         # Accept either single bbox object or list of bbox objects
@@ -997,88 +1241,100 @@ async def update_project_metadata(project_id: str, request: Request):
         else:
             return None
 
-    # Index existing images by id and filename for quick lookup
-    id_index = {img.get('id'): img for img in metadata['images'] if 'id' in img}
-    fn_index = {img.get('filename'): img for img in metadata['images'] if 'filename' in img}
-
-    updated_ids = []
     now_ts = int(time.time())
 
-    # Allowed fields client may update per image
-    allowed_fields = {'rotation', 'deskew_angle', 'brightness', 'contrast', 'bbox'}
-
-    for inc in incoming_images:
-        if not isinstance(inc, dict):
-            continue
-
-        img_id = inc.get('id')
-        filename = inc.get('filename')
-
-        target = None
-        if img_id and img_id in id_index:
-            target = id_index[img_id]
-        elif filename and filename in fn_index:
-            target = fn_index[filename]
-
-        # If target not found, create a new minimal image entry and append
-        if target is None:
-            target = {
-                'id': img_id or f"img_{len(metadata['images'])}",
-                'filename': filename or '',
-                'page': inc.get('page'),
-                'width': inc.get('width'),
-                'height': inc.get('height'),
-                'rotation': 0,
-                'deskew_angle': 0.0,
-                'brightness': 1.0,
-                'contrast': 1.0,
-                'bbox': None
-            }
-            metadata['images'].append(target)
-            # update indexes
-            id_index[target.get('id')] = target
-            if target.get('filename'):
-                fn_index[target.get('filename')] = target
-
-        # Merge allowed fields
-        for k, v in inc.items():
-            if k in allowed_fields:
-                if k == 'bbox':
-                    sanitized = sanitize_bbox(v)
-                    target['bbox'] = sanitized
-                elif k in ('brightness', 'contrast'):
-                    try:
-                        target[k] = float(v)
-                    except Exception:
-                        pass
-                elif k in ('rotation', 'deskew_angle'):
-                    try:
-                        target[k] = float(v)
-                    except Exception:
-                        pass
+    def new_metadata():
+        # No metadata yet: initialize a minimal structure
+        return {
+            'project_id': project_id,
+            'original_pdf': f"{project_id}.pdf",
+            'created': now_ts,
+            'updated': now_ts,
+            'images': [],
+            'layout': None
+        }
+
+    def merge(metadata):
+        # Ensure images list exists
+        metadata.setdefault('images', [])
+
+        # Index existing images by id and filename for quick lookup
+        id_index = {img.get('id'): img for img in metadata['images'] if 'id' in img}
+        fn_index = {img.get('filename'): img for img in metadata['images'] if 'filename' in img}
+
+        updated_ids = []
+
+        # Allowed fields client may update per image
+        allowed_fields = {'rotation', 'deskew_angle', 'brightness', 'contrast', 'bbox'}
+
+        for inc in incoming_images:
+            if not isinstance(inc, dict):
+                continue
+
+            img_id = inc.get('id')
+            filename = inc.get('filename')
+
+            target = None
+            if img_id and img_id in id_index:
+                target = id_index[img_id]
+            elif filename and filename in fn_index:
+                target = fn_index[filename]
+
+            # If target not found, create a new minimal image entry and append
+            if target is None:
+                target = {
+                    'id': img_id or f"img_{len(metadata['images'])}",
+                    'filename': filename or '',
+                    'page': inc.get('page'),
+                    'width': inc.get('width'),
+                    'height': inc.get('height'),
+                    'rotation': 0,
+                    'deskew_angle': 0.0,
+                    'brightness': 1.0,
+                    'contrast': 1.0,
+                    'bbox': None
+                }
+                metadata['images'].append(target)
+                # update indexes
+                id_index[target.get('id')] = target
+                if target.get('filename'):
+                    fn_index[target.get('filename')] = target
+
+            # Merge allowed fields
+            for k, v in inc.items():
+                if k in allowed_fields:
+                    if k == 'bbox':
+                        sanitized = sanitize_bbox(v)
+                        target['bbox'] = sanitized
+                    elif k in ('brightness', 'contrast'):
+                        try:
+                            target[k] = float(v)
+                        except Exception:
+                            pass
+                    elif k in ('rotation', 'deskew_angle'):
+                        try:
+                            target[k] = float(v)
+                        except Exception:
+                            pass
 
-        updated_ids.append(target.get('id'))
+            updated_ids.append(target.get('id'))
 
-    # Update the updated timestamp and write back safely
-    metadata['updated'] = now_ts
+        # Update the updated timestamp
+        metadata['updated'] = now_ts
+        return updated_ids
 
+    # Applied to an in-memory copy; rapid saves are coalesced into one atomic write
+    # (the catalog row is refreshed when it lands)
     try:
-        tmp_path = metadata_path + '.tmp'
-        with open(tmp_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2, ensure_ascii=False)
-        os.replace(tmp_path, metadata_path)
+        _, updated_ids = _metadata_store().update(project_id, merge, create=new_metadata)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to write metadata: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to update metadata: {e}")
 
     return {"status": "success", "updated": now_ts, "updated_images": updated_ids}
 
 
-@app.get("/api/scans")
-async def list_scans():
-    """List all PDF files in scan_out directory"""
-    if not os.path.exists(SCAN_OUT_DIR):
-        return {"scans": []}
-    
+def _scan_listing() -> List[Dict]:
+    from agent.pdf_render import open_document
     scans = []
     for filename in sorted(os.listdir(SCAN_OUT_DIR), reverse=True):
         if filename.endswith('.pdf'):
@@ -1087,9 +1343,8 @@ async def list_scans():
             
             # Get PDF info
             try:
-                doc = fitz.open(filepath)
-                pages = len(doc)
-                doc.close()
+                with open_document(filepath) as doc:
+                    pages = len(doc)
             except:
                 pages = 0
             
@@ -1101,8 +1356,30 @@ async def list_scans():
                 "created": int(stat.st_ctime),
                 "pages": pages
             })
+    return scans
+
+
+@app.get("/api/scans")
+async def list_scans():
+    """List all PDF files in scan_out directory"""
+    if not os.path.exists(SCAN_OUT_DIR):
+        return {"scans": []}
     
-    return {"scans": scans}
+    return {"scans": await _offload(_scan_listing)}
+
+
+def _scan_info(filepath: str, filename: str) -> Dict:
+    from agent.pdf_render import open_document
+    with open_document(filepath) as doc:
+        # Get first page dimensions
+        page = doc[0]
+        return {
+            "filename": filename,
+            "pages": len(doc),
+            "width": int(page.rect.width),
+            "height": int(page.rect.height),
+            "metadata": doc.metadata
+        }
 
 
 @app.get("/api/scan/{filename}/info")
@@ -1113,189 +1390,178 @@ async def get_scan_info(filename: str):
         raise HTTPException(status_code=404, detail="File not found")
     
     try:
-        doc = fitz.open(filepath)
-        
-        # Get first page dimensions
-        page = doc[0]
-        width = int(page.rect.width)
-        height = int(page.rect.height)
-        
-        info = {
-            "filename": filename,
-            "pages": len(doc),
-            "width": width,
-            "height": height,
-            "metadata": doc.metadata
-        }
-        
-        doc.close()
-        return info
+        return await _offload(_scan_info, filepath, filename)
+    except PoolOverloaded:
+        raise
     except Exception as e:
         raise _safe_500(e, "Failed to get scan info")
-async def get_page_image(filename: str, page_num: int, size: str = "medium"):
+
+@app.get("/api/scan/{filename}/page/{page_num}")
+async def get_page_image(filename: str, page_num: int, size: str = "medium",
+                         format: Optional[str] = None, request: Request = None):
     """
     Extract page as image with specified size
-    size: small (400px), medium (800px), large (1200px)
+    size: small (72 dpi), medium (150 dpi), large (200 dpi)
+    format: jpg | webp | avif (default: the smallest format the browser accepts)
     """
     filepath = _safe_path(SCAN_OUT_DIR, filename)
     if not os.path.exists(filepath):
         raise HTTPException(status_code=404, detail="File not found")
-    
+    from agent.pdf_render import PAGE_DPI, FORMATS
+    dpi = PAGE_DPI.get(size, PAGE_DPI["medium"])
+    fmt = _page_format(request, format, image_formats.available())
+
     try:
-        doc = fitz.open(filepath)
-        
-        if page_num < 0 or page_num >= len(doc):
-            raise HTTPException(status_code=400, detail="Invalid page number")
-        
-        page = doc[page_num]
-        
-        # Determine DPI based on size
-        if size == "small":
-            dpi = 72  # ~400px width for A4
-        elif size == "large":
-            dpi = 200  # ~1600px width
-        else:  # medium
-            dpi = 150  # ~1200px width
-        
-        # Render page as image
-        pix = page.get_pixmap(dpi=dpi)
-        img_data = pix.tobytes("png")
-        
-        doc.close()
-        
-        return StreamingResponse(
-            io.BytesIO(img_data),
-            media_type="image/png",
-            headers={"Cache-Control": "max-age=3600"}
-        )
-    except HTTPException:
+        cache_path = await _render_page(filepath, page_num, dpi, fmt)
+    except (HTTPException, PoolOverloaded):
         raise
     except Exception as e:
         raise _safe_500(e, "Failed to render page")
 
+    # Cache file name embeds the PDF hash, page, dpi and format
+    etag = f'"{os.path.basename(cache_path)}"'
+    if request and request.headers.get('if-none-match') == etag:
+        return JSONResponse(status_code=304, content=None)
+    return FileResponse(
+        cache_path,
+        media_type=FORMATS[fmt],
+        headers={
+            'ETag': etag,
+            'Cache-Control': 'max-age=3600',
+            'Vary': 'Accept',
+        }
+    )
+
 
 @app.get("/api/scan/{filename}/pages")
-async def get_all_pages(filename: str, size: str = "small"):
-    """Get all pages as base64 images (for thumbnail gallery)"""
+async def get_all_pages(filename: str, size: str = "small",
+                        format: Optional[str] = None, request: Request = None):
+    """Get all pages as inline images (for thumbnail gallery), served from the render cache
+
+    format: jpg | webp | avif for the inline data URLs (default: negotiated from Accept)
+    """
     filepath = _safe_path(SCAN_OUT_DIR, filename)
     if not os.path.exists(filepath):
         raise HTTPException(status_code=404, detail="File not found")
-    
+    fmt = _page_format(request, format, image_formats.available())
+
     try:
-        doc = fitz.open(filepath)
-        pages = []
-        
         dpi = 72 if size == "small" else 100
-        
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            pix = page.get_pixmap(dpi=dpi)
-            img_data = pix.tobytes("png")
-            b64 = base64.b64encode(img_data).decode()
-            
+        pages = []
+        for page_num in range(await _offload(_renderer().page_count, filepath)):
+            cache_path = await _render_page(filepath, page_num, dpi, fmt)
+            with Image.open(cache_path) as im:
+                width, height = im.size
             pages.append({
                 "page": page_num,
-                "image": f"data:image/png;base64,{b64}",
-                "width": pix.width,
-                "height": pix.height
+                "image": _data_url(cache_path),
+                "url": f"/api/scan/{filename}/page/{page_num}?size={size}",
+                "width": width,
+                "height": height
             })
-        
-        doc.close()
         return {"pages": pages}
+    except (HTTPException, PoolOverloaded):
+        raise
     except Exception as e:
         raise _safe_500(e, "Failed to get pages")
 
 
-@app.post("/api/edit")
-async def apply_edits(request: EditRequest):
-    """Apply edits to PDF and generate new file"""
-    filepath = _safe_path(SCAN_OUT_DIR, request.filename)
-    if not os.path.exists(filepath):
-        raise HTTPException(status_code=404, detail="File not found")
-    
-    try:
-        # Extract images from PDF
-        doc = fitz.open(filepath)
-        
+def _render_edited_pdf(filepath: str, request: EditRequest, output_path: str) -> int:
+    """Rasterise the edited pages at 300 DPI, apply the edits and write ``output_path``."""
+    import cv2
+    import numpy as np
+    from agent.pdf_render import open_document
+
+    # Extract images from PDF (only PyMuPDF work holds the process-wide fitz lock)
+    rendered = []
+    with open_document(filepath) as doc:
         # Get original dimensions from first page
-        first_page = doc[0]
-        original_width = int(first_page.rect.width)
-        
-        # Calculate scale factor
-        scale = original_width / request.preview_width
-        
-        # Process each page
-        processed_images = []
-        
+        original_width = int(doc[0].rect.width)
         for page_edit in request.pages:
-            page = doc[page_edit.page]
-            
             # Render at high DPI for quality
-            pix = page.get_pixmap(dpi=300)
+            pix = doc[page_edit.page].get_pixmap(dpi=300)
             img_array = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+            rendered.append((page_edit, img_array.copy(), pix.n))
+            pix = None
+    
+    # Calculate scale factor
+    scale = original_width / request.preview_width
+    
+    # Process each page
+    processed_images = []
+    
+    for page_edit, img_array, channels in rendered:
+        # Convert to BGR for OpenCV
+        if channels == 4:  # RGBA
+            img = cv2.cvtColor(img_array, cv2.COLOR_RGBA2BGR)
+        else:  # RGB
+            img = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+        
+        # Apply crop if specified
+        if page_edit.crop:
+            crop = page_edit.crop
+            # Scale coordinates to original resolution
+            x = int(crop.x * scale * (300/72))  # Adjust for DPI
+            y = int(crop.y * scale * (300/72))
+            w = int(crop.w * scale * (300/72))
+            h = int(crop.h * scale * (300/72))
             
-            # Convert to BGR for OpenCV
-            if pix.n == 4:  # RGBA
-                img = cv2.cvtColor(img_array, cv2.COLOR_RGBA2BGR)
-            else:  # RGB
-                img = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-            
-            # Apply crop if specified
-            if page_edit.crop:
-                crop = page_edit.crop
-                # Scale coordinates to original resolution
-                x = int(crop.x * scale * (300/72))  # Adjust for DPI
-                y = int(crop.y * scale * (300/72))
-                w = int(crop.w * scale * (300/72))
-                h = int(crop.h * scale * (300/72))
-                
-                # Ensure bounds
-                x = max(0, min(x, img.shape[1]))
-                y = max(0, min(y, img.shape[0]))
-                w = min(w, img.shape[1] - x)
-                h = min(h, img.shape[0] - y)
-                
-                img = img[y:y+h, x:x+w]
-            
-            # Apply rotation if specified
-            if page_edit.rotate:
-                if page_edit.rotate == 90:
-                    img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
-                elif page_edit.rotate == 180:
-                    img = cv2.rotate(img, cv2.ROTATE_180)
-                elif page_edit.rotate == 270:
-                    img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
-            
-            # Apply brightness/contrast if specified
-            if page_edit.brightness or page_edit.contrast:
-                alpha = page_edit.contrast or 1.0
-                beta = int((page_edit.brightness or 1.0 - 1.0) * 100)
-                img = cv2.convertScaleAbs(img, alpha=alpha, beta=beta)
+            # Ensure bounds
+            x = max(0, min(x, img.shape[1]))
+            y = max(0, min(y, img.shape[0]))
+            w = min(w, img.shape[1] - x)
+            h = min(h, img.shape[0] - y)
             
-            processed_images.append(img)
+            img = img[y:y+h, x:x+w]
+        
+        # Apply rotation if specified
+        if page_edit.rotate:
+            if page_edit.rotate == 90:
+                img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+            elif page_edit.rotate == 180:
+                img = cv2.rotate(img, cv2.ROTATE_180)
+            elif page_edit.rotate == 270:
+                img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
         
-        doc.close()
+        # Apply brightness/contrast if specified
+        if page_edit.brightness or page_edit.contrast:
+            alpha = page_edit.contrast or 1.0
+            beta = int((page_edit.brightness or 1.0 - 1.0) * 100)
+            img = cv2.convertScaleAbs(img, alpha=alpha, beta=beta)
         
+        processed_images.append(img)
+    
+    # Convert images to PIL and save as PDF
+    pil_images = []
+    for img in processed_images:
+        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        pil_img = Image.fromarray(img_rgb)
+        pil_images.append(pil_img)
+    
+    if pil_images:
+        pil_images[0].save(
+            output_path,
+            save_all=True,
+            append_images=pil_images[1:] if len(pil_images) > 1 else [],
+            resolution=300.0,
+            quality=95
+        )
+    return len(processed_images)
+
+
+@app.post("/api/edit")
+async def apply_edits(request: EditRequest):
+    """Apply edits to PDF and generate new file"""
+    filepath = _safe_path(SCAN_OUT_DIR, request.filename)
+    if not os.path.exists(filepath):
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    try:
         # Generate new PDF
         base_name = os.path.splitext(request.filename)[0]
         output_filename = f"{base_name}_edited.pdf"
         output_path = os.path.join(SCAN_OUT_DIR, output_filename)
-        
-        # Convert images to PIL and save as PDF
-        pil_images = []
-        for img in processed_images:
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            pil_img = Image.fromarray(img_rgb)
-            pil_images.append(pil_img)
-        
-        if pil_images:
-            pil_images[0].save(
-                output_path,
-                save_all=True,
-                append_images=pil_images[1:] if len(pil_images) > 1 else [],
-                resolution=300.0,
-                quality=95
-            )
+        pages_processed = await _offload(_render_edited_pdf, filepath, request, output_path)
         
         # Save metadata for bbox info and include created/updated timestamps
         now_ts = int(time.time())
@@ -1339,11 +1605,11 @@ async def apply_edits(request: EditRequest):
         return {
             "status": "success",
             "file": output_filename,
-            "pages_processed": len(processed_images),
+            "pages_processed": pages_processed,
             "metadata_saved": True
         }
         
-    except HTTPException:
+    except (HTTPException, PoolOverloaded):
         raise
     except Exception as e:
         raise _safe_500(e, "Failed to apply edits")
@@ -1419,6 +1685,8 @@ async def delete_project(project_id: str):
         os.path.join(SCAN_OUT_DIR, f"{project_id}_edited.pdf"),
         os.path.join(SCAN_OUT_DIR, f"{project_id}.json"),
     ]
+    # Drop cached metadata first so a pending coalesced write cannot recreate the JSON
+    _metadata_store().discard(project_id)
     for path in candidates:
         if os.path.exists(path):
             try:
@@ -1439,6 +1707,8 @@ async def delete_project(project_id: str):
     if not deleted and not errors:
         raise HTTPException(status_code=404, detail="Project not found")
 
+    await _catalog_refresh(project_id, f"{project_id}_color", f"{project_id}_edited")
+
     if errors:
         raise HTTPException(status_code=500, detail="; ".join(errors))
 
@@ -1463,13 +1733,15 @@ async def generate_pdf_with_progress(
     Returns SSE stream with progress updates.
     """
     import asyncio
-    from agent.transform_service import apply_metadata_transforms
-    from agent.pdf_generator import save_pdf_scan_document_fast, save_pdf_scan_document_mono_fast
-    from agent.layout_engine import layout_items_by_orientation
+    from agent.incremental_pdf import get_builder
     from reportlab.lib.pagesizes import A4
     
     # Query params (EventSource / GET) provide: quality, paper_size, filename
     # Values are passed via the function parameters (defaults above)
+
+    # Refuse up front (503 + Retry-After) rather than mid-stream when the pool is saturated
+    get_pool().check_admission()
+    pool_key = get_pool().new_key("generate")
     
     async def generate():
         try:
@@ -1477,13 +1749,12 @@ async def generate_pdf_with_progress(
             yield f"data: {json.dumps({'progress': 0, 'stage': 'loading', 'message': 'Loading project metadata...'})}\n\n"
             await asyncio.sleep(0.1)
             
-            metadata_path = os.path.join(SCAN_OUT_DIR, f"{project_id}.json")
-            if not os.path.exists(metadata_path):
+            # Snapshot includes edits not yet flushed to disk
+            snapshot = _metadata_store().get(project_id)
+            if snapshot is None:
                 yield f"data: {json.dumps({'error': f'Project {project_id} not found'})}\n\n"
                 return
-            
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
+            metadata = snapshot.data
             
             images = metadata.get('images', [])
             if not images:
@@ -1501,23 +1772,20 @@ async def generate_pdf_with_progress(
             yield f"data: {json.dumps({'progress': 20, 'stage': 'transform', 'message': 'Applying image transformations...'})}\n\n"
             await asyncio.sleep(0.1)
             
-            # Parallelize heavy image transforms in a small thread pool (PIL/OpenCV release GIL)
+            # Heavy image transforms run on the shared worker pool (PIL/OpenCV release the GIL);
+            # the batch is windowed so other requests keep getting served in between.
+            # Results are cached per (source hash, transform fields, dpi), so only edited
+            # images are transformed again.
             transformed_items = []
             project_images_dir = os.path.join(SCAN_OUT_DIR, project_id, 'images')
-            loop = asyncio.get_event_loop()
-            from concurrent.futures import ThreadPoolExecutor
             from agent.layout_engine import determine_document_span
+            builder = get_builder(SCAN_OUT_DIR)
 
-            max_workers = min(DEFAULT_MAX_WORKERS, max(1, len(images)))
-            executor = ThreadPoolExecutor(max_workers=max_workers)
-
-            # Prepare asyncio tasks: each task returns (idx, img_meta, fname, transformed_img)
-            tasks = []
             def _transform_worker(img_path, img_meta, target_dpi, idx, fname):
-                # Runs in ThreadPoolExecutor
-                transformed = apply_metadata_transforms(img_path, img_meta, True, target_dpi)
-                return (idx, img_meta, fname, transformed)
+                # Runs on a pool worker thread
+                return (idx, img_meta, fname, builder.encode(img_path, img_meta, target_dpi))
 
+            jobs = []
             for i, img_meta in enumerate(images):
                 fname = img_meta.get('filename') or img_meta.get('source_file') or img_meta.get('source_path')
                 if not fname:
@@ -1531,29 +1799,20 @@ async def generate_pdf_with_progress(
                     yield f"data: {json.dumps({'warning': f'Image not found: {fname}'})}\n\n"
                     continue
 
-                # schedule transform on the dedicated ThreadPoolExecutor
-                raw_task = loop.run_in_executor(
-                    executor,
-                    _transform_worker,
-                    img_path,
-                    img_meta,
-                    target_dpi,
-                    i,
-                    fname
-                )
-                tasks.append(asyncio.ensure_future(raw_task))
-
-            total = len(tasks)
+                jobs.append((img_path, img_meta, target_dpi, i, fname))
+
+            total = len(jobs)
             if total == 0:
                 yield f"data: {json.dumps({'error': 'No images could be transformed'})}\n\n"
-                executor.shutdown(wait=False)
                 return
 
             completed = 0
-            # Use asyncio.as_completed to await asyncio Futures as they finish
-            for fut in asyncio.as_completed(tasks):
-                try:
-                    idx, img_meta, fname, transformed_img = await fut
+            reused_images = 0
+            async for _, result, error in get_pool().map_unordered(
+                    request_metrics.timed(_transform_worker, wait=False), jobs, key=pool_key):
+                if error is None:
+                    idx, img_meta, fname, transformed_img = result
+                    reused_images += transformed_img.cached
 
                     # Determine span using scan_dpi from metadata (fallback to target_dpi)
                     scan_dpi = int(img_meta.get('scan_dpi') or target_dpi)
@@ -1567,27 +1826,21 @@ async def generate_pdf_with_progress(
                     )
 
                     pos = (0, 0)
-                    transformed_items.append((span, pos, transformed_img, scan_dpi))
-
-                except Exception as e:
-                    # Since the worker returns metadata on success, if we get here we may not have idx/fname
-                    try:
-                        # Attempt to extract info from exception if present
-                        yield f"data: {json.dumps({'warning': f'Failed to transform an image: {str(e)}'})}\n\n"
-                    except Exception:
-                        yield f"data: {json.dumps({'warning': 'Failed to transform an image'})}\n\n"
+                    transformed_items.append((idx, (span, pos, transformed_img, scan_dpi)))
+                else:
+                    yield f"data: {json.dumps({'warning': f'Failed to transform an image: {str(error)}'})}\n\n"
 
                 completed += 1
                 progress = 20 + int((completed / total) * 30)
                 yield f"data: {json.dumps({'progress': progress, 'stage': 'transform', 'message': f'Transformed {completed}/{total} images'})}\n\n"
-
-            executor.shutdown(wait=False)
             
             if not transformed_items:
                 yield f"data: {json.dumps({'error': 'No images could be transformed'})}\n\n"
                 return
             
-            yield f"data: {json.dumps({'progress': 50, 'stage': 'transform', 'message': f'Transformed {len(transformed_items)} images'})}\n\n"
+            # Completion order varies; lay out in metadata order so unchanged pages match the last run
+            transformed_items = [item for _, item in sorted(transformed_items, key=lambda t: t[0])]
+            yield f"data: {json.dumps({'progress': 50, 'stage': 'transform', 'message': f'Transformed {len(transformed_items)} images ({reused_images} unchanged)'})}\n\n"
             await asyncio.sleep(0.1)
             
             # Stage 3: Render PDF (50-90%)
@@ -1596,7 +1849,7 @@ async def generate_pdf_with_progress(
             
             # Layout documents using the same smart layout as `main.py`
             from agent.layout_engine import layout_documents_smart
-            pages = layout_documents_smart(transformed_items, int(A4[0]), int(A4[1]), 10)
+            pages = await _offload(layout_documents_smart, transformed_items, int(A4[0]), int(A4[1]), 10, key=pool_key)
             
             yield f"data: {json.dumps({'progress': 60, 'stage': 'render', 'message': f'Rendering {len(pages)} pages...'})}\n\n"
             await asyncio.sleep(0.1)
@@ -1614,26 +1867,15 @@ async def generate_pdf_with_progress(
             yield f"data: {json.dumps({'progress': 70, 'stage': 'render', 'message': 'Generating color PDF...'})}\n\n"
             await asyncio.sleep(0.1)
             
-            # Run PDF generation in thread pool (blocking I/O)
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                save_pdf_scan_document_fast,
-                pages,
-                output_color,
-                A4
-            )
+            # Run PDF generation on the worker pool (the builder takes the PyMuPDF lock per call);
+            # pages whose content is unchanged are copied from the previous output
+            stats = await _offload(builder.write_pdf, pages, output_color, 'color', A4, key=pool_key)
             
-            yield f"data: {json.dumps({'progress': 80, 'stage': 'render', 'message': 'Generating monochrome PDF...'})}\n\n"
+            color_note = f"color: {stats['rendered']} rendered, {stats['reused']} reused"
+            yield f"data: {json.dumps({'progress': 80, 'stage': 'render', 'message': f'Generating monochrome PDF... ({color_note})'})}\n\n"
             await asyncio.sleep(0.1)
             
-            await loop.run_in_executor(
-                None,
-                save_pdf_scan_document_mono_fast,
-                pages,
-                output_mono,
-                A4
-            )
+            await _offload(builder.write_pdf, pages, output_mono, 'mono', A4, key=pool_key)
             
             # Stage 4: Save and complete (90-100%)
             yield f"data: {json.dumps({'progress': 90, 'stage': 'save', 'message': 'Finalizing PDF files...'})}\n\n"
@@ -1650,56 +1892,123 @@ async def generate_pdf_with_progress(
 
             yield f"data: {json.dumps({'progress': 100, 'stage': 'complete', 'message': 'PDF generation complete!', 'files': files_out})}\n\n"
         
+        except PoolOverloaded as e:
+            yield f"data: {json.dumps({'error': 'Server busy, please retry', 'retry_after': e.retry_after})}\n\n"
         except Exception as e:
             yield f"data: {json.dumps({'error': f'PDF generation failed: {str(e)}'})}\n\n"
     
     return StreamingResponse(generate(), media_type="text/event-stream")
 
 
-@app.post("/api/crop-from-metadata")
-async def crop_from_metadata(request: CropFromMetadataRequest):
-    """Crop image from metadata and new bbox for debugging"""
-    print(f"Crop request: project_id={request.project_id}, image_index={request.image_index}, bbox_count={len(request.bbox)}")
+def _resolve_project_image(project_id: str, image_index: int):
+    """(image metadata, source path) of the ``image_index``-th image in metadata order."""
+    # Sort images by order
+    images = _project_snapshot(project_id, "Project metadata not found").ordered_images()
+
+    if image_index >= len(images):
+        raise HTTPException(status_code=400, detail="Invalid image index")
+
+    image_meta = images[image_index]
+
+    # Resolve image filename from metadata: prefer 'filename' or 'source_file', fall back to legacy 'source_path'
+    filename = image_meta.get('filename') or image_meta.get('source_file') or image_meta.get('source_path')
+    if not filename:
+        raise HTTPException(status_code=404, detail="Source filename not found in metadata")
+
+    # Prefer project-local images folder: scan_out/{project_id}/images/{filename}
+    project_images_dir = Path(SCAN_OUT_DIR) / project_id / 'images'
+    full_source_path = project_images_dir / filename
+
+    # Fallbacks: direct file under scan_out or absolute path stored in metadata
+    if not full_source_path.exists():
+        alt1 = Path(SCAN_OUT_DIR) / filename
+        if alt1.exists():
+            full_source_path = alt1
+        else:
+            alt2 = Path(filename)
+            if alt2.exists():
+                full_source_path = alt2
+            else:
+                raise HTTPException(status_code=404, detail=f"Source image not found: {filename}")
+    return image_meta, full_source_path
+
+
+def _preview_engine():
+    """Shared crop-preview engine (working proxies in the derivative store)."""
+    from agent.preview_proxy import get_preview_engine
+    return get_preview_engine(_thumb_store())
+
+
+def _crop_preview(request: CropPreviewRequest, fmt: str):
+    from agent.preview_proxy import Superseded
+    _validate_project_id(request.project_id)
+    image_meta, source_path = _resolve_project_image(request.project_id, request.image_index)
+    bbox = request.bbox
     try:
-        # Load project metadata
-        metadata_path = os.path.join(SCAN_OUT_DIR, f"{request.project_id}.json")
-        if not os.path.exists(metadata_path):
-            raise HTTPException(status_code=404, detail="Project metadata not found")
+        return _preview_engine().render(
+            str(source_path),
+            bbox=(bbox.x, bbox.y, bbox.w, bbox.h) if bbox else None,
+            rotation=int(request.rotation or 0),
+            deskew_angle=float(image_meta.get('deskew_angle', 0) or 0),
+            brightness=request.brightness,
+            contrast=request.contrast,
+            max_width=max(16, min(request.max_width, 4096)),
+            max_height=max(16, min(request.max_height, 4096)),
+            fmt=fmt,
+            session=request.session,
+            seq=request.seq,
+        )
+    except Superseded:
+        return None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        with open(metadata_path, 'r') as f:
-            metadata = json.load(f)
 
-        # Sort images by order
-        images = sorted(metadata.get('images', []), key=lambda x: x.get('order', 0))
+@app.post("/api/crop-preview")
+async def crop_preview(request: CropPreviewRequest, http_request: Request):
+    """Fast crop/adjust preview as binary JPEG/WebP, rendered from a cached working proxy.
+
+    ``bbox`` is in full-resolution (rotated, deskewed) image coordinates; the result
+    fits within ``max_width`` x ``max_height``. Editors should send a per-tab ``session``
+    and an increasing ``seq``: requests overtaken by a newer ``seq`` return 204.
+    """
+    fmt = _page_format(http_request, request.format)
+    _preview_engine().announce(request.session, request.seq)
+    result = await _offload(_crop_preview, request, fmt,
+                            key=f"preview:{request.session}" if request.session else None)
+    if result is None:
+        return Response(status_code=204)
+    data, (width, height) = result
+    return Response(
+        content=data,
+        media_type='image/webp' if fmt == 'webp' else 'image/jpeg',
+        headers={
+            'Cache-Control': 'no-store',
+            'X-Preview-Width': str(width),
+            'X-Preview-Height': str(height),
+        },
+    )
 
-        if request.image_index >= len(images):
-            raise HTTPException(status_code=400, detail="Invalid image index")
 
-        image_meta = images[request.image_index]
+@app.post("/api/crop-from-metadata")
+async def crop_from_metadata(request: CropFromMetadataRequest):
+    """Crop image from metadata and new bbox for debugging"""
+    # Whole-image OpenCV decode/warp: never on the event loop
+    return await _offload(_crop_from_metadata, request)
 
-        # Resolve image filename from metadata: prefer 'filename' or 'source_file', fall back to legacy 'source_path'
-        filename = image_meta.get('filename') or image_meta.get('source_file') or image_meta.get('source_path')
-        if not filename:
-            raise HTTPException(status_code=404, detail="Source filename not found in metadata")
 
-        # Prefer project-local images folder: scan_out/{project_id}/images/{filename}
-        project_images_dir = Path(SCAN_OUT_DIR) / request.project_id / 'images'
-        full_source_path = project_images_dir / filename
+def _crop_from_metadata(request: CropFromMetadataRequest) -> Dict:
+    import cv2
+    from agent.image_buffers import view_bgr
 
-        # Fallbacks: direct file under scan_out or absolute path stored in metadata
-        if not full_source_path.exists():
-            alt1 = Path(SCAN_OUT_DIR) / filename
-            if alt1.exists():
-                full_source_path = alt1
-            else:
-                alt2 = Path(filename)
-                if alt2.exists():
-                    full_source_path = alt2
-                else:
-                    raise HTTPException(status_code=404, detail=f"Source image not found: {filename}")
+    print(f"Crop request: project_id={request.project_id}, image_index={request.image_index}, bbox_count={len(request.bbox)}")
+    try:
+        image_meta, full_source_path = _resolve_project_image(request.project_id, request.image_index)
 
-        # Load source image via OpenCV
-        img = cv2.imread(str(full_source_path))
+        # Page the agent already decoded (shared buffer), else decode via OpenCV
+        img = view_bgr(str(full_source_path))
+        if img is None:
+            img = cv2.imread(str(full_source_path))
         if img is None:
             raise HTTPException(status_code=404, detail=f"Failed to load image: {full_source_path}")
 
@@ -1793,7 +2102,6 @@ async def crop_from_metadata(request: CropFromMetadataRequest):
 
     except Exception as e:
         print(f"Crop error: {str(e)}")
-        import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Crop failed: {str(e)}")
 
@@ -0,0 +1,172 @@
+"""Pre-forked "zygote" process host for run.py (POSIX only).
+
+Started cold, every service re-imports NumPy, OpenCV, PyMuPDF and the model
+stack (1-2 s) and keeps its own copy of them. In zygote mode the orchestrator
+imports those libraries once (``Zygote.preload``), freezes the resulting
+objects out of the garbage collector (``gc.freeze``, so collections in the
+children do not touch and copy their pages) and then ``fork``s every service
+from itself:
+
+- restarts are a fork plus the service's own start-up, not an interpreter
+  start and a cold import;
+- library code and the read-only data of the preloaded modules stay shared
+  copy-on-write between the services.
+
+``Zygote.spawn`` runs a module like ``python -m`` and returns the same
+``(name, proc, stdout_pipe)`` tuple as ``spawn_child``; ``proc`` supports the
+``Popen`` calls the orchestrator makes (``poll``, ``wait``, ``terminate``,
+``kill``). ``Zygote.fork`` runs any callable the same way, for pipeline
+workers. Only libraries are preloaded: nothing that opens files, sockets,
+threads or models at import time may go in ``PRELOAD_MODULES``.
+"""
+from __future__ import annotations
+
+import gc
+import importlib
+import os
+import runpy
+import signal
+import subprocess
+import sys
+import time
+import traceback
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+# Imported once in the zygote; the agent/web UI pipeline modules are pure
+# (no threads, files or models at import), see main.PIPELINE_MODULES
+PRELOAD_MODULES = (
+    "numpy", "cv2", "PIL.Image", "fitz", "deskew", "withoutbg",
+    "fastapi", "uvicorn", "httpx", "pydantic",
+    "agent.image_processing", "agent.pdf_generator", "agent.layout_engine",
+    "agent.metadata_generator", "agent.pdf_render",
+)
+
+
+def available() -> bool:
+    return hasattr(os, "fork")
+
+
+class ForkedProcess:
+    """The subset of ``subprocess.Popen`` the orchestrator uses, for a forked child."""
+
+    def __init__(self, pid: int, args: Sequence[str]):
+        self.pid = pid
+        self.args = list(args)
+        self.returncode: Optional[int] = None
+
+    def poll(self) -> Optional[int]:
+        if self.returncode is None:
+            try:
+                pid, status = os.waitpid(self.pid, os.WNOHANG)
+            except ChildProcessError:
+                self.returncode = -1  # already reaped elsewhere
+                return self.returncode
+            if pid:
+                self.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            time.sleep(0.05)
+        return self.returncode
+
+    def send_signal(self, sig: int) -> None:
+        if self.poll() is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self) -> None:
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self) -> None:
+        self.send_signal(signal.SIGKILL)
+
+
+class Zygote:
+    def __init__(self, env: Optional[dict] = None, preload: Iterable[str] = PRELOAD_MODULES):
+        self.env = dict(env or {})
+        self.modules = tuple(preload)
+        self.loaded: List[str] = []
+        self._pipes: list = []  # output pipes of earlier children; closed in new ones
+
+    def preload(self) -> float:
+        """Import the heavy libraries into this process; returns the seconds taken."""
+        for path in reversed(self.env.get("PYTHONPATH", "").split(os.pathsep)):
+            if path and path not in sys.path:
+                sys.path.insert(0, path)
+        start = time.perf_counter()
+        for name in self.modules:
+            try:
+                importlib.import_module(name)
+                self.loaded.append(name)
+            except Exception as e:
+                print(f"Zygote: {name} not preloaded ({type(e).__name__}: {e})")
+        gc.collect()
+        gc.freeze()
+        return time.perf_counter() - start
+
+    def fork(self, name: str, target: Callable[[], Optional[int]],
+             args: Sequence[str] = ()) -> Tuple[str, ForkedProcess, object]:
+        """Run ``target()`` in a forked child; its return value is the exit code."""
+        read_fd, write_fd = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            self._run_child(write_fd, target)  # never returns
+        os.close(write_fd)
+        pipe = os.fdopen(read_fd, "rb")
+        self._pipes = [p for p in self._pipes if not p.closed] + [pipe]
+        return (name, ForkedProcess(pid, args or [name]), pipe)
+
+    def spawn(self, name: str, module: str, args: Sequence[str] = ()) -> Tuple[str, ForkedProcess, object]:
+        """Fork a child that runs ``module`` like ``python -m module args...``."""
+        def run() -> None:
+            sys.argv = [module, *args]
+            runpy.run_module(module, run_name="__main__", alter_sys=True)
+
+        return self.fork(name, run, ["-m", module, *args])
+
+    def _run_child(self, write_fd: int, target: Callable[[], Optional[int]]) -> None:
+        code = 1
+        try:
+            for pipe in self._pipes:
+                try:
+                    os.close(pipe.fileno())
+                except (OSError, ValueError):
+                    pass
+            os.dup2(write_fd, 1)
+            os.dup2(write_fd, 2)
+            os.close(write_fd)
+            # Fresh stream objects: the parent's may have been locked by another
+            # thread at fork time
+            sys.stdout = open(1, "w", encoding="utf-8", buffering=1, closefd=False)
+            sys.stderr = open(2, "w", encoding="utf-8", buffering=1, closefd=False)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.environ.update(self.env)
+            result = target()
+            code = result if isinstance(result, int) else 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except KeyboardInterrupt:
+            code = 130
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(code)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Unit tests for memory admission control
+"""
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent import admission, image_processing
+from agent.admission import AdmissionController, estimate_peak_mb, page_sizes_mb
+from agent.resource_monitor import ResourceMonitor
+
+
+class FixedMemoryMonitor(ResourceMonitor):
+    """ResourceMonitor reporting a settable amount of free memory."""
+
+    def __init__(self, available_mb, min_memory_mb=100):
+        super().__init__(output_dir=".", inbox_dir=".", min_memory_mb=min_memory_mb)
+        self.available_mb = available_mb
+
+    def check_memory(self):
+        return self.available_mb >= self.min_memory_mb, float(self.available_mb)
+
+
+@pytest.fixture
+def pages(tmp_path):
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"page_{i}.png"
+        Image.new("RGB", (1024, 1024), "white").save(path)  # 3 MB decoded
+        paths.append(str(path))
+    return paths
+
+
+def test_estimates_from_headers(pages):
+    sizes = page_sizes_mb(pages)
+    assert sizes == [3.0] * 4
+    full = estimate_peak_mb("scan_document", sizes)
+    lean = estimate_peak_mb("scan_document", sizes, degraded=True)
+    assert lean < full
+    assert estimate_peak_mb("scan_document", sizes, model_loaded=True) == full - admission.BG_MODEL_MB
+    # Duplex modes need every page either way; degrading only drops the page buffers
+    assert estimate_peak_mb("scan_duplex", sizes, degraded=True) == \
+        estimate_peak_mb("scan_duplex", sizes, page_buffers=False)
+
+
+def test_decisions_follow_free_memory(pages):
+    monitor = FixedMemoryMonitor(available_mb=10_000)
+    controller = AdmissionController(monitor)
+    with controller.admit("s1", "scan_document", pages) as adm:
+        assert adm.decision == "run" and not adm.streamed and adm.analysis_width is None
+
+    # Only the lean estimate fits: degraded, pages streamed, analysis width lowered
+    lean = estimate_peak_mb("scan_document", [3.0] * 4, degraded=True)
+    monitor.available_mb = lean + monitor.min_memory_mb + 10
+    width = image_processing.ANALYSIS_WIDTH
+    with controller.admit("s2", "scan_document", pages) as adm:
+        assert adm.degraded and adm.streamed
+        assert adm.analysis_width == min(width, admission.DEGRADED_ANALYSIS_WIDTH)
+        # Per session: concurrent sessions keep the profiled width
+        assert image_processing.ANALYSIS_WIDTH == width
+
+    # Nothing fits and nothing else runs: degraded anyway rather than waiting forever
+    monitor.available_mb = 50
+    with controller.admit("s3", "scan_duplex", pages) as adm:
+        assert adm.degraded and not adm.streamed
+    assert admission.ADMISSIONS.value(decision="degraded") >= 2
+
+
+def test_queued_until_a_running_session_finishes(pages):
+    monitor = FixedMemoryMonitor(available_mb=10_000)
+    controller = AdmissionController(monitor, poll_secs=5)
+    queued_before = admission.ADMISSIONS.value(decision="queued")
+    released = threading.Event()
+    admitted = []
+
+    def second():
+        with controller.admit("s2", "scan_duplex", pages) as adm:
+            admitted.append((adm, released.is_set()))
+
+    with controller.admit("s1", "scan_duplex", pages):
+        monitor.available_mb = 100  # the first session took the memory
+        worker = threading.Thread(target=second)
+        worker.start()
+        time.sleep(0.2)
+        assert not admitted
+        monitor.available_mb = 10_000
+        released.set()
+    worker.join(timeout=2)
+    adm, after_release = admitted[0]
+    assert adm.decision == "run" and after_release and adm.waited_s > 0
+    assert admission.ADMISSIONS.value(decision="queued") == queued_before + 1
+    assert admission.RESERVED_BYTES.value() == 0
+
+
+def test_memory_check_works_without_psutil(tmp_path):
+    ok, available_mb = ResourceMonitor(str(tmp_path), str(tmp_path), min_memory_mb=1).check_memory()
+    if Path("/proc/meminfo").exists():
+        assert ok and available_mb > 0
+
+
+def test_model_is_unloaded_by_the_last_session_out(monkeypatch):
+    unloads = []
+    monkeypatch.setattr(image_processing, "_unload_bg_removal_model", lambda: unloads.append(1))
+    with image_processing.bg_removal_model_session(unload=False):
+        with image_processing.bg_removal_model_session(unload=True):
+            pass
+        assert not unloads  # still in use by the first session
+    assert unloads == [1]
+
+    with image_processing.bg_removal_model_session(unload=False):
+        pass
+    assert unloads == [1]
+
+
+def test_parallel_sessions_load_the_model_once(monkeypatch):
+    loads = []
+
+    def slow_model(**kwargs):
+        loads.append(1)
+        time.sleep(0.2)
+        return object()
+
+    monkeypatch.setattr(image_processing, "OpenSourceModel", slow_model)
+    monkeypatch.setattr(image_processing, "_BG_REMOVAL_MODEL", None)
+    models = []
+    workers = [threading.Thread(target=lambda: models.append(image_processing._get_bg_removal_model()))
+               for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=2)
+    assert loads == [1] and models[0] is models[1]
+    image_processing._unload_bg_removal_model()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the content-addressed derivative (thumbnail) store
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent.derivative_store import DerivativeStore
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Path(path).write_bytes(data)
+    return path
+
+
+def _copy_gen(calls=None, delay=0.0, size=None):
+    def gen(src, out):
+        if calls is not None:
+            calls.append(src)
+        time.sleep(delay)
+        data = Path(src).read_bytes()
+        Path(out).write_bytes(data if size is None else b"x" * size)
+    return gen
+
+
+def test_same_filename_in_two_projects_does_not_collide():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DerivativeStore(os.path.join(tmp, "store"))
+        a = _write(os.path.join(tmp, "p1", "images", "scan_0001.jpg"), b"first")
+        b = _write(os.path.join(tmp, "p2", "images", "scan_0001.jpg"), b"second")
+
+        pa = store.get(a, "w200", "jpg", _copy_gen())
+        pb = store.get(b, "w200", "jpg", _copy_gen())
+        assert pa != pb
+        assert Path(pa).read_bytes() == b"first"
+        assert Path(pb).read_bytes() == b"second"
+
+
+def test_identical_content_is_shared_and_edit_invalidates():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DerivativeStore(os.path.join(tmp, "store"))
+        calls = []
+        a = _write(os.path.join(tmp, "a.jpg"), b"same")
+        b = _write(os.path.join(tmp, "b.jpg"), b"same")
+        assert store.get(a, "w200", "jpg", _copy_gen(calls)) == store.get(b, "w200", "jpg", _copy_gen(calls))
+        assert len(calls) == 1
+
+        _write(a, b"edited")
+        assert Path(store.get(a, "w200", "jpg", _copy_gen(calls))).read_bytes() == b"edited"
+        assert len(calls) == 2
+
+
+def test_concurrent_requests_generate_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DerivativeStore(os.path.join(tmp, "store"))
+        src = _write(os.path.join(tmp, "a.jpg"), b"data")
+        calls = []
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(store.get(src, "w800", "jpg", _copy_gen(calls, delay=0.2))))
+            for _ in range(6)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1
+        assert len(set(results)) == 1 and len(results) == 6
+
+
+def test_failed_generation_propagates_and_leaves_nothing():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DerivativeStore(os.path.join(tmp, "store"))
+        src = _write(os.path.join(tmp, "a.jpg"), b"data")
+
+        def broken(_src, out):
+            Path(out).write_bytes(b"partial")
+            raise RuntimeError("decode failed")
+
+        with pytest.raises(RuntimeError):
+            store.get(src, "w200", "jpg", broken)
+        leftovers = [n for _, _, names in os.walk(store.root) for n in names]
+        assert leftovers == []
+        # A later request retries rather than caching the failure
+        assert os.path.exists(store.get(src, "w200", "jpg", _copy_gen()))
+
+
+def test_quota_evicts_least_recently_used():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DerivativeStore(os.path.join(tmp, "store"), max_bytes=3000)
+        paths = []
+        for i in range(3):
+            src = _write(os.path.join(tmp, f"{i}.jpg"), f"src{i}".encode())
+            p = store.get(src, "w200", "jpg", _copy_gen(size=1000))
+            os.utime(p, (100 + i, 100 + i))  # deterministic LRU order
+            paths.append((src, p))
+
+        # Touch the oldest so the middle one becomes least recently used
+        store.get(paths[0][0], "w200", "jpg", _copy_gen(size=1000))
+
+        src = _write(os.path.join(tmp, "3.jpg"), b"src3")
+        store.get(src, "w200", "jpg", _copy_gen(size=1000))
+        assert store.usage() <= 2700
+        assert os.path.exists(paths[0][1])
+        assert not os.path.exists(paths[1][1])
+
+
+def test_two_processes_generating_the_same_entry_do_not_clobber():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "store")
+        agent, web_ui = DerivativeStore(root), DerivativeStore(root)  # single-flight is per process
+        src = _write(os.path.join(tmp, "a.jpg"), b"data" * 1000)
+        both_writing = threading.Barrier(2)
+
+        def gen(_src, out):
+            with open(out, "wb") as f:
+                f.write(b"data" * 500)
+                both_writing.wait(timeout=2)
+                f.write(b"data" * 500)
+
+        results = []
+        threads = [threading.Thread(target=lambda s=s: results.append(s.get(src, "w800", "jpg", gen)))
+                   for s in (agent, web_ui)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(results) == 2 and results[0] == results[1]
+        assert Path(results[0]).read_bytes() == b"data" * 1000
@@ -7,6 +7,8 @@ Covers:
 - Fail-open behaviour when Magika is unavailable
 - _get_magika singleton caching
 - ScannerFTPHandler.on_file_received integration (extension + Magika + disk guard)
+- Magic-byte sniffing that skips Magika for unambiguous files
+- Hand-off of validation to the worker pool
 """
 
 import os
@@ -295,6 +297,85 @@ class TestScannerFTPHandlerOnFileReceived(unittest.TestCase):
         ftp_module._magika = None
 
 
+# ---------------------------------------------------------------------------
+# Magic-byte sniffing and asynchronous validation
+# ---------------------------------------------------------------------------
+
+class TestSniffContent(unittest.TestCase):
+
+    def _sniff(self, content: bytes, suffix: str = ".jpg"):
+        path = _tmp_file(content, suffix)
+        try:
+            return ftp_module._sniff_content(path)
+        finally:
+            os.unlink(path)
+
+    def test_scanner_formats_recognised(self):
+        self.assertTrue(self._sniff(_jpeg_bytes()))
+        self.assertTrue(self._sniff(_png_bytes(), ".png"))
+        self.assertTrue(self._sniff(_pdf_bytes(), ".pdf"))
+        self.assertTrue(self._sniff(b"II*\x00" + b"\x00" * 12, ".tif"))
+
+    def test_bmp_requires_matching_size_field(self):
+        body = b"\x00" * 58
+        good = b"BM" + struct.pack("<I", 6 + len(body)) + body
+        self.assertTrue(self._sniff(good, ".bmp"))
+        self.assertIsNone(self._sniff(b"BMnot really a bitmap", ".bmp"))
+
+    def test_foreign_formats_rejected(self):
+        self.assertFalse(self._sniff(_executable_bytes()))
+        self.assertFalse(self._sniff(b"MZ\x90\x00" + b"\x00" * 60))
+        self.assertFalse(self._sniff(b"#!/bin/sh\nrm -rf /\n"))
+
+    def test_unknown_header_is_ambiguous(self):
+        self.assertIsNone(self._sniff(_text_bytes()))
+
+    def test_magika_skipped_for_recognised_jpeg(self):
+        """A JPEG header is enough — Magika must not be consulted."""
+        path = _tmp_file(_jpeg_bytes(), ".jpg")
+        try:
+            with patch.object(ftp_module, "_is_content_type_allowed") as mock_magika:
+                self.assertTrue(ftp_module._validate_upload(path, "scanner"))
+            mock_magika.assert_not_called()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def test_magika_consulted_for_ambiguous_content(self):
+        path = _tmp_file(_text_bytes(), ".jpg")
+        try:
+            with patch.object(ftp_module, "_is_content_type_allowed", return_value=False) as m:
+                self.assertFalse(ftp_module._validate_upload(path, "scanner"))
+            m.assert_called_once_with(path)
+            self.assertFalse(os.path.exists(path))
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+class TestAsyncValidation(unittest.TestCase):
+
+    def test_on_file_received_submits_to_pool(self):
+        """With async_validation the IO loop only enqueues the check."""
+        handler = ScannerFTPHandler.__new__(ScannerFTPHandler)
+        handler.async_validation = True
+        handler.username = "anonymous"
+        handler.remote_ip = "10.0.0.7"
+        pool = MagicMock()
+        with patch.object(ftp_module, "_get_validation_pool", return_value=pool), \
+                patch.object(ftp_module, "_validate_upload") as validate:
+            handler.on_file_received("/inbox/scan_duplex/10_0_0_7/p1.jpg")
+        validate.assert_not_called()
+        pool.submit.assert_called_once_with(
+            validate, "/inbox/scan_duplex/10_0_0_7/p1.jpg", "10_0_0_7"
+        )
+
+    def test_unknown_server_mode_rejected(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(ValueError):
+                ftp_module.create_ftp_server(directory=tmp, port=0, server_mode="forking")
+
+
 # ---------------------------------------------------------------------------
 # Sanity checks on module-level constants
 # ---------------------------------------------------------------------------
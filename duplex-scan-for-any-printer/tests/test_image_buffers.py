@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the shared decoded-page buffers
+"""
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent import image_buffers
+from agent.image_buffers import BufferStore, buffer_key
+
+
+def _scan(tmp_path, name="page_1.png", seed=0):
+    rng = np.random.default_rng(seed)
+    path = tmp_path / name
+    Image.fromarray(rng.integers(0, 255, (60, 40, 3), dtype=np.uint8)).save(path)
+    return str(path)
+
+
+def test_put_and_view_are_zero_copy_and_keyed_by_file(tmp_path):
+    store = BufferStore(str(tmp_path / "buffers"), idle_secs=60)
+    source = _scan(tmp_path)
+    with Image.open(source) as img:
+        pixels = np.asarray(img)
+    with store.session("scan_duplex-1"):
+        assert store.put("scan_duplex-1", buffer_key(source), pixels)
+        view = store.view(source)
+    assert isinstance(view, np.memmap) and not view.flags.writeable
+    assert np.array_equal(view, pixels)
+
+    # Moving the file keeps the key; rewriting it does not
+    moved = str(tmp_path / "project")
+    os.makedirs(moved)
+    moved = os.path.join(moved, "page_1.png")
+    os.replace(source, moved)
+    assert store.view(moved) is not None
+    Image.fromarray(pixels[::-1].copy()).save(moved)
+    assert store.view(moved) is None
+
+
+def test_last_release_cleans_up_without_grace(tmp_path):
+    store = BufferStore(str(tmp_path / "buffers"), idle_secs=0)
+    source = _scan(tmp_path)
+    group_dir = tmp_path / "buffers" / "s1"
+    first = store.acquire("s1")
+    second = store.acquire("s1")
+    store.put("s1", buffer_key(source), np.zeros((4, 4, 3), np.uint8))
+    store.release(first)
+    assert group_dir.exists()
+    store.release(second)
+    assert not group_dir.exists()
+    assert store.view(source) is None
+
+
+def test_idle_groups_and_dead_holders_are_swept(tmp_path):
+    store = BufferStore(str(tmp_path / "buffers"), idle_secs=0.2)
+    source = _scan(tmp_path)
+    with store.session("s1"):
+        store.put("s1", buffer_key(source), np.zeros((4, 4), np.uint8))
+    # A lease left by a process that no longer exists does not pin the group
+    (tmp_path / "buffers" / "s1" / ".lease-999999999-0").touch()
+    assert store.view(source) is not None
+    time.sleep(0.3)
+    assert store.sweep(force=True) == 1
+    assert store.view(source) is None
+
+
+def test_quota_skips_pages_that_do_not_fit(tmp_path):
+    store = BufferStore(str(tmp_path / "buffers"), max_bytes=1024)
+    source = _scan(tmp_path)
+    with store.session("s1"):
+        assert not store.put("s1", buffer_key(source), np.zeros((64, 64, 3), np.uint8))
+    assert store.view(source) is None
+    assert not BufferStore(str(tmp_path / "off"), max_bytes=0).put("s1", "k", np.zeros(1))
+
+
+def test_view_bgr_matches_opencv_decode(tmp_path, monkeypatch):
+    store = BufferStore(str(tmp_path / "buffers"))
+    monkeypatch.setattr(image_buffers, "_store", store)
+    source = _scan(tmp_path)
+    with Image.open(source) as img:
+        assert image_buffers.put_image("s1", source, img)
+    assert np.array_equal(image_buffers.view_bgr(source), cv2.imread(source))
+
+    gray = str(tmp_path / "gray.png")
+    Image.new("L", (8, 8), 128).save(gray)
+    with Image.open(gray) as img:
+        assert image_buffers.put_image("s1", gray, img)
+    assert image_buffers.view_bgr(gray).shape == (8, 8, 3)
+
+
+def test_async_writes_leave_the_caller_and_skip_when_backed_up(tmp_path, monkeypatch):
+    store = BufferStore(str(tmp_path / "buffers"))
+    monkeypatch.setattr(image_buffers, "_store", store)
+    source = _scan(tmp_path)
+    img = Image.open(source)  # lazy, as load_image hands it over
+    assert image_buffers.put_image_async("s1", source, img)
+    assert img.fp is None  # decoded by the caller, not raced by the writer
+    image_buffers.flush_writes(timeout=5)
+    assert np.array_equal(image_buffers.view_bgr(source), cv2.imread(source))
+
+    # No free slot: the page is skipped rather than blocking the session thread
+    monkeypatch.setattr(image_buffers, "_write_slots", threading.BoundedSemaphore(1))
+    image_buffers._write_slots.acquire()
+    assert not image_buffers.put_image_async("s2", source, img)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Unit tests for Accept-negotiated derivative formats
+"""
+import io
+import sys
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent import image_formats
+
+CHROME_ACCEPT = "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8"
+
+
+def test_negotiation(monkeypatch):
+    monkeypatch.delenv("WEB_UI_AVIF", raising=False)
+    assert image_formats.negotiate("") == "jpg"
+    assert image_formats.negotiate("*/*") == "jpg"
+    if "webp" in image_formats.available():
+        assert image_formats.negotiate(CHROME_ACCEPT) == "webp"
+        assert image_formats.negotiate(CHROME_ACCEPT, ("jpg",)) == "jpg"
+    assert image_formats.preferred() in ("webp", "jpg")
+
+
+def test_avif_is_opt_in(monkeypatch):
+    if "avif" not in image_formats.available():
+        pytest.skip("Pillow built without AVIF")
+    monkeypatch.setenv("WEB_UI_AVIF", "true")
+    assert image_formats.negotiate(CHROME_ACCEPT) == "avif"
+    assert image_formats.negotiate(CHROME_ACCEPT, ("jpg", "webp")) == "webp"
+    assert image_formats.preferred() == "avif"
+
+
+@pytest.mark.parametrize("fmt", image_formats.available())
+def test_encode_roundtrip(fmt):
+    img = Image.new("P", (64, 48))
+    data = image_formats.encode(img, fmt)
+    with Image.open(io.BytesIO(data)) as decoded:
+        assert decoded.size == (64, 48)
+        assert decoded.format == {"jpg": "JPEG", "webp": "WEBP", "avif": "AVIF"}[fmt]
+
+
+def test_unknown_format_rejected():
+    with pytest.raises(ValueError):
+        image_formats.encode(Image.new("RGB", (4, 4)), "gif")
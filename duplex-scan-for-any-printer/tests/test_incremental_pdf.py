@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Unit tests for incremental scan_document PDF regeneration
+"""
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+fitz = pytest.importorskip("fitz")
+
+from reportlab.lib.pagesizes import A4
+
+from agent.derivative_store import DerivativeStore, store_root
+from agent.incremental_pdf import IncrementalPdfBuilder, get_builder, transform_key
+from agent.layout_engine import determine_document_span, layout_documents_smart
+from agent.pdf_generator import save_pdf_scan_document_fast
+
+
+def _images(tmp, n):
+    paths = []
+    for i in range(n):
+        path = os.path.join(tmp, f"{i}.jpg")
+        Image.new("RGB", (900, 1200), (30 * i, 80, 120)).save(path)
+        paths.append(path)
+    return paths
+
+
+def _builder(tmp):
+    return IncrementalPdfBuilder(DerivativeStore(os.path.join(tmp, "store")), os.path.join(tmp, "manifests"))
+
+
+def _layout(items):
+    placed = []
+    for img in items:
+        span = determine_document_span(img.width, img.height, int(A4[0]), int(A4[1]), 10, dpi=300)
+        placed.append((span, (0, 0), img, 300))
+    return layout_documents_smart(placed, int(A4[0]), int(A4[1]), 10)
+
+
+def _rects(path):
+    with fitz.open(path) as doc:
+        return [[tuple(round(v, 2) for v in info["bbox"]) for info in page.get_image_info()] for page in doc]
+
+
+def test_transform_key_ignores_non_transform_fields():
+    meta = {"rotation": 90, "bbox": {"x": 1, "y": 2, "w": 3, "h": 4}}
+    assert transform_key(meta, 200) == transform_key({**meta, "order": 5, "filename": "x.jpg"}, 200)
+    assert transform_key(meta, 200) != transform_key({**meta, "rotation": 0}, 200)
+    assert transform_key(meta, 200) != transform_key(meta, 300)
+
+
+def test_encode_is_cached_per_source_and_params():
+    with tempfile.TemporaryDirectory() as tmp:
+        builder = _builder(tmp)
+        src = _images(tmp, 1)[0]
+        first = builder.encode(src, {}, 300)
+        assert not first.cached and first.size == (900, 1200)
+        again = builder.encode(src, {"order": 3}, 300)
+        assert again.cached and again.key == first.key
+        cropped = builder.encode(src, {"bbox": {"x": 0, "y": 0, "w": 400, "h": 300}}, 300)
+        assert not cropped.cached and cropped.size == (400, 300)
+
+
+def test_layout_matches_full_rebuild():
+    with tempfile.TemporaryDirectory() as tmp:
+        builder = _builder(tmp)
+        srcs = _images(tmp, 3)
+        out = os.path.join(tmp, "out.pdf")
+        builder.write_pdf(_layout([builder.encode(s, {}, 300) for s in srcs]), out)
+
+        legacy = os.path.join(tmp, "legacy.pdf")
+        save_pdf_scan_document_fast(_layout([Image.open(s) for s in srcs]), legacy, A4)
+        assert _rects(out) == _rects(legacy)
+
+
+def test_only_changed_pages_are_rebuilt():
+    with tempfile.TemporaryDirectory() as tmp:
+        builder = _builder(tmp)
+        srcs = _images(tmp, 8)  # two pages of four quadrants
+        out = os.path.join(tmp, "out_color.pdf")
+        metas = [{} for _ in srcs]
+
+        stats = builder.write_pdf(_layout([builder.encode(s, m, 300) for s, m in zip(srcs, metas)]), out)
+        assert stats == {"pages": 2, "reused": 0, "rendered": 2}
+
+        metas[6] = {"brightness": 20}
+        stats = builder.write_pdf(_layout([builder.encode(s, m, 300) for s, m in zip(srcs, metas)]), out)
+        assert stats == {"pages": 2, "reused": 1, "rendered": 1}
+        assert len(_rects(out)) == 2
+
+
+def test_foreign_rewrite_disables_reuse():
+    with tempfile.TemporaryDirectory() as tmp:
+        builder = _builder(tmp)
+        srcs = _images(tmp, 2)
+        out = os.path.join(tmp, "out_mono.pdf")
+        pages = _layout([builder.encode(s, {}, 300) for s in srcs])
+        builder.write_pdf(pages, out, "mono")
+
+        save_pdf_scan_document_fast(_layout([Image.open(s) for s in srcs]), out, A4)
+        assert builder.write_pdf(pages, out, "mono")["reused"] == 0
+
+
+def test_evicted_streams_are_reencoded():
+    with tempfile.TemporaryDirectory() as tmp:
+        builder = _builder(tmp)
+        srcs = _images(tmp, 2)
+        encoded = [builder.encode(s, {"rotation": 90}, 300) for s in srcs]
+        expected = os.path.join(tmp, "expected.pdf")
+        builder.write_pdf(_layout(encoded), expected, "mono")
+
+        # The cache drops the streams between encode() and write_pdf()
+        for img in encoded:
+            os.remove(img.color_path)
+            os.remove(img.mono_path)
+        out = os.path.join(tmp, "out.pdf")
+        assert builder.write_pdf(_layout(encoded), out, "mono")["rendered"] == 1
+        assert _rects(out) == _rects(expected)
+
+
+def test_streams_have_their_own_store():
+    with tempfile.TemporaryDirectory() as tmp:
+        builder = get_builder(tmp)
+        assert builder.store.root != store_root(tmp)
+        assert os.path.dirname(builder.store.root) == os.path.dirname(store_root(tmp))
+
+
+def test_concurrent_generates_of_one_output_keep_the_manifest_in_step():
+    with tempfile.TemporaryDirectory() as tmp:
+        builder = _builder(tmp)
+        srcs = _images(tmp, 8)
+        out = os.path.join(tmp, "out_color.pdf")
+        pages = _layout([builder.encode(s, {}, 300) for s in srcs])
+        errors = []
+
+        def generate():
+            try:
+                builder.write_pdf(pages, out)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=generate) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors
+        assert not [n for n in os.listdir(tmp) if n.endswith(".tmp")]
+        # The manifest matches the saved file: the next run reuses every page
+        assert builder.write_pdf(pages, out)["reused"] == 2
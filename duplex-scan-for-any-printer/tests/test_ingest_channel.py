@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the FTP → agent ingest channel and the watcher fallback
+"""
+import hashlib
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import agent.ftp_watcher as watcher_module
+from agent.ftp_watcher import FTPWatcher
+from agent.ingest_channel import (
+    IngestEvent,
+    IngestListener,
+    IngestNotifier,
+    EVENT_BEGIN,
+    EVENT_COMPLETE,
+    EVENT_ABORT,
+)
+
+needs_unix_dgram = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="Unix datagram sockets not available"
+)
+
+
+def _watcher(root):
+    delivered = []
+    w = FTPWatcher(
+        root,
+        {"scan_duplex": "scan_duplex"},
+        lambda mode, path, device: delivered.append((mode, path, device)),
+        ingest_socket=os.path.join(root, "ingest.sock"),
+    )
+    os.makedirs(os.path.join(root, "scan_duplex", "scanner_a"), exist_ok=True)
+    return w, delivered
+
+
+def test_event_roundtrip():
+    ev = IngestEvent(EVENT_COMPLETE, "/in/a.jpg", device="scanner_a", size=3, sha256="ab")
+    assert IngestEvent.decode(ev.encode()) == ev
+
+
+@needs_unix_dgram
+def test_notifier_to_listener_carries_size_and_hash():
+    with tempfile.TemporaryDirectory() as tmp:
+        sock_path = os.path.join(tmp, "ingest.sock")
+        received = []
+        got = threading.Event()
+
+        def on_event(ev):
+            received.append(ev)
+            got.set()
+
+        listener = IngestListener(on_event, path=sock_path)
+        assert listener.start()
+        try:
+            f = os.path.join(tmp, "page.jpg")
+            Path(f).write_bytes(b"scan-bytes")
+            assert IngestNotifier(sock_path).complete(f, "scanner_a")
+            assert got.wait(2)
+        finally:
+            listener.stop()
+
+        (ev,) = received
+        assert ev.event == EVENT_COMPLETE
+        assert ev.size == len(b"scan-bytes")
+        assert ev.sha256 == hashlib.sha256(b"scan-bytes").hexdigest()
+        assert ev.device == "scanner_a"
+
+
+def test_notifier_without_listener_is_silent():
+    with tempfile.TemporaryDirectory() as tmp:
+        assert IngestNotifier(os.path.join(tmp, "missing.sock")).begin("/in/a.jpg") is False
+
+
+def test_complete_event_delivers_once():
+    """Channel completion delivers immediately; the watchdog duplicate is dropped"""
+    with tempfile.TemporaryDirectory() as tmp:
+        w, delivered = _watcher(tmp)
+        folder = w._folders[0]
+        f = os.path.join(folder, "scanner_a", "p1.jpg")
+
+        w._on_ingest_event(IngestEvent(EVENT_BEGIN, f))
+        w._on_fs_created(folder, f)
+        Path(f).write_bytes(b"12345")
+        w._on_ingest_event(IngestEvent(EVENT_COMPLETE, f, size=5))
+        assert delivered == [("scan_duplex", f, "scanner_a")]
+
+        # Late watchdog event for the same file settles but is deduplicated
+        w._on_fs_created(folder, f)
+        for _, path, size in w._settled(time.time()) + w._settled(time.time() + 5):
+            w._deliver(folder, path, size)
+        assert len(delivered) == 1
+
+
+def test_complete_event_is_checked_against_its_hash():
+    """A file rewritten with the same size after the server hashed it is left to the fallback"""
+    with tempfile.TemporaryDirectory() as tmp:
+        w, delivered = _watcher(tmp)
+        folder = w._folders[0]
+        f = os.path.join(folder, "scanner_a", "p1.jpg")
+        Path(f).write_bytes(b"12345")
+
+        w._on_ingest_event(IngestEvent(EVENT_COMPLETE, f, size=5, sha256=hashlib.sha256(b"54321").hexdigest()))
+        assert delivered == [] and f in w._pending
+
+        w._on_ingest_event(IngestEvent(EVENT_COMPLETE, f, size=5, sha256=hashlib.sha256(b"12345").hexdigest()))
+        assert delivered == [("scan_duplex", f, "scanner_a")]
+
+
+def test_upload_in_progress_is_not_settled():
+    """A path claimed by 'begin' never reaches the fallback, however slow the upload"""
+    with tempfile.TemporaryDirectory() as tmp:
+        w, _ = _watcher(tmp)
+        folder = w._folders[0]
+        f = os.path.join(folder, "scanner_a", "slow.jpg")
+        Path(f).write_bytes(b"partial")
+
+        w._on_ingest_event(IngestEvent(EVENT_BEGIN, f))
+        w._on_fs_created(folder, f)
+        now = time.time()
+        assert w._settled(now) == []
+        assert w._settled(now + 30) == []
+
+        w._on_ingest_event(IngestEvent(EVENT_ABORT, f))
+        assert f not in w._pending
+
+
+def test_fallback_settles_stable_file(monkeypatch):
+    """Without the channel, a file is delivered once its size stops changing"""
+    monkeypatch.setattr(watcher_module, "_FALLBACK_SETTLE_SECS", 1.0)
+    with tempfile.TemporaryDirectory() as tmp:
+        w, _ = _watcher(tmp)
+        folder = w._folders[0]
+        f = os.path.join(folder, "smb.jpg")
+        Path(f).write_bytes(b"abc")
+        w._on_fs_created(folder, f)
+
+        now = time.time()
+        assert w._settled(now) == []          # first size observation
+        Path(f).write_bytes(b"abcdef")        # still growing
+        assert w._settled(now + 2) == []
+        assert w._settled(now + 2.5) == []    # stable, but not for long enough
+        assert w._settled(now + 3.5) == [(folder, f, 6)]
+
+
+def test_event_outside_watched_folders_is_ignored():
+    with tempfile.TemporaryDirectory() as tmp:
+        w, delivered = _watcher(tmp)
+        outside = os.path.join(tmp, "elsewhere.jpg")
+        Path(outside).write_bytes(b"x")
+        w._on_ingest_event(IngestEvent(EVENT_COMPLETE, outside, size=1))
+        assert delivered == []
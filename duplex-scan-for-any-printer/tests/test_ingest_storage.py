@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Unit tests for moving inbox scans into project storage without copying
+"""
+import errno
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import agent.ingest_storage as storage
+from agent.ingest_storage import place_file
+
+
+def _src(tmp, data=b"scan-bytes"):
+    p = os.path.join(tmp, "inbox.jpg")
+    Path(p).write_bytes(data)
+    return p
+
+
+def test_consumed_source_is_renamed():
+    with tempfile.TemporaryDirectory() as tmp:
+        src = _src(tmp)
+        dst = os.path.join(tmp, "project.jpg")
+        assert place_file(src, dst, keep_source=False) == "rename"
+        assert not os.path.exists(src)
+        assert Path(dst).read_bytes() == b"scan-bytes"
+
+
+def test_kept_source_shares_data_without_copy(monkeypatch):
+    monkeypatch.setattr(storage, "_reflink", lambda src, dst: False)
+    with tempfile.TemporaryDirectory() as tmp:
+        src = _src(tmp)
+        dst = os.path.join(tmp, "project.jpg")
+        assert place_file(src, dst) == "hardlink"
+        assert os.path.samefile(src, dst)
+
+        # Deleting the inbox entry leaves the project image intact
+        os.remove(src)
+        assert Path(dst).read_bytes() == b"scan-bytes"
+
+
+def test_falls_back_to_copy_across_filesystems(monkeypatch):
+    def cross_device(*_args):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(storage, "_reflink", lambda src, dst: False)
+    monkeypatch.setattr(storage.os, "link", cross_device)
+    monkeypatch.setattr(storage.os, "rename", cross_device)
+    with tempfile.TemporaryDirectory() as tmp:
+        src = _src(tmp)
+        dst = os.path.join(tmp, "project.jpg")
+        assert place_file(src, dst, keep_source=False) == "copy"
+        assert os.path.exists(src)  # caller's inbox cleanup removes it
+        assert Path(dst).read_bytes() == b"scan-bytes"
+
+
+def test_reflink_failure_leaves_no_partial_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        src = _src(tmp)
+        dst = os.path.join(tmp, "project.jpg")
+        if not storage._reflink(src, dst):
+            assert not os.path.exists(dst)
+        else:
+            assert Path(dst).read_bytes() == b"scan-bytes"
+
+
+def test_missing_source_raises():
+    with tempfile.TemporaryDirectory() as tmp:
+        with pytest.raises(OSError):
+            place_file(os.path.join(tmp, "gone.jpg"), os.path.join(tmp, "project.jpg"))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the project metadata cache / write coalescing
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent.metadata_store import MetadataStore
+
+
+def _write(tmp, pid, data):
+    with open(os.path.join(tmp, f"{pid}.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def _read(tmp, pid):
+    with open(os.path.join(tmp, f"{pid}.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _doc(n=2):
+    return {"images": [{"id": f"i{i}", "filename": f"{i}.jpg", "source_file": f"src{i}.jpg",
+                        "order": n - i} for i in range(n)]}
+
+
+def _set_brightness(value):
+    def mutate(data):
+        data["images"][0]["brightness"] = value
+        return value
+    return mutate
+
+
+def test_reads_are_cached_until_file_changes():
+    with tempfile.TemporaryDirectory() as tmp:
+        _write(tmp, "p", _doc())
+        store = MetadataStore(tmp)
+        first = store.get("p")
+        assert store.get("p") is first and store.parses == 1
+
+        _write(tmp, "p", {"images": [], "padding": "x" * 10})  # different size → new stat key
+        assert store.get("p").data["images"] == []
+        assert store.parses == 2
+        assert store.get("missing") is None
+
+
+def test_filename_index_and_order():
+    with tempfile.TemporaryDirectory() as tmp:
+        _write(tmp, "p", _doc())
+        snap = MetadataStore(tmp).get("p")
+        assert snap.image("1.jpg")["id"] == "i1"
+        assert snap.image("src0.jpg")["id"] == "i0"
+        assert snap.image("nope.jpg") is None
+        assert [img["id"] for img in snap.ordered_images()] == ["i1", "i0"]
+
+
+def test_rapid_updates_coalesce_into_one_write():
+    with tempfile.TemporaryDirectory() as tmp:
+        _write(tmp, "p", _doc())
+        store = MetadataStore(tmp, write_delay=0.1)
+        for i in range(10):
+            _, result = store.update("p", _set_brightness(i))
+        assert result == 9
+        assert store.get("p").data["images"][0]["brightness"] == 9
+        assert "brightness" not in _read(tmp, "p")["images"][0]
+
+        time.sleep(0.4)
+        assert store.writes == 1
+        assert _read(tmp, "p")["images"][0]["brightness"] == 9
+        assert store.get("p") is not None and store.parses == 1  # our own write is not re-parsed
+
+
+def test_snapshots_are_copy_on_write():
+    with tempfile.TemporaryDirectory() as tmp:
+        _write(tmp, "p", _doc())
+        store = MetadataStore(tmp, write_delay=60)
+        before = store.get("p")
+        after, _ = store.update("p", _set_brightness(5))
+        assert "brightness" not in before.data["images"][0]
+        assert after.image("0.jpg")["brightness"] == 5
+
+        assert store.flush() == 1
+        assert _read(tmp, "p")["images"][0]["brightness"] == 5
+
+
+def test_create_and_flush_hook():
+    with tempfile.TemporaryDirectory() as tmp:
+        flushed = []
+        store = MetadataStore(tmp, write_delay=60, on_flush=flushed.append)
+        with pytest.raises(FileNotFoundError):
+            store.update("new", _set_brightness(1))
+        store.update("new", lambda data: data["images"].append({"id": "a"}), create=lambda: {"images": []})
+        store.flush("new")
+        assert _read(tmp, "new") == {"images": [{"id": "a"}]}
+        assert flushed == ["new"]
+
+
+def test_discard_drops_pending_write():
+    with tempfile.TemporaryDirectory() as tmp:
+        _write(tmp, "p", _doc())
+        store = MetadataStore(tmp, write_delay=0.1)
+        store.update("p", _set_brightness(3))
+        store.discard("p")
+        time.sleep(0.3)
+        assert store.writes == 0
+        assert "brightness" not in _read(tmp, "p")["images"][0]
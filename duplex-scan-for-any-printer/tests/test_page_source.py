@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Unit tests for multi-page TIFF/PDF page sources
+"""
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent.page_source import HAS_PYMUPDF, expand_pages, iter_pages, needs_expansion, page_count
+
+needs_pymupdf = pytest.mark.skipif(not HAS_PYMUPDF, reason="PyMuPDF not installed")
+
+
+def _jpeg_bytes(color, size=(200, 280)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "JPEG", quality=80)
+    return buf.getvalue()
+
+
+def _scanner_pdf(path, jpegs):
+    """PDF shaped like an ADF scan: one full-page JPEG per page."""
+    import fitz
+    doc = fitz.open()
+    for data in jpegs:
+        page = doc.new_page(width=200, height=280)
+        page.insert_image(page.rect, stream=data)
+    doc.save(path)
+    doc.close()
+
+
+def test_multiframe_tiff_pages_in_order():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "adf.tiff")
+        frames = [Image.new("RGB", (40, 60), c) for c in ("red", "green", "blue")]
+        frames[0].save(path, save_all=True, append_images=frames[1:])
+
+        assert page_count(path) == 3
+        assert needs_expansion(path)
+        colors = [p.image.getpixel((0, 0)) for p in iter_pages(path)]
+        assert colors == [(255, 0, 0), (0, 128, 0), (0, 0, 255)]
+
+
+def test_single_frame_tiff_is_left_alone():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "one.tif")
+        Image.new("L", (10, 10)).save(path)
+        assert not needs_expansion(path)
+
+
+@needs_pymupdf
+def test_pdf_jpeg_streams_extracted_verbatim():
+    with tempfile.TemporaryDirectory() as tmp:
+        jpegs = [_jpeg_bytes("white"), _jpeg_bytes("black")]
+        path = os.path.join(tmp, "scan_0007.pdf")
+        _scanner_pdf(path, jpegs)
+
+        pages = list(iter_pages(path))
+        assert [p.ext for p in pages] == [".jpg", ".jpg"]
+        assert [p.data for p in pages] == jpegs  # no rasterisation, no re-encode
+
+
+@needs_pymupdf
+def test_pdf_without_embedded_scan_is_rendered():
+    import fitz
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "text.pdf")
+        doc = fitz.open()
+        doc.new_page(width=100, height=100).insert_text((10, 50), "hello")
+        doc.save(path)
+        doc.close()
+
+        (page,) = list(iter_pages(path))
+        assert page.ext == ".png"
+        assert Image.open(io.BytesIO(page.data)).size == (417, 417)  # 300 dpi
+
+
+@needs_pymupdf
+def test_expand_pages_names_keep_one_ordering_group():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scan_0007.pdf")
+        _scanner_pdf(path, [_jpeg_bytes("white")] * 3)
+        out = expand_pages(path, tmp)
+        assert [os.path.basename(p) for p in out] == [
+            "scan_0007_1.jpg", "scan_0007_2.jpg", "scan_0007_3.jpg",
+        ]
+
+        plain = os.path.join(tmp, "document.pdf")
+        _scanner_pdf(plain, [_jpeg_bytes("white")] * 2)
+        assert [os.path.basename(p) for p in expand_pages(plain, tmp)] == [
+            "document_0_1.jpg", "document_0_2.jpg",
+        ]
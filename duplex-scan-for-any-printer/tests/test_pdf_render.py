@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the cached PDF page render service
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+fitz = pytest.importorskip("fitz")
+
+from agent import image_formats
+from agent.derivative_store import DerivativeStore
+from agent.pdf_render import PAGE_DPI, PdfRenderService
+
+
+def _pdf(path, pages, text="page"):
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page(width=595, height=842).insert_text((72, 72), f"{text} {i}")
+    doc.save(path)
+    doc.close()
+
+
+def _service(tmp):
+    return PdfRenderService(DerivativeStore(os.path.join(tmp, "store")), max_docs=2)
+
+
+def test_render_is_cached_jpeg(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = os.path.join(tmp, "scan.pdf")
+        _pdf(pdf, 2)
+        svc = _service(tmp)
+
+        first = svc.render(pdf, 1, PAGE_DPI["small"])
+        with Image.open(first) as im:
+            assert im.format == "JPEG"
+            assert im.size == (595, 842)
+
+        encodes = []
+        real = svc._encode
+        monkeypatch.setattr(svc, "_encode", lambda *a: encodes.append(a) or real(*a))
+        assert svc.render(pdf, 1, PAGE_DPI["small"]) == first
+        assert encodes == []
+
+
+def test_webp_variant():
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = os.path.join(tmp, "scan.pdf")
+        _pdf(pdf, 1)
+        path = _service(tmp).render(pdf, 0, 72, "webp")
+        with Image.open(path) as im:
+            assert im.format == "WEBP"
+
+
+def test_rewritten_pdf_reopens_and_rerenders():
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = os.path.join(tmp, "scan.pdf")
+        _pdf(pdf, 1)
+        svc = _service(tmp)
+        old = svc.render(pdf, 0, 72)
+        assert svc.page_count(pdf) == 1
+
+        time.sleep(0.01)
+        _pdf(pdf, 3, text="edited")
+        assert svc.page_count(pdf) == 3
+        assert svc.render(pdf, 0, 72) != old
+
+
+def test_open_documents_are_bounded():
+    with tempfile.TemporaryDirectory() as tmp:
+        svc = _service(tmp)
+        for i in range(4):
+            pdf = os.path.join(tmp, f"{i}.pdf")
+            _pdf(pdf, 1)
+            svc.page_count(pdf)
+        assert len(svc._docs) == 2
+
+
+def test_out_of_range_page():
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = os.path.join(tmp, "scan.pdf")
+        _pdf(pdf, 1)
+        with pytest.raises(IndexError):
+            _service(tmp).render(pdf, 5, 72)
+
+
+def test_prerender_covers_every_page_and_size():
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = os.path.join(tmp, "scan.pdf")
+        _pdf(pdf, 3)
+        svc = _service(tmp)
+        assert svc.prerender(pdf, sizes=("small", "medium")) == 6
+        digest = svc.store.source_digest(pdf)
+        for page in range(3):  # warmed in the format browsers negotiate
+            assert os.path.exists(svc.store.path_for(digest, f"p{page}-150dpi", image_formats.preferred()))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the crop/adjust preview engine
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent.derivative_store import DerivativeStore
+from agent.preview_proxy import PreviewEngine, Superseded
+
+
+def _source(tmp, w=3000, h=2000):
+    img = np.full((h, w, 3), 255, np.uint8)
+    img[:h // 2, :w // 2] = (0, 0, 255)  # red top-left quadrant
+    path = os.path.join(tmp, "scan.jpg")
+    cv2.imwrite(path, img)
+    return path
+
+
+def _engine(tmp, **kw):
+    return PreviewEngine(DerivativeStore(os.path.join(tmp, "store")), proxy_size=600, **kw)
+
+
+def _decode(data):
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def test_proxy_is_bounded_and_cached(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        src = _source(tmp)
+        engine = _engine(tmp)
+        proxy = engine.proxy(src)
+        assert max(proxy.image.shape[:2]) == 600
+        assert proxy.scale == pytest.approx(600 / 3000)
+
+        monkeypatch.setattr(engine, "_build", lambda *a: pytest.fail("proxy rebuilt"))
+        assert engine.proxy(src) is proxy
+
+
+def test_rotation_swaps_proxy_axes():
+    with tempfile.TemporaryDirectory() as tmp:
+        proxy = _engine(tmp).proxy(_source(tmp), rotation=90)
+        h, w = proxy.image.shape[:2]
+        assert (w, h) == (400, 600)
+        assert proxy.scale == pytest.approx(600 / 3000)
+
+
+def test_bbox_in_full_resolution_coordinates():
+    with tempfile.TemporaryDirectory() as tmp:
+        src = _source(tmp)
+        data, size = _engine(tmp).render(src, bbox=(0, 0, 1500, 1000), max_width=300, max_height=300)
+        assert size == (300, 200)
+        b, g, r = _decode(data)[100, 150]
+        assert r > 200 and g < 60 and b < 60  # inside the red quadrant
+
+
+def test_tone_and_format():
+    with tempfile.TemporaryDirectory() as tmp:
+        src = _source(tmp)
+        engine = _engine(tmp)
+        plain, _ = engine.render(src, bbox=(2000, 1500, 500, 500))
+        darker, _ = engine.render(src, bbox=(2000, 1500, 500, 500), brightness=0.5)
+        assert _decode(darker).mean() < _decode(plain).mean() - 30
+        webp, _ = engine.render(src, fmt="webp")
+        assert webp[8:12] == b"WEBP"
+
+
+def test_superseded_requests_are_skipped():
+    with tempfile.TemporaryDirectory() as tmp:
+        src = _source(tmp)
+        engine = _engine(tmp)
+        engine.announce("tab", 1)
+        engine.announce("tab", 2)
+        with pytest.raises(Superseded):
+            engine.render(src, session="tab", seq=1)
+        engine.render(src, session="tab", seq=2)
+        engine.render(src, session="other", seq=1)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the scan_out project catalog
+"""
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import agent.project_catalog as catalog_module
+from agent.project_catalog import ProjectCatalog, detect_mode
+
+needs_pymupdf = pytest.mark.skipif(not catalog_module.HAS_PYMUPDF, reason="PyMuPDF not installed")
+
+
+def _pdf(out_dir, project_id, pages=1):
+    import fitz
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page(width=100, height=100)
+    doc.save(os.path.join(out_dir, f"{project_id}.pdf"))
+    doc.close()
+
+
+def _metadata(out_dir, project_id, created, images=2):
+    with open(os.path.join(out_dir, f"{project_id}.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "created": created,
+            "updated": created + 1,
+            "images": [{"path": f"img_{i}.jpg"} for i in range(images)],
+        }, f)
+
+
+def test_detect_mode():
+    assert detect_mode("scan_document-1700000000.pdf") == "scan_document"
+    assert detect_mode("card_2in1-1700000000.pdf") == "card_2in1"
+    assert detect_mode("scan_duplex-scanner_a-1700000000.pdf") == "scan_duplex"
+    assert detect_mode("misc.pdf") == "unknown"
+
+
+@needs_pymupdf
+def test_reconcile_indexes_and_pages_by_cursor():
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(5):
+            pid = f"scan_duplex-{1000 + i}"
+            _pdf(tmp, pid, pages=i + 1)
+            _metadata(tmp, pid, created=1000 + i)
+        _pdf(tmp, "scan_duplex-1004_mono")  # companions are not projects
+
+        cat = ProjectCatalog(tmp)
+        assert cat.reconcile(force=True) == 5
+        assert cat.count() == 5
+
+        first, cursor = cat.page(limit=2)
+        assert [e.id for e in first] == ["scan_duplex-1004", "scan_duplex-1003"]
+        assert first[0].pages == 5 and first[0].image_count == 2
+        assert first[0].first_image == "img_0.jpg"
+        second, cursor = cat.page(limit=2, cursor=cursor)
+        third, cursor = cat.page(limit=2, cursor=cursor)
+        assert [e.id for e in second + third] == [
+            "scan_duplex-1002", "scan_duplex-1001", "scan_duplex-1000",
+        ]
+        assert cursor is None
+
+
+@needs_pymupdf
+def test_reconcile_only_reads_changed_projects(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        _pdf(tmp, "a-1")
+        _pdf(tmp, "b-2")
+        cat = ProjectCatalog(tmp)
+        cat.reconcile(force=True)
+
+        indexed = []
+        real_index = cat._index
+        monkeypatch.setattr(cat, "_index", lambda pid, *a: indexed.append(pid) or real_index(pid, *a))
+
+        _metadata(tmp, "b-2", created=5000)
+        os.remove(os.path.join(tmp, "a-1.pdf"))
+        assert cat.reconcile() == 2  # directory changed: no need to force
+        assert indexed == ["b-2"]
+        assert cat.get("a-1") is None
+        assert cat.get("b-2").created == 5000
+        assert cat.reconcile() == 0  # nothing changed since
+
+
+@needs_pymupdf
+def test_record_is_incremental_and_shared_across_instances():
+    with tempfile.TemporaryDirectory() as tmp:
+        agent_side = ProjectCatalog(tmp)
+        web_side = ProjectCatalog(tmp)
+        _pdf(tmp, "scan_document-7", pages=3)
+        agent_side.record("scan_document-7")
+
+        entry = web_side.get("scan_document-7")
+        assert entry.pages == 3 and entry.mode == "scan_document"
+
+        os.remove(os.path.join(tmp, "scan_document-7.pdf"))
+        agent_side.record("scan_document-7")
+        assert web_side.get("scan_document-7") is None
+
+
+def test_metadata_only_projects_are_filtered():
+    with tempfile.TemporaryDirectory() as tmp:
+        _metadata(tmp, "legacy_session", created=10)
+        cat = ProjectCatalog(tmp)
+        cat.reconcile(force=True)
+        assert cat.count() == 0
+        assert cat.count(require_pdf=False, require_metadata=True) == 1
+
+
+def test_invalid_cursor_rejected():
+    with tempfile.TemporaryDirectory() as tmp:
+        with pytest.raises(ValueError):
+            ProjectCatalog(tmp).page(cursor="not-a-cursor")
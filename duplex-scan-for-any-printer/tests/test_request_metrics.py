@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the web UI request metrics middleware
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent import request_metrics
+from agent.derivative_store import DerivativeStore
+from agent.work_pool import WorkPool
+
+
+def _app(tmp_path):
+    app = FastAPI()
+    app.add_middleware(request_metrics.RequestMetricsMiddleware)
+    pool = WorkPool(workers=1)
+    store = DerivativeStore(str(tmp_path / "store"))
+    source = tmp_path / "src.bin"
+    source.write_bytes(b"x" * 100)
+
+    def render(src, out):
+        time.sleep(0.02)
+        with open(out, "wb") as f:
+            f.write(b"y" * 2048)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        with request_metrics.stage("lookup"):
+            path = await pool.run(request_metrics.timed(store.get), str(source), "w1", "bin", render)
+        return {"id": item_id, "size": Path(path).stat().st_size}
+
+    @app.get("/events")
+    async def events():
+        async def gen():
+            yield "data: 1\n\n"
+        return StreamingResponse(gen(), media_type="text/event-stream")
+
+    return app
+
+
+def _get(app, *paths):
+    """Send GETs through the ASGI app in order; returns the responses."""
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.get(p) for p in paths]
+    return asyncio.run(run())
+
+
+def test_route_templates_stages_and_cache_tags(tmp_path):
+    responses = _get(_app(tmp_path), "/items/a", "/items/b", "/nope")
+    assert [r.status_code for r in responses] == [200, 200, 404]
+
+    labels = dict(method="GET", route="/items/{item_id}", status="200")
+    assert request_metrics.REQUEST_SECONDS.count(**labels) == 2
+    assert request_metrics.REQUEST_SECONDS.count(method="GET", route="unmatched", status="404") >= 1
+    assert request_metrics.IN_PROGRESS.value(route="/items/{item_id}") == 0
+    cache = request_metrics.cache_results()["/items/{item_id}"]
+    assert cache["miss"] == 1 and cache["hit"] == 1
+
+    slow = [r for r in request_metrics.slowest(50) if r["route"] == "/items/{item_id}"]
+    first = next(r for r in slow if r["path"] == "/items/a")
+    assert first["cache"] == {"miss": 1}
+    assert first["stages"]["get"]["count"] == 1 and first["stages"]["get"]["ms"] >= 20
+    assert first["stages"]["lookup"]["ms"] >= first["stages"]["get"]["ms"]
+    assert first["bytes"] > 0
+
+
+def test_event_streams_are_not_timed(tmp_path):
+    before = request_metrics.REQUEST_SECONDS.count(method="GET", route="/events", status="200")
+    assert _get(_app(tmp_path), "/events")[0].text.startswith("data:")
+    assert request_metrics.REQUEST_SECONDS.count(method="GET", route="/events", status="200") == before
+    assert request_metrics.IN_PROGRESS.value(route="/events") == 0
+
+
+def test_helpers_are_noops_outside_requests():
+    fn = lambda: 1  # noqa: E731
+    assert request_metrics.timed(fn) is fn
+    request_metrics.cache("hit")
+    with request_metrics.stage("x"):
+        pass
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the pushed session event stream
+"""
+import asyncio
+import json
+import sys
+import threading
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent.notification_manager import NotificationManager
+from agent.session_events import EventBroadcaster, EventRelay, EventStreamChannel, parse_sse
+
+
+def _events(chunks):
+    """Decode SSE text chunks into event dicts (comments/retry skipped)."""
+    return [json.loads(c[c.index("data: ") + 6:]) for c in chunks if "data: " in c]
+
+
+async def _take(agen, n):
+    return [await agen.__anext__() for _ in range(n)]
+
+
+def test_hooks_reach_subscribers_from_other_threads():
+    state = {"sessions": []}
+    broadcaster = EventBroadcaster(snapshot=lambda: dict(state))
+    manager = NotificationManager([EventStreamChannel(broadcaster)])
+
+    async def main():
+        stream = broadcaster.stream()
+        first = _events(await _take(stream, 2))  # retry + initial snapshot
+        assert first[0]["type"] == "snapshot" and first[0]["sessions"] == []
+
+        def fire():
+            state["sessions"] = [{"id": "s1", "state": "WAIT_CONFIRM"}]
+            manager.notify_image_added({"id": "s1", "image_count": 1})
+            manager.notify_session_ready({"id": "s1"})
+
+        threading.Thread(target=fire).start()
+        added, ready = _events(await _take(stream, 2))
+        assert added["type"] == "image_added" and added["data"]["image_count"] == 1
+        assert ready["type"] == "session_ready" and ready["sessions"][0]["id"] == "s1"
+        assert ready["id"] == added["id"] + 1
+        await stream.aclose()
+        assert broadcaster.subscriber_count == 0
+
+    asyncio.run(main())
+    assert manager.get_statuses()["events"]["subscribers"] == 0
+
+
+def test_reconnect_replays_missed_events_or_falls_back_to_snapshot():
+    broadcaster = EventBroadcaster(history=3)
+    for i in range(5):
+        broadcaster.publish("image_added", {"n": i})  # ids 1..5, history keeps 3..5
+
+    async def main():
+        _, backlog = broadcaster.subscribe(last_event_id=3)
+        assert [e["id"] for e in backlog] == [4, 5]
+        _, backlog = broadcaster.subscribe(last_event_id=1)  # gap: 2 was evicted
+        assert [e["type"] for e in backlog] == ["snapshot"] and backlog[0]["id"] == 5
+        _, backlog = broadcaster.subscribe(last_event_id=99)  # agent restarted
+        assert [e["type"] for e in backlog] == ["snapshot"]
+
+    asyncio.run(main())
+
+
+def test_heartbeat_while_idle():
+    async def main():
+        stream = EventBroadcaster().stream(heartbeat=0.01)
+        await _take(stream, 2)
+        assert await stream.__anext__() == ": ping\n\n"
+        await stream.aclose()
+
+    asyncio.run(main())
+
+
+def test_parse_sse():
+    async def lines():
+        for line in ["retry: 3000", "", ": ping", "id: 7", "data: {\"a\":", "data: 1}", "", "data: x", ""]:
+            yield line
+
+    async def main():
+        return [item async for item in parse_sse(lines())]
+
+    assert asyncio.run(main()) == [(None, None), ("7", "{\"a\":\n1}"), (None, "x")]
+
+
+def test_relay_shares_one_upstream_and_reconnects_with_last_id():
+    opened = []
+
+    async def upstream(last_event_id):
+        opened.append(last_event_id)
+        if len(opened) == 1:
+            for i in (1, 2):
+                yield f"id: {i}"
+                yield "data: " + json.dumps({"type": "image_added", "id": i})
+                yield ""
+            return  # upstream drops; the relay reconnects with Last-Event-ID 2
+        while True:
+            yield ": ping"
+            await asyncio.sleep(0.01)
+
+    async def main():
+        relay = EventRelay(upstream, heartbeat=5)
+        a, b = relay.stream(), relay.stream()
+        first_a = await a.__anext__()
+        await asyncio.sleep(0.05)
+        first_b = await b.__anext__()
+        assert first_a["id"] == 1 and first_b["id"] == 2  # b starts from the latest state
+        assert [e.get("id") for e in await _take(a, 1)] == [2]
+        assert (await a.__anext__())["type"] == "disconnected"
+        await asyncio.sleep(1.2)
+        assert opened == [None, "2"]
+        await a.aclose()
+        await b.aclose()
+        await relay.close()
+
+    asyncio.run(main())
+
+
+def test_wait_confirm_hint_publishes_through_agent_api_without_deadlock(tmp_path):
+    from agent import agent_api
+    from agent.session_manager import SessionManager, STATE_WAIT_CONFIRM
+
+    manager = NotificationManager()
+
+    def on_state_change(session, old, new):
+        # What ScanAgent._on_session_state_change does: the event snapshot
+        # calls back into SessionManager.active_sessions()
+        if new == STATE_WAIT_CONFIRM:
+            manager.notify_session_ready({"id": session.id})
+
+    sm = SessionManager(300, on_confirm=lambda s: None, on_reject=lambda s: None,
+                        on_state_change=on_state_change)
+    agent_api.init(sm, manager, lambda *args: None)
+    published = agent_api.events.published
+    page = tmp_path / "page.jpg"
+    page.write_bytes(b"")
+
+    def scan():
+        sm.add_image("scan_duplex", str(page), device="dev1")
+        sm.hint_wait_confirm("scan_duplex", "dev1")
+
+    try:
+        worker = threading.Thread(target=scan, daemon=True)
+        worker.start()
+        worker.join(timeout=2)
+        assert not worker.is_alive(), "hint_wait_confirm deadlocked on the session lock"
+        assert agent_api.events.published > published
+    finally:
+        agent_api.init(None, None, None)
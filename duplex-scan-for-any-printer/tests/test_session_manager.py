@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Unit tests for per-device session tracking in SessionManager
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+from unittest.mock import Mock
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent.session_manager import (
+    SessionManager,
+    DEFAULT_DEVICE,
+    STATE_CONFIRMED,
+    STATE_SUSPENDED,
+    STATE_WAIT_CONFIRM,
+)
+from agent.ftp_watcher import resolve_mode_and_device
+from agent.ftp_server import ScannerFTPHandler, _device_name
+
+
+def _manager():
+    confirmed, rejected = [], []
+    sm = SessionManager(300, on_confirm=confirmed.append, on_reject=rejected.append)
+    return sm, confirmed, rejected
+
+
+def test_devices_collect_in_parallel():
+    """Two scanners in the same mode get separate sessions"""
+    sm, _, _ = _manager()
+    sm.add_image("scan_document", "/in/a1.jpg", device="scanner_a")
+    sm.add_image("scan_document", "/in/b1.jpg", device="scanner_b")
+    sm.add_image("scan_document", "/in/a2.jpg", device="scanner_a")
+
+    sessions = {s.device: s for s in sm.active_sessions()}
+    assert set(sessions) == {"scanner_a", "scanner_b"}
+    assert sessions["scanner_a"].images == ["/in/a1.jpg", "/in/a2.jpg"]
+    assert sessions["scanner_b"].images == ["/in/b1.jpg"]
+    assert sessions["scanner_a"].id != sessions["scanner_b"].id
+
+
+def test_mode_switch_only_suspends_same_device():
+    """Switching mode suspends the device's own session, not other devices'"""
+    sm, _, _ = _manager()
+    sm.add_image("scan_duplex", "/in/a1.jpg", device="scanner_a")
+    sm.add_image("scan_duplex", "/in/b1.jpg", device="scanner_b")
+    sm.add_image("card_2in1", "/in/a2.jpg", device="scanner_a")
+
+    active = {(s.device, s.mode) for s in sm.active_sessions()}
+    assert active == {("scanner_a", "card_2in1"), ("scanner_b", "scan_duplex")}
+    assert sm._suspended[("scanner_a", "scan_duplex")].state == STATE_SUSPENDED
+
+
+def test_confirm_routes_by_session_id_and_device():
+    """Confirm targets the requested session and leaves the others collecting"""
+    sm, confirmed, _ = _manager()
+    sm.add_image("scan_document", "/in/a1.jpg", device="scanner_a")
+    sm.add_image("scan_document", "/in/b1.jpg", device="scanner_b")
+    target = next(s for s in sm.active_sessions() if s.device == "scanner_a")
+
+    s = sm.confirm_latest(print_requested=True, session_id=target.id)
+    assert s is target
+    assert s.state == STATE_CONFIRMED and s.print_requested
+    assert confirmed == [target]
+    assert [x.device for x in sm.active_sessions()] == ["scanner_b"]
+
+    s = sm.confirm_latest(device="scanner_b")
+    assert s is not None and s.device == "scanner_b"
+    assert sm.active_sessions() == []
+
+
+def test_confirm_unknown_target_is_noop():
+    sm, confirmed, _ = _manager()
+    sm.add_image("scan_document", "/in/a1.jpg", device="scanner_a")
+    assert sm.confirm_latest(session_id="missing") is None
+    assert sm.confirm_latest(device="scanner_b") is None
+    assert confirmed == []
+    assert len(sm.active_sessions()) == 1
+
+
+def test_confirm_filters_by_state():
+    """Commands restricted to WAIT_CONFIRM skip sessions still collecting"""
+    sm, _, _ = _manager()
+    sm.add_image("scan_document", "/in/a1.jpg", device="scanner_a")
+    assert sm.reject_latest(states=(STATE_WAIT_CONFIRM,)) is None
+    sm.hint_wait_confirm("scan_document", device="scanner_a")
+    assert sm.reject_latest(states=(STATE_WAIT_CONFIRM,)) is not None
+
+
+def test_reject_cleans_files_of_target_only():
+    sm, _, rejected = _manager()
+    with tempfile.TemporaryDirectory() as tmp:
+        a = os.path.join(tmp, "a.jpg")
+        b = os.path.join(tmp, "b.jpg")
+        for p in (a, b):
+            Path(p).write_bytes(b"x")
+        sm.add_image("scan_document", a, device="scanner_a")
+        sm.add_image("scan_document", b, device="scanner_b")
+
+        s = sm.reject_latest(device="scanner_a")
+        assert rejected == [s]
+        assert not os.path.exists(a)
+        assert os.path.exists(b)
+
+
+def test_default_device_keeps_legacy_session_id():
+    sm, _, _ = _manager()
+    sm.add_image("scan_duplex", "/in/x.jpg")
+    (s,) = sm.active_sessions()
+    assert s.device == DEFAULT_DEVICE
+    assert s.id.startswith("scan_duplex-") and s.id.count("-") == 1
+
+
+def test_watcher_resolves_device_subfolder():
+    folder = os.path.join("inbox", "scan_duplex")
+    assert resolve_mode_and_device(folder, os.path.join(folder, "p1.jpg")) == (
+        "scan_duplex", DEFAULT_DEVICE
+    )
+    assert resolve_mode_and_device(folder, os.path.join(folder, "192_168_1_20", "p1.jpg")) == (
+        "scan_duplex", "192_168_1_20"
+    )
+
+
+def test_ftp_device_name_and_path():
+    """FTP uploads are filed under the client IP (prefixed with the authenticated user)"""
+    assert _device_name("anonymous", "192.168.1.20") == "192_168_1_20"
+    assert _device_name("office-mfp", "10.0.0.5") == "office-mfp_10_0_0_5"
+    assert _device_name("", "fe80::1") == "fe80__1"
+    # Scanners sharing the configured credentials stay separate devices
+    assert _device_name("scanner", "10.0.0.5") != _device_name("scanner", "10.0.0.6")
+    long_a = _device_name("scanner", "2001:db8:85a3::8a2e:370:7334")
+    long_b = _device_name("scanner", "2001:db8:85a3::8a2e:370:7335")
+    assert len(long_a) <= 32 and long_a != long_b
+
+    with tempfile.TemporaryDirectory() as root:
+        handler = ScannerFTPHandler.__new__(ScannerFTPHandler)
+        handler.fs = Mock(root=root)
+        handler.username = "anonymous"
+        handler.remote_ip = "192.168.1.20"
+
+        mode_file = os.path.join(root, "scan_duplex", "p1.jpg")
+        routed = handler._device_path(mode_file)
+        assert routed == os.path.join(root, "scan_duplex", "192_168_1_20", "p1.jpg")
+        assert os.path.isdir(os.path.dirname(routed))
+
+        # Files outside a top-level mode folder keep their path
+        root_file = os.path.join(root, "p1.jpg")
+        assert handler._device_path(root_file) == root_file
+        assert handler._device_path(routed) == routed
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the on-demand session profiler
+"""
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent import session_profiler, tracing
+
+
+def _busy_stage(seconds):
+    end = time.time() + seconds
+    blocks = []
+    while time.time() < end:
+        blocks.append(bytearray(64 * 1024))
+    return len(blocks)
+
+
+def test_unarmed_sessions_are_not_profiled(tmp_path):
+    session_profiler.arm(0)
+    with session_profiler.profile_session("plain", str(tmp_path)) as prof:
+        assert prof is None
+    assert not os.path.exists(session_profiler.profile_dir(str(tmp_path), "plain"))
+
+
+def test_armed_session_writes_stacks_and_stage_memory(tmp_path):
+    assert session_profiler.arm(1) == 1
+    with tracing.session_span("prof-1", "profiler_test") as root, \
+            session_profiler.profile_session("prof-1", str(tmp_path), root) as prof:
+        assert prof is not None
+        assert session_profiler.status()["active"] == ["prof-1"]
+        with tracing.span("busy"):
+            _busy_stage(0.2)
+
+    assert session_profiler.status()["armed"] == 0
+    directory = session_profiler.profile_dir(str(tmp_path), "prof-1")
+    stacks = open(os.path.join(directory, session_profiler.STACKS_FILE), encoding="utf-8").read()
+    assert "_busy_stage (test_session_profiler.py)" in stacks
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks.splitlines())
+
+    report = json.load(open(os.path.join(directory, session_profiler.MEMORY_FILE), encoding="utf-8"))
+    assert report["session_id"] == "prof-1" and report["stack_samples"] > 0
+    busy = next(s for s in report["stages"] if s["stage"] == "busy")
+    assert busy["samples"] > 0 and busy["traced_peak_bytes"] > 0
+    assert session_profiler.status()["recent"][0]["session_id"] == "prof-1"
+
+
+def test_arm_is_clamped():
+    assert session_profiler.arm(-3) == 0
+    assert session_profiler.arm(10_000) == session_profiler.MAX_ARMED
+    session_profiler.arm(0)
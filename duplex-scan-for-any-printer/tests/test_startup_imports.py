@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Unit tests for lazy startup imports and the import-time profile parser
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Add src to path
+SRC_DIR = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+
+from orchestrator_utils import parse_importtime
+
+HEAVY_MODULES = ("cv2", "numpy", "scipy", "fitz", "agent.image_processing", "agent.pdf_generator")
+
+
+def _modules_after_import(module):
+    env = {**os.environ, "PYTHONPATH": str(SRC_DIR)}
+    code = f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", code], env=env, cwd=str(SRC_DIR),
+                         capture_output=True, text=True, check=True).stdout
+    return set(json.loads(out.strip().splitlines()[-1]))
+
+
+def test_agent_starts_without_imaging_stack():
+    loaded = _modules_after_import("main")
+    assert not loaded & set(HEAVY_MODULES)
+    assert "telegram" not in loaded
+
+
+def test_web_ui_starts_without_opencv():
+    loaded = _modules_after_import("web_ui_server")
+    assert "cv2" not in loaded
+    assert "pyvips" not in loaded
+
+
+def test_parse_importtime():
+    text = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   _io\n"
+        "import time:      5000 |      95000 | numpy\n"
+        "import time:     80000 |      90000 |   numpy.core\n"
+        "some other stderr line\n"
+    )
+    rows = parse_importtime(text)
+    assert [r.module for r in rows] == ["_io", "numpy", "numpy.core"]
+    assert rows[1].depth == 0 and rows[2].depth == 1
+    assert rows[2].self_s == 0.08
+    assert abs(rows[1].cumulative_s - 0.095) < 1e-9
@@ -5,7 +5,7 @@ Unit tests for Telegram bot integration
 import os
 import sys
 from pathlib import Path
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock, patch, MagicMock, AsyncMock
 import asyncio
 
 # Add src to path
@@ -153,6 +153,48 @@ def test_telegram_bot_update_session_info():
     assert bot._latest_session_info == session_info
 
 
+def test_telegram_bot_tracks_sessions_per_device():
+    """Resolving one session leaves other scanners' sessions pending"""
+    bot = TelegramBot(config=TelegramConfig(enabled=True, bot_token="test"))
+    bot.update_session_info({"id": "scan_document-a-1", "device": "a", "image_count": 1})
+    bot.update_session_info({"id": "scan_document-b-1", "device": "b", "image_count": 2})
+
+    # Bare commands act on the most recent session; explicit ids must be pending
+    assert bot._resolve_session_id(None) == "scan_document-b-1"
+    assert bot._resolve_session_id("scan_document-a-1") == "scan_document-a-1"
+    assert bot._resolve_session_id("missing") is None
+
+    bot.notify_session_action(False, action_by="Web UI", session_id="scan_document-b-1")
+    assert list(bot._pending_sessions) == ["scan_document-a-1"]
+    assert bot._latest_session_info["id"] == "scan_document-a-1"
+
+
+def test_telegram_bot_button_routes_session_id():
+    """Inline buttons carry a token of the session id through to the session callback"""
+    bot = TelegramBot(config=TelegramConfig(enabled=True, bot_token="test"))
+    long_id = "scan_document-" + "x" * 32 + "-20261019_120000_123456"
+    bot.update_session_info({"id": "scan_document-a-1"})
+    bot.update_session_info({"id": long_id})
+    callback = Mock()
+    bot.set_session_callback(callback)
+
+    # Telegram rejects callback_data over 64 bytes
+    buttons = [b for row in bot._session_keyboard(long_id).inline_keyboard for b in row]
+    assert all(len(b.callback_data.encode()) <= 64 for b in buttons)
+
+    update = MagicMock()
+    update.callback_query.data = f"cmd_confirm_print:{bot._callback_token('scan_document-a-1')}"
+    update.callback_query.answer = AsyncMock()
+    update.callback_query.edit_message_text = AsyncMock()
+    update.effective_chat.id = 555
+    asyncio.run(bot.button_callback(update, None))
+
+    callback.assert_called_once_with(
+        confirm=True, print_requested=True, session_id="scan_document-a-1"
+    )
+    assert bot._confirmer_chat_ids == {"scan_document-a-1": 555}
+
+
 def test_telegram_bot_send_notification_when_stopped():
     """Test that send_notification does nothing when bot is stopped"""
     config = TelegramConfig(enabled=True, bot_token="test")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Deep Zoom tile pyramid
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent.derivative_store import DerivativeStore
+from agent.tile_pyramid import PyramidInfo, TilePyramid
+
+
+def _source(tmp, w=1000, h=600):
+    img = np.full((h, w, 3), 255, np.uint8)
+    img[:, : w // 2] = (255, 0, 0)  # blue left half
+    path = os.path.join(tmp, "scan.jpg")
+    cv2.imwrite(path, img, [cv2.IMWRITE_JPEG_QUALITY, 100])
+    return path
+
+
+def _pyramid(tmp, **kw):
+    return TilePyramid(DerivativeStore(os.path.join(tmp, "store")), **kw)
+
+
+def test_geometry_matches_deep_zoom():
+    info = PyramidInfo(1000, 600, tile_size=254, overlap=1)
+    assert info.max_level == 10
+    assert info.level_size(10) == (1000, 600)
+    assert info.level_size(9) == (500, 300)
+    assert info.level_size(0) == (1, 1)
+    assert info.tile_counts(10) == (4, 3)
+    assert info.tile_rect(10, 0, 0) == (0, 0, 255, 255)
+    assert info.tile_rect(10, 1, 1) == (253, 253, 509, 509)
+    assert info.tile_rect(10, 3, 2) == (761, 507, 1000, 600)
+    with pytest.raises(IndexError):
+        info.tile_rect(10, 4, 0)
+    with pytest.raises(IndexError):
+        info.tile_rect(11, 0, 0)
+    assert 'TileSize="254"' in info.dzi_xml("jpg") and 'Width="1000"' in info.dzi_xml("jpg")
+
+
+def test_tiles_crop_the_right_region():
+    with tempfile.TemporaryDirectory() as tmp:
+        src = _source(tmp)
+        pyramid = _pyramid(tmp)
+        left = cv2.imread(pyramid.tile(src, 10, 0, 0))
+        right = cv2.imread(pyramid.tile(src, 10, 3, 0))
+        assert left.shape == (255, 255, 3) and right.shape == (255, 239, 3)
+        assert left[100, 100, 0] > 200 and left[100, 100, 2] < 60   # blue
+        assert right[100, 100].min() > 200                          # white
+
+        whole = cv2.imread(pyramid.tile(src, 8, 0, 0, "webp"))
+        assert whole.shape[:2] == (150, 250)
+
+
+def test_tiles_are_cached_and_levels_decoded_once(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        src = _source(tmp)
+        pyramid = _pyramid(tmp)
+        decodes = []
+        original = TilePyramid._decode_level
+
+        def counting(*args):
+            decodes.append(args[-1])
+            return original(*args)
+
+        monkeypatch.setattr(TilePyramid, "_decode_level", staticmethod(counting))
+        first = pyramid.tile(src, 10, 0, 0)
+        for col in range(4):
+            pyramid.tile(src, 10, col, 1)
+        assert decodes == [10]
+        assert pyramid.tile(src, 10, 0, 0) == first
+
+
+def test_level_cache_is_byte_bounded():
+    with tempfile.TemporaryDirectory() as tmp:
+        src = _source(tmp)
+        pyramid = _pyramid(tmp, cache_bytes=500 * 300 * 3)
+        pyramid.tile(src, 9, 0, 0)
+        pyramid.tile(src, 8, 0, 0)
+        pyramid.tile(src, 10, 0, 0)  # larger than the budget: kept alone
+        assert len(pyramid._levels) == 1
+        assert pyramid._level_bytes == 1000 * 600 * 3
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Unit tests for pipeline timing spans and the Prometheus exposition
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent import tracing
+
+
+def test_histogram_buckets_are_cumulative():
+    h = tracing.Histogram("test_latency_seconds", "Test latency.", ("op",), buckets=(0.1, 1.0), register=False)
+    for v in (0.05, 0.5, 0.7, 5.0):
+        h.observe(v, op="x")
+
+    lines = h.render()
+    assert '# TYPE test_latency_seconds histogram' in lines
+    assert 'test_latency_seconds_bucket{op="x",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{op="x",le="1"} 3' in lines
+    assert 'test_latency_seconds_bucket{op="x",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_count{op="x"} 4' in lines
+    assert h.count(op="x") == 4
+
+
+def test_labels_must_match_declaration():
+    c = tracing.Counter("test_things_total", "Things.", ("mode",), register=False)
+    c.inc(2, mode='a"b')
+    assert 'test_things_total{mode="a\\"b"} 2' in c.render()
+    with pytest.raises(ValueError):
+        c.inc(mode="a", extra="b")
+
+
+def test_session_span_observes_stages_and_keeps_trace():
+    before = tracing.STAGE_SECONDS.count(mode="tracing_test", stage="load")
+    with tracing.session_span("sess-1", "tracing_test") as root:
+        assert tracing.SESSIONS_IN_PROGRESS.value() >= 1
+        with tracing.span("load") as sp:
+            assert tracing.current_span() is sp
+        tracing.record("pdf_color", 0.25)
+    assert tracing.current_span() is None
+    assert root.duration is not None and sp.duration <= root.duration
+
+    assert tracing.STAGE_SECONDS.count(mode="tracing_test", stage="load") == before + 1
+    assert tracing.SESSION_SECONDS.count(mode="tracing_test", outcome="ok") >= 1
+    trace = tracing.recent_traces(1)[0]
+    assert trace["attrs"]["session_id"] == "sess-1"
+    assert [c["name"] for c in trace["children"]] == ["load", "pdf_color"]
+    assert trace["children"][1]["duration_ms"] == 250.0
+
+
+def test_failed_session_is_counted_as_error():
+    with pytest.raises(RuntimeError):
+        with tracing.session_span("sess-2", "tracing_test"):
+            raise RuntimeError("boom")
+    assert tracing.SESSION_SECONDS.count(mode="tracing_test", outcome="error") == 1
+    assert tracing.recent_traces(1)[0]["error"] == "RuntimeError: boom"
+
+    text = tracing.render()
+    assert "# TYPE scan_session_duration_seconds histogram" in text
+    assert "process_resident_memory_bytes " in text
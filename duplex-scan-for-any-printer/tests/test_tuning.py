@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the hardware performance profile
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent import tuning
+
+PI = {"cores": 4, "ram_mb": 3800, "decode_mps": 45.0, "encode_mps": 30.0, "gflops": 12.0}
+NUC = {"cores": 8, "ram_mb": 15800, "decode_mps": 160.0, "encode_mps": 140.0, "gflops": 300.0}
+
+
+@pytest.fixture(autouse=True)
+def _restore_settings():
+    yield
+    tuning.use({"settings": tuning.DEFAULTS})
+
+
+def test_tiers_follow_the_hardware():
+    assert tuning.classify(PI) == "low"
+    assert tuning.classify(NUC) == "high"
+    assert tuning.classify({**NUC, "cores": 2}) == "low"
+    assert tuning.derive(PI, "low") == tuning.DEFAULTS
+
+    high = tuning.derive(NUC, "high")
+    assert high["analysis_width"] > tuning.DEFAULTS["analysis_width"]
+    assert high["web_ui_workers"] == 7  # one core left for the agent
+    assert high["keep_bg_model_loaded"]
+
+    # Forcing a tier on small hardware caps it but never goes below the defaults
+    small = tuning.derive({**PI, "cores": 2, "ram_mb": 1000}, "high")
+    assert small["web_ui_workers"] == tuning.DEFAULTS["web_ui_workers"]
+    assert small["page_buffer_mb"] == tuning.DEFAULTS["page_buffer_mb"]
+    assert not small["keep_bg_model_loaded"]
+
+
+def test_overrides_win_and_are_checked():
+    settings = tuning.derive(NUC, "high", {"analysis_width": "700", "keep_bg_model_loaded": "false"})
+    assert settings["analysis_width"] == 700
+    assert settings["keep_bg_model_loaded"] is False
+    with pytest.raises(ValueError):
+        tuning.derive(NUC, "high", {"jpeg_speed": 1})
+
+
+def test_profile_is_persisted_and_reused(tmp_path, monkeypatch):
+    runs = []
+    monkeypatch.setattr(tuning, "calibrate", lambda: runs.append(1) or dict(NUC))
+    monkeypatch.setattr(tuning, "fingerprint", lambda: {"cpu": "nuc"})
+
+    profile = tuning.load_or_calibrate(str(tmp_path))
+    assert profile["tier"] == "high" and (tmp_path / tuning.PROFILE_FILE).exists()
+    assert tuning.settings() == profile["settings"]
+
+    # Same machine: no new measurement, even when the config asks for another tier
+    assert tuning.load_or_calibrate(str(tmp_path))["settings"] == profile["settings"]
+    forced = tuning.load_or_calibrate(str(tmp_path), "low", {"web_ui_workers": 3})
+    assert forced["tier"] == "low" and forced["settings"]["web_ui_workers"] == 3
+    assert len(runs) == 1
+    # Readers that pass no profile get what the agent resolved
+    assert tuning.load_or_calibrate(str(tmp_path), None)["settings"]["web_ui_workers"] == 3
+
+    monkeypatch.setattr(tuning, "fingerprint", lambda: {"cpu": "pi"})
+    tuning.load_or_calibrate(str(tmp_path))
+    assert len(runs) == 2
+    with pytest.raises(ValueError):
+        tuning.load_or_calibrate(str(tmp_path), "turbo")
+
+
+def test_calibrate_measures_this_machine():
+    measured = tuning.calibrate(repeat=1)
+    assert measured["cores"] >= 1 and measured["ram_mb"] > 0
+    assert measured["decode_mps"] > 0 and measured["encode_mps"] > 0 and measured["gflops"] > 0
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the shared bounded worker pool
+"""
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent.work_pool import PoolOverloaded, WorkPool
+
+
+def test_run_returns_results_and_propagates_errors():
+    pool = WorkPool(workers=2, max_queue=4)
+
+    def boom():
+        raise ValueError("bad page")
+
+    async def main():
+        assert await pool.run(lambda a, b: a + b, 2, 3) == 5
+        with pytest.raises(ValueError):
+            await pool.run(boom)
+
+    asyncio.run(main())
+    stats = pool.metrics()
+    assert stats["completed"] == 1 and stats["failed"] == 1
+    pool.shutdown()
+
+
+def test_full_queue_rejects_with_retry_after():
+    pool = WorkPool(workers=1, max_queue=2)
+    gate = threading.Event()
+
+    async def main():
+        blocker = asyncio.ensure_future(pool.run(gate.wait))
+        await asyncio.sleep(0.05)  # worker picks it up
+        queued = [asyncio.ensure_future(pool.run(time.sleep, 0)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(PoolOverloaded) as exc:
+            await pool.run(time.sleep, 0)
+        assert exc.value.retry_after >= 1
+        gate.set()
+        await asyncio.gather(blocker, *queued)
+
+    asyncio.run(main())
+    assert pool.metrics()["rejected"] == 1
+    pool.shutdown()
+
+
+def test_keys_are_served_round_robin():
+    pool = WorkPool(workers=1, max_queue=16)
+    gate = threading.Event()
+    order = []
+
+    async def main():
+        blocker = asyncio.ensure_future(pool.run(gate.wait))
+        await asyncio.sleep(0.05)
+        batch = [asyncio.ensure_future(pool.run(order.append, f"big{i}", key="big")) for i in range(4)]
+        await asyncio.sleep(0)
+        small = asyncio.ensure_future(pool.run(order.append, "small", key="small"))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(blocker, small, *batch)
+
+    asyncio.run(main())
+    # The single request queued after a 4-job batch runs second, not last
+    assert order.index("small") == 1
+    pool.shutdown()
+
+
+def test_map_unordered_bounds_queued_jobs():
+    pool = WorkPool(workers=2, max_queue=3)
+    peak = []
+
+    def work(i):
+        peak.append(pool.metrics()["queued"] + pool.metrics()["running"])
+        time.sleep(0.01)
+        return i * 2
+
+    async def main():
+        results = []
+        async for args, result, error in pool.map_unordered(work, [(i,) for i in range(10)], window=2):
+            assert error is None
+            results.append(result)
+        return results
+
+    assert sorted(asyncio.run(main())) == [i * 2 for i in range(10)]
+    assert max(peak) <= 2
+    pool.shutdown()
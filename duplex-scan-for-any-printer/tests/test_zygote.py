@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the pre-forked zygote process host
+"""
+import gc
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import zygote
+
+pytestmark = pytest.mark.skipif(not zygote.available(), reason="fork() not available")
+
+
+def test_fork_streams_output_and_exit_code():
+    host = zygote.Zygote(preload=("json",))
+    host.preload()
+    gc.unfreeze()  # preload froze this test process's objects
+    assert host.loaded == ["json"]
+
+    def work():
+        print("hello from child", flush=True)
+        print("to stderr", file=sys.stderr)
+        return 3
+
+    name, proc, pipe = host.fork("worker", work)
+    output = pipe.read().decode()
+    pipe.close()
+    assert proc.wait(timeout=10) == 3
+    assert "hello from child" in output and "to stderr" in output
+
+
+def test_child_exceptions_and_sys_exit():
+    host = zygote.Zygote(preload=())
+
+    def crash():
+        raise RuntimeError("boom")
+
+    _, proc, pipe = host.fork("crash", crash)
+    assert "RuntimeError: boom" in pipe.read().decode()
+    assert proc.wait(timeout=10) == 1
+
+    _, proc, pipe = host.fork("exit", lambda: sys.exit(7))
+    pipe.read()
+    assert proc.wait(timeout=10) == 7
+
+
+def test_terminate_and_wait_timeout():
+    host = zygote.Zygote(preload=())
+    _, proc, pipe = host.fork("sleeper", lambda: time.sleep(30))
+    assert proc.poll() is None
+    with pytest.raises(subprocess.TimeoutExpired):
+        proc.wait(timeout=0.1)
+    proc.terminate()
+    assert proc.wait(timeout=10) == -15
+    pipe.close()
@@ -1,5 +1,6 @@
 import { defineStore } from 'pinia'
 import axios from 'axios'
+import { apiUrl } from '@/utils/api'
 
 export interface BotStatus {
   enabled: boolean
@@ -19,6 +20,7 @@ export interface SessionStatus {
   current_session_id: string | null
   state: string
   mode: string
+  device?: string | null
   image_count: number
   timeout_seconds: number
   message: string
@@ -42,6 +44,8 @@ export const useScansStore = defineStore('scans', {
     botStatus: null as BotStatus | null,
     botInfo: null as BotInfo | null,
     sessionStatus: null as SessionStatus | null,
+    sessionEvents: null as EventSource | null,
+    sessionStreamLive: false,
   }),
 
   getters: {
@@ -95,9 +99,39 @@ export const useScansStore = defineStore('scans', {
       }
     },
 
+    /**
+     * Subscribe to pushed session updates (replaces polling fetchSessionStatus).
+     * EventSource reconnects on its own; sessionStreamLive is false while the
+     * stream or the agent behind it is down, so callers can fall back to polling.
+     */
+    subscribeSessionEvents() {
+      if (this.sessionEvents) return
+      const source = new EventSource(apiUrl('api/session/events'))
+      source.onmessage = (event: MessageEvent) => {
+        const data = JSON.parse(event.data as string)
+        this.sessionStatus = data.status
+        this.sessionStreamLive = data.type !== 'disconnected'
+        if (data.type === 'session_processed') this.fetchScans()
+      }
+      source.onerror = () => {
+        this.sessionStreamLive = false
+      }
+      this.sessionEvents = source
+    },
+
+    unsubscribeSessionEvents() {
+      this.sessionEvents?.close()
+      this.sessionEvents = null
+      this.sessionStreamLive = false
+    },
+
     async confirmSession(printRequested = false): Promise<{ ok: boolean; message?: string }> {
       try {
-        const response = await axios.post(`api/session/confirm?print_requested=${printRequested}`)
+        // Target the session shown in the UI — other scanners may have sessions pending too
+        const sessionId = this.sessionStatus?.current_session_id
+        const response = await axios.post('api/session/confirm', null, {
+          params: { print_requested: printRequested, ...(sessionId ? { session_id: sessionId } : {}) },
+        })
         await this.fetchSessionStatus()
         return response.data
       } catch (error: any) {
@@ -107,7 +141,10 @@ export const useScansStore = defineStore('scans', {
 
     async rejectSession(): Promise<{ ok: boolean; message?: string }> {
       try {
-        const response = await axios.post('api/session/reject')
+        const sessionId = this.sessionStatus?.current_session_id
+        const response = await axios.post('api/session/reject', null, {
+          params: sessionId ? { session_id: sessionId } : {},
+        })
         await this.fetchSessionStatus()
         return response.data
       } catch (error: any) {